@@ -1,9 +1,9 @@
 import sys
 import os
 
-import sys, os, subprocess, threading, hashlib, shutil, tempfile, datetime, struct, time, json, binascii
-from dialogs import SelectivePatchDialog, RootFSEditDialog, CustomScriptDialog, SpecialFunctionsWindow, UBootEnvEditorDialog
-from core.logging_utils import configure_logging
+import sys, os, subprocess, threading, hashlib, shutil, datetime, struct, time, json, binascii
+from dialogs import SelectivePatchDialog, RootFSEditDialog, CustomScriptDialog, SpecialFunctionsWindow, UBootEnvEditorDialog, JobSignals, JobMonitorWidget, HexViewerDialog
+from core.logging_utils import configure_logging, write_category, GuiLogger
 
 # --- System library check (Linux: libxcb-cursor0 for Qt) ---
 def check_system_libs():
@@ -38,21 +38,6 @@ def utc_timestamp() -> str:
     return datetime.datetime.now(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
 
 # Helper: prefer bundled external/<tool> before falling back to system PATH
-def preferred_tool(name):
-    repo_dir = os.path.dirname(__file__)
-    # check common bundle locations first
-    cand = [
-        os.path.join(repo_dir, 'external', name, name),
-        os.path.join(repo_dir, 'external', name, 'bin', name),
-        os.path.join(repo_dir, 'external', name),
-    ]
-    for p in cand:
-        if os.path.isfile(p) and os.access(p, os.X_OK):
-            return p
-    # fall back to PATH
-    which = shutil.which(name)
-    return which or ''
-
 # --- Auto install dependencies if missing ---
 REQUIRED = [
     ("PySide6", "PySide6>=6.4.0"),
@@ -85,7 +70,7 @@ configure_logging()
 # --- GUI / i18n / consent helpers (shared) ---
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton, QTextEdit, QFileDialog, QLabel, QComboBox, QHBoxLayout, QMessageBox, QTabWidget, QLineEdit, QSpinBox, QInputDialog, QDialog, QCheckBox,
-    QTreeWidget, QTreeWidgetItem, QSplitter, QMenu, QProgressDialog, QProgressBar, QGroupBox, QStatusBar
+    QTreeWidget, QTreeWidgetItem, QSplitter, QMenu, QProgressBar, QGroupBox, QStatusBar, QPlainTextEdit
 )
 from PySide6.QtGui import QAction, QIcon
 from PySide6.QtCore import Qt, QTimer
@@ -119,6 +104,11 @@ _STRINGS = {
     'tab_log': {'th': 'บันทึก', 'en': 'Log'},
     'tab_rootfs_info': {'th': 'ข้อมูล RootFS', 'en': 'RootFS Info'},
     'tab_future': {'th': 'อื่น ๆ', 'en': 'Utilities'},
+    'act_delta_output': {'th': 'บันทึกผล patch เป็น delta', 'en': 'Save Patch Outputs as Delta'},
+    'act_apply_delta': {'th': 'สร้าง firmware จาก delta...', 'en': 'Materialise Delta...'},
+    'act_diff_images': {'th': 'เทียบ firmware ทั้งไฟล์', 'en': 'Diff Firmware Images'},
+    'tab_jobs': {'th': 'งานเบื้องหลัง', 'en': 'Jobs'},
+    'act_hex_view': {'th': 'ดู hex ของ firmware', 'en': 'Hex Viewer'},
 }
 def _(key):
     return _STRINGS.get(key, {}).get(LANG, key)
@@ -126,6 +116,7 @@ def _(key):
 CONFIG_DIR = os.path.join(os.path.expanduser('~'), '.config', 'firmware_toolkit')
 CONSENT_PATH = os.path.join(CONFIG_DIR, 'consent.json')
 ICON_PATH = os.path.join(os.path.dirname(__file__), 'icons', 'firmware_toolkit_yak.svg')
+LOG_VIEW_LINES = 20000  # on-screen log keeps the newest lines only; full history is in logs/
 
 def load_consent():
     try:
@@ -170,244 +161,57 @@ class ConsentDialog(QDialog):
             'timestamp': utc_timestamp()
         }
 
-from passlib.hash import sha512_crypt
 from core.fs_scan import scan_all_rootfs_partitions
-from core.secret_scan import scan_secrets_in_dir
-from core.elf_analyze import analyze_elf
+from core.elf_analyze import read_elf_header
 from core.file_utils import sha256sum, md5sum, crc32sum, get_entropy
+from core.extract_cache import get_cache as get_extract_cache
+from core.squashfs_reader import read_superblock as read_squashfs_superblock
+from core.repack_fit import plan_fit
+from core.size_estimator import SizeEstimator, shrink_candidates, plan_shrink
+from core.elf_strip import strip_elfs
+from core.slice_io import extract_slice, clone_file, splice_partition
+from core.file_classify import classify_tree, get_filetype
+from core.workspace import new_workspace, ROOTFS_WS_FACTOR
+from core.patch_txn import disable_inetd_services, set_root_password, set_boot_delay_byte
+from core.delta import apply_delta, read_delta_header, DELTA_SUFFIX
+from core.fw_diff import diff_images, format_report as format_diff_report
+from core.tree_diff import write_report, format_entry
+from core.cas_store import get_store as get_cas_store, diff_manifests
+from core.jobs import JobRunner, JobBusy
+from core.elf_diff import diff_elf_pairs, format_elf_diff
+from core.rootfs_ops import (
+    normalize_fs,
+    extract_rootfs,
+    read_rootfs_file,
+    repack_rootfs,
+    detect_serial_port,
+    serial_getty_op,
+    new_patch_transaction,
+    profile_transaction,
+)
 from core.uboot_env import (
     scan_uboot_env,
     analyze_bootloader_env,
     patch_uboot_env_bootdelay,
     patch_uboot_env_vars,
+    patch_compiled_uboot_bootdelay,
 )
 
 
-def get_filetype(fpath):
-    try:
-        return subprocess.check_output(["file", "-b", fpath], text=True).strip()
-    except Exception as e:
-        return f"file error: {e}"
-
-
-
-    
-
-def list_files_in_rootfs(rootfs_dir):
-    filelist = []
-    for root, dirs, files in os.walk(rootfs_dir):
-        for fname in files:
-            fpath = os.path.join(root, fname)
-            rel = os.path.relpath(fpath, rootfs_dir)
-            ftype = get_filetype(fpath)
-            filelist.append((rel, ftype))
-    return filelist
-
-def _normalize_fs(fs_type: str) -> str:
-    if not fs_type:
-        return fs_type
-    fs = fs_type.lower()
-    # Map common substrings / variants
-    if 'squash' in fs:
-        return 'squashfs'
-    if 'cramfs' in fs:
-        return 'cramfs'
-    if 'jffs2' in fs or fs == 'jffs':
-        return 'jffs2'
-    if fs.startswith('ubi') or 'ubifs' in fs:
-        return 'ubi'
-    return fs_type  # fallback original
-
-def extract_rootfs(fs_type, rootfs_bin, extract_dir, log_func):
-    fs_type = _normalize_fs(fs_type)
-    if fs_type == "squashfs":
-        # Primary tool unsquashfs; fallback to sasquatch (unmodified squashfs) if available; then binwalk
-        unsq = shutil.which("unsquashfs")
-        sasq = shutil.which("sasquatch")  # patched unsquashfs for LZMA edge cases
-        if unsq:
-            try:
-                subprocess.check_output([unsq, "-d", extract_dir, rootfs_bin], stderr=subprocess.STDOUT, timeout=45)
-                return True, ""
-            except Exception as e:
-                log_func(f"unsquashfs error: {e}; จะลอง sasquatch/ binwalk fallback")
-        if sasq:
-            try:
-                subprocess.check_output([sasq, "-d", extract_dir, rootfs_bin], stderr=subprocess.STDOUT, timeout=60)
-                return True, ""
-            except Exception as e:
-                log_func(f"sasquatch error: {e}; จะลอง binwalk fallback")
-    elif fs_type == "cramfs":
-        try:
-            subprocess.check_output(["cramfsck", "-x", extract_dir, rootfs_bin],
-                                   stderr=subprocess.STDOUT, timeout=30)
-            return True, ""
-        except Exception as e:
-            log_func(f"cramfsck error: {e}; จะลอง binwalk fallback")
-    elif fs_type in ("jffs2", "jffs"):
-        jefferson = shutil.which("jefferson")
-        if jefferson:
-            try:
-                subprocess.check_output([jefferson, rootfs_bin, extract_dir],
-                                       stderr=subprocess.STDOUT, timeout=60)
-                return True, ""
-            except Exception as e:
-                log_func(f"jefferson error: {e}; จะลอง binwalk fallback")
-        else:
-            log_func("jefferson tool not found for jffs2; จะลอง binwalk fallback")
-    elif fs_type == "ubi":
-        ubireader = shutil.which("ubireader_extract_files")
-        if ubireader:
-            try:
-                subprocess.check_output([
-                    "ubireader_extract_files", "-o", extract_dir, rootfs_bin
-                ], stderr=subprocess.STDOUT, timeout=120)
-                return True, ""
-            except Exception as e:
-                log_func(f"ubireader error: {e}; จะลอง binwalk fallback")
-        else:
-            log_func("ubireader_extract_files tool not found for ubi; จะลอง binwalk fallback")
-    else:
-        log_func(f"ไม่รองรับการแตก {fs_type}; จะลอง binwalk fallback")
-
-    # ---- Binwalk fallback ----
-    bw = preferred_tool('binwalk') or shutil.which("binwalk")
-    if not bw:
-        return False, "ไม่สำเร็จและไม่มี binwalk fallback (ติดตั้งด้วย: sudo apt install binwalk หรือ pip install binwalk --break-system-packages)"
-    try:
-        # Run extraction (-e) into a temp dir then move best candidate into extract_dir
-        tmp_bw = tempfile.mkdtemp(prefix="bw-extract-")
-        try:
-            subprocess.check_output([bw, "-e", rootfs_bin, "--directory", tmp_bw], stderr=subprocess.STDOUT, timeout=180)
-        except subprocess.CalledProcessError as e:
-            # binwalk returns non‑zero sometimes even if it extracted; continue
-            log_func(f"binwalk non-zero exit: {e}")
-        # Find candidate dirs (common names)
-        candidates = []
-        for r, dirs, files in os.walk(tmp_bw):
-            for d in dirs:
-                name = d.lower()
-                if any(x in name for x in ["squashfs-root", "rootfs", "fs_", "_extracted"]):
-                    candidates.append(os.path.join(r, d))
-        if not candidates:
-            # maybe binwalk created _rootfs.bin etc; as last resort copy everything
-            for d in os.listdir(tmp_bw):
-                p = os.path.join(tmp_bw, d)
-                if os.path.isdir(p):
-                    candidates.append(p)
-        if not candidates:
-            shutil.rmtree(tmp_bw, ignore_errors=True)
-            return False, "binwalk fallback ไม่พบโฟลเดอร์ rootfs"
-        # Pick largest candidate
-        def dir_size(p):
-            total=0
-            for rp, _, fs in os.walk(p):
-                for f in fs:
-                    try: total += os.path.getsize(os.path.join(rp,f))
-                    except: pass
-            return total
-        best = max(candidates, key=dir_size)
-        shutil.copytree(best, extract_dir, dirs_exist_ok=True)
-        shutil.rmtree(tmp_bw, ignore_errors=True)
-        log_func(f"✅ binwalk fallback extract สำเร็จ (เลือก {os.path.basename(best)})")
-        return True, ""
-    except Exception as e:
-        return False, f"binwalk fallback ล้มเหลว: {e}"
-
-def repack_rootfs(fs_type, unsquashfs_dir, rootfs_bin_out, log_func, force_comp=None):
-    fs_type = _normalize_fs(fs_type)
-    if fs_type == "squashfs":
-        mksquashfs = shutil.which("mksquashfs")
-        if not mksquashfs:
-            return False, "mksquashfs tool not found"
-
-        # --- ตรวจสอบ compression เดิม ---
-        comp = "gzip"  # default
-        extra_opts = []
-        try:
-            # หาไฟล์ squashfs เดิมใกล้ๆ rootfs_bin_out
-            orig_info = None
-            parent_dir = os.path.dirname(rootfs_bin_out) or "."
-            for fname in os.listdir(parent_dir):
-                if fname.endswith(".bin") or fname.endswith(".img") or fname.endswith(".squashfs"):
-                    orig_path = os.path.join(parent_dir, fname)
-                    try:
-                        out = subprocess.check_output(["unsquashfs", "-s", orig_path], text=True, stderr=subprocess.DEVNULL)
-                        orig_info = out
-                        break
-                    except Exception:
-                        continue
-            if orig_info:
-                for line in orig_info.splitlines():
-                    if "Compression:" in line:
-                        comp = line.split(":",1)[1].strip().split()[0].lower()
-                        break
-            # override by caller
-            if force_comp:
-                comp = force_comp
-
-            # เพิ่มออปชันบีบอัดสูงสุดตามชนิด
-            if comp == "xz":
-                extra_opts = ["-comp", "xz", "-b", "256K", "-Xdict-size", "100%"]
-            elif comp == "lzma":
-                extra_opts = ["-comp", "lzma", "-b", "256K"]
-            elif comp == "gzip":
-                extra_opts = ["-comp", "gzip", "-b", "256K"]
-            elif comp == "zstd":
-                extra_opts = ["-comp", "zstd", "-b", "256K"]
-            else:
-                extra_opts = ["-comp", comp]
-        except Exception as e:
-            log_func(f"[WARN] ตรวจสอบ compression เดิมไม่สำเร็จ: {e}")
-            extra_opts = ["-comp", "gzip", "-b", "256K"]
-
-        try:
-            cmd = [mksquashfs, unsquashfs_dir, rootfs_bin_out, "-noappend"] + extra_opts
-            log_func(f"[INFO] repack squashfs: {' '.join(cmd)}")
-            subprocess.check_output(cmd, stderr=subprocess.STDOUT, timeout=120)
-            return True, ""
-        except Exception as e:
-            return False, f"mksquashfs error: {e}"
-
-    elif fs_type == "cramfs":
-        mkcramfs = shutil.which("mkcramfs")
-        if not mkcramfs:
-            return False, "mkcramfs tool not found"
-        try:
-            subprocess.check_output(
-                [mkcramfs, unsquashfs_dir, rootfs_bin_out],
-                stderr=subprocess.STDOUT, timeout=60
-            )
-            return True, ""
-        except Exception as e:
-            return False, f"mkcramfs error: {e}"
-
-    elif fs_type in ("jffs2", "jffs"):
-        mkfsjffs2 = shutil.which("mkfs.jffs2")
-        if not mkfsjffs2:
-            return False, "mkfs.jffs2 tool not found"
-        try:
-            subprocess.check_output(
-                [mkfsjffs2, "-d", unsquashfs_dir, "-o", rootfs_bin_out],
-                stderr=subprocess.STDOUT, timeout=120
-            )
-            return True, ""
-        except Exception as e:
-            return False, f"mkfs.jffs2 error: {e}"
-
-    else:
-        return False, f"ไม่รองรับการ pack {fs_type}"
+def list_files_in_rootfs(rootfs_dir, log_func=lambda m: None):
+    # magic table in-process; only unknown files go to one batched `file` run
+    return classify_tree(rootfs_dir, log_func)
 
 def patch_boot_delay(fw_path, rootfs_part, new_delay, out_path, log_func):
     # Patch at offset 0x100 (example, may vary by firmware)
     try:
-        with open(fw_path, "rb") as f:
-            data = bytearray(f.read())
-        if len(data) <= 0x100:
+        if os.path.getsize(fw_path) <= 0x100:
             log_func("❌ ไฟล์เล็กเกินไป ไม่มี offset 0x100")
             return False, "file too small"
-        data[0x100] = new_delay & 0xFF
-        with open(out_path, "wb") as f:
-            f.write(data)
+        clone_file(fw_path, out_path)
+        with open(out_path, "r+b") as f:
+            f.seek(0x100)
+            f.write(bytes([new_delay & 0xFF]))
         log_func(f"✅ Patch boot delay ที่ offset 0x100 เป็น {new_delay} วินาที สำเร็จ: {out_path}")
         return True, ""
     except Exception as e:
@@ -662,7 +466,7 @@ def patch_uboot_env_bootdelay(src_fw, dst_fw, new_val, log_func=lambda m:None):
     padding=b'\x00'*((size-4)-used)
     new_block=struct.pack('<I', new_crc)+new_env_region+b'\x00'+padding
     # copy whole file then patch
-    with open(src_fw,'rb') as fsrc, open(dst_fw,'wb') as fdst: shutil.copyfileobj(fsrc,fdst)
+    clone_file(src_fw, dst_fw)
     with open(dst_fw,'r+b') as f: f.seek(off); f.write(new_block)
     log_func(f"[UBOOT] bootdelay {target.get('bootdelay')} -> {new_val} @0x{off:X} size=0x{size:X} crc_old={stored_crc:08x} crc_new={new_crc:08x}")
     return True
@@ -674,7 +478,7 @@ def patch_uboot_env_bootdelay_all(src_fw, dst_fw, new_val, log_func=lambda m:Non
     import struct, binascii
     try:
         # start by copying original to dst
-        with open(src_fw,'rb') as fsrc, open(dst_fw,'wb') as fdst: shutil.copyfileobj(fsrc,fdst)
+        clone_file(src_fw, dst_fw)
         total=0; changed=0
         # combined scan normal+deep (deep will include normal again but dedup by offset)
         envs = scan_uboot_env(src_fw)
@@ -731,45 +535,6 @@ def patch_uboot_env_bootdelay_all(src_fw, dst_fw, new_val, log_func=lambda m:Non
         log_func(f"[UBOOT] patch-all error: {e}")
         return False
 
-def patch_compiled_uboot_bootdelay(src_fw, dst_fw, new_val, log_func=lambda m:None, search_limit=0x80000):
-    """Patch bootdelay inside the compiled-in default environment string in U-Boot binary.
-    - search_limit: int bytes from start, or None for full file
-    - Only patches when new digits length == old digits length (avoid shifting)
-    - Returns True if at least one replacement
-    """
-    try:
-        with open(src_fw,'rb') as f: data=bytearray(f.read())
-        limit=len(data) if (search_limit is None) else min(len(data), search_limit)
-        target = b'bootdelay='
-        count=0
-        i=0
-        new_s=str(new_val).encode()
-        while True:
-            p=data.find(target, i, limit)
-            if p==-1: break
-            # read digits after '=' until non-digit or max 5 chars
-            d_start=p+len(target)
-            d_end=d_start
-            while d_end<limit and chr(data[d_end]).isdigit():
-                d_end+=1
-            old_digits=data[d_start:d_end]
-            if not old_digits:
-                i=d_end; continue
-            if len(old_digits)==len(new_s):
-                if old_digits!=new_s:
-                    log_func(f"[UBOOT] compiled bootdelay patch {old_digits.decode()}->{new_s.decode()} at 0x{p:X}")
-                    data[d_start:d_end]=new_s; count+=1
-            else:
-                log_func(f"[UBOOT] skip compiled bootdelay at 0x{p:X} (len mismatch {len(old_digits)} vs {len(new_s)})")
-            i=d_end
-        if count:
-            with open(dst_fw,'wb') as f: f.write(data)
-            return True
-        return False
-    except Exception as e:
-        log_func(f"[UBOOT] compiled patch error: {e}")
-        return False
-
 def patch_uboot_env_vars(src_fw, dst_fw, target_offset, target_size, updates: dict, log_func=lambda m:None):
     """Patch arbitrary U-Boot environment variables.
     updates: {key: new_value or '' (empty string means delete)}
@@ -823,62 +588,38 @@ def patch_uboot_env_vars(src_fw, dst_fw, target_offset, target_size, updates: di
         used=len(new_env_region)+1
         padding=b'\x00'*((target_size-4)-used)
         new_block=struct.pack('<I', new_crc)+new_env_region+b'\x00'+padding
-        with open(src_fw,'rb') as fsrc, open(dst_fw,'wb') as fdst: shutil.copyfileobj(fsrc,fdst)
+        clone_file(src_fw, dst_fw)
         with open(dst_fw,'r+b') as f: f.seek(target_offset); f.write(new_block)
         log_func(f"[UBOOT] Patch vars @0x{target_offset:X} size=0x{target_size:X} crc_old={stored_crc:08x} crc_new={new_crc:08x} updates={len(updates)}")
         return True, ''
     except Exception as e:
         log_func(f"[UBOOT] error: {e}"); return False, str(e)
 
-def patch_rootfs_shell_serial(fw_path, rootfs_part, out_path, log_func):
+# sentinel: "ask the GUI" (None already means auto-detect)
+_AUTO_PORT = object()
+
+def patch_rootfs_shell_serial(fw_path, rootfs_part, out_path, log_func, preferred_port=_AUTO_PORT):
     # เพิ่ม getty สำหรับพอร์ตอนุกรมที่ตรวจพบ (auto-detect)
-    tmpdir = tempfile.mkdtemp(prefix="patch-serial-")
-    log_func(f"[TEMP] serial patch workspace: {tmpdir}")
+    # preferred_port: ส่งมาตรงๆ เมื่อรันใน background job (ห้ามแตะ widget จาก worker thread)
+    if preferred_port is _AUTO_PORT:
+        preferred_port = _gui_preferred_serial_port()
+    ws = new_workspace("patch-serial-", rootfs_part['size'] * ROOTFS_WS_FACTOR, log_func)
+    tmpdir = ws.path
     try:
         # Extract rootfs
         rootfs_bin = os.path.join(tmpdir, "rootfs.bin")
-        with open(fw_path, "rb") as f:
-            f.seek(rootfs_part['offset'])
-            rootfs = f.read(rootfs_part['size'])
-            with open(rootfs_bin, "wb") as fo:
-                fo.write(rootfs)
+        extract_slice(fw_path, rootfs_part['offset'], rootfs_part['size'], rootfs_bin)
         log_func(f"[INFO] ขนาด rootfs เดิม: {os.path.getsize(rootfs_bin)} bytes")
         unsquashfs_dir = os.path.join(tmpdir, "unsquashfs")
         os.makedirs(unsquashfs_dir)
-        ok, err = extract_rootfs(rootfs_part['fs'], rootfs_bin, unsquashfs_dir, log_func)
+        ok, err = get_extract_cache().checkout(fw_path, rootfs_part, unsquashfs_dir, extract_rootfs, log_func)
         if not ok:
             log_func(f"❌ แตก rootfs ไม่สำเร็จ: {err}")
             return False, err
-        # detect preferred serial port
-        serial_port = auto_detect_tty_port_from_context(fw_path, rootfs_part, unsquashfs_dir, log_func)
-        inittab_path = os.path.join(unsquashfs_dir, "etc", "inittab")
-        if os.path.exists(inittab_path):
-            # avoid duplicate entries
-            existing = ''
-            try:
-                existing = open(inittab_path,'r',encoding='utf-8',errors='ignore').read()
-            except Exception: pass
-            getty_line = f"{serial_port}:12345:respawn:/sbin/getty -L {serial_port} 115200 vt100"
-            if serial_port not in existing:
-                with open(inittab_path, "a", encoding="utf-8") as f:
-                    f.write("\n"+getty_line+"\n")
-                log_func(f"เพิ่ม getty {serial_port} ใน inittab สำเร็จ")
-            else:
-                log_func(f"พบ {serial_port} อยู่แล้วใน inittab (ข้าม)")
-        else:
-            log_func("ไม่พบ /etc/inittab ใน rootfs (สร้างใหม่พร้อม getty)")
-            try:
-                os.makedirs(os.path.dirname(inittab_path), exist_ok=True)
-                with open(inittab_path,'w',encoding='utf-8') as f:
-                    f.write(f"::sysinit:/bin/mount -t proc proc /proc\n")
-                    f.write(f"::sysinit:/bin/mount -t sysfs sysfs /sys\n")
-                    f.write(f"::respawn:/sbin/getty -L {serial_port} 115200 vt100\n")
-                log_func("สร้าง inittab ใหม่สำเร็จ")
-            except Exception as e:
-                log_func(f"สร้าง inittab ใหม่ล้มเหลว: {e}")
+        serial_getty_op(fw_path, rootfs_part, preferred_port)(unsquashfs_dir, log_func)
         # Repack rootfs
         new_rootfs_bin = os.path.join(tmpdir, "new_rootfs.bin")
-        ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func)
+        ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func, base_image=rootfs_bin)
         if not ok:
             log_func(f"❌ repack rootfs ไม่สำเร็จ: {err}")
             return False, err
@@ -890,266 +631,207 @@ def patch_rootfs_shell_serial(fw_path, rootfs_part, out_path, log_func):
             shrink_steps = []
 
             # Step 1: strip ELF symbols (if strip available)
-            def step_strip_binaries():
-                stripped = 0
-                strip_bin = shutil.which('strip')
-                if not strip_bin:
-                    log_func('[AI] ไม่พบเครื่องมือ strip; ข้ามการ strip บินารี่')
-                    return 0
-                for dp, dn, fnames in os.walk(unsquashfs_dir):
-                    for fname in fnames:
-                        fpath = os.path.join(dp, fname)
-                        try:
-                            with open(fpath, 'rb') as tf:
-                                head = tf.read(4)
-                            if head == b'\x7fELF':
-                                # attempt strip --strip-unneeded
-                                try:
-                                    subprocess.run([strip_bin, '--strip-unneeded', fpath], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
-                                    stripped += 1
-                                except Exception:
-                                    # try without flags
-                                    try:
-                                        subprocess.run([strip_bin, fpath], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
-                                        stripped += 1
-                                    except Exception:
-                                        pass
-                        except Exception:
-                            continue
-                log_func(f"[AI] strip: ดำเนินการ strip บินารี่แล้ว {stripped} ไฟล์")
-                return stripped
-
-            # Step 2: remove docs, man, locale, logs, tmp
-            def step_remove_docs_logs():
-                removed = []
-                patterns = ['usr/share/doc', 'usr/share/man', 'usr/share/locale', 'var/log', 'tmp', 'var/tmp', 'usr/share/locale-langpack']
-                for p in patterns:
-                    full = os.path.join(unsquashfs_dir, p)
-                    if os.path.exists(full):
-                        try:
-                            # record size before removal
-                            sz = 0
-                            for rp, dn, fn in os.walk(full):
-                                for f in fn:
-                                    try:
-                                        sz += os.path.getsize(os.path.join(rp, f))
-                                    except Exception:
-                                        pass
-                            shutil.rmtree(full, ignore_errors=True)
-                            removed.append((p, sz))
-                            log_func(f"[AI] ลบ {p} (ประมาณ {sz} bytes)")
-                        except Exception:
-                            continue
-                return removed
-
-            # Attempt to reduce size by removing unnecessary files
-            def step_remove_unnecessary_files():
-                removed = []
-                patterns = ['usr/share/doc', 'usr/share/man', 'usr/share/locale', 'var/log', 'tmp', 'var/tmp']
-                for p in patterns:
-                    full = os.path.join(unsquashfs_dir, p)
-                    if os.path.exists(full):
-                        try:
-                            shutil.rmtree(full, ignore_errors=True)
-                            removed.append(p)
-                            log_func(f"[AI] Removed unnecessary files: {p}")
-                        except Exception as e:
-                            log_func(f"[AI] Failed to remove {p}: {e}")
-                return removed
-
-            # run steps iteratively and try repack after each
-            try_order = [step_strip_binaries, step_remove_docs_logs, step_remove_unnecessary_files]
-            success = False
-            for step in try_order:
-                res = step()
-                # repack with same compression first
+            def step_strip_binaries(paths=None):
+                results = strip_elfs(paths if paths is not None else unsquashfs_dir, log_func)
+                return sum(1 for r in results if r['ok'])
+
+            # Fit planner: try several compressor / block size / BCJ configurations
+            # concurrently (one round) before and after removing content.
+            is_sqfs = normalize_fs(rootfs_part['fs']) == 'squashfs'
+            orig_comp, orig_bs = 'gzip', 4096  # jffs2/cramfs: zlib per 4K page
+            if is_sqfs:
+                try:
+                    with open(rootfs_bin, 'rb') as f:
+                        sb = read_squashfs_superblock(f)
+                    orig_comp, orig_bs = sb['compression_name'], sb['block_size']
+                except Exception:
+                    pass
+
+            fit_results = []
+
+            def try_fit(stage):
+                if is_sqfs:
+                    ok, info = plan_fit(unsquashfs_dir, new_rootfs_bin, rootfs_part['size'], log_func,
+                                        orig_comp=orig_comp, results_out=fit_results)
+                    if ok:
+                        log_func(f"[AI] หลัง {stage}: {info['comp']} bs={info['block_size']} bcj={info['bcj'] or '-'} -> {info['size']} bytes")
+                    else:
+                        log_func(f"[AI] หลัง {stage} ยังไม่พอ: {info}")
+                    return ok
                 ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func)
                 if not ok:
-                    log_func(f"[AI] หลังขั้นตอน {step.__name__} pack ล้มเหลว: {err}")
-                else:
-                    new_size = os.path.getsize(new_rootfs_bin)
-                    log_func(f"[AI] หลัง {step.__name__} ขนาด rootfs: {new_size} bytes")
-                    if new_size <= rootfs_part['size']:
-                        success = True
-                        log_func("[AI] ลดขนาดสำเร็จหลังขั้นตอนอัตโนมัติ")
-                        break
-
-            # if still too big, try stronger compression (xz)
+                    log_func(f"[AI] หลัง {stage} pack ล้มเหลว: {err}")
+                    return False
+                size = os.path.getsize(new_rootfs_bin)
+                log_func(f"[AI] หลัง {stage} ขนาด rootfs: {size} bytes")
+                return size <= rootfs_part['size']
+
+            est_report = {}
+
+            def shrink_by_plan():
+                # estimate against the closest configuration we actually packed, then pick the
+                # cheapest strips/removals covering the deficit; one confirming repack after
+                ref = min(fit_results, key=lambda r: r['size']) if fit_results else \
+                    {'comp': orig_comp, 'block_size': orig_bs, 'size': new_size}
+                try:
+                    est = SizeEstimator(ref['comp'], ref['block_size'])
+                except Exception:
+                    est = SizeEstimator('gzip', ref['block_size'])
+                est_report.update(est.estimate_tree(unsquashfs_dir, log_func))
+                scale = ref['size'] / est_report['total'] if est_report['total'] else 1.0
+                need = int((ref['size'] - rootfs_part['size']) / scale) + 4096
+                plan = plan_shrink(shrink_candidates(unsquashfs_dir, est_report), need)
+                if plan is None:
+                    log_func(f"[AI] แม้ strip/ลบไฟล์ที่เสนอได้ทั้งหมดก็ยังลดไม่พอ (ต้องลด ~{need} bytes)")
+                    return False
+                strips = [os.path.join(unsquashfs_dir, it['path']) for it in plan if it['action'] == 'strip']
+                removals = [it for it in plan if it['action'] == 'remove']
+                log_func(f"[AI] แผนลดขนาด: strip {len(strips)} ไฟล์, ลบ {[it['path'] for it in removals]} "
+                         f"(คาดว่าลดได้ ~{int(sum(it['saving'] for it in plan) * scale)} bytes, ต้องการ ~{int(need * scale)})")
+                if strips:
+                    step_strip_binaries(strips)
+                for it in removals:
+                    shutil.rmtree(os.path.join(unsquashfs_dir, it['path']), ignore_errors=True)
+                    log_func(f"[AI] ลบ {it['path']} (ประมาณ {int(it['saving'] * scale)} bytes หลังบีบอัด)")
+                return try_fit('ตามแผนลดขนาด')
+
+            success = try_fit('ปรับการบีบอัด')
             if not success:
-                log_func('[AI] พยายามใช้การบีบอัดที่แรงขึ้น: xz')
-                ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func, force_comp='xz')
-                if ok:
-                    new_size = os.path.getsize(new_rootfs_bin)
-                    log_func(f"[AI] หลังใช้ xz ขนาด rootfs: {new_size} bytes")
-                    if new_size <= rootfs_part['size']:
-                        success = True
-                else:
-                    log_func(f"[AI] repack ด้วย xz ล้มเหลว: {err}")
+                success = shrink_by_plan()
+            if success:
+                log_func("[AI] ลดขนาดสำเร็จหลังขั้นตอนอัตโนมัติ")
 
             if not success:
                 log_func("❌ พยายามลดขนาดอัตโนมัติทั้งหมดแล้วแต่ยังไม่พอ -> แสดงไฟล์แนะนำเพื่อลดด้วยมือ")
-                file_sizes = []
-                for dp, dn, fn in os.walk(unsquashfs_dir):
-                    for f in fn:
-                        fpath = os.path.join(dp, f)
-                        try:
-                            sz = os.path.getsize(fpath)
-                            file_sizes.append((sz, os.path.relpath(fpath, unsquashfs_dir)))
-                        except Exception:
-                            continue
-                largest = sorted(file_sizes, reverse=True)[:10]
+                if est_report:
+                    # rank by estimated compressed contribution, not raw size
+                    largest = sorted(((est, rel) for rel, (_, est) in est_report['files'].items()
+                                      if os.path.exists(os.path.join(unsquashfs_dir, rel))), reverse=True)[:10]
+                    label = "bytes หลังบีบอัด (ประมาณ)"
+                else:
+                    largest = []
+                    for dp, dn, fn in os.walk(unsquashfs_dir):
+                        for f in fn:
+                            try:
+                                largest.append((os.path.getsize(os.path.join(dp, f)), os.path.relpath(os.path.join(dp, f), unsquashfs_dir)))
+                            except Exception:
+                                continue
+                    largest = sorted(largest, reverse=True)[:10]
+                    label = "bytes"
                 if largest:
                     log_func("[TOP] ไฟล์ที่กินพื้นที่มากสุดใน rootfs ใหม่:")
                     for sz, path in largest:
-                        log_func(f"  {path}: {sz} bytes")
+                        log_func(f"  {path}: {sz} {label}")
                 return False, "new rootfs too large"
             # success: new_rootfs_bin now contains smaller image
             new_size = os.path.getsize(new_rootfs_bin)
             log_func(f"[OK] ได้ rootfs ใหม่ขนาด {new_size} bytes หลังการลดอัตโนมัติ")
-        # Write new firmware
-        with open(fw_path, "rb") as f:
-            fw_data = bytearray(f.read())
-        with open(new_rootfs_bin, "rb") as f:
-            new_rootfs = f.read()
-        fw_data[rootfs_part['offset']:rootfs_part['offset'] + len(new_rootfs)] = new_rootfs
-        # fill zero if needed
-        if len(new_rootfs) < rootfs_part['size']:
-            fw_data[rootfs_part['offset'] + len(new_rootfs):rootfs_part['offset'] + rootfs_part['size']] = b'\x00' * (rootfs_part['size'] - len(new_rootfs))
-        with open(out_path, "wb") as f:
-            f.write(fw_data)
+        # Write new firmware (clone + splice; fill zero if needed)
+        ok, err = splice_partition(fw_path, out_path, rootfs_part['offset'], rootfs_part['size'], new_rootfs_bin)
+        if not ok:
+            log_func(f"❌ เขียน firmware ใหม่ไม่สำเร็จ: {err}")
+            return False, err
         log_func(f"✅ Patch shell serial สำเร็จ: {out_path}")
         return True, ""
     finally:
-        shutil.rmtree(tmpdir)
+        ws.cleanup()
 
 def patch_rootfs_network(fw_path, rootfs_part, out_path, log_func):
     # ปิด telnet / ftp (ลบหรือคอมเมนต์ใน inetd.conf) ถ้าไม่พบให้ log ไว้
-    tmpdir = tempfile.mkdtemp(prefix="patch-net-")
-    log_func(f"[TEMP] network patch workspace: {tmpdir}")
+    try:
+        inetd = read_rootfs_file(fw_path, rootfs_part, 'etc/inetd.conf')
+    except FileNotFoundError:
+        inetd = b''
+    if inetd is not None and not any(
+            (b'telnet' in ln.lower() or b'ftp' in ln.lower()) and not ln.strip().startswith(b'#')
+            for ln in inetd.splitlines()):
+        log_func("[PRECHECK] ไม่มี telnet/ftp ที่เปิดอยู่ใน inetd.conf — คัดลอก firmware เดิมโดยไม่ repack")
+        try:
+            clone_file(fw_path, out_path)  # no-op when out_path already is fw_path (unified output)
+        except OSError as e:
+            log_func(f"❌ คัดลอก firmware ไม่สำเร็จ: {e}")
+            return False, str(e)
+        return True, ""
+    ws = new_workspace("patch-net-", rootfs_part['size'] * ROOTFS_WS_FACTOR, log_func)
+    tmpdir = ws.path
     try:
         rootfs_bin = os.path.join(tmpdir, "rootfs.bin")
-        with open(fw_path, "rb") as f:
-            f.seek(rootfs_part['offset'])
-            rootfs = f.read(rootfs_part['size'])
-            with open(rootfs_bin, "wb") as fo:
-                fo.write(rootfs)
+        extract_slice(fw_path, rootfs_part['offset'], rootfs_part['size'], rootfs_bin)
         unsquashfs_dir = os.path.join(tmpdir, "unsquashfs")
         os.makedirs(unsquashfs_dir)
-        ok, err = extract_rootfs(rootfs_part['fs'], rootfs_bin, unsquashfs_dir, log_func)
+        ok, err = get_extract_cache().checkout(fw_path, rootfs_part, unsquashfs_dir, extract_rootfs, log_func)
         if not ok:
             log_func(f"❌ แตก rootfs ไม่สำเร็จ: {err}")
             return False, err
-        inetd_path = os.path.join(unsquashfs_dir, "etc", "inetd.conf")
-        if os.path.exists(inetd_path):
-            try:
-                with open(inetd_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                new_lines = []
-                removed = 0
-                for ln in lines:
-                    low = ln.lower()
-                    if ('telnet' in low or 'ftp' in low) and not low.strip().startswith('#'):
-                        new_lines.append('#DISABLED ' + ln)
-                        removed += 1
-                    else:
-                        new_lines.append(ln)
-                with open(inetd_path, 'w', encoding='utf-8') as f:
-                    f.writelines(new_lines)
-                log_func(f"ปิด telnet/ftp ใน inetd.conf (คอมเมนต์ {removed} บรรทัด)")
-            except Exception as e:
-                log_func(f"แก้ไข inetd.conf ไม่สำเร็จ: {e}")
-        else:
-            log_func("ไม่พบ etc/inetd.conf (อาจไม่มีบริการ telnet/ftp)")
+        try:
+            detail = disable_inetd_services(unsquashfs_dir, log_func)
+            log_func(detail or "ไม่พบ telnet/ftp ที่เปิดอยู่ใน etc/inetd.conf")
+        except Exception as e:
+            log_func(f"แก้ไข inetd.conf ไม่สำเร็จ: {e}")
         # Repack rootfs
         new_rootfs_bin = os.path.join(tmpdir, "new_rootfs.bin")
-        ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func)
+        ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func, base_image=rootfs_bin)
         if not ok:
             log_func(f"❌ pack rootfs ไม่สำเร็จ: {err}")
             return False, err
         # Write new firmware
-        with open(fw_path, "rb") as f:
-            fw_data = bytearray(f.read())
-        with open(new_rootfs_bin, "rb") as f:
-            new_rootfs = f.read()
-        if len(new_rootfs) > rootfs_part['size']:
+        if os.path.getsize(new_rootfs_bin) > rootfs_part['size']:
             log_func("❌ rootfs ใหม่ใหญ่เกินขอบเขตเดิม ไม่สามารถ patch ได้")
             return False, "rootfs too large"
-        fw_data[rootfs_part['offset']:rootfs_part['offset'] + len(new_rootfs)] = new_rootfs
-        if len(new_rootfs) < rootfs_part['size']:
-            fw_data[rootfs_part['offset'] + len(new_rootfs):rootfs_part['offset'] + rootfs_part['size']] = b'\x00' * (rootfs_part['size'] - len(new_rootfs))
-        with open(out_path, "wb") as f:
-            f.write(fw_data)
+        ok, err = splice_partition(fw_path, out_path, rootfs_part['offset'], rootfs_part['size'], new_rootfs_bin)
+        if not ok:
+            log_func(f"❌ เขียน firmware ใหม่ไม่สำเร็จ: {err}")
+            return False, err
         log_func(f"✅ Patch shell network สำเร็จ: {out_path}")
         return True, ""
     finally:
-        shutil.rmtree(tmpdir)
+        ws.cleanup()
 
 def patch_root_password(fw_path, rootfs_part, password, out_path, log_func):
-    tmpdir = tempfile.mkdtemp(prefix="patch-rootpw-")
-    log_func(f"[TEMP] root password patch workspace: {tmpdir}")
+    try:
+        shadow = read_rootfs_file(fw_path, rootfs_part, 'etc/shadow')
+    except FileNotFoundError:
+        log_func("❌ ไม่พบ /etc/shadow ใน rootfs")
+        return False, "shadow missing"
+    if shadow is not None and not any(ln.startswith(b'root:') for ln in shadow.splitlines()):
+        log_func("❌ ไม่พบ user root ใน /etc/shadow")
+        return False, "root user not found"
+    ws = new_workspace("patch-rootpw-", rootfs_part['size'] * ROOTFS_WS_FACTOR, log_func)
+    tmpdir = ws.path
     try:
         rootfs_bin = os.path.join(tmpdir, "rootfs.bin")
-        with open(fw_path, "rb") as f:
-            f.seek(rootfs_part['offset'])
-            rootfs = f.read(rootfs_part['size'])
-            with open(rootfs_bin, "wb") as fo:
-                fo.write(rootfs)
+        extract_slice(fw_path, rootfs_part['offset'], rootfs_part['size'], rootfs_bin)
         unsquashfs_dir = os.path.join(tmpdir, "unsquashfs")
         os.makedirs(unsquashfs_dir)
-        ok, err = extract_rootfs(rootfs_part['fs'], rootfs_bin, unsquashfs_dir, log_func)
+        ok, err = get_extract_cache().checkout(fw_path, rootfs_part, unsquashfs_dir, extract_rootfs, log_func)
         if not ok:
             log_func(f"❌ แตก rootfs ไม่สำเร็จ: {err}")
             return False, err
-        shadow_path = os.path.join(unsquashfs_dir, "etc", "shadow")
-        if not os.path.exists(shadow_path):
+        # Allow passing a pre-computed hash (starts with $6$) so imported profiles can work without plain password.
+        try:
+            set_root_password(password)(unsquashfs_dir, log_func)
+        except FileNotFoundError:
             log_func("❌ ไม่พบ /etc/shadow ใน rootfs")
             return False, "shadow missing"
-        # Allow passing a pre-computed hash (starts with $6$) so imported profiles can work without plain password.
-        if password == "":
-            new_hash = "!"  # lock root
-        elif password.startswith("$6$"):
-            new_hash = password  # already hashed (sha512-crypt)
-        else:
-            new_hash = sha512_crypt.hash(password, rounds=5000)
-        with open(shadow_path, "r") as f:
-            lines = f.readlines()
-        new_lines = []
-        found = False
-        for line in lines:
-            if line.startswith("root:"):
-                found = True
-                parts = line.split(":")
-                parts[1] = new_hash
-                new_lines.append(":".join(parts))
-            else:
-                new_lines.append(line)
-        if not found:
+        except ValueError:
             log_func("❌ ไม่พบ user root ใน /etc/shadow")
             return False, "root user not found"
-        with open(shadow_path, "w") as f:
-            for l in new_lines:
-                f.write(l if l.endswith("\n") else l + "\n")
         new_rootfs_bin = os.path.join(tmpdir, "new_rootfs.bin")
-        ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func)
+        ok, err = repack_rootfs(rootfs_part['fs'], unsquashfs_dir, new_rootfs_bin, log_func, base_image=rootfs_bin)
         if not ok:
             log_func(f"❌ pack rootfs ไม่สำเร็จ: {err}")
             return False, err
-        with open(fw_path, "rb") as f:
-            fw_data = bytearray(f.read())
-        with open(new_rootfs_bin, "rb") as f:
-            new_rootfs = f.read()
-        if len(new_rootfs) > rootfs_part['size']:
+        if os.path.getsize(new_rootfs_bin) > rootfs_part['size']:
             log_func("❌ rootfs ใหม่ใหญ่เกินขอบเขตเดิม ไม่สามารถ patch ได้")
             return False, "rootfs too large"
-        fw_data[rootfs_part['offset']:rootfs_part['offset'] + len(new_rootfs)] = new_rootfs
-        if len(new_rootfs) < rootfs_part['size']:
-            fw_data[rootfs_part['offset'] + len(new_rootfs):rootfs_part['offset'] + rootfs_part['size']] = b'\x00' * (rootfs_part['size'] - len(new_rootfs))
-        with open(out_path, "wb") as f:
-            f.write(fw_data)
+        ok, err = splice_partition(fw_path, out_path, rootfs_part['offset'], rootfs_part['size'], new_rootfs_bin)
+        if not ok:
+            log_func(f"❌ เขียน firmware ใหม่ไม่สำเร็จ: {err}")
+            return False, err
         log_func(f"✅ Patch root password สำเร็จ: {out_path}")
         return True, ""
     finally:
-        shutil.rmtree(tmpdir)
+        ws.cleanup()
 
 class MainWindow(QMainWindow):
     """Main application window (reconstructed clean version)"""
@@ -1168,6 +850,12 @@ class MainWindow(QMainWindow):
         self.rootfs_parts = []
         self.analysis_result = None
         self.rootfs_reports = []
+        # background jobs: core operations run on worker threads, results come back via Qt signals
+        self.job_signals = JobSignals(self)
+        self.jobs = JobRunner(listener=self.job_signals)
+        self._job_callbacks = {}
+        self.job_signals.log.connect(self._on_job_log)
+        self.job_signals.finished.connect(self._on_job_finished)
 
         # ---- Build central UI ----
         central = QWidget(); main_v = QVBoxLayout(central)
@@ -1223,7 +911,10 @@ class MainWindow(QMainWindow):
         main_v.addWidget(sec_grp)
 
         # Tabs & future utilities
-        self.tabs = QTabWidget(); self.log_view = QTextEdit(); self.log_view.setReadOnly(True); self.info_view = QTextEdit(); self.info_view.setReadOnly(True)
+        self.tabs = QTabWidget(); self.log_view = QPlainTextEdit(); self.log_view.setReadOnly(True); self.log_view.setMaximumBlockCount(LOG_VIEW_LINES)
+        # log lines are buffered (any thread) and appended in batches by a GUI timer
+        self._gui_log = GuiLogger(self.log_view.appendPlainText); self._log_timer = QTimer(self); self._log_timer.timeout.connect(self._flush_log); self._log_timer.start(100)
+        self.info_view = QTextEdit(); self.info_view.setReadOnly(True)
         self.tabs.addTab(self.log_view, _("tab_log")); self.tabs.addTab(self.info_view, _("tab_rootfs_info"))
         self.rootfs_part_spin = QSpinBox(); self.rootfs_part_spin.setRange(1, 32); self.rootfs_part_spin.hide()
         fut = QWidget(); fut_l = QVBoxLayout(fut)
@@ -1231,6 +922,8 @@ class MainWindow(QMainWindow):
             ("Scan Vulnerabilities", self.scan_vulnerabilities),
             ("Scan Backdoor/Webshell", self.scan_backdoor),
             ("Diff Executables", self.diff_executables),
+            ("Diff Firmware Images", self.diff_firmware_images),
+            ("Hex Viewer", self.open_hex_viewer),
             ("Selective Patch", self.patch_selective),
             ("Edit U-Boot Env", self.open_uboot_env_editor),
             ("Edit RootFS File", self.edit_rootfs_file),
@@ -1240,7 +933,8 @@ class MainWindow(QMainWindow):
             ("Import Patch Profile", self.import_patch_profile),
         ]:
             b = QPushButton(text); b.clicked.connect(slot); fut_l.addWidget(b)
-        fut_l.addStretch(); self.tabs.addTab(fut, _("tab_future")); main_v.addWidget(self.tabs, 1)
+        fut_l.addStretch(); self.tabs.addTab(fut, _("tab_future"))
+        self.job_monitor = JobMonitorWidget(self.job_signals); self.tabs.addTab(self.job_monitor, _("tab_jobs")); main_v.addWidget(self.tabs, 1)
 
         # Utility buttons
         util_h = QHBoxLayout(); btn_special = QPushButton(_("btn_special")); btn_special.setProperty('category','info'); btn_special.clicked.connect(self.open_special_functions_window); util_h.addWidget(btn_special)
@@ -1285,21 +979,44 @@ class MainWindow(QMainWindow):
 
     # ---------- Utility / Logging ----------
     def log(self, text):
-        self.log_view.append(text); self.log_view.ensureCursorVisible(); self.status.showMessage(text[:120])
+        self._gui_log(text)
+    def _flush_log(self):
+        if self._gui_log.flush():
+            self.log_view.ensureCursorVisible(); self.status.showMessage(self._gui_log.last[:120])
     def info(self, text):
         self.info_view.append(text); self.info_view.ensureCursorVisible()
     def clear_logs(self):
-        self.log_view.clear(); self.info_view.clear(); self.log("[LOG CLEARED]")
+        self._gui_log.drain(); self.log_view.clear(); self.info_view.clear(); self.log("[LOG CLEARED]")
     # Persist log lines to category file under logs_dir
     def log_to_file(self, category: str, text: str):
+        write_category(self.logs_dir, category, text)
+    # ---------- Background jobs ----------
+    def run_job(self, name, func, *args, on_done=None, key=None, category=None, **kwargs):
+        """Run func(ctx, *args) on the job runner; on_done(result) is called on the GUI thread if it succeeds."""
         try:
-            cat_dir = os.path.join(self.logs_dir, category)
-            os.makedirs(cat_dir, exist_ok=True)
-            day = datetime.datetime.utcnow().strftime('%Y%m%d')
-            with open(os.path.join(cat_dir, f"{day}.log"), 'a', encoding='utf-8') as f:
-                f.write(text + "\n")
-        except Exception:
-            pass
+            job=self.jobs.submit(name, func, *args, key=key, **kwargs)
+        except JobBusy:
+            QMessageBox.warning(self, name, "มีงานประเภทเดียวกันกำลังทำงานอยู่ รอให้เสร็จก่อน"); return None
+        self._job_callbacks[job.id]=(on_done, category)
+        self.job_monitor.add_job(job); self.log(f"[JOB] เริ่ม {name}")
+        return job
+    def _on_job_log(self, job, line):
+        self.log(line)
+        category=self._job_callbacks.get(job.id,(None,None))[1]
+        if category: self.log_to_file(category, line)
+    def _on_job_finished(self, job):
+        on_done,_cat=self._job_callbacks.pop(job.id,(None,None))
+        if job.status=='done':
+            self.log(f"[JOB] {job.name} เสร็จ ({job.elapsed():.1f}s)")
+            if on_done: on_done(job.result)
+        elif job.status=='cancelled':
+            self.log(f"[JOB] {job.name} ถูกยกเลิก")
+        else:
+            self.log(f"❌ [JOB] {job.name}: {job.error}"); QMessageBox.critical(self, job.name, job.error)
+    def closeEvent(self, event):
+        self.jobs.shutdown(wait=False)
+        super().closeEvent(event)
+
     def update_status(self):
         fw = os.path.basename(self.fw_path) if self.fw_path else "(no fw)"; self.status.showMessage(f"FW: {fw} | Parts: {len(self.rootfs_parts)} | Out: {self.output_dir}")
 
@@ -1322,12 +1039,18 @@ class MainWindow(QMainWindow):
         # Other menus...
         # Analysis
         m_an = mb.addMenu(_("menu_analysis"))
-        for key,func in [('act_fw_info',self.show_fw_info),('act_ai_analyze',self.ai_analyze_all),('act_diff_exec',self.diff_executables),('act_hash_sig',self.check_hash_signature)]:
+        for key,func in [('act_fw_info',self.show_fw_info),('act_ai_analyze',self.ai_analyze_all),('act_diff_exec',self.diff_executables),('act_diff_images',self.diff_firmware_images),('act_hex_view',self.open_hex_viewer),('act_hash_sig',self.check_hash_signature)]:
             m_an.addAction(QAction(QIcon(ICON_PATH), _(key),self,triggered=func))
         # Patching
         m_patch = mb.addMenu(_("menu_patching"))
         for key,func in [('act_patch_boot',self.do_patch_boot_delay),('act_patch_serial',self.do_patch_serial),('act_patch_network',self.do_patch_network),('act_patch_all',self.do_patch_all),('act_patch_rootpw',self.do_patch_rootpw),('act_patch_selective',self.patch_selective),('act_export_profile',self.export_patch_profile),('act_import_profile',self.import_patch_profile)]:
             m_patch.addAction(QAction(QIcon(ICON_PATH), _(key),self,triggered=func))
+        m_patch.addSeparator()
+        a_delta = QAction(QIcon(ICON_PATH), _("act_delta_output"), self, checkable=True)
+        a_delta.setChecked(getattr(self, 'delta_output', False))
+        a_delta.toggled.connect(lambda on: setattr(self, 'delta_output', on))
+        m_patch.addAction(a_delta)
+        m_patch.addAction(QAction(QIcon(ICON_PATH), _("act_apply_delta"), self, triggered=self.materialise_delta))
         # RootFS
         m_root = mb.addMenu(_("menu_rootfs"))
         for key,func in [('act_edit_rootfs',self.edit_rootfs_file),('act_custom_script',self.run_custom_script),('act_special_window',self.open_special_functions_window)]:
@@ -1538,10 +1261,6 @@ class MainWindow(QMainWindow):
             raise ValueError("index ผิดพลาด")
         return self.rootfs_parts[idx]
 
-    # helper to create combined UI + file logger per function
-    def _func_logger(self, category):
-        return lambda m: (self.log(m), self.log_to_file(category, m))
-
     # ---------- Patch operations ----------
     def _ensure_unified_path(self):
         if not self.patched_fw_path and self.fw_path:
@@ -1552,42 +1271,41 @@ class MainWindow(QMainWindow):
         if not self.fw_path:
             QMessageBox.warning(self, "เลือกไฟล์ก่อน", "กรุณาเลือกไฟล์ firmware ก่อน"); return
         new_val = int(self.delay_combo.currentText())
-        unified = self._ensure_unified_path()
-        logger = self._func_logger('patch_boot')
-        # try U-Boot env patch first (single), then deep+all fallback, finally raw byte
-        tried_env = patch_uboot_env_bootdelay(self.fw_path, unified, new_val, logger)
-        if not tried_env:
-            # deep + all blocks
-            logger('[INFO] ลอง deep scan + patch ทุกบล็อค')
-            if not patch_uboot_env_bootdelay_all(self.fw_path, unified, new_val, logger):
-                # compiled-in default env inside U-Boot binary
-                logger('[INFO] ลอง patch bootdelay ภายใน U-Boot binary')
-                if not patch_compiled_uboot_bootdelay(self.fw_path, unified, new_val, logger):
-                    logger('[INFO] compiled-in patch ไม่พบในช่วงแรก ลองทั้งไฟล์')
-                    if not patch_compiled_uboot_bootdelay(self.fw_path, unified, new_val, logger, search_limit=None):
-                        logger('[INFO] ใช้ fallback แก้ byte @0x100')
-                        patch_boot_delay(self.fw_path, None, new_val, unified, logger)
-        # verify by rescanning unified
-        try:
-            envs_after = scan_uboot_env(unified, deep=True)
-            any_bd = [e.get('bootdelay') for e in envs_after if e.get('bootdelay') is not None]
-            logger(f"[VERIFY] env bootdelay values now: {any_bd}")
-        except Exception as e:
-            logger(f"[VERIFY] env rescan error: {e}")
-        self.fw_path = unified
-        # log boot delay change
-        try:
-            before = getattr(self, '_last_boot_delay', None)
-            after = None
+        src = self.fw_path; unified = self._ensure_unified_path()
+        before = getattr(self, '_last_boot_delay', None)
+        def work(ctx):
+            logger = ctx.log
+            # try U-Boot env patch first (single), then deep+all fallback, finally raw byte
+            tried_env = patch_uboot_env_bootdelay(src, unified, new_val, logger)
+            if not tried_env:
+                # deep + all blocks
+                logger('[INFO] ลอง deep scan + patch ทุกบล็อค')
+                if not patch_uboot_env_bootdelay_all(src, unified, new_val, logger):
+                    # compiled-in default env inside U-Boot binary
+                    logger('[INFO] ลอง patch bootdelay ภายใน U-Boot binary')
+                    if not patch_compiled_uboot_bootdelay(src, unified, new_val, logger):
+                        logger('[INFO] compiled-in patch ไม่พบในช่วงแรก ลองทั้งไฟล์')
+                        if not patch_compiled_uboot_bootdelay(src, unified, new_val, logger, search_limit=None):
+                            logger('[INFO] ใช้ fallback แก้ byte @0x100')
+                            patch_boot_delay(src, None, new_val, unified, logger)
+            # verify by rescanning unified
             try:
-                after = read_boot_delay_byte(self.fw_path)
+                envs_after = scan_uboot_env(unified, deep=True)
+                any_bd = [e.get('bootdelay') for e in envs_after if e.get('bootdelay') is not None]
+                logger(f"[VERIFY] env bootdelay values now: {any_bd}")
+            except Exception as e:
+                logger(f"[VERIFY] env rescan error: {e}")
+            try:
+                return read_boot_delay_byte(unified)
             except Exception:
-                pass
+                return None
+        def done(after):
+            self.fw_path = unified
+            # log boot delay change
             self.log(f"[BOOTDELAY] before={before} after={after}")
             self._last_boot_delay = after
-        except Exception:
-            pass
-        self.update_status(); QMessageBox.information(self, "Boot Delay", f"เสร็จสิ้น: {unified}")
+            self.update_status(); QMessageBox.information(self, "Boot Delay", f"เสร็จสิ้น: {unified}")
+        self.run_job("Patch Boot Delay", work, on_done=done, key='patch', category='patch_boot')
 
     def do_patch_serial(self):
         if not self.fw_path:
@@ -1600,169 +1318,167 @@ class MainWindow(QMainWindow):
             preferred = custom if custom else sel
         else:
             preferred = custom if custom else None  # None -> auto
-        self._preferred_serial_port = preferred  # store for patch function to read
-        patch_rootfs_shell_serial(self.fw_path, part, unified, self._func_logger('patch_serial'))
-        self.fw_path = unified; self.update_status(); QMessageBox.information(self, "Serial", f"เสร็จสิ้น: {unified}")
+        self._preferred_serial_port = preferred  # remembered for profiles / Patch All
+        src = self.fw_path
+        self.run_job("Patch Serial", lambda ctx: patch_rootfs_shell_serial(src, part, unified, ctx.log, preferred_port=preferred),
+                     on_done=lambda _r: self._patched(unified, "Serial"), key='patch', category='patch_serial')
+
+    def _patched(self, unified, title):
+        self.fw_path = unified; self.update_status(); QMessageBox.information(self, title, f"เสร็จสิ้น: {unified}")
 
     def do_patch_network(self):
         if not self.fw_path:
             QMessageBox.warning(self, "เลือกไฟล์ก่อน", ""); return
         if not self.require('patch','need_consent_patch'): return
-        part = self.get_selected_rootfs_part(); unified = self._ensure_unified_path()
-        patch_rootfs_network(self.fw_path, part, unified, self._func_logger('patch_network'))
-        self.fw_path = unified; self.update_status(); QMessageBox.information(self, "Network", f"เสร็จสิ้น: {unified}")
+        part = self.get_selected_rootfs_part(); unified = self._ensure_unified_path(); src = self.fw_path
+        self.run_job("Patch Network", lambda ctx: patch_rootfs_network(src, part, unified, ctx.log),
+                     on_done=lambda _r: self._patched(unified, "Network"), key='patch', category='patch_network')
 
     def do_patch_all(self):
         if not self.fw_path:
             QMessageBox.warning(self,"เลือกไฟล์ก่อน","" ); return
         if not self.require('patch','need_consent_patch'): return
-        part = self.get_selected_rootfs_part(); unified = self._ensure_unified_path()
-        tmp_serial = unified + ".serial.tmp"; tmp_net = unified + ".net.tmp"
-        patch_rootfs_shell_serial(self.fw_path, part, tmp_serial, self._func_logger('patch_all'))
-        patch_rootfs_network(tmp_serial, part, tmp_net, self._func_logger('patch_all'))
-        try:
-            shutil.move(tmp_net, unified)
-        finally:
-            for t in (tmp_serial,):
-                try: os.remove(t)
-                except Exception: pass
-        self.fw_path = unified; self.update_status(); QMessageBox.information(self,"Patch All",f"เสร็จสิ้น: {unified}")
+        part = self.get_selected_rootfs_part(); unified = self._ensure_unified_path(); src = self.fw_path
+        preferred = getattr(self, '_preferred_serial_port', None)
+        def work(ctx):
+            # one extract / repack / splice for both patches
+            txn = new_patch_transaction(src, part, ctx.log)
+            txn.add_file("serial_shell", serial_getty_op(src, part, preferred)).add_file("network_services", disable_inetd_services)
+            ok, err = txn.commit(unified)
+            if not ok:
+                raise RuntimeError(err)
+        self.run_job("Patch All", work, on_done=lambda _r: self._patched(unified, "Patch All"), key='patch', category='patch_all')
 
     def do_patch_rootpw(self):
         if not self.fw_path:
             QMessageBox.warning(self,"เลือกไฟล์ก่อน",""); return
         if not self.require('patch','need_consent_patch'): return
-        part = self.get_selected_rootfs_part(); pw = self.rootpw_edit.text(); unified = self._ensure_unified_path()
-        patch_root_password(self.fw_path, part, pw, unified, self._func_logger('patch_rootpw'))
-        self.fw_path = unified; self.update_status(); QMessageBox.information(self,"Root Password",f"เสร็จสิ้น: {unified}")
+        part = self.get_selected_rootfs_part(); pw = self.rootpw_edit.text(); unified = self._ensure_unified_path(); src = self.fw_path
+        self.run_job("Patch Root Password", lambda ctx: patch_root_password(src, part, pw, unified, ctx.log),
+                     on_done=lambda _r: self._patched(unified, "Root Password"), key='patch', category='patch_rootpw')
 
     # ---------- Info / Analysis ----------
     def show_fw_info(self):
         if not self.fw_path: QMessageBox.warning(self,"ยังไม่ได้เลือกไฟล์","เลือก firmware ก่อน"); return
-        self.info_view.clear(); self.info(f"*** Firmware Info ***\n{self.fw_path}\n")
-        try:
-            s=os.stat(self.fw_path); self.info(f"Size: {s.st_size} bytes\nSHA256: {sha256sum(self.fw_path)}\nMD5: {md5sum(self.fw_path)}\n")
-            self.info(f"Filetype: {get_filetype(self.fw_path)}\n")
-            self.info(f"Entropy: {get_entropy(self.fw_path)}\n")
-            # Boot delay info (env + raw byte)
+        fw = self.fw_path
+        self.info_view.clear(); self.info(f"*** Firmware Info ***\n{fw}\n")
+        def work(ctx):
+            lines = []
+            try:
+                s=os.stat(fw); ctx.progress(0,4,"SHA256"); sha=sha256sum(fw); ctx.progress(1,4,"MD5"); md5=md5sum(fw)
+                lines.append(f"Size: {s.st_size} bytes\nSHA256: {sha}\nMD5: {md5}\n")
+                ctx.progress(2,4,"entropy")
+                lines.append(f"Filetype: {get_filetype(fw)}\n")
+                lines.append(f"Entropy: {get_entropy(fw)}\n")
+                # Boot delay info (env + raw byte)
+                ctx.progress(3,4,"U-Boot env")
+                try:
+                    envs=scan_uboot_env(fw)
+                except Exception:
+                    envs=[]
+                if envs:
+                    for i,e in enumerate(envs,1):
+                        bd=e.get('bootdelay')
+                        lines.append(f"BootDelay[env#{i}] @0x{e['offset']:X} size=0x{e['size']:X} crc_ok={e['valid']} => {bd if bd is not None else '?'}")
+                else:
+                    lines.append("BootDelay[env]: ไม่พบ U-Boot environment")
+                b=read_boot_delay_byte(fw)
+                if b is not None:
+                    lines.append(f"BootDelay[byte@0x100]={b}")
+            except Exception as e:
+                lines.append(f"error: {e}")
+            parts = scan_all_rootfs_partitions(fw, log_func=lambda x: None)
+            if parts:
+                lines.append("RootFS:")
+                for i,p in enumerate(parts,1): lines.append(f" [{i}] {p['fs']} 0x{p['offset']:X} size=0x{p['size']:X}")
+            else:
+                lines.append("ไม่พบ rootfs")
+            ctx.progress(4,4,"done")
+            return lines
+        self.run_job("Firmware Info", work, on_done=lambda lines: [self.info(l) for l in lines])
+    def ai_analyze_all(self):
+        if not self.fw_path: QMessageBox.warning(self,"ยังไม่ได้เลือกไฟล์",""); return
+        self.log("=== เริ่ม AI วิเคราะห์ ==="); self.info_view.clear()
+        fw = self.fw_path
+        def work(ctx):
+            # --- Boot Delay (U-Boot env + fallback byte) pre-scan ---
+            pre_findings=[]; suggestions=None
             try:
-                envs=scan_uboot_env(self.fw_path)
+                envs=scan_uboot_env(fw)
             except Exception:
                 envs=[]
             if envs:
                 for i,e in enumerate(envs,1):
-                    bd=e.get('bootdelay')
-                    self.info(f"BootDelay[env#{i}] @0x{e['offset']:X} size=0x{e['size']:X} crc_ok={e['valid']} => {bd if bd is not None else '?'}")
+                    val=e.get('bootdelay')
+                    pre_findings.append(
+                        f"Boot Delay (U-Boot env#{i} @0x{e['offset']:X} size=0x{e['size']:X} crc_ok={e['valid']}) = {val if val is not None else '?'}"
+                    )
+                # Add env AI analysis (best env)
+                env_ai_findings, suggestions = analyze_bootloader_env(envs)
+                pre_findings.extend(env_ai_findings)
             else:
-                self.info("BootDelay[env]: ไม่พบ U-Boot environment")
-            b=read_boot_delay_byte(self.fw_path)
-            if b is not None:
-                self.info(f"BootDelay[byte@0x100]={b}")
-        except Exception as e:
-            self.info(f"error: {e}")
-        parts = scan_all_rootfs_partitions(self.fw_path, log_func=lambda x: None)
-        if parts:
-            self.info("RootFS:")
-            for i,p in enumerate(parts,1): self.info(f" [{i}] {p['fs']} 0x{p['offset']:X} size=0x{p['size']:X}")
-        else:
-            self.info("ไม่พบ rootfs")
-    def ai_analyze_all(self):
-        if not self.fw_path: QMessageBox.warning(self,"ยังไม่ได้เลือกไฟล์",""); return
-        self.log("=== เริ่ม AI วิเคราะห์ ==="); self.info_view.clear()
-        # --- Boot Delay (U-Boot env + fallback byte) pre-scan ---
-        pre_findings=[]
-        try:
-            envs=scan_uboot_env(self.fw_path)
-        except Exception:
-            envs=[]
-        if envs:
-            for i,e in enumerate(envs,1):
-                val=e.get('bootdelay')
-                pre_findings.append(
-                    f"Boot Delay (U-Boot env#{i} @0x{e['offset']:X} size=0x{e['size']:X} crc_ok={e['valid']}) = {val if val is not None else '?'}"
-                )
-            # Add env AI analysis (best env)
-            env_ai_findings, env_ai_suggestions = analyze_bootloader_env(envs)
-            pre_findings.extend(env_ai_findings)
-            # store suggestions for later combined AI patch suggestions if needed
-            self.bootenv_suggestions = env_ai_suggestions
-        else:
-            byte_val=read_boot_delay_byte(self.fw_path)
-            pre_findings.append(f"Boot Delay (U-Boot env): ไม่พบ environment (byte@0x100={byte_val if byte_val is not None else '?'})")
-        # Always include raw byte@0x100 line (helps heuristic suggestions)
-        byte_val=read_boot_delay_byte(self.fw_path)
-        if byte_val is not None:
-            pre_findings.append(f"Boot Delay (byte@0x100): {byte_val}")
-        # --- RootFS + other analysis ---
-        findings, reports = self.analyze_all_rootfs_firmware(
-            self.fw_path,
-            log_func=lambda m: (self.log(m), self.log_to_file('analysis', m)),
-            output_dir=self.logs_dir
-        )
-        all_findings = pre_findings + findings
-        self.analysis_result = all_findings; self.rootfs_reports = reports
-        for line in all_findings:
-            self.log(line)
-        self.log("==== จบการวิเคราะห์ ====")
-        QMessageBox.information(self, "AI วิเคราะห์", f"เสร็จสิ้น rootfs={len(reports)}")
-    def analyze_all_rootfs_firmware(self, fw_path, log_func, output_dir):
-        findings=[]; reports=[]; tmpdir=tempfile.mkdtemp(prefix="ai-fw-rootfs-"); log_func(f"[TEMP] ai analysis workspace: {tmpdir}")
-        try:
-            parts=scan_all_rootfs_partitions(fw_path, log_func=log_func, use_cache=True)
-            if not parts:
-                findings.append("❌ ไม่พบ rootfs ใดๆ ใน firmware นี้"); return findings,reports
-            for idx,part in enumerate(parts):
-                log_func(f"== RootFS #{idx+1}: {part['fs']} @0x{part['offset']:X} size=0x{part['size']:X} ==")
-                findings.append(f"-- RootFS#{idx+1}: {part['fs']} size=0x{part['size']:X}")
-                rootfs_bin=os.path.join(tmpdir,f"rootfs_{idx+1}.bin")
-                with open(fw_path,'rb') as f: f.seek(part['offset']); data=f.read(part['size'])
-                with open(rootfs_bin,'wb') as fo: fo.write(data)
-                extract_dir=os.path.join(tmpdir,f"extract_{idx+1}"); os.makedirs(extract_dir,exist_ok=True)
-                ok,err=extract_rootfs(part['fs'],rootfs_bin,extract_dir,log_func)
-                report_lines=[]
-                if ok:
-                    files=list_files_in_rootfs(extract_dir); findings.append(f"ไฟล์: {len(files)}")
-                    # Secret scan (lightweight)
-                    secrets = scan_secrets_in_dir(extract_dir)
-                    if secrets:
-                        findings.append(f"[SECRETS] พบ {len(secrets)} รายการ (แสดงสูงสุด 5)")
-                        for s in secrets[:5]:
-                            findings.append(f"  {s['type']} -> {s['file']} :: {s['snippet'][:60]}")
-                    # ELF summary (sample up to 30 executables)
-                    elf_infos = []
-                    for rel, ftype in files:
-                        if len(elf_infos) >= 30:
-                            break
-                        fpath = os.path.join(extract_dir, rel)
-                        try:
-                            with open(fpath,'rb') as ef:
-                                if ef.read(4) != b'\x7fELF':
-                                    continue
-                            elf_infos.append(analyze_elf(fpath))
-                        except Exception:
-                            continue
-                    arch_count = {}
-                    for info in elf_infos:
-                        arch = info.get('arch','?')
-                        arch_count[arch] = arch_count.get(arch,0)+1
-                    if arch_count:
-                        findings.append('[ELF] Arch summary: ' + ', '.join(f"{k}:{v}" for k,v in arch_count.items()))
-                    for critical in ["etc/passwd","etc/shadow","etc/inittab","etc/inetd.conf"]:
-                        fp=os.path.join(extract_dir,critical)
-                        if os.path.exists(fp):
-                            findings.append(f"พบ {critical}")
-                        else:
-                            findings.append(f"ไม่พบ {critical}")
-                else:
-                    findings.append(f"❌ แตก rootfs ไม่สำเร็จ: {err}")
-                ts=datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                analysis_dir = os.path.join(self.logs_dir, 'analysis'); os.makedirs(analysis_dir, exist_ok=True)
-                outname=os.path.join(analysis_dir,f"ai_rootfs{idx+1}_{part['fs']}_0x{part['offset']:X}_{ts}.txt")
-                with open(outname,'w',encoding='utf-8') as f:
-                    for line in findings: f.write(line+"\n")
-                reports.append(outname); findings.append(f"บันทึก {outname}")
-        finally:
-            shutil.rmtree(tmpdir,ignore_errors=True)
+                byte_val=read_boot_delay_byte(fw)
+                pre_findings.append(f"Boot Delay (U-Boot env): ไม่พบ environment (byte@0x100={byte_val if byte_val is not None else '?'})")
+            # Always include raw byte@0x100 line (helps heuristic suggestions)
+            byte_val=read_boot_delay_byte(fw)
+            if byte_val is not None:
+                pre_findings.append(f"Boot Delay (byte@0x100): {byte_val}")
+            # --- RootFS + other analysis ---
+            findings, reports = self.analyze_all_rootfs_firmware(fw, log_func=ctx.log, output_dir=self.logs_dir, progress=ctx.progress)
+            return pre_findings + findings, reports, suggestions
+        def done(result):
+            all_findings, reports, suggestions = result
+            if suggestions is not None:
+                # store suggestions for later combined AI patch suggestions if needed
+                self.bootenv_suggestions = suggestions
+            self.analysis_result = all_findings; self.rootfs_reports = reports
+            for line in all_findings:
+                self.log(line)
+            self.log("==== จบการวิเคราะห์ ====")
+            QMessageBox.information(self, "AI วิเคราะห์", f"เสร็จสิ้น rootfs={len(reports)}")
+        self.run_job("AI Analyze", work, on_done=done, key='analyze', category='analysis')
+    def analyze_all_rootfs_firmware(self, fw_path, log_func, output_dir, progress=None):
+        findings=[]; reports=[]
+        parts=scan_all_rootfs_partitions(fw_path, log_func=log_func, use_cache=True)
+        if not parts:
+            findings.append("❌ ไม่พบ rootfs ใดๆ ใน firmware นี้"); return findings,reports
+        # independent partitions extract concurrently
+        manifests=get_cas_store().ingest_partitions(fw_path,parts,extract_rootfs,log_func)
+        for idx,(part,manifest) in enumerate(zip(parts,manifests)):
+            if progress: progress(idx, len(parts), f"rootfs #{idx+1}")
+            log_func(f"== RootFS #{idx+1}: {part['fs']} @0x{part['offset']:X} size=0x{part['size']:X} ==")
+            findings.append(f"-- RootFS#{idx+1}: {part['fs']} size=0x{part['size']:X}")
+            ok=not isinstance(manifest,Exception); err=str(manifest)
+            if ok:
+                entries=manifest['entries']; paths={e['path'] for e in entries}
+                findings.append(f"ไฟล์: {sum(1 for e in entries if e['type']=='file')}")
+                # Secret scan (lightweight, memoised per distinct file in the CAS store)
+                secrets = get_cas_store().scan_secrets(manifest)
+                if secrets:
+                    findings.append(f"[SECRETS] พบ {len(secrets)} รายการ (แสดงสูงสุด 5)")
+                    for s in secrets[:5]:
+                        findings.append(f"  {s['type']} -> {s['file']} :: {s['snippet'][:60]}")
+                # ELF summary (sample up to 30 executables)
+                elf_infos = get_cas_store().analyze_elfs(manifest, limit=30)
+                arch_count = {}
+                for info in elf_infos:
+                    arch = info.get('arch','?')
+                    arch_count[arch] = arch_count.get(arch,0)+1
+                if arch_count:
+                    findings.append('[ELF] Arch summary: ' + ', '.join(f"{k}:{v}" for k,v in arch_count.items()))
+                for critical in ["etc/passwd","etc/shadow","etc/inittab","etc/inetd.conf"]:
+                    if critical in paths:
+                        findings.append(f"พบ {critical}")
+                    else:
+                        findings.append(f"ไม่พบ {critical}")
+            else:
+                findings.append(f"❌ แตก rootfs ไม่สำเร็จ: {err}")
+            ts=datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            analysis_dir = os.path.join(self.logs_dir, 'analysis'); os.makedirs(analysis_dir, exist_ok=True)
+            outname=os.path.join(analysis_dir,f"ai_rootfs{idx+1}_{part['fs']}_0x{part['offset']:X}_{ts}.txt")
+            with open(outname,'w',encoding='utf-8') as f:
+                for line in findings: f.write(line+"\n")
+            reports.append(outname); findings.append(f"บันทึก {outname}")
         return findings,reports
     def show_ai_findings(self):
         if not self.analysis_result: QMessageBox.warning(self,"ยังไม่มีผล",""); return
@@ -1785,14 +1501,23 @@ class MainWindow(QMainWindow):
     def ai_apply_fixes(self):
         if not getattr(self,'recommended_actions',None): QMessageBox.warning(self,"ยังไม่มีคำแนะนำ",""); return
         if not self.fw_path: QMessageBox.warning(self,"ยังไม่ได้เลือกไฟล์",""); return
-        applied=[]; part=self.get_selected_rootfs_part()
-        if any("boot delay" in r.lower() for r in self.recommended_actions):
-            out=os.path.join(self.output_dir,f"auto_fix_bootdelay_{int(time.time())}.bin"); patch_boot_delay(self.fw_path,part,1,out,self.log); applied.append("bootdelay->1")
-        if any("telnet" in r.lower() or "ftp" in r.lower() for r in self.recommended_actions):
-            out=os.path.join(self.output_dir,f"auto_fix_network_{int(time.time())}.bin"); patch_rootfs_network(self.fw_path,part,out,self.log); applied.append("network")
-        if any("รหัสผ่าน" in r or "password" in r.lower() for r in self.recommended_actions):
-            out=os.path.join(self.output_dir,f"auto_fix_rootpw_{int(time.time())}.bin"); patch_root_password(self.fw_path,part,self.rootpw_edit.text().strip() or "admin1234",out,self.log); applied.append("rootpw")
-        QMessageBox.information(self,"Auto Fix", "\n".join(applied) if applied else "ไม่มีการแก้ไข")
+        recs=self.recommended_actions; applied=[]; part=self.get_selected_rootfs_part(); src=self.fw_path
+        pw=self.rootpw_edit.text().strip() or "admin1234"
+        if any("boot delay" in r.lower() for r in recs): applied.append("bootdelay->1")
+        if any("telnet" in r.lower() or "ftp" in r.lower() for r in recs): applied.append("network")
+        if any("รหัสผ่าน" in r or "password" in r.lower() for r in recs): applied.append("rootpw")
+        if not applied:
+            QMessageBox.information(self,"Auto Fix","ไม่มีการแก้ไข"); return
+        out,delta=self._patch_output_path(f"auto_fix_{int(time.time())}")
+        def work(ctx):
+            txn=new_patch_transaction(src,part,ctx.log)
+            if "bootdelay->1" in applied: txn.add_raw("bootdelay->1",set_boot_delay_byte(1))
+            if "network" in applied: txn.add_file("network",disable_inetd_services)
+            if "rootpw" in applied: txn.add_file("rootpw",set_root_password(pw))
+            ok,err=txn.commit(out,delta=delta)
+            if not ok: raise RuntimeError(err)
+        self.run_job("Auto Fix",work,on_done=lambda _r: QMessageBox.information(self,"Auto Fix","\n".join(applied)+f"\n-> {out}"),
+                     key='patch',category='patch_auto_fix')
 
     # ---------- Diff, Selective Patch, Editing ----------
     def diff_executables(self):
@@ -1801,51 +1526,59 @@ class MainWindow(QMainWindow):
         if not second: return
         try: part=self.get_selected_rootfs_part()
         except Exception as e: QMessageBox.warning(self,"Diff",str(e)); return
-        prog=QProgressDialog("Diff executables...","ยกเลิก",0,0,self); prog.setWindowModality(Qt.WindowModal); prog.show(); QApplication.processEvents()
-        tmp_base=tempfile.mkdtemp(prefix="diff_fw_"); self.log(f"[TEMP] diff executables workspace: {tmp_base}")
-        try:
-            def _extract(image, target):
+        fw=self.fw_path; output_dir=self.output_dir
+        def work(ctx):
+            def _manifest(image):
                 parts2=scan_all_rootfs_partitions(image, log_func=lambda x: None)
                 m=None
                 for p2 in parts2:
-                    if p2['offset']==part['offset'] and p2['size']==part['size'] and _normalize_fs(p2['fs'])==_normalize_fs(part['fs']): m=p2; break
+                    if p2['offset']==part['offset'] and p2['size']==part['size'] and normalize_fs(p2['fs'])==normalize_fs(part['fs']): m=p2; break
                 if not m and parts2: m=parts2[0]
                 if not m: raise RuntimeError("ไม่พบ rootfs")
-                slice_path=os.path.join(target,"slice.bin");
-                with open(image,'rb') as f: f.seek(m['offset']); data=f.read(m['size'])
-                with open(slice_path,'wb') as f: f.write(data)
-                ok,err=extract_rootfs(m['fs'],slice_path,target,log_func=lambda x: None)
-                if not ok: raise RuntimeError(err)
-            orig=os.path.join(tmp_base,"orig"); new=os.path.join(tmp_base,"new"); os.makedirs(orig); os.makedirs(new)
-            _extract(self.fw_path,orig); _extract(second,new)
+                return get_cas_store().ingest_partition(image,m,extract_rootfs,ctx.log)
+            t0=time.time(); ctx.progress(0,3,"ingest"); orig=_manifest(fw); new=_manifest(second)
+            ctx.progress(1,3,"tree diff")
+            report_path=os.path.join(output_dir,f"tree_diff_{int(time.time())}.jsonl")
+            stats={}; write_report(diff_manifests(orig,new,stats),report_path); stats['seconds']=round(time.time()-t0,3)
+            exec_entries=[]; others=[]
+            with open(report_path,'r',encoding='utf-8') as f:
+                for line in f:
+                    e=json.loads(line)
+                    if e['exec']: exec_entries.append(e)
+                    else: others.append(format_entry(e))
+            ctx.progress(2,3,"ELF diff")
+            store=get_cas_store()
+            elf_pairs=[(e['path'],store.object_path(e['old']['sha256']),store.object_path(e['new']['sha256'])) for e in exec_entries
+                       if 'content' in e['changes'] and read_elf_header(store.object_path(e['new']['sha256']))]
+            elf_diffs=diff_elf_pairs(elf_pairs,log_func=ctx.log) if elf_pairs else {}
             execs=[]
-            for base,root in [("orig",orig),("new",new)]:
-                for dp,_,files in os.walk(root):
-                    for nm in files:
-                        fp=os.path.join(dp,nm); rel=os.path.relpath(fp,root)
-                        try:
-                            with open(fp,'rb') as f: hdr=f.read(4); st=os.stat(fp)
-                        except Exception: continue
-                        if hdr==b'\x7fELF' or (st.st_mode & 0o111): execs.append((base,rel,fp))
-            pairs={};
-            for base,rel,fp in execs: pairs.setdefault(rel,{})[base]=fp
-            added=[]; removed=[]; changed=[]
-            for rel,m in pairs.items():
-                if 'orig' in m and 'new' in m:
-                    h1=hashlib.sha256(open(m['orig'],'rb').read()).hexdigest(); h2=hashlib.sha256(open(m['new'],'rb').read()).hexdigest()
-                    if h1!=h2: changed.append((rel,h1[:12],h2[:12]))
-                elif 'orig' in m: removed.append(rel)
-                else: added.append(rel)
-            lines=[f"Executables (orig/new): {len([e for e in execs if e[0]=='orig'])}/{len([e for e in execs if e[0]=='new'])}", f"Added {len(added)} Removed {len(removed)} Changed {len(changed)}"]
-            if added: lines.append("[Added]"); lines+= [" + "+a for a in added[:40]]
-            if removed: lines.append("[Removed]"); lines+= [" - "+r for r in removed[:40]]
-            if changed: lines.append("[Changed]"); lines+= [f" * {r} {h1}->{h2}" for r,h1,h2 in changed[:80]]
-            report="\n".join(lines); self.log("[Diff Executables]\n"+report)
-            dlg=QDialog(self); dlg.setWindowTitle("Diff Executables Report"); v=QVBoxLayout(dlg); te=QTextEdit(); te.setReadOnly(True); te.setText(report); v.addWidget(te); btn=QPushButton("ปิด"); btn.clicked.connect(dlg.accept); v.addWidget(btn); dlg.resize(900,600); prog.close(); dlg.exec()
-        except Exception as e:
-            prog.close(); QMessageBox.critical(self,"Diff",str(e))
-        finally:
-            shutil.rmtree(tmp_base,ignore_errors=True)
+            for e in exec_entries:
+                execs.append(format_entry(e))
+                if e['path'] in elf_diffs: execs+=format_elf_diff(elf_diffs[e['path']])
+            lines=[f"Added {stats['added']} Removed {stats['removed']} Changed {stats['changed']} Unchanged {stats['unchanged']}",
+                   f"{stats['seconds']}s -> {report_path}"]
+            if execs: lines.append("[Executables]"); lines+=execs
+            if others: lines.append("[Other entries]"); lines+=others
+            ctx.log("[Diff Tree] "+lines[0]+f" ({report_path})")
+            return "\n".join(lines)
+        def done(report):
+            dlg=QDialog(self); dlg.setWindowTitle("Diff Report"); v=QVBoxLayout(dlg); te=QTextEdit(); te.setReadOnly(True); te.setPlainText(report); v.addWidget(te); btn=QPushButton("ปิด"); btn.clicked.connect(dlg.accept); v.addWidget(btn); dlg.resize(900,600); dlg.exec()
+        self.run_job("Diff RootFS", work, on_done=done)
+    def diff_firmware_images(self):
+        """Chunk-level diff of the whole image against another firmware, no extraction needed."""
+        if not self.fw_path: QMessageBox.warning(self,"Diff","เลือก firmware ก่อน"); return
+        second,_=QFileDialog.getOpenFileName(self,"เลือก firmware ที่จะเทียบ",os.path.dirname(self.fw_path))
+        if not second: return
+        fw=self.fw_path
+        def done(report):
+            self.log("[Diff Firmware]\n"+report)
+            dlg=QDialog(self); dlg.setWindowTitle("Firmware Diff Report"); v=QVBoxLayout(dlg); te=QTextEdit(); te.setReadOnly(True); te.setFontFamily("monospace"); te.setText(report); v.addWidget(te); btn=QPushButton("ปิด"); btn.clicked.connect(dlg.accept); v.addWidget(btn); dlg.resize(900,600); dlg.exec()
+        self.run_job("Diff Firmware Images", lambda ctx: format_diff_report(diff_images(fw,second,log_func=ctx.log)), on_done=done)
+    def open_hex_viewer(self):
+        if not self.fw_path: QMessageBox.warning(self,"Hex Viewer","เลือก firmware ก่อน"); return
+        try: dlg=HexViewerDialog(self,self.fw_path)
+        except OSError as e: QMessageBox.critical(self,"Hex Viewer",str(e)); return
+        dlg.setAttribute(Qt.WA_DeleteOnClose); dlg.show()
     def patch_selective(self):
         if not self.fw_path: QMessageBox.warning(self,"ยังไม่ได้เลือกไฟล์",""); return
         dlg=SelectivePatchDialog(self)
@@ -1854,21 +1587,39 @@ class MainWindow(QMainWindow):
         if not actions: QMessageBox.information(self,"Selective Patch","ไม่ได้เลือก patch"); return
         try: part=self.get_selected_rootfs_part()
         except Exception as e: QMessageBox.critical(self,"Selective Patch",str(e)); return
-        ts=int(time.time()); current=self.fw_path; temps=[]; applied=[]
-        try:
-            if actions.get('boot_delay'):
-                out=os.path.join(self.output_dir,f"_tmp_boot_{ts}.bin"); ok,_=patch_boot_delay(current,part,actions['boot_delay_value'],out,self.log); current=out; temps.append(out); applied.append(f"BootDelay={actions['boot_delay_value']}")
-            if actions.get('serial_shell'):
-                out=os.path.join(self.output_dir,f"_tmp_serial_{ts}.bin"); ok,_=patch_rootfs_shell_serial(current,part,out,self.log); current=out; temps.append(out); applied.append("SerialShell")
-            if actions.get('network_services'):
-                out=os.path.join(self.output_dir,f"_tmp_net_{ts}.bin"); ok,_=patch_rootfs_network(current,part,out,self.log); current=out; temps.append(out); applied.append("DisableTelnet/FTP")
-            if actions.get('root_password'):
-                out=os.path.join(self.output_dir,f"_tmp_rootpw_{ts}.bin"); ok,_=patch_root_password(current,part,actions['root_password_value'],out,self.log); current=out; temps.append(out); applied.append("RootPassword")
-            final=os.path.join(self.output_dir,f"selective_patch_{ts}.bin"); shutil.copyfile(current,final); self.log(f"✅ Selective Patch -> {final}"); QMessageBox.information(self,"Selective Patch",f"สำเร็จ: {final}\n{', '.join(applied)}")
-        finally:
-            for t in temps:
-                try: os.remove(t)
-                except: pass
+        ts=int(time.time()); final,delta=self._patch_output_path(f"selective_patch_{ts}")
+        def done(applied):
+            self.log(f"✅ Selective Patch -> {final}"); QMessageBox.information(self,"Selective Patch",f"สำเร็จ: {final}\n{', '.join(applied)}")
+        self.run_job("Selective Patch",self._profile_job(actions,part,actions.get('root_password_value'),final,delta),
+                     on_done=done,key='patch',category='patch_selective')
+    def _patch_output_path(self, stem):
+        """(path, delta) for a new patch output in output_dir; delta files when 'Save as Delta' is on."""
+        delta=bool(getattr(self,'delta_output',False))
+        return os.path.join(self.output_dir, stem+(DELTA_SUFFIX if delta else ".bin")), delta
+    def materialise_delta(self):
+        path,_=QFileDialog.getOpenFileName(self,"เลือก delta",self.output_dir,f"Firmware delta (*{DELTA_SUFFIX})")
+        if not path: return
+        try: hdr=read_delta_header(path)
+        except Exception as e: QMessageBox.critical(self,"Delta",str(e)); return
+        src=self.original_fw_path if self.original_fw_path and os.path.exists(self.original_fw_path) and os.path.getsize(self.original_fw_path)==hdr['source_size'] else None
+        if not src:
+            src,_=QFileDialog.getOpenFileName(self,f"เลือก firmware ต้นฉบับ ({hdr.get('source_name','')})",os.path.dirname(path))
+            if not src: return
+        default=path[:-len(DELTA_SUFFIX)]+".bin" if path.endswith(DELTA_SUFFIX) else path+".bin"
+        out,_=QFileDialog.getSaveFileName(self,"บันทึก firmware",default)
+        if not out: return
+        ok,err=apply_delta(src,path,out,log_func=self.log)
+        if not ok: QMessageBox.critical(self,"Delta",err); return
+        QMessageBox.information(self,"Delta",f"เสร็จสิ้น: {out}")
+    def _profile_job(self, patches, part, password, out, delta):
+        """Job function committing a SelectivePatchDialog / patch profile action dict to out; returns the applied names."""
+        src=self.fw_path; preferred=getattr(self,'_preferred_serial_port',None)
+        def work(ctx):
+            txn,applied=profile_transaction(src,part,patches,ctx.log,password,preferred)
+            ok,err=txn.commit(out,delta=delta)
+            if not ok: raise RuntimeError(err)
+            return applied
+        return work
     def edit_rootfs_file(self):
         if not self.fw_path:
             QMessageBox.warning(self,"ยังไม่ได้เลือกไฟล์",""); return
@@ -1882,18 +1633,14 @@ class MainWindow(QMainWindow):
         need=True
         if self.edit_cache_dir and os.path.isdir(self.edit_cache_dir) and self.edit_cache_part_index==idx and os.listdir(self.edit_cache_dir): need=False
         if need:
-            tmp_work=tempfile.mkdtemp(prefix="edit_rootfs_"); self.log(f"[TEMP] rootfs edit workspace: {tmp_work}")
-            rootfs_bin=os.path.join(tmp_work,"rootfs.bin")
-            with open(self.fw_path,'rb') as f: f.seek(part['offset']); data=f.read(part['size'])
-            with open(rootfs_bin,'wb') as fo: fo.write(data)
-            extract_dir=os.path.join(tmp_work,"extract"); os.makedirs(extract_dir,exist_ok=True)
-            ok,err=extract_rootfs(part['fs'],rootfs_bin,extract_dir,self.log)
+            ws=new_workspace("edit_rootfs_", part['size']*ROOTFS_WS_FACTOR, self.log)
+            extract_dir=os.path.join(ws.path,"extract"); os.makedirs(extract_dir,exist_ok=True)
+            ok,err=get_extract_cache().checkout(self.fw_path,part,extract_dir,extract_rootfs,self.log)
             if not ok:
-                shutil.rmtree(tmp_work,ignore_errors=True); QMessageBox.critical(self,"RootFS",err); return
-            if self.edit_cache_dir and os.path.exists(self.edit_cache_dir):
-                try: shutil.rmtree(self.edit_cache_dir)
-                except: pass
-            self.edit_cache_dir=extract_dir; self.edit_cache_workspace=tmp_work; self.edit_cache_part_index=idx
+                ws.cleanup(); QMessageBox.critical(self,"RootFS",err); return
+            if getattr(self,'edit_cache_workspace',None):
+                self.edit_cache_workspace.cleanup()
+            self.edit_cache_dir=extract_dir; self.edit_cache_workspace=ws; self.edit_cache_part_index=idx
             self.log(f"แตก rootfs -> {extract_dir}")
         dlg=RootFSEditDialog(self,self.edit_cache_dir,part,self.fw_path,self.output_dir); dlg.exec()
     def run_custom_script(self):
@@ -1907,12 +1654,18 @@ class MainWindow(QMainWindow):
         dlg=CustomScriptDialog(self,part); dlg.exec()
     def check_hash_signature(self):
         if not self.fw_path: QMessageBox.warning(self,"Hash","ยังไม่ได้เลือกไฟล์"); return
-        fw_sha=sha256sum(self.fw_path); fw_md5=md5sum(self.fw_path); details=[f"Firmware: {os.path.basename(self.fw_path)}",f"SHA256: {fw_sha}",f"MD5: {fw_md5}"]
-        if self.rootfs_parts:
-            details.append("\n[RootFS Slice Hashes]")
-            with open(self.fw_path,'rb') as f:
-                for i,p in enumerate(self.rootfs_parts,1): f.seek(p['offset']); seg=f.read(min(65536,p['size'])); details.append(f"Part{i} {p['fs']} slice_sha25616={hashlib.sha256(seg).hexdigest()[:16]}")
-        dlg=QDialog(self); dlg.setWindowTitle("Hash & Signature Report"); v=QVBoxLayout(dlg); te=QTextEdit(); te.setReadOnly(True); te.setText("\n".join(details)); v.addWidget(te); b=QPushButton("ปิด"); b.clicked.connect(dlg.accept); v.addWidget(b); dlg.resize(700,600); dlg.exec()
+        fw=self.fw_path; parts=list(self.rootfs_parts)
+        def work(ctx):
+            ctx.progress(0,2,"SHA256"); fw_sha=sha256sum(fw); ctx.progress(1,2,"MD5"); fw_md5=md5sum(fw)
+            details=[f"Firmware: {os.path.basename(fw)}",f"SHA256: {fw_sha}",f"MD5: {fw_md5}"]
+            if parts:
+                details.append("\n[RootFS Slice Hashes]")
+                with open(fw,'rb') as f:
+                    for i,p in enumerate(parts,1): f.seek(p['offset']); seg=f.read(min(65536,p['size'])); details.append(f"Part{i} {p['fs']} slice_sha25616={hashlib.sha256(seg).hexdigest()[:16]}")
+            return details
+        def done(details):
+            dlg=QDialog(self); dlg.setWindowTitle("Hash & Signature Report"); v=QVBoxLayout(dlg); te=QTextEdit(); te.setReadOnly(True); te.setText("\n".join(details)); v.addWidget(te); b=QPushButton("ปิด"); b.clicked.connect(dlg.accept); v.addWidget(b); dlg.resize(700,600); dlg.exec()
+        self.run_job("Hash & Signature", work, on_done=done)
     def export_patch_profile(self):
         if not self.fw_path: QMessageBox.warning(self,"Export Profile","เลือก firmware ก่อน"); return
         dlg=SelectivePatchDialog(self)
@@ -1935,21 +1688,9 @@ class MainWindow(QMainWindow):
         if QMessageBox.question(self,"ยืนยัน","Apply: "+dlg_text+" ?")!=QMessageBox.Yes: return
         try: part=self.get_selected_rootfs_part()
         except Exception as e: QMessageBox.warning(self,"Import",str(e)); return
-        ts=int(time.time()); current=self.fw_path; temps=[]
-        try:
-            if patches.get('boot_delay'):
-                out=os.path.join(self.output_dir,f"_tmp_prof_boot_{ts}.bin"); patch_boot_delay(current,part,patches['boot_delay_value'],out,self.log); temps.append(out); current=out
-            if patches.get('serial_shell'):
-                out=os.path.join(self.output_dir,f"_tmp_prof_serial_{ts}.bin"); patch_rootfs_shell_serial(current,part,out,self.log); temps.append(out); current=out
-            if patches.get('network_services'):
-                out=os.path.join(self.output_dir,f"_tmp_prof_net_{ts}.bin"); patch_rootfs_network(current,part,out,self.log); temps.append(out); current=out
-            if patches.get('root_password'):
-                out=os.path.join(self.output_dir,f"_tmp_prof_rootpw_{ts}.bin"); patch_root_password(current,part,patches.get('root_password_value','admin1234'),out,self.log); temps.append(out); current=out
-            final=os.path.join(self.output_dir,f"apply_profile_{ts}.bin"); shutil.copyfile(current,final); self.log(f"✅ Apply Patch Profile -> {final}")
-        finally:
-            for t in temps:
-                try: os.remove(t)
-                except: pass
+        ts=int(time.time()); final,delta=self._patch_output_path(f"apply_profile_{ts}")
+        self.run_job("Apply Profile",self._profile_job(patches,part,patches.get('root_password_value','admin1234'),final,delta),
+                     on_done=lambda _r: self.log(f"✅ Apply Patch Profile -> {final}"),key='patch',category='patch_profile')
     def open_uboot_env_editor(self):
         if not self.fw_path:
             QMessageBox.warning(self,"U-Boot Env","เลือก firmware ก่อน")
@@ -1971,71 +1712,18 @@ class MainWindow(QMainWindow):
     def scan_vulnerabilities(self): QMessageBox.information(self,"Vuln Scan","[DEMO]")
     def scan_backdoor(self): QMessageBox.information(self,"Backdoor Scan","[DEMO]")
 
-def auto_detect_tty_port_from_context(fw_path, rootfs_part, extracted_rootfs_dir, log_func):
-    """Detect serial console port using multiple heuristics (bootargs, inittab, securetty)."""
-    candidates=[]
-    # user preference (stored on MainWindow if present)
-    try:
-        from inspect import currentframe
-        # We cannot access MainWindow directly here reliably; placeholder logic: if global singleton or attribute set on caller.
-    except Exception:
-        pass
-    # 1. U-Boot env bootargs
-    try:
-        envs = scan_uboot_env(fw_path, deep=True)
-        if envs:
-            bootargs = envs[0].get('vars',{}).get('bootargs','')
-            import re
-            m = re.search(r'console=(tty[A-Za-z0-9]+)', bootargs)
-            if m:
-                candidates.append(m.group(1))
-    except Exception:
-        pass
-    # 2. inittab existing getty lines
-    inittab_path = os.path.join(extracted_rootfs_dir,'etc','inittab')
-    if os.path.exists(inittab_path):
-        try:
-            import re
-            txt=open(inittab_path,'r',encoding='utf-8',errors='ignore').read()
-            for m in re.finditer(r'getty[^\n]*?(tty\w+)', txt):
-                candidates.append(m.group(1))
-        except Exception:
-            pass
-    # 3. securetty
-    securetty_path = os.path.join(extracted_rootfs_dir,'etc','securetty')
-    if os.path.exists(securetty_path):
-        try:
-            for line in open(securetty_path,'r',encoding='utf-8',errors='ignore'):
-                line=line.strip()
-                if line.startswith('tty') and len(line)<16:
-                    candidates.append(line)
-        except Exception:
-            pass
-    # 4. common fallbacks
-    candidates += ['ttyS0','ttyS1','ttyAMA0']
-    # choose first existing inittab mention else first candidate
-    seen=[]
-    for c in candidates:
-        if c not in seen:
-            seen.append(c)
-    # If caller (MainWindow) set _preferred_serial_port use it
-    chosen = seen[0]
+def _gui_preferred_serial_port():
+    """Serial port chosen in the main window's Serial box (None -> auto-detect)."""
     try:
-        # attempt to retrieve via global reference to QApplication activeWindow
-        from PySide6.QtWidgets import QApplication
         w = QApplication.activeWindow()
-        if w and hasattr(w, '_preferred_serial_port') and w._preferred_serial_port:
-            pref = w._preferred_serial_port
-            if pref.startswith('tty') and pref not in seen:
-                seen.insert(0, pref)
-            if pref.startswith('tty'):
-                chosen = pref
-                log_func(f"[AUTO-TTY] ใช้ค่าที่ผู้ใช้เลือก: {chosen}")
+        return getattr(w, '_preferred_serial_port', None) or None
     except Exception:
-        pass
-    log_func(f"[AUTO-TTY] candidates={seen} -> เลือก {chosen}")
-    return chosen
-        
+        return None
+
+def auto_detect_tty_port_from_context(fw_path, rootfs_part, extracted_rootfs_dir, log_func):
+    """Detect serial console port using multiple heuristics (bootargs, inittab, securetty)."""
+    return detect_serial_port(fw_path, extracted_rootfs_dir, log_func, _gui_preferred_serial_port())
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
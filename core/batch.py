@@ -0,0 +1,302 @@
+"""Headless batch patching: apply one exported patch profile to many images.
+
+    python -m core.batch PROFILE.json SOURCE -o OUT_DIR [-j N] [--results FILE]
+                         [--rootfs-index N] [--mem-mb N] [--cpu-seconds N]
+                         [--timeout SECONDS] [--watch SECONDS] [--delta]
+
+PROFILE is the JSON written by "Export Patch Profile". SOURCE is a directory
+(searched recursively) or a manifest listing one image path per line ('#'
+comments allowed) or JSONL records with a "path" key.
+
+Every image runs scan -> extract -> patch -> repack -> splice as one
+PatchTransaction in its own worker process, at most N at a time. Each worker
+gets its own address-space / CPU-time rlimits and wall-clock timeout, and a
+worker that crashes or is killed only fails its own image. Each finished
+image appends one JSON line to the results file (fsync'ed). On restart,
+images that already have an "ok" record for the same file and profile are
+skipped, so an interrupted run resumes where it stopped. --watch keeps
+polling SOURCE for new images until interrupted. --delta stores each output
+as a core.delta file against its source image instead of a full copy.
+"""
+from __future__ import annotations
+import os, sys, json, time, signal, hashlib, argparse, multiprocessing
+from multiprocessing.connection import wait as _wait_any
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # non-POSIX
+    resource = None
+
+from core.fs_scan import scan_all_rootfs_partitions
+from core.delta import DELTA_SUFFIX
+from core.rootfs_ops import profile_transaction, PROFILE_PATCHES
+import core.tool_runner as tool_runner
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['load_profile', 'profile_digest', 'discover_images', 'load_results', 'patch_image', 'run_batch', 'main']
+
+# sidecar files that live next to images (results, manifests, logs, half-written outputs)
+_SKIP_SUFFIXES = ('.json', '.jsonl', '.log', '.txt', '.md', '.part', '.txn', DELTA_SUFFIX)
+
+
+def load_profile(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    patches = profile.get('patches')
+    if not isinstance(patches, dict) or not any(patches.get(k) for k in PROFILE_PATCHES):
+        raise ValueError(f"{path}: profile has no enabled patches ({', '.join(PROFILE_PATCHES)})")
+    return profile
+
+
+def profile_digest(profile: Dict[str, Any], rootfs_index: int = 1) -> str:
+    """Identity of what gets applied; results from another profile never count as done."""
+    blob = json.dumps({'patches': profile.get('patches', {}), 'rootfs_index': rootfs_index}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def discover_images(source: str, exclude: Optional[str] = None) -> List[Tuple[str, str]]:
+    """[(image_path, output_stem)] sorted, from a directory tree or a manifest file."""
+    found: List[Tuple[str, str]] = []
+    if os.path.isdir(source):
+        exclude = os.path.realpath(exclude) if exclude else None
+        for dp, dn, fn in os.walk(source):
+            if exclude:
+                dn[:] = [d for d in dn if os.path.realpath(os.path.join(dp, d)) != exclude]
+            for name in fn:
+                p = os.path.join(dp, name)
+                if name.lower().endswith(_SKIP_SUFFIXES) or not os.path.isfile(p):
+                    continue
+                rel = os.path.relpath(p, source)
+                found.append((p, os.path.splitext(rel)[0].replace(os.sep, '__')))
+        return sorted(found)
+    base = os.path.dirname(os.path.abspath(source))
+    seen: Dict[str, int] = {}
+    with open(source, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            p = json.loads(line)['path'] if line.startswith('{') else line
+            p = p if os.path.isabs(p) else os.path.join(base, p)
+            stem = os.path.splitext(os.path.basename(p))[0]
+            n = seen[stem] = seen.get(stem, 0) + 1
+            found.append((p, stem if n == 1 else f"{stem}.{n}"))
+    return found
+
+
+def _file_id(path: str) -> str:
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def load_results(results_path: str) -> Dict[str, Dict[str, Any]]:
+    """Last record per (file id, profile digest); a torn final line from a crash is ignored."""
+    done: Dict[str, Dict[str, Any]] = {}
+    try:
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                done[f"{rec.get('file_id')}|{rec.get('profile')}"] = rec
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def patch_image(path: str, out_path: str, patches: Dict[str, Any], rootfs_index: int = 1,
+                log_func: LogFunc = lambda m: None, delta: bool = False) -> Dict[str, Any]:
+    """Run the whole pipeline for one image; returns the result record fields."""
+    parts = scan_all_rootfs_partitions(path, log_func=log_func, use_cache=False)
+    part = parts[rootfs_index - 1] if 0 < rootfs_index <= len(parts) else None
+    needs_rootfs = any(patches.get(k) for k in ('serial_shell', 'network_services', 'root_password'))
+    if needs_rootfs and part is None:
+        return {'status': 'error', 'error': f"ไม่พบ rootfs #{rootfs_index} (พบ {len(parts)})"}
+    txn, applied = profile_transaction(path, part, patches, log_func)
+    ok, err = txn.commit(out_path, delta=delta)
+    rec: Dict[str, Any] = {'status': 'ok' if ok else 'error', 'applied': applied, 'ops': txn.results}
+    if part:
+        rec['partition'] = {k: part[k] for k in ('fs', 'offset', 'size')}
+    if ok:
+        rec['output'] = out_path
+        with open(out_path + '.manifest.json', 'r', encoding='utf-8') as f:
+            m = json.load(f)
+        rec['manifest'] = out_path + '.manifest.json'
+        rec['sha256'] = m['input']['sha256']
+        rec['output_sha256'] = m['output']['sha256']
+    else:
+        rec['error'] = err
+    return rec
+
+
+def _limit_resources(mem_mb: Optional[int], cpu_seconds: Optional[int]) -> None:
+    if resource is None:
+        return
+    # inherited by mksquashfs / unsquashfs children as well
+    if mem_mb:
+        resource.setrlimit(resource.RLIMIT_AS, (mem_mb * 1024 * 1024, mem_mb * 1024 * 1024))
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+
+
+def _kill_group(p) -> None:
+    """SIGKILL the worker's process group: the worker and every extract / repack tool it started."""
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except (OSError, AttributeError):  # group already gone, or no process groups (non-POSIX)
+        if p.is_alive():
+            p.kill()
+
+
+def _worker(conn, task: Dict[str, Any]) -> None:
+    if hasattr(os, 'setpgid'):
+        os.setpgid(0, 0)  # group leader, so the parent's killpg also reaches our tools
+        tool_runner.OWN_GROUP = False
+    _limit_resources(task['mem_mb'], task['cpu_seconds'])
+    t0 = time.time()
+    with open(task['log_path'], 'w', encoding='utf-8') as logf:
+        def log(m):
+            logf.write(m + '\n'); logf.flush()
+        try:
+            rec = patch_image(task['path'], task['out_path'], task['patches'], task['rootfs_index'], log,
+                              task['delta'])
+        except BaseException as e:  # MemoryError from RLIMIT_AS included
+            log(f"❌ {type(e).__name__}: {e}")
+            rec = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+    rec['seconds'] = round(time.time() - t0, 3)
+    conn.send(rec)
+    conn.close()
+
+
+def run_batch(profile: Dict[str, Any], images: List[Tuple[str, str]], out_dir: str, jobs: int = 0,
+              results_path: Optional[str] = None, rootfs_index: int = 1, mem_mb: Optional[int] = None,
+              cpu_seconds: Optional[int] = None, timeout: Optional[float] = None, retry_errors: bool = True,
+              delta: bool = False, log_func: LogFunc = print) -> Dict[str, int]:
+    """Patch images (skipping ones already done); returns {'ok', 'error', 'skipped'} counts.
+
+    retry_errors=False also skips images whose last record is an error (used between --watch polls).
+    """
+    os.makedirs(os.path.join(out_dir, 'logs'), exist_ok=True)
+    results_path = results_path or os.path.join(out_dir, 'results.jsonl')
+    digest = profile_digest(profile, rootfs_index)
+    done = load_results(results_path)
+    counts = {'ok': 0, 'error': 0, 'skipped': 0}
+    queue: List[Dict[str, Any]] = []
+    for path, stem in images:
+        try:
+            fid = _file_id(path)
+        except OSError as e:
+            log_func(f"[BATCH] ข้าม {path}: {e}")
+            counts['error'] += 1
+            continue
+        prev = done.get(f"{fid}|{digest}")
+        if prev and (prev.get('status') == 'ok' or not retry_errors):
+            counts['skipped'] += 1
+            continue
+        ext = DELTA_SUFFIX if delta else (os.path.splitext(path)[1] or '.bin')
+        queue.append({'path': path, 'file_id': fid, 'patches': profile['patches'], 'rootfs_index': rootfs_index,
+                      'out_path': os.path.join(out_dir, f"{stem}_patched{ext}"),
+                      'log_path': os.path.join(out_dir, 'logs', f"{stem}.log"),
+                      'mem_mb': mem_mb, 'cpu_seconds': cpu_seconds, 'delta': delta})
+    if counts['skipped']:
+        log_func(f"[BATCH] ข้าม {counts['skipped']} image ที่ทำเสร็จแล้ว (resume)")
+    if not queue:
+        return counts
+    jobs = jobs or os.cpu_count() or 1
+    ctx = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    running: Dict[Any, Dict[str, Any]] = {}  # sentinel -> {p, conn, task, started, rec}
+    total = len(queue)
+    finished = [0]
+    with open(results_path, 'a', encoding='utf-8') as results:
+        def finish(task, rec):
+            rec.update(image=task['path'], file_id=task['file_id'], profile=digest, log=task['log_path'],
+                       finished=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+            results.write(json.dumps(rec, ensure_ascii=False) + '\n')
+            results.flush(); os.fsync(results.fileno())
+            counts['ok' if rec['status'] == 'ok' else 'error'] += 1
+            finished[0] += 1
+            log_func(f"[BATCH] {finished[0]}/{total} {rec['status']} {task['path']}"
+                     f"{'' if rec['status'] == 'ok' else ' -> ' + str(rec.get('error'))}")
+        while queue or running:
+            while queue and len(running) < jobs:
+                task = queue.pop(0)
+                parent, child = ctx.Pipe(duplex=False)
+                p = ctx.Process(target=_worker, args=(child, task), daemon=True)
+                p.start()
+                child.close()
+                if hasattr(os, 'setpgid'):
+                    try:
+                        os.setpgid(p.pid, p.pid)  # also from this side: a kill may come before the child runs
+                    except OSError:
+                        pass
+                running[p.sentinel] = {'p': p, 'conn': parent, 'task': task, 'started': time.time(), 'rec': None}
+            # the result pipe is read as soon as it is readable: a record bigger than the
+            # pipe buffer would otherwise block the worker from exiting
+            ready = _wait_any(list(running) + [r['conn'] for r in running.values() if r['rec'] is None], timeout=1.0)
+            now = time.time()
+            for sentinel, r in list(running.items()):
+                p, conn, task = r['p'], r['conn'], r['task']
+                if r['rec'] is None and (conn in ready or (not p.is_alive() and conn.poll())):
+                    try:
+                        r['rec'] = conn.recv()
+                    except (EOFError, OSError):
+                        r['rec'] = {}  # pipe closed without a record
+                if p.is_alive() and not (timeout and now - r['started'] > timeout):
+                    continue
+                if r['rec']:
+                    rec = r['rec']
+                elif p.is_alive():
+                    rec = {'status': 'error', 'error': f"timeout after {timeout:.0f}s"}
+                else:
+                    # negative exit code: killed by that signal (SIGKILL / SIGXCPU from the rlimits)
+                    rec = {'status': 'error', 'error': f"worker exit code {p.exitcode}"}
+                _kill_group(p)  # before join: also sweeps tools left behind by a worker that died
+                p.join()
+                conn.close()
+                del running[sentinel]
+                finish(task, rec)
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog='python -m core.batch', description=__doc__.split('\n')[0])
+    ap.add_argument('profile', help='patch profile JSON (Export Patch Profile)')
+    ap.add_argument('source', help='directory of images or manifest file')
+    ap.add_argument('-o', '--out-dir', required=True)
+    ap.add_argument('-j', '--jobs', type=int, default=0, help='parallel images (default: CPU count)')
+    ap.add_argument('--results', help='results JSONL (default: OUT_DIR/results.jsonl)')
+    ap.add_argument('--rootfs-index', type=int, default=1, help='1-based rootfs partition to patch')
+    ap.add_argument('--mem-mb', type=int, help='address-space limit per image worker')
+    ap.add_argument('--cpu-seconds', type=int, help='CPU-time limit per image worker')
+    ap.add_argument('--timeout', type=float, help='wall-clock limit per image')
+    ap.add_argument('--watch', type=float, metavar='SECONDS', help='keep polling SOURCE for new images')
+    ap.add_argument('--delta', action='store_true', help='write deltas against the source instead of full images')
+    args = ap.parse_args(argv)
+    profile = load_profile(args.profile)
+    total = {'ok': 0, 'error': 0, 'skipped': 0}
+    first = True
+    try:
+        while True:
+            images = discover_images(args.source, exclude=args.out_dir)
+            counts = run_batch(profile, images, args.out_dir, args.jobs, args.results, args.rootfs_index,
+                               args.mem_mb, args.cpu_seconds, args.timeout, retry_errors=first,
+                               delta=args.delta)
+            first = False
+            for k in ('ok', 'error'):
+                total[k] += counts[k]
+            total['skipped'] = counts['skipped']
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        print("[BATCH] หยุดโดยผู้ใช้ — รันคำสั่งเดิมอีกครั้งเพื่อทำต่อ", file=sys.stderr)
+        return 130
+    print(f"[BATCH] ok {total['ok']} error {total['error']} skipped {total['skipped']}")
+    return 1 if total['error'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""Content-addressable store for extracted firmware trees.
+
+Extracted trees of many firmware versions mostly hold the same files (busybox,
+libc, web assets). The store keeps every regular file once under
+``objects/<sha256[:2]>/<sha256>`` (cloned in with a reflink where the
+filesystem supports it, read-only) and describes each extracted partition by a
+manifest under ``manifests/<id>.json``: path, type, mode, owner, size, hash
+and symlink target of every entry.
+
+Consumers work off manifests instead of walking trees:
+
+* diff_manifests is a join of two manifests (no file is read),
+* scan_secrets / analyze_elfs run once per distinct object and memoise the
+  result under ``derived/<kind>/``, so the next firmware only pays for the
+  files that are new to the store,
+* materialise rebuilds a tree from hardlinks (read-only consumers) or
+  reflink copies (writable) when a real directory is needed.
+
+Manifest ids for firmware partitions are the extraction-cache key (slice
+hash + fs + extractor fingerprint), so an already ingested partition is found
+without extracting it again.
+
+ingest holds a shared flock on the store from its first object until its
+manifest is written, and gc takes it exclusively, so gc (in any process) never
+deletes objects whose manifest is still being written.
+"""
+from __future__ import annotations
+import os, json, time, shutil, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from core.extract_cache import ExtractionCache, get_cache
+from core.slice_io import clone_file
+from core.tree_diff import Meta, scan_tree, diff_metadata, make_entry
+from core.jobs import propagate
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX
+    fcntl = None
+
+LogFunc = Callable[[str], None]
+ExtractFunc = Callable[[str, str, str, LogFunc], Tuple[bool, str]]
+
+__all__ = ['CASStore', 'get_store', 'diff_manifests', 'CAS_DIR']
+
+CAS_DIR = os.environ.get('FW_CAS_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'firmware_toolkit', 'cas'))
+ELF_MAGIC = b"\x7fELF"
+
+
+def _hash_file(path: str) -> Tuple[str, bool]:
+    """(sha256, is_elf) with chunked reads."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        first = f.read(1024 * 1024)
+        h.update(first)
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest(), first.startswith(ELF_MAGIC)
+
+
+def _entry_meta(e: Dict[str, Any]) -> Meta:
+    extra = e.get('target') if e['type'] == 'symlink' else e.get('rdev')
+    return (e['type'], e.get('size', 0), int(e['mode'], 8), e['uid'], e['gid'], extra, e.get('sha256'))
+
+
+class CASStore:
+    """objects/ (one read-only copy per distinct file), manifests/ (one per extracted tree), derived/ (memo)."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or CAS_DIR)
+        self._lock = threading.Lock()
+        for sub in ('objects', 'manifests', 'derived'):
+            os.makedirs(os.path.join(self.root, sub), exist_ok=True)
+
+    @contextmanager
+    def _store_lock(self, exclusive: bool) -> Iterator[None]:
+        with open(os.path.join(self.root, '.lock'), 'a+') as lk:
+            if fcntl:
+                fcntl.flock(lk, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lk, fcntl.LOCK_UN)
+
+    # ---- objects ----
+    def object_path(self, sha: str) -> str:
+        return os.path.join(self.root, 'objects', sha[:2], sha)
+
+    def _store_object(self, src: str, sha: str) -> bool:
+        """Copy src in as object sha unless present; True when new bytes were stored."""
+        dst = self.object_path(sha)
+        if os.path.exists(dst):
+            return False
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            clone_file(src, tmp)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return True
+
+    # ---- manifests ----
+    def _manifest_path(self, manifest_id: str) -> str:
+        return os.path.join(self.root, 'manifests', f"{manifest_id}.json")
+
+    def has_manifest(self, manifest_id: str) -> bool:
+        return os.path.exists(self._manifest_path(manifest_id))
+
+    def load_manifest(self, manifest_id: str) -> Dict[str, Any]:
+        with open(self._manifest_path(manifest_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def manifests(self) -> List[str]:
+        return sorted(n[:-5] for n in os.listdir(os.path.join(self.root, 'manifests')) if n.endswith('.json'))
+
+    def ingest(self, tree: str, manifest_id: str, info: Optional[Dict[str, Any]] = None,
+               workers: Optional[int] = None, log_func: LogFunc = lambda m: None) -> Dict[str, Any]:
+        """Store every file of tree and write its manifest; returns the manifest.
+
+        A file that cannot be read raises (OSError) and no manifest is written.
+        """
+        with self._store_lock(exclusive=False):
+            return self._ingest(tree, manifest_id, info, workers, log_func)
+
+    def _ingest(self, tree: str, manifest_id: str, info: Optional[Dict[str, Any]], workers: Optional[int],
+                log_func: LogFunc) -> Dict[str, Any]:
+        t0 = time.time()
+        meta = scan_tree(tree)
+        stats = {'files': 0, 'new_objects': 0, 'new_bytes': 0, 'deduped_bytes': 0}
+
+        def _put(rel: str) -> Tuple[str, str, bool]:
+            # an unreadable file fails the ingest: a manifest missing it would be reused forever
+            path = os.path.join(tree, rel)
+            sha, elf = _hash_file(path)
+            fresh = self._store_object(path, sha)
+            with self._lock:
+                stats['files'] += 1
+                size = meta[rel][1]
+                if fresh:
+                    stats['new_objects'] += 1; stats['new_bytes'] += size
+                else:
+                    stats['deduped_bytes'] += size
+            return rel, sha, elf
+
+        files = [rel for rel, m in meta.items() if m[0] == 'file']
+        with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) * 2)) as pool:
+            hashed = {rel: (sha, elf) for rel, sha, elf in pool.map(_put, files)}
+        entries = []
+        for rel in sorted(meta):
+            kind, size, mode, uid, gid, extra, _ = meta[rel]
+            e: Dict[str, Any] = {'path': rel, 'type': kind, 'mode': f"{mode:04o}", 'uid': uid, 'gid': gid}
+            if kind == 'file':
+                sha, elf = hashed[rel]
+                e.update(size=size, sha256=sha)
+                if elf:
+                    e['elf'] = True
+            elif kind == 'symlink':
+                e['target'] = extra
+            elif kind == 'device':
+                e['rdev'] = extra
+            entries.append(e)
+        manifest = {'id': manifest_id, 'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'info': info or {}, 'stats': stats, 'entries': entries}
+        path = self._manifest_path(manifest_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        log_func(f"[CAS] {manifest_id}: {stats['files']} ไฟล์, object ใหม่ {stats['new_objects']} "
+                 f"({stats['new_bytes']} B), ซ้ำ {stats['deduped_bytes']} B {time.time() - t0:.2f}s")
+        return manifest
+
+    def ingest_partition(self, fw_path: str, part: Dict[str, Any], extract_func: ExtractFunc,
+                         log_func: LogFunc = lambda m: None, cache: Optional[ExtractionCache] = None) -> Dict[str, Any]:
+        """Manifest for a firmware partition, extracting (through the extraction cache) only when not ingested yet."""
+        cache = cache or get_cache()
+        manifest_id = cache.key(fw_path, part)
+        if self.has_manifest(manifest_id):
+            return self.load_manifest(manifest_id)
+        info = {'source': os.path.basename(fw_path), 'fs': part.get('fs'), 'offset': part['offset'], 'size': part['size']}
+        with cache.use(fw_path, part, extract_func, log_func) as (ok, tree):
+            if not ok:
+                raise RuntimeError(tree)
+            return self.ingest(tree, manifest_id, info, log_func=log_func)
+
+    def ingest_partitions(self, fw_path: str, parts: List[Dict[str, Any]], extract_func: ExtractFunc,
+                          log_func: LogFunc = lambda m: None, workers: Optional[int] = None,
+                          cache: Optional[ExtractionCache] = None) -> List[Any]:
+        """ingest_partition for independent partitions concurrently; a manifest or the exception, in order."""
+        def _one(part):
+            try:
+                return self.ingest_partition(fw_path, part, extract_func, log_func, cache)
+            except Exception as e:
+                return e
+        if len(parts) <= 1:
+            return [_one(p) for p in parts]
+        # extractors are external processes or release the GIL in zlib/lzma, so threads overlap well
+        with ThreadPoolExecutor(max_workers=workers or min(len(parts), 4)) as pool:
+            return list(pool.map(propagate(_one), parts))
+
+    # ---- derived data, memoised per object ----
+    def derived(self, kind: str, sha: str, func: Callable[[str], Any]) -> Any:
+        """func(object_path) computed once per object and kept under derived/<kind>/."""
+        path = os.path.join(self.root, 'derived', kind, sha[:2], f"{sha}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        value = func(self.object_path(sha))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return value
+
+    def scan_secrets(self, manifest: Dict[str, Any], limit: int = 500) -> List[Dict[str, str]]:
+        """scan_secrets_in_dir equivalent over a manifest: findings {file, type, snippet}."""
+        from core.secret_scan import scan_secrets_in_file, MAX_FILE_SIZE
+        findings: List[Dict[str, str]] = []
+        for e in manifest['entries']:
+            if e['type'] != 'file' or e.get('elf') or e['size'] > MAX_FILE_SIZE:
+                continue
+            for hit in self.derived('secrets', e['sha256'], scan_secrets_in_file):
+                findings.append({'file': e['path'], **hit})
+                if len(findings) >= limit:
+                    return findings
+        return findings
+
+    def analyze_elfs(self, manifest: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """core.elf_analyze.analyze_elf for each ELF in the manifest ('path' is the path inside the tree)."""
+        from core.elf_analyze import analyze_elf
+        out = []
+        for e in manifest['entries']:
+            if not e.get('elf'):
+                continue
+            info = dict(self.derived('elf', e['sha256'], analyze_elf))
+            info['path'] = e['path']
+            out.append(info)
+            if limit and len(out) >= limit:
+                break
+        return out
+
+    # ---- trees ----
+    def materialise(self, manifest: Dict[str, Any], dest: str, writable: bool = False) -> int:
+        """Recreate the tree at dest: hardlinks to objects (read-only) or reflink copies (writable)."""
+        count = 0
+        dirs = []
+        for e in manifest['entries']:
+            path = os.path.join(dest, e['path'])
+            if e['type'] == 'dir':
+                os.makedirs(path, exist_ok=True)
+                dirs.append((path, int(e['mode'], 8)))
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if e['type'] == 'symlink':
+                os.symlink(e['target'], path)
+            elif e['type'] == 'file':
+                obj = self.object_path(e['sha256'])
+                if writable:
+                    clone_file(obj, path)
+                    os.chmod(path, int(e['mode'], 8))
+                else:
+                    try:
+                        os.link(obj, path)
+                    except OSError:  # other filesystem
+                        clone_file(obj, path)
+                count += 1
+        for path, mode in reversed(dirs):
+            os.chmod(path, mode | 0o700)
+        return count
+
+    def gc(self, log_func: LogFunc = lambda m: None) -> int:
+        """Delete objects (and their derived data) no manifest refers to. Returns bytes freed."""
+        with self._store_lock(exclusive=True):
+            live = set()
+            for mid in self.manifests():
+                live.update(e['sha256'] for e in self.load_manifest(mid)['entries'] if e.get('sha256'))
+            freed = 0
+            objects = os.path.join(self.root, 'objects')
+            for sub in os.listdir(objects):
+                for name in os.listdir(os.path.join(objects, sub)):
+                    if name in live or name.endswith('.tmp'):
+                        continue
+                    path = os.path.join(objects, sub, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    for kind in os.listdir(os.path.join(self.root, 'derived')):
+                        try:
+                            os.remove(os.path.join(self.root, 'derived', kind, sub, f"{name}.json"))
+                        except OSError:
+                            pass
+        log_func(f"[CAS] gc: คืนพื้นที่ {freed} bytes")
+        return freed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+        for sub in ('objects', 'manifests', 'derived'):
+            os.makedirs(os.path.join(self.root, sub), exist_ok=True)
+
+
+def diff_manifests(old: Dict[str, Any], new: Dict[str, Any],
+                   stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+    """core.tree_diff entries for two manifests; a pure join, content compared by hash."""
+    stats = stats if stats is not None else {}
+    for k in ('added', 'removed', 'changed', 'unchanged'):
+        stats.setdefault(k, 0)
+    a = {e['path']: _entry_meta(e) for e in old['entries']}
+    b = {e['path']: _entry_meta(e) for e in new['entries']}
+    pending: List[Tuple[str, Meta, Meta, List[str]]] = []
+    yield from diff_metadata(a, b, stats, pending)
+    for rel, ma, mb, changes in pending:
+        if ma[6] != mb[6]:
+            changes = changes + ['content']
+        if changes:
+            stats['changed'] += 1
+            e = make_entry(rel, 'changed', ma, mb, changes)
+            e['old']['sha256'], e['new']['sha256'] = ma[6], mb[6]
+            yield e
+        else:
+            stats['unchanged'] += 1
+
+
+_DEFAULT: Optional[CASStore] = None
+
+def get_store() -> CASStore:
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = CASStore()
+    return _DEFAULT
@@ -0,0 +1,215 @@
+"""Compact binary deltas of patched firmware against its source image.
+
+A patched image differs from its source only inside the ranges the patch
+touched (the spliced rootfs partition, an env block, the boot delay byte), so
+a delta is built from those known regions instead of diffing whole files:
+
+* outside the regions the target is taken to equal the source byte-for-byte
+  and becomes one COPY op per gap;
+* inside a region, extents the squashfs builder copied verbatim from the old
+  partition (``SquashFSBuilder.reused_extents``) become COPY ops from their
+  old position, the remainder is compared with the source at the same offset
+  in ``BLOCK``-sized pieces and only differing pieces are stored, zlib
+  compressed, as DATA ops.
+
+File layout: ``FWDELTA1``, u32 header length, JSON header, then ops in target
+order: ``C`` <u64 src_off> <u64 length> or ``D`` <u64 raw length> <u64 stored
+length> <zlib bytes>. apply_delta streams the ops (copies go kernel-side via
+slice_io.copy_range), so memory stays bounded by one DATA op.
+"""
+from __future__ import annotations
+import os, json, time, zlib, struct
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from core.file_utils import sha256sum
+from core.slice_io import copy_range
+
+LogFunc = Callable[[str], None]
+Region = Tuple[int, int]          # (offset, length) in the target
+Extent = Tuple[int, int, int]     # (target_off, source_off, length)
+
+__all__ = ['create_delta', 'apply_delta', 'read_delta_header', 'DeltaError', 'DELTA_MAGIC', 'DELTA_SUFFIX']
+
+DELTA_MAGIC = b'FWDELTA1'
+DELTA_SUFFIX = '.fwdelta'
+BLOCK = 4096
+_MAX_DATA = 4 * 1024 * 1024  # raw bytes per DATA op
+_OP = struct.Struct('<cQQ')
+
+
+class DeltaError(Exception):
+    pass
+
+
+def _merge(regions: Iterable[Region], size: int) -> List[Region]:
+    out: List[List[int]] = []
+    for off, ln in sorted((max(0, o), min(o + n, size) - max(0, o)) for o, n in regions):
+        if ln <= 0:
+            continue
+        if out and off <= out[-1][0] + out[-1][1]:
+            out[-1][1] = max(out[-1][1], off + ln - out[-1][0])
+        else:
+            out.append([off, ln])
+    return [(o, n) for o, n in out]
+
+
+def _region_ops(src_fd: int, dst_fd: int, src_size: int, off: int, ln: int,
+                extents: Sequence[Extent]) -> Iterator[Tuple[str, int, int]]:
+    """('C', src_off, len) / ('D', target_off, len) covering target[off:off+ln]."""
+    pos, end = off, off + ln
+    for t_off, s_off, e_len in extents:
+        if t_off + e_len <= pos or t_off >= end:
+            continue
+        if t_off > pos:
+            yield from _compare_ops(src_fd, dst_fd, src_size, pos, t_off - pos)
+            pos = t_off
+        skip = pos - t_off
+        take = min(e_len - skip, end - pos)
+        yield 'C', s_off + skip, take
+        pos += take
+    if pos < end:
+        yield from _compare_ops(src_fd, dst_fd, src_size, pos, end - pos)
+
+
+def _compare_ops(src_fd: int, dst_fd: int, src_size: int, off: int, ln: int) -> Iterator[Tuple[str, int, int]]:
+    pos, end = off, off + ln
+    while pos < end:
+        n = min(BLOCK * 256, end - pos)
+        new = os.pread(dst_fd, n, pos)
+        old = os.pread(src_fd, n, pos) if pos < src_size else b''
+        for i in range(0, len(new), BLOCK):
+            a, b = new[i:i + BLOCK], old[i:i + BLOCK]
+            yield ('C', pos + i, len(a)) if a == b else ('D', pos + i, len(a))
+        pos += n
+
+
+def _coalesce(ops: Iterable[Tuple[str, int, int]]) -> Iterator[Tuple[str, int, int]]:
+    cur = None
+    for kind, a, n in ops:
+        if cur and cur[0] == kind and cur[1] + cur[2] == a and (kind == 'C' or cur[2] + n <= _MAX_DATA):
+            cur[2] += n
+            continue
+        if cur:
+            yield tuple(cur)
+        cur = [kind, a, n]
+    if cur:
+        yield tuple(cur)
+
+
+def create_delta(source: str, target: str, delta_path: str, regions: Optional[Iterable[Region]] = None,
+                 extents: Iterable[Extent] = (), target_sha256: Optional[str] = None,
+                 log_func: LogFunc = lambda m: None) -> Dict[str, Any]:
+    """Write delta_path turning source into target; returns the header (with op/byte counts).
+
+    regions: target ranges that may differ from source (None = whole file).
+    extents: (target_off, source_off, length) ranges known to equal the source elsewhere.
+    """
+    t0 = time.time()
+    src_size, dst_size = os.path.getsize(source), os.path.getsize(target)
+    if regions is None:
+        regions = [(0, dst_size)]
+    regions = list(regions)
+    if dst_size > src_size:
+        regions.append((src_size, dst_size - src_size))
+    regions = _merge(regions, dst_size)
+    extents = sorted(e for e in extents if e[2] > 0)
+    header: Dict[str, Any] = {
+        'version': 1, 'source_name': os.path.basename(source), 'source_size': src_size,
+        'source_sha256': sha256sum(source), 'target_size': dst_size,
+        'target_sha256': target_sha256 or sha256sum(target), 'regions': regions,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    stats = {'copy_ops': 0, 'data_ops': 0, 'copy_bytes': 0, 'data_bytes': 0, 'stored_bytes': 0}
+    hdr = json.dumps(header, sort_keys=True).encode()
+    tmp = f"{delta_path}.{os.getpid()}.part"
+    try:
+        with open(source, 'rb') as fs, open(target, 'rb') as ft, open(tmp, 'wb') as out:
+            sfd, tfd = fs.fileno(), ft.fileno()
+            out.write(DELTA_MAGIC + struct.pack('<I', len(hdr)) + hdr)
+
+            def ops():
+                pos = 0
+                for off, ln in regions:
+                    if off > pos:
+                        yield 'C', pos, off - pos
+                    yield from _region_ops(sfd, tfd, src_size, off, ln, extents)
+                    pos = off + ln
+                if pos < dst_size:
+                    yield 'C', pos, dst_size - pos
+
+            for kind, a, n in _coalesce(ops()):
+                if kind == 'C':
+                    out.write(_OP.pack(b'C', a, n))
+                    stats['copy_ops'] += 1; stats['copy_bytes'] += n
+                else:
+                    packed = zlib.compress(os.pread(tfd, n, a), 6)
+                    out.write(_OP.pack(b'D', n, len(packed)))
+                    out.write(packed)
+                    stats['data_ops'] += 1; stats['data_bytes'] += n; stats['stored_bytes'] += len(packed)
+        os.replace(tmp, delta_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    header.update(stats, delta_size=os.path.getsize(delta_path))
+    log_func(f"[DELTA] {os.path.basename(delta_path)}: {header['delta_size']} bytes แทน {dst_size} "
+             f"(copy {stats['copy_ops']} ops / {stats['copy_bytes']} B, data {stats['data_ops']} ops / "
+             f"{stats['data_bytes']} B) {time.time() - t0:.2f}s")
+    return header
+
+
+def read_delta_header(delta_path: str) -> Dict[str, Any]:
+    with open(delta_path, 'rb') as f:
+        return _read_header(f)
+
+
+def _read_header(f) -> Dict[str, Any]:
+    if f.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+        raise DeltaError('not a firmware delta')
+    (n,) = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(n))
+
+
+def apply_delta(source: str, delta_path: str, out_path: str, verify: bool = True,
+                log_func: LogFunc = lambda m: None) -> Tuple[bool, str]:
+    """Materialise the patched image at out_path from source + delta. Returns (ok, err)."""
+    tmp = f"{out_path}.{os.getpid()}.part"
+    try:
+        with open(delta_path, 'rb') as fd, open(source, 'rb') as fs, open(tmp, 'wb') as out:
+            header = _read_header(fd)
+            if os.fstat(fs.fileno()).st_size != header['source_size']:
+                return False, 'source size does not match the delta'
+            if verify and sha256sum(source) != header['source_sha256']:
+                return False, 'source sha256 does not match the delta'
+            pos = 0
+            while True:
+                raw = fd.read(_OP.size)
+                if not raw:
+                    break
+                if len(raw) != _OP.size:
+                    return False, 'truncated delta'
+                kind, a, n = _OP.unpack(raw)
+                if kind == b'C':
+                    if copy_range(fs.fileno(), out.fileno(), a, n, pos) != n:
+                        return False, f'short copy at 0x{pos:X}'
+                    pos += n
+                elif kind == b'D':
+                    data = zlib.decompress(fd.read(n))
+                    if len(data) != a:
+                        return False, f'corrupt data op at 0x{pos:X}'
+                    os.pwrite(out.fileno(), data, pos)
+                    pos += a
+                else:
+                    return False, f'unknown delta op {kind!r}'
+            if pos != header['target_size']:
+                return False, f"delta covers {pos} of {header['target_size']} bytes"
+            out.truncate(pos)
+        if verify and sha256sum(tmp) != header['target_sha256']:
+            return False, 'output sha256 does not match the delta'
+        os.replace(tmp, out_path)
+        log_func(f"[DELTA] สร้าง {out_path} จาก {os.path.basename(source)} + {os.path.basename(delta_path)}")
+        return True, ''
+    except (OSError, ValueError, zlib.error, DeltaError) as e:
+        return False, str(e)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
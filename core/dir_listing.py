@@ -0,0 +1,81 @@
+"""Single-directory listing helpers behind the lazy rootfs tree views.
+
+A view lists a directory only when it is expanded, in two steps:
+list_names (one scandir, entry types from d_type, no per-entry stat) gives
+the rows immediately, then stat_entries fills size / mode / symlink target in
+batches. listing_changes turns a re-listing into row removals and insertions
+so an already shown directory is updated in place after add / replace /
+delete instead of being rebuilt.
+"""
+from __future__ import annotations
+import os, stat
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+__all__ = ['list_names', 'stat_entries', 'iter_batches', 'listing_changes', 'sort_key', 'STAT_BATCH']
+
+STAT_BATCH = 256
+
+Entry = Tuple[str, str]                            # (name, kind)
+Stat = Tuple[int, int, Optional[str]]              # (size, permission bits, symlink target)
+
+
+def sort_key(entry: Entry):
+    """Directories first, then by name (the order rows are shown in)."""
+    return (entry[1] != 'dir', entry[0])
+
+
+def _kind(e: os.DirEntry) -> str:
+    try:
+        if e.is_symlink():
+            return 'symlink'
+        if e.is_dir(follow_symlinks=False):
+            return 'dir'
+        if e.is_file(follow_symlinks=False):
+            return 'file'
+    except OSError:
+        pass
+    return 'other'
+
+
+def list_names(path: str) -> List[Entry]:
+    """Sorted (name, kind) of the entries directly in path; [] when it cannot be read."""
+    try:
+        with os.scandir(path) as it:
+            out = [(e.name, _kind(e)) for e in it]
+    except OSError:
+        return []
+    out.sort(key=sort_key)
+    return out
+
+
+def stat_entries(path: str, names: Iterable[str]) -> Dict[str, Stat]:
+    """name -> (size, mode bits, symlink target or None) via lstat; vanished entries are left out."""
+    out: Dict[str, Stat] = {}
+    for n in names:
+        p = os.path.join(path, n)
+        try:
+            st = os.lstat(p)
+            target = os.readlink(p) if stat.S_ISLNK(st.st_mode) else None
+        except OSError:
+            continue
+        out[n] = (st.st_size, stat.S_IMODE(st.st_mode), target)
+    return out
+
+
+def iter_batches(items: Sequence, size: int = STAT_BATCH) -> Iterator[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def listing_changes(old: Sequence[Entry], new: Sequence[Entry]) -> Tuple[List[int], List[Tuple[int, Entry]]]:
+    """Row edits turning old into new (both sorted with sort_key).
+
+    Returns (rows to remove, highest first, so they can be removed one by one)
+    and (row, entry) insertions in ascending order, applied after the removals.
+    An entry whose kind changed is removed and re-inserted.
+    """
+    keep = set(new)
+    removed = [i for i in range(len(old) - 1, -1, -1) if old[i] not in keep]
+    have = set(old)
+    inserts = [(i, e) for i, e in enumerate(new) if e not in have]
+    return removed, inserts
@@ -4,7 +4,7 @@ Optional: if 'r2' (radare2) or 'rabin2' is present we can gather extra info.
 """
 from __future__ import annotations
 import os, struct, subprocess, shutil
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List
 
 ELF_MAGIC = b"\x7fELF"
 
@@ -23,6 +23,151 @@ ENDIAN_MAP = {1: "LE", 2: "BE"}
 TYPE_MAP = {1: "REL", 2: "EXEC", 3: "DYN"}
 
 
+def read_elf_header(path: str) -> Optional[Dict[str, Any]]:
+    """Single small read of the ELF identification/header; None for non-ELF files."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(0x40)
+    except OSError:
+        return None
+    if len(head) < 0x34 or not head.startswith(ELF_MAGIC) or head[5] not in (1, 2):
+        return None
+    e = '<' if head[5] == 1 else '>'
+    e_type, e_machine = struct.unpack(e + 'HH', head[16:20])
+    return {'class': head[4], 'endian': e, 'type': e_type, 'machine': e_machine,
+            'arch': ARCH_MAP.get(e_machine, hex(e_machine))}
+
+
+def elf_sections(path: str) -> List[Dict[str, Any]]:
+    """Section headers (name, type, offset, size, flags, addr, link, entsize); [] for non-ELF / stripped-of-sections files."""
+    hdr = read_elf_header(path)
+    if hdr is None:
+        return []
+    e = hdr['endian']
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(0x40)
+            if hdr['class'] == 2:
+                shoff, = struct.unpack(e + 'Q', head[0x28:0x30])
+                shentsize, shnum, shstrndx = struct.unpack(e + 'HHH', head[0x3A:0x40])
+                fmt = e + 'IIQQQQIIQQ'
+            else:
+                shoff, = struct.unpack(e + 'I', head[0x20:0x24])
+                shentsize, shnum, shstrndx = struct.unpack(e + 'HHH', head[0x2E:0x34])
+                fmt = e + 'IIIIIIIIII'
+            if not shoff or not shnum or shentsize < struct.calcsize(fmt) or shnum > 4096:
+                return []
+            f.seek(shoff)
+            table = f.read(shentsize * shnum)
+            raw = []
+            for i in range(shnum):
+                ent = table[i * shentsize:i * shentsize + struct.calcsize(fmt)]
+                if len(ent) < struct.calcsize(fmt):
+                    break
+                name, stype, flags, addr, offset, size, link, _info, _align, entsize = struct.unpack(fmt, ent)
+                raw.append((name, stype, flags, offset, size, addr, link, entsize))
+            names = b''
+            if shstrndx < len(raw):
+                f.seek(raw[shstrndx][3])
+                names = f.read(min(raw[shstrndx][4], 1 << 20))
+    except (OSError, struct.error):
+        return []
+    out = []
+    for name, stype, flags, offset, size, addr, link, entsize in raw:
+        end = names.find(b'\0', name)
+        out.append({'name': names[name:end if end >= 0 else None].decode('ascii', 'replace'),
+                    'type': stype, 'flags': flags, 'offset': offset, 'size': size,
+                    'addr': addr, 'link': link, 'entsize': entsize})
+    return out
+
+
+_SYM_TYPES = {0: 'NOTYPE', 1: 'OBJECT', 2: 'FUNC', 3: 'SECTION', 4: 'FILE', 10: 'IFUNC'}
+_SYM_BINDS = {0: 'LOCAL', 1: 'GLOBAL', 2: 'WEAK', 10: 'UNIQUE'}
+_MAX_TABLE = 64 << 20
+
+
+def _read_section(f, sec: Dict[str, Any], limit: int = _MAX_TABLE) -> bytes:
+    if sec['type'] == 8 or sec['size'] > limit:  # SHT_NOBITS
+        return b''
+    f.seek(sec['offset'])
+    return f.read(sec['size'])
+
+
+def elf_symbols(path: str, table: str = '.dynsym', sections: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Named symbols of table ('.dynsym' or '.symtab'): name, value, size, type, bind, shndx (0 = undefined)."""
+    hdr = read_elf_header(path)
+    secs = sections if sections is not None else elf_sections(path)
+    sym = next((s for s in secs if s['name'] == table), None)
+    if hdr is None or sym is None or sym['link'] >= len(secs):
+        return []
+    e = hdr['endian']
+    fmt, order = (e + 'IBBHQQ', 'nioxvs') if hdr['class'] == 2 else (e + 'IIIBBH', 'nvsiox')
+    width = struct.calcsize(fmt)
+    out = []
+    try:
+        with open(path, 'rb') as f:
+            data = _read_section(f, sym)
+            strtab = _read_section(f, secs[sym['link']])
+    except OSError:
+        return []
+    for i in range(width, len(data) - width + 1, width):  # entry 0 is the null symbol
+        v = dict(zip(order, struct.unpack(fmt, data[i:i + width])))
+        end = strtab.find(b'\0', v['n'])
+        name = strtab[v['n']:end if end >= 0 else None].decode('ascii', 'replace')
+        if not name:
+            continue
+        out.append({'name': name, 'value': v['v'], 'size': v['s'], 'shndx': v['x'],
+                    'type': _SYM_TYPES.get(v['i'] & 0xF, str(v['i'] & 0xF)),
+                    'bind': _SYM_BINDS.get(v['i'] >> 4, str(v['i'] >> 4))})
+    return out
+
+
+def elf_needed(path: str, sections: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """DT_NEEDED libraries from .dynamic, in link order."""
+    hdr = read_elf_header(path)
+    secs = sections if sections is not None else elf_sections(path)
+    dyn = next((s for s in secs if s['name'] == '.dynamic'), None)
+    if hdr is None or dyn is None or dyn['link'] >= len(secs):
+        return []
+    fmt = hdr['endian'] + ('qQ' if hdr['class'] == 2 else 'iI')
+    width = struct.calcsize(fmt)
+    try:
+        with open(path, 'rb') as f:
+            data = _read_section(f, dyn)
+            strtab = _read_section(f, secs[dyn['link']])
+    except OSError:
+        return []
+    out = []
+    for i in range(0, len(data) - width + 1, width):
+        tag, val = struct.unpack(fmt, data[i:i + width])
+        if tag == 0:  # DT_NULL
+            break
+        if tag == 1:  # DT_NEEDED
+            end = strtab.find(b'\0', val)
+            out.append(strtab[val:end if end >= 0 else None].decode('ascii', 'replace'))
+    return out
+
+
+# sections removed by strip --strip-unneeded / strip
+_STRIPPABLE = ('.symtab', '.strtab', '.gnu_debuglink')
+
+
+def strippable_size(path: str) -> int:
+    """Bytes strip would remove (symbol tables + debug info); 0 when already stripped."""
+    total = 0
+    for sec in elf_sections(path):
+        n = sec['name']
+        if sec['type'] == 8:  # SHT_NOBITS occupies no file space
+            continue
+        if n in _STRIPPABLE or n.startswith(('.debug', '.zdebug')):
+            total += sec['size']
+    return total
+
+
+def has_symtab(path: str) -> bool:
+    return any(sec['name'] == '.symtab' for sec in elf_sections(path))
+
+
 def analyze_elf(path: str) -> Dict[str, Any]:
     info: Dict[str, Any] = {"path": path}
     try:
@@ -60,4 +205,4 @@ def analyze_elf(path: str) -> Dict[str, Any]:
         info['error'] = str(e)
     return info
 
-__all__ = ["analyze_elf"]
+__all__ = ["analyze_elf", "read_elf_header", "elf_sections", "elf_symbols", "elf_needed", "strippable_size", "has_symtab"]
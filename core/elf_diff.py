@@ -0,0 +1,174 @@
+"""Structural diff of two builds of the same ELF binary.
+
+Built on core.elf_analyze's section / symbol / DT_NEEDED readers:
+
+* sections   each non-NOBITS section is hashed (blake2b over an mmap slice);
+             equal size + hash means unchanged and nothing below looks at it
+* dynamic    exported / imported dynamic symbols and DT_NEEDED libraries are
+             compared as sets
+* functions  optional: FUNC symbols from .symtab (or .dynsym when stripped)
+             give function boundaries; only functions inside sections whose
+             hash changed are hashed and compared by name
+
+Function hashes are over raw bytes, so code that merely moved (different call
+targets after an insertion) shows up as changed; the section and symbol level
+results are unaffected by that.
+"""
+from __future__ import annotations
+import os, mmap, bisect, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+from core.elf_analyze import read_elf_header, elf_sections, elf_symbols, elf_needed
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['elf_fingerprint', 'diff_elf', 'diff_elf_pairs', 'format_elf_diff']
+
+_ARM = 0x28
+
+
+def _hash(buf, off: int, ln: int) -> str:
+    return hashlib.blake2b(buf[off:off + ln], digest_size=16).hexdigest()
+
+
+def _map(path: str):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def elf_fingerprint(path: str) -> Optional[Dict[str, Any]]:
+    """Header, per-section (size, hash), dynamic imports/exports, DT_NEEDED and raw symbols; None if not ELF."""
+    hdr = read_elf_header(path)
+    if hdr is None:
+        return None
+    secs = elf_sections(path)
+    buf = _map(path)
+    try:
+        size = len(buf)
+        sections = {}
+        for i, s in enumerate(secs):
+            if not s['name'] or s['type'] == 8 or s['offset'] + s['size'] > size:
+                continue
+            sections[s['name']] = {'index': i, 'size': s['size'], 'hash': _hash(buf, s['offset'], s['size'])}
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+    dynsym = elf_symbols(path, '.dynsym', secs)
+    symtab = elf_symbols(path, '.symtab', secs)
+    return {
+        'header': {k: hdr[k] for k in ('class', 'endian', 'type', 'arch')},
+        'sections': sections,
+        'imports': sorted({s['name'] for s in dynsym if s['shndx'] == 0}),
+        'exports': sorted({s['name'] for s in dynsym if s['shndx'] != 0 and s['bind'] in ('GLOBAL', 'WEAK')}),
+        'needed': elf_needed(path, secs),
+        '_secs': secs,
+        '_funcs': [s for s in (symtab or dynsym) if s['type'] in ('FUNC', 'IFUNC') and 0 < s['shndx'] < len(secs)],
+    }
+
+
+def _function_hashes(path: str, fp: Dict[str, Any], only: Iterable[int]) -> Dict[str, str]:
+    """name -> hash for functions in the given section indexes (size 0 symbols end at the next symbol)."""
+    only = set(only)
+    secs = fp['_secs']
+    thumb = 1 if read_elf_header(path)['machine'] == _ARM else 0
+    by_sec: Dict[int, List[Tuple[int, int, str]]] = {}
+    for s in fp['_funcs']:
+        if s['shndx'] in only:
+            by_sec.setdefault(s['shndx'], []).append((s['value'] & ~thumb, s['size'], s['name']))
+    out: Dict[str, str] = {}
+    if not by_sec:
+        return out
+    buf = _map(path)
+    try:
+        for idx, funcs in by_sec.items():
+            sec = secs[idx]
+            funcs.sort()
+            starts = [v for v, _, _ in funcs]
+            end_sec = sec['addr'] + sec['size']
+            for v, n, name in funcs:
+                if n == 0:
+                    j = bisect.bisect_right(starts, v)
+                    n = (starts[j] if j < len(starts) else end_sec) - v
+                off = sec['offset'] + (v - sec['addr'])
+                if v < sec['addr'] or v + n > end_sec or n <= 0:
+                    continue
+                out.setdefault(name, _hash(buf, off, n))
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+    return out
+
+
+def _set_diff(a: Iterable[str], b: Iterable[str]) -> Dict[str, List[str]]:
+    a, b = set(a), set(b)
+    return {'added': sorted(b - a), 'removed': sorted(a - b)}
+
+
+def diff_elf(old_path: str, new_path: str, functions: bool = True) -> Dict[str, Any]:
+    """Section / symbol / library (and optionally function) level differences between two ELF files."""
+    fa, fb = elf_fingerprint(old_path), elf_fingerprint(new_path)
+    if fa is None or fb is None:
+        return {'error': 'not ELF'}
+    sa, sb = fa['sections'], fb['sections']
+    changed = [n for n in sa if n in sb and (sa[n]['size'], sa[n]['hash']) != (sb[n]['size'], sb[n]['hash'])]
+    out: Dict[str, Any] = {
+        'header': {k: [fa['header'][k], fb['header'][k]] for k in fa['header'] if fa['header'][k] != fb['header'][k]},
+        'sections': {'changed': [{'name': n, 'old_size': sa[n]['size'], 'new_size': sb[n]['size']} for n in changed],
+                     **_set_diff(sa, sb), 'unchanged': sum(1 for n in sa if n in sb) - len(changed)},
+        'imports': _set_diff(fa['imports'], fb['imports']),
+        'exports': _set_diff(fa['exports'], fb['exports']),
+        'needed': _set_diff(fa['needed'], fb['needed']),
+    }
+    if functions:
+        ha = _function_hashes(old_path, fa, (sa[n]['index'] for n in changed))
+        hb = _function_hashes(new_path, fb, (sb[n]['index'] for n in changed))
+        # functions only in unchanged sections are equal by construction; names count across all sections
+        names_a = {s['name'] for s in fa['_funcs']}
+        names_b = {s['name'] for s in fb['_funcs']}
+        out['functions'] = {'changed': sorted(n for n in ha if n in hb and ha[n] != hb[n]),
+                            **_set_diff(names_a, names_b)}
+    return out
+
+
+def diff_elf_pairs(pairs: Iterable[Tuple[str, str, str]], functions: bool = True, workers: Optional[int] = None,
+                   log_func: LogFunc = lambda m: None) -> Dict[str, Dict[str, Any]]:
+    """diff_elf over (label, old_path, new_path) triples in a thread pool; label -> result."""
+    pairs = list(pairs)
+
+    def _one(p):
+        try:
+            return p[0], diff_elf(p[1], p[2], functions)
+        except Exception as e:  # one unparsable binary must not sink the batch
+            return p[0], {'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) * 2)) as pool:
+        results = dict(pool.map(_one, pairs))
+    log_func(f"[ELFDIFF] เทียบ ELF {len(results)} ไฟล์")
+    return results
+
+
+def format_elf_diff(d: Dict[str, Any], indent: str = '    ') -> List[str]:
+    """Report lines for one diff_elf result (empty when only unnamed bytes changed)."""
+    if 'error' in d:
+        return [f"{indent}({d['error']})"]
+    lines = []
+    for k, (a, b) in d['header'].items():
+        lines.append(f"{indent}header {k}: {a} -> {b}")
+    s = d['sections']
+    if s['changed']:
+        lines.append(f"{indent}sections changed: " + ', '.join(
+            f"{c['name']}({c['old_size']}->{c['new_size']})" if c['old_size'] != c['new_size'] else c['name']
+            for c in s['changed']) + f" [{s['unchanged']} unchanged]")
+    for key in ('sections', 'needed', 'imports', 'exports', 'functions'):
+        part = d.get(key)
+        if not part:
+            continue
+        for sign, field in (('+', 'added'), ('-', 'removed')):
+            if part.get(field):
+                lines.append(f"{indent}{key} {sign} {', '.join(part[field])}")
+    if d.get('functions', {}).get('changed'):
+        lines.append(f"{indent}functions changed: {', '.join(d['functions']['changed'])}")
+    return lines
@@ -0,0 +1,118 @@
+"""Parallel ELF stripping for the rootfs shrink pipeline.
+
+Each candidate is identified with a single small header read; binaries that
+carry no .symtab are skipped without spawning anything. The remaining ones are
+stripped through a bounded thread pool (the work happens in the strip
+subprocesses) with the cross-strip matching their e_machine / endianness,
+falling back to llvm-strip and finally the host strip.
+
+Relocatable objects (kernel modules) only get --strip-debug; --strip-unneeded
+or a plain strip would drop symbols the module loader needs.
+"""
+from __future__ import annotations
+import os, shutil, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Any
+
+from core.elf_analyze import read_elf_header, has_symtab
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['find_strip_tool', 'strip_elfs', 'CROSS_PREFIXES']
+
+# (e_machine, endian) -> toolchain prefixes to try, most common first
+CROSS_PREFIXES = {
+    (0x28, '<'): ('arm-linux-gnueabihf-', 'arm-linux-gnueabi-', 'arm-openwrt-linux-', 'arm-none-linux-gnueabi-'),
+    (0x28, '>'): ('armeb-linux-gnueabi-',),
+    (0xB7, '<'): ('aarch64-linux-gnu-', 'aarch64-openwrt-linux-'),
+    (0x08, '>'): ('mips-linux-gnu-', 'mips-openwrt-linux-'),
+    (0x08, '<'): ('mipsel-linux-gnu-', 'mipsel-openwrt-linux-'),
+    (0x14, '>'): ('powerpc-linux-gnu-',),
+    (0x15, '>'): ('powerpc64-linux-gnu-',),
+    (0x15, '<'): ('powerpc64le-linux-gnu-',),
+    (0x03, '<'): ('i686-linux-gnu-',),
+    (0x3E, '<'): ('x86_64-linux-gnu-',),
+    (0xF3, '<'): ('riscv64-linux-gnu-',),
+}
+
+_tool_cache: Dict[tuple, Optional[str]] = {}
+
+
+def find_strip_tool(machine: int, endian: str) -> Optional[str]:
+    """Best strip binary for an ELF arch: matching cross-strip, then llvm-strip, then host strip."""
+    key = (machine, endian)
+    if key not in _tool_cache:
+        tool = None
+        for prefix in CROSS_PREFIXES.get(key, ()):
+            tool = shutil.which(prefix + 'strip')
+            if tool:
+                break
+        _tool_cache[key] = tool or shutil.which('llvm-strip') or shutil.which('strip')
+    return _tool_cache[key]
+
+
+def _strip_one(path: str, hdr: Dict[str, Any], timeout: int) -> Dict[str, Any]:
+    res: Dict[str, Any] = {'path': path, 'before': 0, 'after': 0, 'saved': 0, 'ok': False, 'err': ''}
+    tool = find_strip_tool(hdr['machine'], hdr['endian'])
+    if not tool:
+        res['err'] = 'no strip tool'
+        return res
+    try:
+        res['before'] = res['after'] = os.path.getsize(path)
+        flag = '--strip-debug' if hdr['type'] == 1 else '--strip-unneeded'
+        proc = subprocess.run([tool, flag, path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              timeout=timeout, text=True)
+        if proc.returncode != 0:
+            lines = (proc.stderr or '').strip().splitlines()
+            res['err'] = lines[-1] if lines else f'exit {proc.returncode}'
+            return res
+        res['after'] = os.path.getsize(path)
+        res['saved'] = res['before'] - res['after']
+        res['ok'] = True
+    except Exception as e:
+        res['err'] = str(e)
+    return res
+
+
+def strip_elfs(targets, log_func: LogFunc = lambda m: None, workers: Optional[int] = None,
+               timeout: int = 30) -> List[Dict[str, Any]]:
+    """Strip ELF files under a directory (str) or from an iterable of paths.
+
+    Returns one result per stripped candidate: {path, before, after, saved, ok, err}.
+    """
+    if isinstance(targets, str):
+        paths: Iterable[str] = (os.path.join(dp, f) for dp, dn, fn in os.walk(targets) for f in fn)
+    else:
+        paths = targets
+    jobs = []
+    seen = set()
+    skipped = 0
+    for p in paths:
+        try:
+            st = os.lstat(p)
+        except OSError:
+            continue
+        if not os.path.isfile(p) or os.path.islink(p) or (st.st_dev, st.st_ino) in seen:
+            continue
+        seen.add((st.st_dev, st.st_ino))
+        hdr = read_elf_header(p)
+        if hdr is None:
+            continue
+        if not has_symtab(p):
+            skipped += 1
+            continue
+        jobs.append((p, hdr))
+    if not jobs:
+        log_func(f"[STRIP] ไม่มีบินารี่ที่ต้อง strip (ข้าม {skipped} ไฟล์ที่ strip แล้ว)")
+        return []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        results = list(pool.map(lambda j: _strip_one(j[0], j[1], timeout), jobs))
+    done = [r for r in results if r['ok']]
+    saved = sum(r['saved'] for r in done)
+    log_func(f"[STRIP] strip {len(done)}/{len(jobs)} ไฟล์ ลดได้ {saved} bytes (ข้าม {skipped} ไฟล์ที่ strip แล้ว)")
+    for r in sorted(done, key=lambda r: r['saved'], reverse=True)[:10]:
+        log_func(f"  {r['path']}: -{r['saved']} bytes ({r['before']} -> {r['after']})")
+    failed = [r for r in results if not r['ok']]
+    if failed:
+        log_func(f"[STRIP] strip ไม่สำเร็จ {len(failed)} ไฟล์ (เช่น {failed[0]['path']}: {failed[0]['err']})")
+    return results
@@ -0,0 +1,331 @@
+"""Managed rootfs extraction cache shared across operations.
+
+Entries are keyed by the SHA-256 of the partition slice, the filesystem type
+and a fingerprint of the external extractor binaries, so an
+analyze -> patch -> diff session extracts each partition exactly once.
+
+Read-only consumers (analysis, diff) use the cached tree directly, inside
+``with cache.use(...)``, which holds a shared flock on the entry's pin file so
+LRU eviction triggered by a concurrent extraction (in this or another process,
+e.g. a core.batch worker) cannot remove it while it is being read; mutating
+consumers (patches, editor, custom scripts) get a working copy made with
+``cp --reflink=auto`` (copy-on-write where the filesystem supports it, plain
+copy otherwise). Hardlinked copies are deliberately not used: the patch code
+rewrites files in place, which would corrupt the shared cache entry.
+
+The extraction itself (slice copy, extractor output) is staged in a
+core.workspace RAM workspace when the tmpfs budget has room, and the finished
+tree is then copied onto the cache in one pass; without room it is staged
+inside the cache directory and renamed into place.
+
+LRU eviction keeps the total cache size under a byte quota.
+"""
+from __future__ import annotations
+import os, json, time, shutil, hashlib, subprocess, threading, stat
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, Optional, Tuple
+
+from core.slice_io import extract_slice
+from core.workspace import new_workspace, ROOTFS_WS_FACTOR
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX
+    fcntl = None
+
+LogFunc = Callable[[str], None]
+ExtractFunc = Callable[[str, str, str, LogFunc], Tuple[bool, str]]
+
+__all__ = ['ExtractionCache', 'get_cache', 'copy_tree', 'CACHE_DIR', 'CACHE_QUOTA']
+
+# bump when extract semantics change so stale trees are not reused
+EXTRACTOR_VERSION = 1
+
+CACHE_DIR = os.environ.get('FW_EXTRACT_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'firmware_toolkit', 'extract'))
+CACHE_QUOTA = int(os.environ.get('FW_EXTRACT_CACHE_QUOTA', str(4 * 1024 ** 3)))
+
+_FS_TOOLS = {
+    'squashfs': ('unsquashfs', 'sasquatch'),
+    'cramfs': ('cramfsck',),
+    'jffs2': ('jefferson',),
+    'ubi': ('ubireader_extract_files',),
+}
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for dp, dn, fn in os.walk(path):
+        for f in fn:
+            try:
+                total += os.lstat(os.path.join(dp, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _ignore_special(dir_path, names):
+    # fifos / device nodes would block or fail in copy2
+    skip = []
+    for n in names:
+        try:
+            m = os.lstat(os.path.join(dir_path, n)).st_mode
+        except OSError:
+            skip.append(n); continue
+        if not (stat.S_ISDIR(m) or stat.S_ISREG(m) or stat.S_ISLNK(m)):
+            skip.append(n)
+    return skip
+
+
+def copy_tree(src: str, dest: str) -> None:
+    """Copy a tree preserving modes/mtimes; reflink when the filesystem allows."""
+    os.makedirs(dest, exist_ok=True)
+    cp = shutil.which('cp')
+    if cp:
+        try:
+            subprocess.run([cp, '-a', '--reflink=auto', src + '/.', dest], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return
+        except Exception:
+            pass
+    shutil.copytree(src, dest, symlinks=True, ignore=_ignore_special, dirs_exist_ok=True)
+
+
+class ExtractionCache:
+    """On-disk cache of extracted partition trees with LRU eviction under a quota."""
+
+    def __init__(self, root: Optional[str] = None, quota: Optional[int] = None):
+        self.root = os.path.abspath(root or CACHE_DIR)
+        self.quota = CACHE_QUOTA if quota is None else quota
+        self._lock = threading.Lock()
+        self._digests: Dict[tuple, str] = {}
+        self._pinned: Dict[str, int] = {}  # key -> active use() blocks
+        self._pin_files: Dict[str, Any] = {}  # key -> pin file holding LOCK_SH
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---- keys ----
+    def slice_digest(self, fw_path: str, part: Dict[str, Any]) -> str:
+        st = os.stat(fw_path)
+        memo = (os.path.abspath(fw_path), st.st_size, st.st_mtime_ns, part['offset'], part['size'])
+        if memo in self._digests:
+            return self._digests[memo]
+        h = hashlib.sha256()
+        remaining = part['size']
+        with open(fw_path, 'rb') as f:
+            f.seek(part['offset'])
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                h.update(chunk); remaining -= len(chunk)
+        digest = h.hexdigest()
+        self._digests[memo] = digest
+        return digest
+
+    @staticmethod
+    def tool_fingerprint(fs_type: str) -> str:
+        parts = [f"v{EXTRACTOR_VERSION}"]
+        for name in _FS_TOOLS.get(fs_type, ()) + ('binwalk',):
+            p = shutil.which(name)
+            if p:
+                try:
+                    st = os.stat(p)
+                    parts.append(f"{name}:{st.st_size}:{int(st.st_mtime)}")
+                except OSError:
+                    parts.append(f"{name}:?")
+        return ';'.join(parts)
+
+    def key(self, fw_path: str, part: Dict[str, Any]) -> str:
+        fs = part.get('fs', '')
+        raw = f"{self.slice_digest(fw_path, part)}:{fs}:{self.tool_fingerprint(fs)}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    # ---- index (shared between processes via flock) ----
+    def _index_path(self):
+        return os.path.join(self.root, 'index.json')
+
+    def _update_index(self, fn):
+        with self._lock, open(os.path.join(self.root, '.lock'), 'a+') as lk:
+            if fcntl:
+                fcntl.flock(lk, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._index_path(), 'r', encoding='utf-8') as f:
+                        index = json.load(f)
+                except Exception:
+                    index = {}
+                result = fn(index)
+                tmp = self._index_path() + f'.{os.getpid()}'
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(index, f)
+                os.replace(tmp, self._index_path())
+                return result
+            finally:
+                if fcntl:
+                    fcntl.flock(lk, fcntl.LOCK_UN)
+
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        return self._update_index(lambda idx: dict(idx))
+
+    def total_size(self) -> int:
+        return sum(e.get('size', 0) for e in self.entries().values())
+
+    # ---- pins (shared flock per entry, so other processes see them too) ----
+    def _pin_path(self, key: str) -> str:
+        return os.path.join(self.root, f'.pin-{key}')
+
+    def _pin(self, key: str) -> None:
+        with self._lock:
+            n = self._pinned.get(key, 0)
+            self._pinned[key] = n + 1
+            if n or not fcntl:
+                return
+            path = self._pin_path(key)
+            while True:
+                f = open(path, 'a+')
+                fcntl.flock(f, fcntl.LOCK_SH)
+                try:
+                    if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+                f.close()  # evict() removed the file while we waited; lock the new one
+            self._pin_files[key] = f
+
+    def _unpin(self, key: str) -> None:
+        with self._lock:
+            n = self._pinned.get(key, 0) - 1
+            if n > 0:
+                self._pinned[key] = n
+                return
+            self._pinned.pop(key, None)
+            f = self._pin_files.pop(key, None)
+            if f:
+                f.close()
+
+    def _remove_unpinned(self, key: str) -> bool:
+        """rmtree an entry unless a use() block in any process holds its pin."""
+        if key in self._pinned:
+            return False
+        if not fcntl:
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            return True
+        path = self._pin_path(key)
+        with open(path, 'a+') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            os.remove(path)
+        return True
+
+    # ---- public API ----
+    @contextmanager
+    def use(self, fw_path: str, part: Dict[str, Any], extract_func: ExtractFunc,
+            log_func: LogFunc = lambda m: None) -> Iterator[Tuple[bool, str]]:
+        """Yield (True, tree_dir) or (False, err); the entry cannot be evicted until the block exits."""
+        key = self.key(fw_path, part)
+        self._pin(key)  # before the lookup, so a concurrent evict() cannot remove it under us
+        try:
+            yield self._get(key, fw_path, part, extract_func, log_func)
+        finally:
+            self._unpin(key)
+
+    def get(self, fw_path: str, part: Dict[str, Any], extract_func: ExtractFunc,
+            log_func: LogFunc = lambda m: None) -> Tuple[bool, str]:
+        """Return (True, tree_dir) for a read-only cached extraction, or (False, err).
+
+        The tree is not pinned once this returns; consumers still reading it
+        while other extractions may run should use use() instead.
+        """
+        with self.use(fw_path, part, extract_func, log_func) as result:
+            return result
+
+    def _get(self, key: str, fw_path: str, part: Dict[str, Any], extract_func: ExtractFunc,
+             log_func: LogFunc) -> Tuple[bool, str]:
+        tree = os.path.join(self.root, key, 'tree')
+        if os.path.isdir(tree):
+            def _touch(idx):
+                if key not in idx:  # tree left by a run that died before indexing it
+                    idx[key] = {'size': _tree_size(tree)}
+                idx[key]['atime'] = time.time()
+            self._update_index(_touch)
+            log_func(f"[CACHE] hit {part.get('fs')}@0x{part['offset']:X} -> {tree}")
+            return True, tree
+        staging = os.path.join(self.root, f"tmp-{key}-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        ws = new_workspace(f"extract-{key[:12]}-", part['size'] * ROOTFS_WS_FACTOR, log_func)
+        if not ws.on_ram:
+            ws.cleanup(); ws = None  # a disk workspace gains nothing over staging next to the cache
+        work = ws.path if ws else staging
+        try:
+            os.makedirs(os.path.join(work, 'tree'), exist_ok=True)
+            rootfs_bin = os.path.join(work, 'rootfs.bin')
+            extract_slice(fw_path, part['offset'], part['size'], rootfs_bin)
+            ok, err = extract_func(part['fs'], rootfs_bin, os.path.join(work, 'tree'), log_func)
+            if not ok:
+                return False, err
+            os.remove(rootfs_bin)
+            size = _tree_size(os.path.join(work, 'tree'))
+            if ws:
+                copy_tree(os.path.join(ws.path, 'tree'), os.path.join(staging, 'tree'))
+            try:
+                os.rename(staging, os.path.join(self.root, key))
+            except OSError:
+                pass  # another worker finished the same key first; keep theirs
+            def _add(idx):
+                idx[key] = {'size': size, 'atime': time.time(), 'fs': part.get('fs'),
+                            'offset': part['offset'], 'source': os.path.basename(fw_path)}
+            self._update_index(_add)
+            log_func(f"[CACHE] stored {part.get('fs')}@0x{part['offset']:X} ({size} bytes) -> {tree}")
+            self.evict(keep=key)
+            return True, tree
+        finally:
+            if ws:
+                ws.cleanup()
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def checkout(self, fw_path: str, part: Dict[str, Any], dest: str, extract_func: ExtractFunc,
+                 log_func: LogFunc = lambda m: None) -> Tuple[bool, str]:
+        """Materialise a private, writable working copy of the partition tree at dest."""
+        with self.use(fw_path, part, extract_func, log_func) as (ok, tree):
+            if not ok:
+                return False, tree
+            try:
+                copy_tree(tree, dest)
+            except Exception as e:
+                return False, f"cache checkout error: {e}"
+        return True, ''
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Drop least recently used entries until total size <= quota. Returns bytes freed."""
+        def _evict(idx):
+            freed = 0
+            for k in list(idx):
+                if not os.path.isdir(os.path.join(self.root, k)):
+                    idx.pop(k)
+            total = sum(e.get('size', 0) for e in idx.values())
+            for k, e in sorted(idx.items(), key=lambda kv: kv[1].get('atime', 0)):
+                if total <= self.quota:
+                    break
+                if k == keep or not self._remove_unpinned(k):
+                    continue
+                idx.pop(k); total -= e.get('size', 0); freed += e.get('size', 0)
+            return freed
+        return self._update_index(_evict)
+
+    def clear(self) -> None:
+        def _clear(idx):
+            for k in list(idx):
+                shutil.rmtree(os.path.join(self.root, k), ignore_errors=True)
+            idx.clear()
+        self._update_index(_clear)
+
+
+_DEFAULT: Optional[ExtractionCache] = None
+
+def get_cache() -> ExtractionCache:
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = ExtractionCache()
+    return _DEFAULT
@@ -4,9 +4,26 @@ import os, hashlib, binascii, math, random
 from typing import List
 
 __all__ = [
-    'sha256sum','md5sum','crc32sum','get_entropy'
+    'sha256sum','md5sum','crc32sum','get_entropy','valid_entry_name','safe_join'
 ]
 
+def valid_entry_name(name: str) -> bool:
+    """True when a directory-entry name read from an image is one plain path component."""
+    return bool(name) and name not in ('.', '..') and '/' not in name and '\0' not in name
+
+def safe_join(dest: str, *parts: str) -> str:
+    """os.path.join(dest, *parts); ValueError if the real path (symlinks resolved) leaves dest.
+
+    For extractors writing entries from untrusted firmware: call it right
+    before creating each file, directory, symlink or device node.
+    """
+    out = os.path.join(dest, *parts)
+    root = os.path.realpath(dest)
+    real = os.path.realpath(out)
+    if real != root and not real.startswith(root.rstrip(os.sep) + os.sep):
+        raise ValueError(f"entry escapes extraction directory: {os.path.join(*parts) if parts else out}")
+    return out
+
 def sha256sum(path: str) -> str:
     h = hashlib.sha256()
     with open(path, 'rb') as f:
@@ -7,7 +7,7 @@ The function samples the firmware binary to find filesystem signatures and
 falls back to binwalk if direct signature scanning doesn't yield results.
 """
 from __future__ import annotations
-import os, shutil, subprocess, binascii
+import os, mmap, shutil, subprocess, binascii
 from typing import List, Dict, Callable, Any, Optional
 
 
@@ -44,42 +44,48 @@ def scan_all_rootfs_partitions(fw_path: str, log_func: Callable[[str], None] = p
     results = []
     try:
         with open(fw_path, "rb") as f:
-            data = f.read()
-            for sig, name in FS_SIGNATURES:
-                idx = 0
-                while True:
-                    idx = data.find(sig, idx)
-                    if idx == -1:
-                        break
-                    results.append((name, sig, idx))
-                    idx += 1
+            size_fw = os.fstat(f.fileno()).st_size
+            # mmap keeps multi-GB images out of memory; the page cache does the reading
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size_fw else b''
     except Exception as e:
         log_func(f"scan error: {e}")
         return []
+    try:
+        for sig, name in FS_SIGNATURES:
+            idx = 0
+            while True:
+                idx = data.find(sig, idx)
+                if idx == -1:
+                    break
+                results.append((name, sig, idx))
+                idx += 1
 
-    if results:
-        parts = []
-        sorted_results = sorted(results, key=lambda x: x[2])
-        for i, (fs_name, sig, offset) in enumerate(sorted_results):
-            next_offset = len(data)
-            if i + 1 < len(sorted_results):
-                next_offset = sorted_results[i + 1][2]
-            size = next_offset - offset
-            entry: Dict[str, Any] = dict(fs=fs_name, offset=offset, size=size, sig=sig.hex())
-            # quick UBI volume marker heuristic: look for "UBI#" strings inside region
-            if fs_name == 'ubi':
-                try:
-                    slice_bytes = data[offset: offset + min(size, 4096)]
-                    if b'UBI#' in slice_bytes or b'UBI!' in slice_bytes:
-                        entry['volumes_hint'] = slice_bytes.count(b'UBI')
-                except Exception:
-                    pass
-            parts.append(entry)
-        display_parts = [f"{p['fs']}@0x{p['offset']:X}" for p in parts]
-        log_func(f"พบ rootfs {len(parts)} ชุด: {display_parts}")
-        if use_cache and cache_key:
-            _CACHE[cache_key] = parts
-        return parts
+        if results:
+            parts = []
+            sorted_results = sorted(results, key=lambda x: x[2])
+            for i, (fs_name, sig, offset) in enumerate(sorted_results):
+                next_offset = size_fw
+                if i + 1 < len(sorted_results):
+                    next_offset = sorted_results[i + 1][2]
+                size = next_offset - offset
+                entry: Dict[str, Any] = dict(fs=fs_name, offset=offset, size=size, sig=sig.hex())
+                # quick UBI volume marker heuristic: look for "UBI#" strings inside region
+                if fs_name == 'ubi':
+                    try:
+                        slice_bytes = data[offset: offset + min(size, 4096)]
+                        if b'UBI#' in slice_bytes or b'UBI!' in slice_bytes:
+                            entry['volumes_hint'] = slice_bytes.count(b'UBI')
+                    except Exception:
+                        pass
+                parts.append(entry)
+            display_parts = [f"{p['fs']}@0x{p['offset']:X}" for p in parts]
+            log_func(f"พบ rootfs {len(parts)} ชุด: {display_parts}")
+            if use_cache and cache_key:
+                _CACHE[cache_key] = parts
+            return parts
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
 
     bw = shutil.which("binwalk")
     if not bw:
@@ -111,8 +117,6 @@ def scan_all_rootfs_partitions(fw_path: str, log_func: Callable[[str], None] = p
     if not found:
         log_func("binwalk fallback ยังไม่พบ rootfs")
         return []
-    with open(fw_path, 'rb') as f:
-        size_fw = len(f.read())
     found_sorted = sorted(found, key=lambda x: x[1])
     parts = []
     for i, (fs_name, offset, desc) in enumerate(found_sorted):
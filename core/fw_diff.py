@@ -0,0 +1,323 @@
+"""Whole-image binary diff of two firmware files, before anything is extracted.
+
+Both images are cut into content-defined chunks (CDC): a chunk ends where a
+3-byte window matches a fixed pseudo-random byte-class pattern (p = 1/4096,
+0x00 / 0xFF excluded so erased flash and padding never anchor), bounded by
+MIN_CHUNK / MAX_CHUNK. The boundary test is evaluated by the ``re`` engine
+directly over an mmap, so the scan is linear and runs at C speed; because a
+boundary depends only on the bytes next to it, an insertion shifts the chunks
+after it instead of changing them.
+
+The old image's chunks are indexed by an 8-byte blake2b digest, the new
+image's chunks are streamed against that index and grouped into runs of
+consecutive matches. The heaviest chain of runs in increasing old-offset order
+is the common backbone; runs off the chain are ``moved`` and the gaps between
+chain runs are trimmed byte-wise and classified ``changed`` / ``inserted`` /
+``deleted``. Memory is the chunk index (~1/5000 of the old image) plus the run
+list; file data is never held beyond one chunk.
+
+Regions are mapped onto the partitions found by scan_all_rootfs_partitions on
+each side.
+"""
+from __future__ import annotations
+import os, re, sys, mmap, time, bisect, hashlib, random
+from typing import Callable, Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+LogFunc = Callable[[str], None]
+Run = Tuple[int, int, int]  # (new_off, old_off, length)
+
+__all__ = ['diff_images', 'iter_chunks', 'format_report', 'MIN_CHUNK', 'MAX_CHUNK']
+
+MIN_CHUNK = 2048
+MAX_CHUNK = 64 * 1024
+_CMP_BLOCK = 64 * 1024
+
+
+def _anchor_pattern() -> 're.Pattern[bytes]':
+    rnd = random.Random(0x46574446)  # fixed: both images must agree on boundaries
+    pool = list(range(1, 255))
+    classes = []
+    for _ in range(3):
+        rnd.shuffle(pool)
+        classes.append(b'[' + b''.join(re.escape(bytes([b])) for b in sorted(pool[:16])) + b']')
+    return re.compile(b''.join(classes))
+
+
+_ANCHOR = _anchor_pattern()
+
+
+def iter_chunks(buf, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """Yield (offset, length) content-defined chunks covering buf[start:end]."""
+    end = len(buf) if end is None else end
+    pos = start
+    while pos < end:
+        lo, hi = pos + MIN_CHUNK, min(pos + MAX_CHUNK, end)
+        if lo >= end:
+            cut = end
+        else:
+            m = _ANCHOR.search(buf, lo, hi)
+            cut = m.end() if m else hi
+        yield pos, cut - pos
+        pos = cut
+
+
+def _digest(buf, off: int, ln: int) -> bytes:
+    return hashlib.blake2b(buf[off:off + ln], digest_size=8).digest()
+
+
+def _index(buf) -> Dict[bytes, Any]:
+    """digest -> old offset (int), or a sorted list of offsets for repeated chunks."""
+    idx: Dict[bytes, Any] = {}
+    for off, ln in iter_chunks(buf):
+        d = _digest(buf, off, ln)
+        cur = idx.get(d)
+        if cur is None:
+            idx[d] = off
+        elif isinstance(cur, list):
+            cur.append(off)
+        else:
+            idx[d] = [cur, off]
+    return idx
+
+
+def _pick(cands, want: Optional[int]) -> Optional[int]:
+    """Old offset for a matched chunk; repeated chunks (padding, tables) may only extend the run before them."""
+    if isinstance(cands, int):
+        return cands
+    if want is None:
+        return None
+    i = bisect.bisect_left(cands, want)
+    return want if i < len(cands) and cands[i] == want else None
+
+
+def _match_runs(old, new, idx: Dict[bytes, Any]) -> List[Run]:
+    runs: List[List[int]] = []
+    for off, ln in iter_chunks(new):
+        cands = idx.get(_digest(new, off, ln))
+        if cands is None:
+            continue
+        if runs:
+            want = runs[-1][1] + runs[-1][2] if runs[-1][0] + runs[-1][2] == off else None
+        else:
+            want = off if off == 0 else None
+        a = _pick(cands, want)
+        if a is None or old[a:a + ln] != new[off:off + ln]:  # ambiguous, or a 64-bit digest collision
+            continue
+        if runs and a == want:
+            runs[-1][2] += ln
+        else:
+            runs.append([off, a, ln])
+    return [(b, a, n) for b, a, n in runs]
+
+
+def _backbone(runs: Sequence[Run]) -> List[bool]:
+    """Mark the heaviest chain of runs whose old ranges increase with new order (weighted LIS)."""
+    ends = sorted({a + n for _, a, n in runs})
+    tree = [(0, -1)] * (len(ends) + 1)  # Fenwick prefix-max of (weight, run index)
+    best: List[int] = []
+    parent: List[int] = []
+    for j, (_, a, n) in enumerate(runs):
+        i, top = bisect.bisect_right(ends, a), (0, -1)
+        while i > 0:
+            top = max(top, tree[i])
+            i -= i & -i
+        best.append(top[0] + n)
+        parent.append(top[1])
+        i = bisect.bisect_left(ends, a + n) + 1
+        while i <= len(ends):
+            if tree[i][0] < best[j]:
+                tree[i] = (best[j], j)
+            i += i & -i
+    chain = [False] * len(runs)
+    j = max(range(len(runs)), key=best.__getitem__) if runs else -1
+    while j >= 0:
+        chain[j] = True
+        j = parent[j]
+    return chain
+
+
+def _common_prefix(x, xo: int, y, yo: int, limit: int) -> int:
+    n = 0
+    while n < limit:
+        step = min(_CMP_BLOCK, limit - n)
+        a, b = x[xo + n:xo + n + step], y[yo + n:yo + n + step]
+        if a == b:
+            n += step
+            continue
+        lo, hi = 0, step  # binary search the first differing byte
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if a[lo:mid + 1] == b[lo:mid + 1]:
+                lo = mid + 1
+            else:
+                hi = mid
+        return n + lo
+    return n
+
+
+def _common_suffix(x, xe: int, y, ye: int, limit: int) -> int:
+    n = 0
+    while n < limit:
+        step = min(_CMP_BLOCK, limit - n)
+        a, b = x[xe - n - step:xe - n], y[ye - n - step:ye - n]
+        if a == b:
+            n += step
+            continue
+        lo, hi = 0, step  # length of the equal tail
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if a[step - mid:] == b[step - mid:]:
+                lo = mid
+            else:
+                hi = mid - 1
+        return n + lo
+    return n
+
+
+def _part_label(parts: Sequence[Dict[str, Any]], off: int, ln: int) -> List[str]:
+    hit = [p for p in parts if p['offset'] < off + max(ln, 1) and off < p['offset'] + p['size']]
+    return [f"{p['fs']}@0x{p['offset']:X}" for p in hit]
+
+
+def _classify(old, new, runs: Sequence[Run], chain: Sequence[bool]) -> List[Dict[str, Any]]:
+    backbone = [r for r, c in zip(runs, chain) if c]
+    moved = [r for r, c in zip(runs, chain) if not c]
+    regions: List[Dict[str, Any]] = []
+    fences = [(0, 0, 0)] + backbone + [(len(new), len(old), 0)]
+    mi = 0
+    for (pb, pa, pn), (nb, na, _) in zip(fences, fences[1:]):
+        b0, b1, a0, a1 = pb + pn, nb, pa + pn, na
+        if a1 < a0:  # backbone runs never overlap, but guard against duplicated content
+            a1 = a0
+        k = _common_prefix(old, a0, new, b0, min(a1 - a0, b1 - b0))
+        a0, b0 = a0 + k, b0 + k
+        k = _common_suffix(old, a1, new, b1, min(a1 - a0, b1 - b0))
+        a1, b1 = a1 - k, b1 - k
+        residue, cur = [], b0
+        while mi < len(moved) and moved[mi][0] < b1:
+            mb, ma, mn = moved[mi]
+            mi += 1
+            if mb < cur:  # only possible with repeated content next to the trimmed edges
+                ma, mn, mb = ma + cur - mb, mn - (cur - mb), cur
+            mn = min(mn, b1 - mb)
+            if mn <= 0:
+                continue
+            # grow the chunk-aligned run to the exact moved bytes, staying inside the gap
+            grow = _common_suffix(old, ma, new, mb, min(ma, mb - cur))
+            mb, ma, mn = mb - grow, ma - grow, mn + grow
+            mn += _common_prefix(old, ma + mn, new, mb + mn, min(len(old) - ma - mn, b1 - mb - mn))
+            if mb > cur:
+                residue.append((cur, mb - cur))
+            regions.append({'kind': 'moved', 'old_offset': ma, 'old_length': mn, 'new_offset': mb, 'new_length': mn})
+            cur = mb + mn
+        if cur < b1:
+            residue.append((cur, b1 - cur))
+        if a1 > a0 and residue:
+            rb, re_ = residue[0][0], residue[-1][0] + residue[-1][1]
+            regions.append({'kind': 'changed', 'old_offset': a0, 'old_length': a1 - a0,
+                            'new_offset': rb, 'new_length': re_ - rb})
+        elif a1 > a0:
+            regions.append({'kind': 'deleted', 'old_offset': a0, 'old_length': a1 - a0, 'new_offset': b0, 'new_length': 0})
+        else:
+            regions.extend({'kind': 'inserted', 'old_offset': a0, 'old_length': 0, 'new_offset': o, 'new_length': n}
+                           for o, n in residue)
+    # the old home of a moved block is not a deletion
+    gone = [(r['old_offset'], r['old_offset'] + r['old_length']) for r in regions if r['kind'] == 'moved']
+    regions = [r for r in regions if r['kind'] != 'deleted' or not any(
+        lo <= r['old_offset'] and r['old_offset'] + r['old_length'] <= hi for lo, hi in gone)]
+    regions.sort(key=lambda r: (r['new_offset'], r['old_offset']))
+    return regions
+
+
+def _map(path: str):
+    f = open(path, 'rb')
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            return f, b''
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception:
+        f.close()
+        raise
+
+
+def diff_images(old_path: str, new_path: str, parts_old: Optional[Sequence[Dict[str, Any]]] = None,
+                parts_new: Optional[Sequence[Dict[str, Any]]] = None,
+                log_func: LogFunc = lambda m: None) -> Dict[str, Any]:
+    """Diff two firmware images; returns {'old', 'new', 'regions', 'summary', 'seconds'}.
+
+    Each region: kind (changed / inserted / deleted / moved), old_offset, old_length,
+    new_offset, new_length and old_partitions / new_partitions labels ('squashfs@0x...').
+    parts_* default to scan_all_rootfs_partitions of each image.
+    """
+    from core.fs_scan import scan_all_rootfs_partitions
+    t0 = time.time()
+    if parts_old is None:
+        parts_old = scan_all_rootfs_partitions(old_path, log_func=lambda m: None)
+    if parts_new is None:
+        parts_new = scan_all_rootfs_partitions(new_path, log_func=lambda m: None)
+    fo, old = _map(old_path)
+    fn, new = _map(new_path)
+    try:
+        idx = _index(old)
+        runs = _match_runs(old, new, idx)
+        del idx
+        regions = _classify(old, new, runs, _backbone(runs))
+        size_old, size_new = len(old), len(new)
+    finally:
+        for m in (old, new):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        fo.close()
+        fn.close()
+    summary: Dict[str, Any] = {k: 0 for k in ('changed', 'inserted', 'deleted', 'moved')}
+    for r in regions:
+        summary[r['kind']] += 1
+        r['old_partitions'] = _part_label(parts_old, r['old_offset'], r['old_length'])
+        r['new_partitions'] = _part_label(parts_new, r['new_offset'], r['new_length'])
+    summary['new_bytes_differing'] = sum(r['new_length'] for r in regions if r['kind'] in ('changed', 'inserted'))
+    summary['identical'] = not regions and size_old == size_new
+    touched = sorted({p for r in regions if r['kind'] != 'moved' for p in r['new_partitions']})
+    summary['partitions_touched'] = touched
+    report = {
+        'old': {'path': os.path.abspath(old_path), 'size': size_old, 'partitions': list(parts_old)},
+        'new': {'path': os.path.abspath(new_path), 'size': size_new, 'partitions': list(parts_new)},
+        'regions': regions, 'summary': summary, 'seconds': round(time.time() - t0, 3),
+    }
+    log_func(f"[FWDIFF] {os.path.basename(old_path)} -> {os.path.basename(new_path)}: "
+             f"changed {summary['changed']} inserted {summary['inserted']} deleted {summary['deleted']} "
+             f"moved {summary['moved']} ({summary['new_bytes_differing']} B ใหม่) {report['seconds']:.2f}s")
+    return report
+
+
+def format_report(report: Dict[str, Any], limit: int = 200) -> str:
+    """Human-readable text version of a diff_images report."""
+    s = report['summary']
+    lines = [f"old: {report['old']['path']} ({report['old']['size']} B)",
+             f"new: {report['new']['path']} ({report['new']['size']} B)",
+             f"changed {s['changed']}  inserted {s['inserted']}  deleted {s['deleted']}  moved {s['moved']}  "
+             f"new bytes {s['new_bytes_differing']}",
+             f"partitions touched: {', '.join(s['partitions_touched']) or '-'}", ""]
+    for r in report['regions'][:limit]:
+        where = ','.join(r['new_partitions'] or r['old_partitions']) or '-'
+        lines.append(f"{r['kind']:<8} old 0x{r['old_offset']:08X}+{r['old_length']:<8} "
+                     f"new 0x{r['new_offset']:08X}+{r['new_length']:<8} [{where}]")
+    if len(report['regions']) > limit:
+        lines.append(f"... {len(report['regions']) - limit} more")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse, json
+    ap = argparse.ArgumentParser(prog='python -m core.fw_diff', description='Binary diff of two firmware images')
+    ap.add_argument('old')
+    ap.add_argument('new')
+    ap.add_argument('--json', action='store_true', help='print the full report as JSON')
+    ap.add_argument('--limit', type=int, default=200, help='regions listed in the text report')
+    args = ap.parse_args(argv)
+    report = diff_images(args.old, args.new, log_func=lambda m: print(m, file=sys.stderr))
+    print(json.dumps(report, indent=2) if args.json else format_report(report, args.limit))
+    return 0 if report['summary']['identical'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
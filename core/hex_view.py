@@ -0,0 +1,128 @@
+"""Data side of the raw hex viewer (no Qt dependency).
+
+The image is mapped read-only with mmap and only the rows being displayed are
+copied out, so opening and scrolling a multi-GB dump costs the same as a small
+one. region_map labels byte ranges from the existing detectors (rootfs
+partitions from core.fs_scan, U-Boot env blocks from core.uboot_env) for the
+overlay and the jump list. search walks the mapping in windows with
+mmap.find (the page cache does the reading), checking for cancellation of the
+running core.jobs job between windows.
+"""
+from __future__ import annotations
+import os, re, mmap
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from core.fs_scan import scan_all_rootfs_partitions
+from core.uboot_env import scan_uboot_env
+from core.jobs import current_context
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['HexSource', 'format_row', 'region_map', 'region_at', 'parse_pattern', 'search', 'BYTES_PER_ROW']
+
+BYTES_PER_ROW = 16
+SEARCH_WINDOW = 64 * 1024 * 1024
+
+_PRINTABLE = bytes(c if 0x20 <= c < 0x7f else 0x2e for c in range(256))
+_HEX_RE = re.compile(r'^(?:[0-9a-fA-F]{2}\s*)+$')
+
+
+class HexSource:
+    """Read-only mmap of an image; read() copies just the requested slice."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, 'rb')
+        self.size = os.fstat(self._f.fileno()).st_size
+        self._map = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self._map is None or offset >= self.size or length <= 0:
+            return b''
+        return self._map[max(0, offset):min(self.size, offset + length)]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close(); self._map = None
+        self._f.close()
+
+    def __enter__(self) -> 'HexSource':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def format_row(data: bytes, width: int = BYTES_PER_ROW) -> Tuple[str, str]:
+    """(hex, ascii) text of one row; byte i sits at hex column 3*i (+1 past the middle gap)."""
+    half = width // 2
+    cells = [f"{b:02X}" for b in data] + ['  '] * (width - len(data))
+    return ' '.join(cells[:half]) + '  ' + ' '.join(cells[half:]), data.translate(_PRINTABLE).decode('ascii')
+
+
+def region_map(fw_path: str, log_func: LogFunc = lambda m: None) -> List[Dict[str, Any]]:
+    """Sorted regions {'start', 'end', 'kind', 'label'} for rootfs partitions and U-Boot env blocks."""
+    regions = []
+    for i, p in enumerate(scan_all_rootfs_partitions(fw_path, log_func=log_func), 1):
+        regions.append({'start': p['offset'], 'end': p['offset'] + p['size'], 'kind': 'rootfs',
+                        'label': f"RootFS#{i} {p['fs']}"})
+    try:
+        envs = scan_uboot_env(fw_path, deep=True)
+    except Exception as e:
+        log_func(f"[HEX] env scan error: {e}")
+        envs = []
+    for i, e in enumerate(envs, 1):
+        regions.append({'start': e['offset'], 'end': e['offset'] + e['size'], 'kind': 'env',
+                        'label': f"U-Boot env#{i}" + ('' if e.get('valid') else ' (crc!)')})
+    regions.sort(key=lambda r: (r['start'], r['end']))
+    return regions
+
+
+def region_at(regions: List[Dict[str, Any]], offset: int) -> Optional[Dict[str, Any]]:
+    """Innermost region containing offset (env blocks usually sit inside a larger range)."""
+    best = None
+    for r in regions:
+        if r['start'] > offset:
+            break
+        if offset < r['end'] and (best is None or r['end'] - r['start'] < best['end'] - best['start']):
+            best = r
+    return best
+
+
+def parse_pattern(text: str, as_hex: bool) -> bytes:
+    """Search bytes from user input: hex pairs ('de ad be ef') or UTF-8 text."""
+    if as_hex:
+        if not _HEX_RE.match(text.strip()):
+            raise ValueError("รูปแบบ hex ไม่ถูกต้อง (เช่น 68 73 71 73)")
+        return bytes.fromhex(text)
+    if not text:
+        raise ValueError("ยังไม่ได้ระบุคำค้น")
+    return text.encode('utf-8')
+
+
+def search(path: str, pattern: bytes, start: int = 0, wrap: bool = True,
+           window: int = SEARCH_WINDOW) -> Optional[int]:
+    """Offset of the first match at or after start (wrapping to the beginning), None if absent."""
+    if not pattern:
+        return None
+    ctx = current_context()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(pattern):
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            spans = [(max(0, start), size)] + ([(0, min(size, start + len(pattern) - 1))] if wrap and start > 0 else [])
+            for lo, hi in spans:
+                pos = lo
+                while pos < hi:
+                    if ctx is not None:
+                        ctx.progress(pos * 100 // size, 100, "search")  # raises once the job is cancelled
+                    end = min(hi, pos + window + len(pattern) - 1)
+                    idx = mm.find(pattern, pos, end)
+                    if idx != -1:
+                        return idx
+                    pos += window
+        finally:
+            mm.close()
+    return None
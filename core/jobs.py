@@ -0,0 +1,183 @@
+"""Background job runner for long operations started from the GUI.
+
+A job is ``func(ctx, *args, **kwargs)`` run on a worker thread of a
+ThreadPoolExecutor. ctx is a JobContext handing the job:
+
+* ``ctx.log`` a LogFunc, so any core function taking ``log_func`` streams its
+  lines back to the listener unchanged,
+* ``ctx.progress(done, total, msg)`` for structured progress,
+* cooperative cancellation: once ``job.cancel()`` is called, the next
+  ``ctx.progress`` / ``ctx.check()`` raises JobCancelled inside the worker,
+  which unwinds through the core code (temp files are cleaned up by its
+  ``finally`` blocks) and the job ends as 'cancelled'. ``ctx.log`` never
+  raises, so cleanup code that logs still runs to completion. Queued jobs are
+  dropped without starting.
+
+Listener callbacks (on_log, on_progress, on_finished) run on the worker
+thread; the GUI adapter (dialogs.job_monitor) re-emits them as Qt signals so
+slots run on the GUI thread. Jobs sharing a ``key`` (e.g. 'patch', which
+rewrites the working image) are mutually exclusive: submit raises JobBusy
+while one is active. Jobs without a key run concurrently up to max_workers.
+
+current_context() returns the JobContext of the job running on the calling
+thread (None outside a job), so helpers deep in core (core.tool_runner) can
+poll for cancellation and report progress without an extra parameter; a job
+fanning out to its own threads wraps the callables with propagate().
+"""
+from __future__ import annotations
+import os, time, itertools, threading, traceback
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Any, List, Optional
+
+__all__ = ['JobRunner', 'Job', 'JobContext', 'JobCancelled', 'JobBusy', 'current_context', 'propagate']
+
+_local = threading.local()
+
+
+class JobCancelled(BaseException):
+    """BaseException like KeyboardInterrupt, so the many ``except Exception`` handlers in core let it pass."""
+
+
+class JobBusy(Exception):
+    pass
+
+
+class _NullListener:
+    def on_log(self, job: 'Job', line: str) -> None: pass
+    def on_progress(self, job: 'Job', done: int, total: int, msg: str) -> None: pass
+    def on_finished(self, job: 'Job') -> None: pass
+
+
+class JobContext:
+    """What a running job sees: log / progress / cancellation checks."""
+
+    def __init__(self, job: 'Job', listener):
+        self._job = job
+        self._listener = listener
+
+    @property
+    def cancelled(self) -> bool:
+        return self._job._cancel.is_set()
+
+    def check(self) -> None:
+        if self._job._cancel.is_set():
+            raise JobCancelled(self._job.name)
+
+    def log(self, line: str) -> None:
+        self._listener.on_log(self._job, line)
+
+    def progress(self, done: int, total: int = 0, msg: str = '') -> None:
+        self.check()
+        self._job.progress = (done, total, msg)
+        self._listener.on_progress(self._job, done, total, msg)
+
+
+def current_context() -> Optional[JobContext]:
+    return getattr(_local, 'ctx', None)
+
+
+def propagate(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap func so it runs under the caller's job context on whatever thread calls it."""
+    ctx = current_context()
+    if ctx is None:
+        return func
+
+    def _bound(*args, **kwargs):
+        prev = current_context()
+        _local.ctx = ctx
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.ctx = prev
+    return _bound
+
+
+class Job:
+    """Handle for a submitted job; status is queued / running / done / failed / cancelled."""
+
+    def __init__(self, job_id: str, name: str, key: Optional[str]):
+        self.id = job_id
+        self.name = name
+        self.key = key
+        self.status = 'queued'
+        self.result: Any = None
+        self.error = ''
+        self.traceback = ''
+        self.progress = (0, 0, '')
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.future: Optional[Future] = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobRunner:
+    """ThreadPoolExecutor-backed job queue reporting to one listener."""
+
+    def __init__(self, max_workers: Optional[int] = None, listener=None):
+        self.listener = listener or _NullListener()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(4, (os.cpu_count() or 1) + 1),
+                                        thread_name_prefix='job')
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def busy(self, key: str) -> bool:
+        with self._lock:
+            return any(j.key == key and j.active for j in self._jobs.values())
+
+    def submit(self, name: str, func: Callable[..., Any], *args, key: Optional[str] = None, **kwargs) -> Job:
+        with self._lock:
+            if key and any(j.key == key and j.active for j in self._jobs.values()):
+                raise JobBusy(key)
+            job = Job(f"job{next(self._ids)}", name, key)
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func, args, kwargs) -> None:
+        if job._cancel.is_set():
+            job.status = 'cancelled'
+        else:
+            job.status, job.started = 'running', time.time()
+            _local.ctx = JobContext(job, self.listener)
+            try:
+                job.result = func(_local.ctx, *args, **kwargs)
+                job.status = 'done'
+            except JobCancelled:
+                job.status = 'cancelled'
+            except Exception as e:
+                job.status, job.error = 'failed', str(e) or e.__class__.__name__
+                job.traceback = traceback.format_exc()
+            finally:
+                _local.ctx = None
+        job.finished = time.time()
+        try:
+            self.listener.on_finished(job)
+        finally:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    def cancel_all(self) -> None:
+        for j in self.jobs():
+            j.cancel()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.cancel_all()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
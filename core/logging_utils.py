@@ -1,32 +1,161 @@
-"""Logging utilities to centralize logging configuration."""
+"""Logging utilities to centralize logging configuration.
+
+All file output goes through one queue: loggers only enqueue records
+(QueueHandler) and a single QueueListener thread does the writes, so a scan
+logging thousands of lines never waits on disk. The listener feeds:
+
+* ``logs/app.log``, a RotatingFileHandler (FW_LOG_MAX_BYTES, FW_LOG_BACKUPS),
+* stdout,
+* per-category day files ``<root>/<category>/<YYYYMMDD>.log`` written by
+  write_category, kept open between records instead of reopened per line.
+
+GuiLogger is the GUI side: a thread-safe log_func that buffers lines (bounded;
+the oldest are dropped and counted under a flood) until the GUI timer calls
+flush(), which hands them to the widget as one batch.
+"""
 from __future__ import annotations
-import logging, os, pathlib, sys, datetime
-from typing import Optional
+import logging, logging.handlers, os, pathlib, sys, datetime, queue, atexit, threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
 
 LOG_DIR = pathlib.Path(os.environ.get('FW_LOG_DIR', 'logs'))
 LOG_DIR.mkdir(exist_ok=True)
 
 LOG_FILE = LOG_DIR / 'app.log'
+LOG_MAX_BYTES = int(os.environ.get('FW_LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get('FW_LOG_BACKUPS', '5'))
+
+_FMT = logging.Formatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%Y-%m-%dT%H:%M:%S')
+
+_queue: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+_category_log = logging.getLogger('fw.category')
+_category_log.propagate = False
+_category_log.setLevel(logging.INFO)
+
+
+def _is_category(record: logging.LogRecord) -> bool:
+    return hasattr(record, 'category')
+
+
+class _CategoryFiles(logging.Handler):
+    """<root>/<category>/<YYYYMMDD>.log per record, streams kept open; runs on the listener thread only."""
+
+    def __init__(self):
+        super().__init__()
+        self.addFilter(_is_category)
+        self._streams: Dict[tuple, tuple] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        day = datetime.datetime.utcfromtimestamp(record.created).strftime('%Y%m%d')
+        key = (record.log_root, record.category)
+        try:
+            cur = self._streams.get(key)
+            if cur is None or cur[0] != day:
+                if cur:
+                    cur[1].close()
+                cat_dir = os.path.join(record.log_root, record.category)
+                os.makedirs(cat_dir, exist_ok=True)
+                cur = self._streams[key] = (day, open(os.path.join(cat_dir, f"{day}.log"), 'a', encoding='utf-8'))
+            cur[1].write(record.getMessage() + "\n")
+            if _queue.empty():
+                cur[1].flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        for _, f in self._streams.values():
+            f.close()
+        self._streams.clear()
+        super().close()
+
+
+def _ensure_listener() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        app_file = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                        encoding='utf-8', delay=True)
+        stdout = logging.StreamHandler(sys.stdout)
+        for h in (app_file, stdout):
+            h.setFormatter(_FMT)
+            h.addFilter(lambda r: not _is_category(r))
+        _listener = logging.handlers.QueueListener(_queue, app_file, stdout, _CategoryFiles(),
+                                                   respect_handler_level=True)
+        _listener.start()
+        _category_log.addHandler(logging.handlers.QueueHandler(_queue))
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush the queue and close the files (registered atexit)."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
+        for h in list(_category_log.handlers):
+            _category_log.removeHandler(h)
+
 
 def configure_logging(level: int = logging.INFO) -> None:
-    if logging.getLogger().handlers:
+    root = logging.getLogger()
+    if root.handlers:
         return
-    fmt = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
-    datefmt = '%Y-%m-%dT%H:%M:%S'
-    handlers = [
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-    logging.basicConfig(level=level, format=fmt, datefmt=datefmt, handlers=handlers)
+    _ensure_listener()
+    root.addHandler(logging.handlers.QueueHandler(_queue))
+    root.setLevel(level)
+
+
+def write_category(root: str, category: str, text: str) -> None:
+    """Append text to <root>/<category>/<YYYYMMDD>.log on the logging thread."""
+    _ensure_listener()
+    _category_log.info(text, extra={'category': category, 'log_root': root})
+
 
 class GuiLogger:
-    """Adapter that writes to a QTextEdit-like append(str) object plus std logging."""
-    def __init__(self, widget_append, name: str = 'gui'):
+    """Thread-safe log_func buffering lines for a widget; flush() appends them as one batch.
+
+    widget_append receives the joined lines (e.g. QPlainTextEdit.appendPlainText); call flush
+    from a GUI timer. At most max_pending lines wait; older ones are dropped and reported.
+    """
+    def __init__(self, widget_append: Optional[Callable[[str], None]] = None, name: Optional[str] = 'gui',
+                 max_pending: int = 5000):
         self._append = widget_append
-        self._logger = logging.getLogger(name)
+        self._logger = logging.getLogger(name) if name else None
+        self._pending: deque = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.last = ''
+
     def __call__(self, msg: str):
-        self._logger.info(msg)
-        try:
-            self._append(msg)
-        except Exception:
-            pass
+        if self._logger:
+            self._logger.info(msg)
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(msg)
+            self.last = msg
+
+    def drain(self) -> List[str]:
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            if self.dropped:
+                lines.insert(0, f"[... ข้าม {self.dropped} บรรทัด]")
+                self.dropped = 0
+        return lines
+
+    def flush(self) -> int:
+        lines = self.drain()
+        if lines and self._append:
+            try:
+                self._append("\n".join(lines))
+            except Exception:
+                pass
+        return len(lines)
@@ -0,0 +1,248 @@
+"""Transactional firmware patching: extract once, patch, repack once, splice once.
+
+Chaining the single-purpose patch functions (serial getty, inetd, root
+password, boot delay) costs one extraction, one repack and one full firmware
+write per patch. A PatchTransaction instead collects an ordered list of
+operations and commits them together:
+
+* file ops    ``func(rootfs_dir, log_func) -> detail`` edit the unpacked rootfs;
+              they share ONE extraction (via the extraction cache) and ONE repack
+* raw ops     ``func(fw_path, log_func) -> detail`` edit bytes of the output
+              image in place (U-Boot env blocks, the boot delay byte, ...)
+
+Ops return a short description of what they changed ('' when nothing needed
+changing) and raise to abort. A raw op may carry a ``regions`` attribute
+[(offset, length)] naming the bytes it can touch. The output is assembled next
+to out_path and renamed into place only when every op succeeded, followed by a
+JSON manifest describing the input, the partition and each op.
+
+With ``commit(..., delta=True)`` out_path receives a core.delta file against
+the input instead of a full image; the delta is built from the partition
+range, the raw ops' regions and the extents the incremental squashfs repack
+copied from the old partition.
+"""
+from __future__ import annotations
+import os, json, time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from core.delta import create_delta
+from core.extract_cache import ExtractionCache, get_cache
+from core.file_utils import sha256sum
+from core.slice_io import extract_slice, clone_file, splice_partition
+from core.workspace import new_workspace, ROOTFS_WS_FACTOR
+
+LogFunc = Callable[[str], None]
+OpFunc = Callable[[str, LogFunc], str]
+ExtractFunc = Callable[[str, str, str, LogFunc], Tuple[bool, str]]
+# repack_rootfs(fs_type, src_dir, out_bin, log_func, base_image=..., extents_out=[...])
+RepackFunc = Callable[..., Tuple[bool, str]]
+# fit_func(src_dir, out_bin, limit, log_func) -> (ok, err); called when the repack is too large
+FitFunc = Callable[[str, str, int, LogFunc], Tuple[bool, str]]
+
+__all__ = ['PatchTransaction', 'disable_inetd_services', 'set_root_password', 'set_boot_delay_byte',
+           'MANIFEST_SUFFIX']
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+class PatchTransaction:
+    """Ordered file-level and image-level patch ops applied in one extract / repack / splice."""
+
+    def __init__(self, fw_path: str, rootfs_part: Optional[Dict[str, Any]], extract_func: ExtractFunc,
+                 repack_func: RepackFunc, log_func: LogFunc = lambda m: None, fit_func: Optional[FitFunc] = None,
+                 cache: Optional[ExtractionCache] = None):
+        self.fw_path = fw_path
+        self.part = rootfs_part
+        self.extract_func = extract_func
+        self.repack_func = repack_func
+        self.fit_func = fit_func
+        self.log = log_func
+        self.cache = cache
+        self.ops: List[Tuple[str, str, OpFunc]] = []
+        self.results: List[Dict[str, Any]] = []
+        self._current = 'commit'
+        self._regions: List[Tuple[int, int]] = []
+        self._extents: List[Tuple[int, int, int]] = []
+
+    def add_file(self, name: str, func: OpFunc) -> 'PatchTransaction':
+        self.ops.append(('file', name, func))
+        return self
+
+    def add_raw(self, name: str, func: OpFunc) -> 'PatchTransaction':
+        self.ops.append(('raw', name, func))
+        return self
+
+    def _run(self, kind: str, target: str) -> None:
+        for k, name, func in self.ops:
+            if k != kind:
+                continue
+            t0 = time.time()
+            self._current = name
+            detail = func(target, self.log) or ''
+            self.results.append({'op': name, 'kind': kind, 'changed': bool(detail), 'detail': detail,
+                                 'seconds': round(time.time() - t0, 3)})
+            self.log(f"[TXN] {name}: {detail or 'ไม่มีการเปลี่ยนแปลง'}")
+            self._current = 'commit'
+
+    def _build_rootfs(self, tmp_out: str, info: Dict[str, Any]) -> Tuple[bool, str]:
+        part = self.part
+        ws = new_workspace("patch-txn-", part['size'] * ROOTFS_WS_FACTOR, self.log)
+        try:
+            rootfs_bin = os.path.join(ws.path, "rootfs.bin")
+            extract_slice(self.fw_path, part['offset'], part['size'], rootfs_bin)
+            root = os.path.join(ws.path, "rootfs")
+            os.makedirs(root)
+            ok, err = (self.cache or get_cache()).checkout(self.fw_path, part, root, self.extract_func, self.log)
+            if not ok:
+                return False, f"แตก rootfs ไม่สำเร็จ: {err}"
+            self._run('file', root)
+            if not any(r['changed'] for r in self.results if r['kind'] == 'file'):
+                self.log("[TXN] rootfs ไม่มีการเปลี่ยนแปลง — ไม่ต้อง repack")
+                clone_file(self.fw_path, tmp_out)
+                return True, ''
+            new_bin = os.path.join(ws.path, "new_rootfs.bin")
+            extents: List[Tuple[int, int, int]] = []
+            ok, err = self.repack_func(part['fs'], root, new_bin, self.log, base_image=rootfs_bin, extents_out=extents)
+            if not ok:
+                return False, f"pack rootfs ไม่สำเร็จ: {err}"
+            if os.path.getsize(new_bin) > part['size'] and self.fit_func:
+                self.log(f"[TXN] rootfs ใหม่ {os.path.getsize(new_bin)} > {part['size']} bytes — ลองปรับการบีบอัด")
+                ok, err = self.fit_func(root, new_bin, part['size'], self.log)
+                if not ok:
+                    return False, f"rootfs too large ({err})"
+                extents = []  # rebuilt from scratch, nothing was copied from the old image
+            # partition-relative -> firmware offsets (target, source, length)
+            self._extents = [(part['offset'] + n, part['offset'] + o, ln) for n, o, ln in extents]
+            self._regions.append((part['offset'], part['size']))
+            info['rootfs_size_new'] = os.path.getsize(new_bin)
+            return splice_partition(self.fw_path, tmp_out, part['offset'], part['size'], new_bin)
+        finally:
+            info['workspace'] = ws.medium
+            ws.cleanup()
+
+    def _delta_regions(self, size: int) -> List[Tuple[int, int]]:
+        regions = list(self._regions)
+        for k, _, func in self.ops:
+            if k == 'raw':
+                regions.extend(getattr(func, 'regions', None) or [(0, size)])
+        return regions
+
+    def commit(self, out_path: str, manifest_path: Optional[str] = None, delta: bool = False) -> Tuple[bool, str]:
+        """Apply every op and write out_path plus its manifest. Returns (ok, err); nothing is written on error.
+
+        delta=True writes a core.delta file (apply with core.delta.apply_delta) instead of the full image.
+        """
+        t0 = time.time()
+        self.results = []
+        self._regions, self._extents = [], []
+        self._current = 'commit'
+        tmp_out = f"{out_path}.{os.getpid()}.txn"
+        info: Dict[str, Any] = {}
+        try:
+            if any(k == 'file' for k, _, _ in self.ops):
+                if not self.part:
+                    return False, 'file patches need a rootfs partition'
+                ok, err = self._build_rootfs(tmp_out, info)
+                if not ok:
+                    self.log(f"❌ [TXN] {err}")
+                    return False, err
+            else:
+                clone_file(self.fw_path, tmp_out)
+            self._run('raw', tmp_out)
+            if delta:
+                self._current = 'delta'
+                target_sha = sha256sum(tmp_out)
+                info['delta'] = create_delta(self.fw_path, tmp_out, out_path,
+                                             self._delta_regions(os.path.getsize(tmp_out)), self._extents,
+                                             target_sha, self.log)
+                self._current = 'commit'
+            else:
+                os.replace(tmp_out, out_path)
+        except Exception as e:
+            self.log(f"❌ [TXN] {self._current} ล้มเหลว: {e}")
+            return False, f"{self._current}: {e}"
+        finally:
+            if os.path.exists(tmp_out):
+                os.remove(tmp_out)
+        manifest = {
+            'input': {'path': os.path.abspath(self.fw_path), 'sha256': sha256sum(self.fw_path)},
+            'output': {'path': os.path.abspath(out_path),
+                       'sha256': info['delta']['target_sha256'] if delta else sha256sum(out_path)},
+            'partition': {k: self.part[k] for k in ('fs', 'offset', 'size') if k in self.part} if self.part else None,
+            'ops': self.results,
+            'seconds': round(time.time() - t0, 3),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }
+        manifest.update(info)
+        manifest_path = manifest_path or out_path + MANIFEST_SUFFIX
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        changed = sum(1 for r in self.results if r['changed'])
+        self.log(f"✅ [TXN] {changed}/{len(self.results)} op เปลี่ยนแปลง -> {out_path} (manifest {manifest_path})")
+        return True, ''
+
+
+# ---- stock ops ----
+
+def disable_inetd_services(root: str, log_func: LogFunc = lambda m: None) -> str:
+    """Comment out telnet / ftp lines in etc/inetd.conf."""
+    path = os.path.join(root, 'etc', 'inetd.conf')
+    if not os.path.exists(path):
+        return ''
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        lines = f.readlines()
+    removed = 0
+    for i, ln in enumerate(lines):
+        low = ln.lower()
+        if ('telnet' in low or 'ftp' in low) and not low.strip().startswith('#'):
+            lines[i] = '#DISABLED ' + ln
+            removed += 1
+    if not removed:
+        return ''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    return f"inetd.conf: คอมเมนต์ telnet/ftp {removed} บรรทัด"
+
+
+def set_root_password(password: str) -> OpFunc:
+    """Op setting root's hash in etc/shadow ('' locks root, '$6$...' is used as-is)."""
+    def op(root: str, log_func: LogFunc = lambda m: None) -> str:
+        path = os.path.join(root, 'etc', 'shadow')
+        if not os.path.exists(path):
+            raise FileNotFoundError('ไม่พบ /etc/shadow ใน rootfs')
+        if password == '':
+            new_hash = '!'
+        elif password.startswith('$6$'):
+            new_hash = password
+        else:
+            from passlib.hash import sha512_crypt  # only needed for plain-text passwords
+            new_hash = sha512_crypt.hash(password, rounds=5000)
+        with open(path, 'r') as f:
+            lines = f.readlines()
+        for i, line in enumerate(lines):
+            if line.startswith('root:'):
+                parts = line.split(':')
+                parts[1] = new_hash
+                lines[i] = ':'.join(parts)
+                break
+        else:
+            raise ValueError('ไม่พบ user root ใน /etc/shadow')
+        with open(path, 'w') as f:
+            f.writelines(l if l.endswith('\n') else l + '\n' for l in lines)
+        return 'shadow: เปลี่ยน hash ของ root' if new_hash != '!' else 'shadow: ล็อก root'
+    return op
+
+
+def set_boot_delay_byte(value: int, offset: int = 0x100) -> OpFunc:
+    """Op writing the raw boot delay byte (same heuristic offset as patch_boot_delay)."""
+    def op(fw_path: str, log_func: LogFunc = lambda m: None) -> str:
+        with open(fw_path, 'r+b') as f:
+            if f.seek(0, 2) <= offset:
+                raise ValueError('file too small')
+            old = os.pread(f.fileno(), 1, offset)[0]
+            if old == value & 0xFF:
+                return ''
+            os.pwrite(f.fileno(), bytes([value & 0xFF]), offset)
+        return f"boot delay byte@0x{offset:X}: {old} -> {value & 0xFF}"
+    op.regions = [(offset, 1)]
+    return op
@@ -0,0 +1,219 @@
+"""Fit-to-partition squashfs repack planner.
+
+Instead of repacking serially with one setting after another, several
+compressor / block size / BCJ configurations are packed concurrently under a
+CPU budget. Every candidate is killed as soon as its partial output grows past
+the partition limit or past the smallest image already finished, so the wall
+time to a fitting image is roughly that of a single repack.
+
+Uses mksquashfs when present; otherwise falls back to the pure Python
+rebuild_squashfs.SquashFSBuilder (sequentially, with the same early abort).
+"""
+from __future__ import annotations
+import os, shutil, subprocess, time, lzma
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+from core.elf_analyze import read_elf_header
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['detect_bcj', 'candidate_configs', 'plan_fit']
+
+# e_machine -> xz BCJ filter name understood by mksquashfs -Xbcj
+_BCJ_BY_MACHINE = {
+    0x03: 'x86', 0x3E: 'x86',
+    0x28: 'arm', 0xB7: 'arm64',
+    0x14: 'powerpc', 0x15: 'powerpc',
+    0x02: 'sparc', 0x12: 'sparc', 0x2B: 'sparc',
+    0x32: 'ia64',
+}
+_LZMA_BCJ = {
+    'x86': 'FILTER_X86', 'arm': 'FILTER_ARM', 'armthumb': 'FILTER_ARMTHUMB', 'arm64': 'FILTER_ARM64',
+    'powerpc': 'FILTER_POWERPC', 'sparc': 'FILTER_SPARC', 'ia64': 'FILTER_IA64',
+}
+_COMP_ORDER = ('xz', 'zstd', 'gzip', 'lzo')
+_BLOCK_SIZES = (1024 * 1024, 256 * 1024, 64 * 1024)
+
+
+def detect_bcj(root_dir: str, sample: int = 200) -> Optional[str]:
+    """Most common executable arch in the tree mapped to a BCJ filter (None if no match)."""
+    seen: Counter = Counter()
+    checked = 0
+    for dp, dn, fn in os.walk(root_dir):
+        for name in fn:
+            p = os.path.join(dp, name)
+            if os.path.islink(p):
+                continue
+            hdr = read_elf_header(p)
+            if hdr is None:
+                continue
+            bcj = _BCJ_BY_MACHINE.get(hdr['machine'])
+            # the xz PowerPC filter is big-endian only
+            if bcj == 'powerpc' and hdr['endian'] == '<':
+                bcj = None
+            seen[bcj] += 1
+            checked += 1
+            if checked >= sample:
+                break
+        if checked >= sample:
+            break
+    if not seen:
+        return None
+    return seen.most_common(1)[0][0]
+
+
+def candidate_configs(orig_comp: str = 'gzip', bcj: Optional[str] = None,
+                      comps=None, block_sizes=None) -> List[Dict[str, Any]]:
+    """Configurations ordered strongest-first, so the early finisher sets a tight bound."""
+    order = []
+    for c in (comps or (_COMP_ORDER if orig_comp in _COMP_ORDER else (orig_comp,) + _COMP_ORDER)):
+        if c not in order:
+            order.append(c)
+    if orig_comp not in order:
+        order.append(orig_comp)
+    out = []
+    for comp in order:
+        for bs in (block_sizes or _BLOCK_SIZES):
+            if comp == 'xz' and bcj:
+                out.append({'comp': comp, 'block_size': bs, 'bcj': bcj})
+            out.append({'comp': comp, 'block_size': bs, 'bcj': None})
+    return out
+
+
+def _label(cfg) -> str:
+    return f"{cfg['comp']}/{cfg['block_size'] // 1024}K" + (f"+{cfg['bcj']}" if cfg['bcj'] else '')
+
+
+def _mksquashfs_cmd(mksquashfs, src_dir, out, cfg, processors):
+    cmd = [mksquashfs, src_dir, out, '-noappend', '-no-progress', '-comp', cfg['comp'],
+           '-b', str(cfg['block_size']), '-processors', str(processors)]
+    if cfg['comp'] == 'xz':
+        cmd += ['-Xdict-size', '100%']
+        if cfg['bcj']:
+            cmd += ['-Xbcj', cfg['bcj']]
+    return cmd
+
+
+def _size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _run_mksquashfs(mksquashfs, src_dir, work, cfgs, limit, budget, timeout, log_func):
+    concurrent = max(1, min(len(cfgs), budget // 2 or 1))
+    processors = max(1, budget // concurrent)
+    queue = list(enumerate(cfgs))
+    running: Dict[int, Tuple[subprocess.Popen, str, float]] = {}
+    results: Dict[int, int] = {}
+    best = None
+    while queue or running:
+        while queue and len(running) < concurrent:
+            i, cfg = queue.pop(0)
+            out = os.path.join(work, f'cand{i}.sqsh')
+            try:
+                proc = subprocess.Popen(_mksquashfs_cmd(mksquashfs, src_dir, out, cfg, processors),
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                log_func(f"[FIT] {_label(cfg)}: start failed: {e}"); continue
+            running[i] = (proc, out, time.time())
+        time.sleep(0.05)
+        bound = min(limit, best) if best is not None else limit
+        for i, (proc, out, t0) in list(running.items()):
+            rc = proc.poll()
+            if rc is None:
+                if _size(out) > bound or time.time() - t0 > timeout:
+                    proc.kill(); proc.wait()
+                    running.pop(i)
+                    log_func(f"[FIT] {_label(cfgs[i])}: ยกเลิก (เกิน {bound} bytes หรือ timeout)")
+                continue
+            running.pop(i)
+            if rc != 0:
+                log_func(f"[FIT] {_label(cfgs[i])}: mksquashfs exit {rc} (อาจไม่รองรับ)"); continue
+            size = _size(out)
+            results[i] = size
+            log_func(f"[FIT] {_label(cfgs[i])}: {size} bytes")
+            if size <= limit and (best is None or size < best):
+                best = size
+    return results
+
+
+class _Abort(Exception):
+    pass
+
+
+def _run_native(src_dir, work, cfgs, limit, timeout, log_func):
+    from rebuild_squashfs import SquashFSBuilder
+    from core.squashfs_reader import COMPRESSION_IDS, compress_block
+    results: Dict[int, int] = {}
+    best = None
+    for i, cfg in enumerate(cfgs):
+        out = os.path.join(work, f'cand{i}.sqsh')
+        filters = None
+        if cfg['bcj']:
+            fid = getattr(lzma, _LZMA_BCJ.get(cfg['bcj'], ''), None)
+            if fid is None:
+                continue
+            filters = [{'id': fid}]
+        try:
+            compress_block(COMPRESSION_IDS[cfg['comp']], b'probe')
+            builder = SquashFSBuilder(src_dir, block_size=cfg['block_size'], compression=cfg['comp'],
+                                      xz_filters=filters)
+        except Exception:
+            continue  # codec module missing
+        bound = min(limit, best) if best is not None else limit
+        t0 = time.time()
+        def _check(*_):
+            if _size(out) > bound or time.time() - t0 > timeout:
+                raise _Abort()
+        try:
+            builder.build(out, _check)
+        except _Abort:
+            log_func(f"[FIT] {_label(cfg)}: ยกเลิก (เกิน {bound} bytes หรือ timeout)"); continue
+        except Exception as e:
+            log_func(f"[FIT] {_label(cfg)}: builder error: {e}"); continue
+        size = _size(out)
+        results[i] = size
+        log_func(f"[FIT] {_label(cfg)}: {size} bytes (native)")
+        if size <= limit and (best is None or size < best):
+            best = size
+    return results
+
+
+def plan_fit(src_dir: str, out_path: str, limit: int, log_func: LogFunc = lambda m: None,
+             orig_comp: str = 'gzip', cpu_budget: Optional[int] = None, configs=None,
+             timeout: float = 600, results_out: Optional[list] = None) -> Tuple[bool, Any]:
+    """Pack src_dir with the smallest candidate configuration that fits limit bytes.
+
+    Returns (True, {'comp', 'block_size', 'bcj', 'size'}) with the winner written to
+    out_path, or (False, err) when no candidate fits. results_out (if given) is
+    filled with dict(config, size=...) for every candidate that ran to completion.
+    """
+    bcj = detect_bcj(src_dir)
+    cfgs = configs or candidate_configs(orig_comp, bcj)
+    budget = cpu_budget or os.cpu_count() or 1
+    mksquashfs = shutil.which('mksquashfs')
+    work = os.path.join(os.path.dirname(os.path.abspath(out_path)), f'.fit-{os.getpid()}')
+    os.makedirs(work, exist_ok=True)
+    log_func(f"[FIT] ทดลอง {len(cfgs)} แบบพร้อมกัน (cpu budget {budget}, bcj={bcj or '-'}, limit {limit} bytes)")
+    t0 = time.time()
+    try:
+        if mksquashfs:
+            results = _run_mksquashfs(mksquashfs, src_dir, work, cfgs, limit, budget, timeout, log_func)
+        else:
+            cfgs = [c for c in cfgs if c['block_size'] >= 256 * 1024]
+            results = _run_native(src_dir, work, cfgs, limit, timeout, log_func)
+        if results_out is not None:
+            results_out.extend(dict(cfgs[i], size=size) for i, size in sorted(results.items()))
+        fitting = [(size, i) for i, size in results.items() if size <= limit]
+        if not fitting:
+            smallest = min(results.values()) if results else None
+            return False, f"no configuration fits ({smallest} > {limit} bytes)" if smallest else "no candidate could be built"
+        size, i = min(fitting)
+        os.replace(os.path.join(work, f'cand{i}.sqsh'), out_path)
+        log_func(f"[FIT] เลือก {_label(cfgs[i])}: {size} bytes ({time.time() - t0:.1f}s)")
+        return True, dict(cfgs[i], size=size)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
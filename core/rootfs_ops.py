@@ -0,0 +1,444 @@
+"""RootFS extract / repack pipeline extracted from app.py (no Qt dependency).
+
+extract_rootfs / repack_rootfs pick the native readers and builders first and
+fall back to the external tools (unsquashfs, jefferson, ubireader, binwalk,
+mksquashfs, ...) run through core.tool_runner with size-scaled timeouts,
+streamed output and cancellation. The patch transaction helpers at the bottom combine them
+with core.patch_txn so the GUI and the headless batch runner apply patch
+profiles identically.
+"""
+from __future__ import annotations
+import os, re, time, shutil
+from typing import Callable, Dict, Any, List
+
+from core.squashfs_reader import SquashFSImage, extract_squashfs, read_superblock as read_squashfs_superblock
+from core.jffs2 import JFFS2Image, extract_jffs2
+from core.ubi import UBIImage, extract_ubi
+from core.repack_fit import plan_fit
+from core.workspace import new_workspace, tree_usage, ROOTFS_WS_FACTOR
+from core.tool_runner import run_tool, adaptive_timeout
+from core.uboot_env import scan_uboot_env
+from core.patch_txn import PatchTransaction, disable_inetd_services, set_root_password, set_boot_delay_byte
+from rebuild_squashfs import SquashFSBuilder
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['preferred_tool', 'normalize_fs', 'extract_rootfs', 'read_rootfs_file', 'build_squashfs_native',
+           'repack_rootfs', 'detect_serial_port', 'serial_getty_op', 'new_patch_transaction',
+           'profile_transaction', 'PROFILE_PATCHES']
+
+
+def preferred_tool(name):
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # check common bundle locations first
+    cand = [
+        os.path.join(repo_dir, 'external', name, name),
+        os.path.join(repo_dir, 'external', name, 'bin', name),
+        os.path.join(repo_dir, 'external', name),
+    ]
+    for p in cand:
+        if os.path.isfile(p) and os.access(p, os.X_OK):
+            return p
+    # fall back to PATH
+    which = shutil.which(name)
+    return which or ''
+
+def normalize_fs(fs_type: str) -> str:
+    if not fs_type:
+        return fs_type
+    fs = fs_type.lower()
+    # Map common substrings / variants
+    if 'squash' in fs:
+        return 'squashfs'
+    if 'cramfs' in fs:
+        return 'cramfs'
+    if 'jffs2' in fs or fs == 'jffs':
+        return 'jffs2'
+    if fs.startswith('ubi') or 'ubifs' in fs:
+        return 'ubi'
+    return fs_type  # fallback original
+
+def extract_rootfs(fs_type, rootfs_bin, extract_dir, log_func):
+    fs_type = normalize_fs(fs_type)
+    timeout = adaptive_timeout(os.path.getsize(rootfs_bin))
+    if fs_type == "squashfs":
+        # Primary tool unsquashfs; fallback to sasquatch (unmodified squashfs) if available; then binwalk
+        unsq = shutil.which("unsquashfs")
+        sasq = shutil.which("sasquatch")  # patched unsquashfs for LZMA edge cases
+        if unsq:
+            ok, err = run_tool([unsq, "-d", extract_dir, rootfs_bin], log_func, timeout)
+            if ok:
+                return True, ""
+            log_func(f"unsquashfs error: {err}; จะลอง sasquatch/ binwalk fallback")
+        if sasq:
+            ok, err = run_tool([sasq, "-d", extract_dir, rootfs_bin], log_func, timeout)
+            if ok:
+                return True, ""
+            log_func(f"sasquatch error: {err}; จะลอง binwalk fallback")
+        ok, err = extract_squashfs(rootfs_bin, extract_dir)
+        if ok:
+            log_func("✅ แตก squashfs ด้วย native reader สำเร็จ")
+            return True, ""
+        log_func(f"{err}; จะลอง binwalk fallback")
+    elif fs_type == "cramfs":
+        ok, err = run_tool(["cramfsck", "-x", extract_dir, rootfs_bin], log_func, timeout)
+        if ok:
+            return True, ""
+        log_func(f"cramfsck error: {err}; จะลอง binwalk fallback")
+    elif fs_type in ("jffs2", "jffs"):
+        # native lazy-index reader first; jefferson is slow on large NOR images
+        ok, err = extract_jffs2(rootfs_bin, extract_dir)
+        if ok:
+            log_func("[JFFS2] แตกด้วย native jffs2 reader สำเร็จ")
+            return True, ""
+        log_func(f"{err}; จะลอง jefferson")
+        jefferson = shutil.which("jefferson")
+        if jefferson:
+            ok, err = run_tool([jefferson, rootfs_bin, extract_dir], log_func, timeout)
+            if ok:
+                return True, ""
+            log_func(f"jefferson error: {err}; จะลอง binwalk fallback")
+        else:
+            log_func("jefferson tool not found for jffs2; จะลอง binwalk fallback")
+    elif fs_type == "ubi":
+        # native reader: lists volumes from headers only and unpacks just the rootfs volume
+        ok, err = extract_ubi(rootfs_bin, extract_dir, log_func=log_func)
+        if ok:
+            log_func("[UBI] แตกด้วย native ubi reader สำเร็จ")
+            return True, ""
+        log_func(f"{err}; จะลอง ubireader")
+        ubireader = shutil.which("ubireader_extract_files")
+        if ubireader:
+            ok, err = run_tool([ubireader, "-o", extract_dir, rootfs_bin], log_func, timeout)
+            if ok:
+                return True, ""
+            log_func(f"ubireader error: {err}; จะลอง binwalk fallback")
+        else:
+            log_func("ubireader_extract_files tool not found for ubi; จะลอง binwalk fallback")
+    else:
+        log_func(f"ไม่รองรับการแตก {fs_type}; จะลอง binwalk fallback")
+
+    # ---- Binwalk fallback ----
+    bw = preferred_tool('binwalk') or shutil.which("binwalk")
+    if not bw:
+        return False, "ไม่สำเร็จและไม่มี binwalk fallback (ติดตั้งด้วย: sudo apt install binwalk หรือ pip install binwalk --break-system-packages)"
+    # Run extraction (-e) into a temp dir then move best candidate into extract_dir
+    bw_ws = new_workspace("bw-extract-", os.path.getsize(rootfs_bin) * ROOTFS_WS_FACTOR, log_func)
+    try:
+        tmp_bw = bw_ws.path
+        ok, err = run_tool([bw, "-e", rootfs_bin, "--directory", tmp_bw], log_func, timeout * 2)
+        if not ok:
+            # binwalk returns non‑zero sometimes even if it extracted; continue
+            log_func(f"binwalk non-zero exit: {err}")
+        # Find candidate dirs (common names)
+        candidates = []
+        for r, dirs, files in os.walk(tmp_bw):
+            for d in dirs:
+                name = d.lower()
+                if any(x in name for x in ["squashfs-root", "rootfs", "fs_", "_extracted"]):
+                    candidates.append(os.path.join(r, d))
+        if not candidates:
+            # maybe binwalk created _rootfs.bin etc; as last resort copy everything
+            for d in os.listdir(tmp_bw):
+                p = os.path.join(tmp_bw, d)
+                if os.path.isdir(p):
+                    candidates.append(p)
+        if not candidates:
+            bw_ws.cleanup()
+            return False, "binwalk fallback ไม่พบโฟลเดอร์ rootfs"
+        # Pick largest candidate
+        def dir_size(p):
+            total=0
+            for rp, _, fs in os.walk(p):
+                for f in fs:
+                    try: total += os.path.getsize(os.path.join(rp,f))
+                    except: pass
+            return total
+        best = max(candidates, key=dir_size)
+        shutil.copytree(best, extract_dir, dirs_exist_ok=True)
+        bw_ws.cleanup()
+        log_func(f"✅ binwalk fallback extract สำเร็จ (เลือก {os.path.basename(best)})")
+        return True, ""
+    except Exception as e:
+        bw_ws.cleanup()
+        return False, f"binwalk fallback ล้มเหลว: {e}"
+
+def read_rootfs_file(fw_path, rootfs_part, path):
+    """Read a single file from a squashfs / jffs2 / ubi partition in place (no extraction).
+
+    Returns the file bytes, raises FileNotFoundError when the path is absent,
+    and returns None when the native reader cannot answer (other fs types,
+    unsupported codec) so callers fall back to a full extract.
+    """
+    fs = normalize_fs(rootfs_part.get('fs'))
+    if fs not in ('squashfs', 'jffs2', 'ubi'):
+        return None
+    try:
+        if fs == 'jffs2':
+            with JFFS2Image(fw_path, rootfs_part['offset'], rootfs_part['size']) as img:
+                return img.read(path)
+        if fs == 'ubi':
+            with UBIImage(fw_path, rootfs_part['offset'], rootfs_part['size']) as ubi:
+                vol = ubi.rootfs_volume()
+                if vol is None:
+                    return None
+                if vol.is_ubifs():
+                    return vol.ubifs().read(path)
+                with SquashFSImage(vol.open()) as img:
+                    return img.read(path)
+        with SquashFSImage(fw_path, rootfs_part['offset']) as img:
+            return img.read(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(path)
+    except Exception:
+        return None
+
+def build_squashfs_native(src_dir, out_path, comp, log_func, block_size=262144, reuse_image=None, reuse_offset=0,
+                          extents_out=None):
+    """Repack with rebuild_squashfs.SquashFSBuilder (parallel, deterministic output).
+
+    reuse_image: original squashfs (path + offset) whose compressed blocks are copied
+    verbatim for unchanged files (incremental repack).
+    extents_out: list extended with the builder's (new_pos, orig_pos, length) reused extents.
+    """
+    try:
+        builder = SquashFSBuilder(src_dir, block_size=block_size, compression=comp,
+                                  reuse_image=reuse_image, reuse_offset=reuse_offset)
+    except ValueError as e:
+        return False, f"native squashfs builder: {e}"
+    last = [-1]
+    def _progress(blocks_done, blocks_total, bytes_done, bytes_total):
+        pct = bytes_done * 100 // bytes_total if bytes_total else 100
+        if pct // 25 != last[0]:
+            last[0] = pct // 25
+            log_func(f"[REPACK] {pct}% ({blocks_done}/{blocks_total} blocks)")
+    try:
+        t0 = time.time()
+        used = builder.build(out_path, _progress)
+        if extents_out is not None:
+            extents_out.extend(builder.reused_extents)
+        log_func(f"[REPACK] native squashfs {comp} bs={block_size} -> {used} bytes "
+                 f"({builder.workers} workers, {time.time() - t0:.1f}s)")
+        if reuse_image:
+            log_func(f"[REPACK] incremental: reuse {builder.stats.get('reused_files', 0)}/{builder.stats.get('files', 0)} files "
+                     f"({builder.stats.get('reused_bytes', 0)} bytes) จาก image เดิม")
+        return True, ""
+    except Exception as e:
+        return False, f"native squashfs builder error: {e}"
+
+def repack_rootfs(fs_type, unsquashfs_dir, rootfs_bin_out, log_func, force_comp=None, base_image=None, base_offset=0,
+                  extents_out=None):
+    """Pack unsquashfs_dir into rootfs_bin_out.
+
+    base_image/base_offset: the squashfs the tree was extracted from. When given and
+    the codec is unchanged, squashfs is repacked incrementally (unchanged files keep
+    their compressed blocks), which takes seconds instead of a full recompress.
+    extents_out: filled with the reused (new_pos, orig_pos, length) extents for delta output.
+    """
+    fs_type = normalize_fs(fs_type)
+    if fs_type == "squashfs":
+        mksquashfs = shutil.which("mksquashfs")
+        if base_image:
+            try:
+                with open(base_image, "rb") as f:
+                    base_sb = read_squashfs_superblock(f, base_offset)
+            except Exception as e:
+                log_func(f"[WARN] อ่าน superblock ของ image เดิมไม่ได้ ({e}); repack แบบเต็ม")
+                base_sb = None
+            if base_sb and (not force_comp or force_comp == base_sb['compression_name']):
+                ok, err = build_squashfs_native(unsquashfs_dir, rootfs_bin_out, base_sb['compression_name'], log_func,
+                                                block_size=base_sb['block_size'], reuse_image=base_image,
+                                                reuse_offset=base_offset, extents_out=extents_out)
+                if ok:
+                    return True, ""
+                log_func(f"{err}; repack แบบเต็ม")
+
+        # --- ตรวจสอบ compression เดิม ---
+        comp = "gzip"  # default
+        extra_opts = []
+        try:
+            # หาไฟล์ squashfs เดิมใกล้ๆ rootfs_bin_out (อ่าน superblock ตรงๆ ไม่ต้องพึ่ง unsquashfs -s)
+            parent_dir = os.path.dirname(rootfs_bin_out) or "."
+            for fname in sorted(os.listdir(parent_dir)):
+                if fname.endswith(".bin") or fname.endswith(".img") or fname.endswith(".squashfs"):
+                    orig_path = os.path.join(parent_dir, fname)
+                    if orig_path == rootfs_bin_out:
+                        continue
+                    try:
+                        with open(orig_path, "rb") as f:
+                            comp = read_squashfs_superblock(f)['compression_name']
+                        break
+                    except Exception:
+                        continue
+            # override by caller
+            if force_comp:
+                comp = force_comp
+
+            # เพิ่มออปชันบีบอัดสูงสุดตามชนิด
+            if comp == "xz":
+                extra_opts = ["-comp", "xz", "-b", "256K", "-Xdict-size", "100%"]
+            elif comp == "lzma":
+                extra_opts = ["-comp", "lzma", "-b", "256K"]
+            elif comp == "gzip":
+                extra_opts = ["-comp", "gzip", "-b", "256K"]
+            elif comp == "zstd":
+                extra_opts = ["-comp", "zstd", "-b", "256K"]
+            else:
+                extra_opts = ["-comp", comp]
+        except Exception as e:
+            log_func(f"[WARN] ตรวจสอบ compression เดิมไม่สำเร็จ: {e}")
+            comp = "gzip"
+            extra_opts = ["-comp", "gzip", "-b", "256K"]
+
+        if mksquashfs:
+            cmd = [mksquashfs, unsquashfs_dir, rootfs_bin_out, "-noappend"] + extra_opts
+            log_func(f"[INFO] repack squashfs: {' '.join(cmd)}")
+            ok, err = run_tool(cmd, log_func, adaptive_timeout(tree_usage(unsquashfs_dir)))
+            if ok:
+                return True, ""
+            log_func(f"mksquashfs error: {err}; จะลอง builder ในตัว (pure python)")
+        else:
+            log_func("ไม่พบ mksquashfs; ใช้ builder ในตัว (pure python)")
+        return build_squashfs_native(unsquashfs_dir, rootfs_bin_out, comp, log_func)
+
+    elif fs_type == "cramfs":
+        mkcramfs = shutil.which("mkcramfs")
+        if not mkcramfs:
+            return False, "mkcramfs tool not found"
+        ok, err = run_tool([mkcramfs, unsquashfs_dir, rootfs_bin_out], log_func,
+                           adaptive_timeout(tree_usage(unsquashfs_dir)))
+        return (True, "") if ok else (False, f"mkcramfs error: {err}")
+
+    elif fs_type in ("jffs2", "jffs"):
+        mkfsjffs2 = shutil.which("mkfs.jffs2")
+        if not mkfsjffs2:
+            return False, "mkfs.jffs2 tool not found"
+        ok, err = run_tool([mkfsjffs2, "-d", unsquashfs_dir, "-o", rootfs_bin_out], log_func,
+                           adaptive_timeout(tree_usage(unsquashfs_dir)))
+        return (True, "") if ok else (False, f"mkfs.jffs2 error: {err}")
+
+    else:
+        return False, f"ไม่รองรับการ pack {fs_type}"
+
+def detect_serial_port(fw_path, extracted_rootfs_dir, log_func, preferred=None):
+    """Serial console port from bootargs, inittab gettys and securetty; preferred (if tty*) wins."""
+    candidates = []
+    # 1. U-Boot env bootargs
+    try:
+        envs = scan_uboot_env(fw_path, deep=True)
+        if envs:
+            m = re.search(r'console=(tty[A-Za-z0-9]+)', envs[0].get('vars', {}).get('bootargs', ''))
+            if m:
+                candidates.append(m.group(1))
+    except Exception:
+        pass
+    # 2. inittab existing getty lines
+    inittab_path = os.path.join(extracted_rootfs_dir, 'etc', 'inittab')
+    if os.path.exists(inittab_path):
+        try:
+            txt = open(inittab_path, 'r', encoding='utf-8', errors='ignore').read()
+            candidates += [m.group(1) for m in re.finditer(r'getty[^\n]*?(tty\w+)', txt)]
+        except Exception:
+            pass
+    # 3. securetty
+    securetty_path = os.path.join(extracted_rootfs_dir, 'etc', 'securetty')
+    if os.path.exists(securetty_path):
+        try:
+            for line in open(securetty_path, 'r', encoding='utf-8', errors='ignore'):
+                line = line.strip()
+                if line.startswith('tty') and len(line) < 16:
+                    candidates.append(line)
+        except Exception:
+            pass
+    # 4. common fallbacks
+    candidates += ['ttyS0', 'ttyS1', 'ttyAMA0']
+    seen = []
+    for c in candidates:
+        if c not in seen:
+            seen.append(c)
+    chosen = seen[0]
+    if preferred and preferred.startswith('tty'):
+        if preferred not in seen:
+            seen.insert(0, preferred)
+        chosen = preferred
+        log_func(f"[AUTO-TTY] ใช้ค่าที่ผู้ใช้เลือก: {chosen}")
+    log_func(f"[AUTO-TTY] candidates={seen} -> เลือก {chosen}")
+    return chosen
+
+def serial_getty_op(fw_path, rootfs_part, preferred=None):
+    """PatchTransaction file op adding a getty on the auto-detected serial port to etc/inittab."""
+    def op(unsquashfs_dir, log_func):
+        serial_port = detect_serial_port(fw_path, unsquashfs_dir, log_func, preferred)
+        inittab_path = os.path.join(unsquashfs_dir, "etc", "inittab")
+        if os.path.exists(inittab_path):
+            # avoid duplicate entries
+            existing = ''
+            try:
+                existing = open(inittab_path,'r',encoding='utf-8',errors='ignore').read()
+            except Exception: pass
+            getty_line = f"{serial_port}:12345:respawn:/sbin/getty -L {serial_port} 115200 vt100"
+            if serial_port not in existing:
+                with open(inittab_path, "a", encoding="utf-8") as f:
+                    f.write("\n"+getty_line+"\n")
+                log_func(f"เพิ่ม getty {serial_port} ใน inittab สำเร็จ")
+                return f"inittab: เพิ่ม getty {serial_port}"
+            else:
+                log_func(f"พบ {serial_port} อยู่แล้วใน inittab (ข้าม)")
+                return ''
+        else:
+            log_func("ไม่พบ /etc/inittab ใน rootfs (สร้างใหม่พร้อม getty)")
+            try:
+                os.makedirs(os.path.dirname(inittab_path), exist_ok=True)
+                with open(inittab_path,'w',encoding='utf-8') as f:
+                    f.write("::sysinit:/bin/mount -t proc proc /proc\n")
+                    f.write("::sysinit:/bin/mount -t sysfs sysfs /sys\n")
+                    f.write(f"::respawn:/sbin/getty -L {serial_port} 115200 vt100\n")
+                log_func("สร้าง inittab ใหม่สำเร็จ")
+                return f"inittab: สร้างใหม่พร้อม getty {serial_port}"
+            except Exception as e:
+                log_func(f"สร้าง inittab ใหม่ล้มเหลว: {e}")
+                return ''
+    return op
+
+
+def _fit_rootfs_func(fw_path, rootfs_part):
+    """fit_func for PatchTransaction: squashfs only, tries other codec / block size combinations."""
+    if normalize_fs(rootfs_part.get('fs')) != 'squashfs':
+        return None
+    def fit(src_dir, out_bin, limit, log_func):
+        try:
+            with open(fw_path, 'rb') as f:
+                orig_comp = read_squashfs_superblock(f, rootfs_part['offset'])['compression_name']
+        except Exception:
+            orig_comp = 'gzip'
+        ok, info = plan_fit(src_dir, out_bin, limit, log_func, orig_comp=orig_comp)
+        return (True, "") if ok else (False, str(info))
+    return fit
+
+def new_patch_transaction(fw_path, rootfs_part, log_func):
+    """PatchTransaction wired to extract_rootfs / repack_rootfs / plan_fit."""
+    return PatchTransaction(fw_path, rootfs_part, extract_rootfs, repack_rootfs, log_func,
+                            fit_func=_fit_rootfs_func(fw_path, rootfs_part) if rootfs_part else None)
+
+# keys written by SelectivePatchDialog.get_actions() / export_patch_profile
+PROFILE_PATCHES = ('serial_shell', 'network_services', 'root_password', 'boot_delay')
+
+def profile_transaction(fw_path, rootfs_part, patches: Dict[str, Any], log_func, password=None,
+                        preferred_serial=None):
+    """(PatchTransaction, applied labels) for a patch profile's ``patches`` dict."""
+    txn = new_patch_transaction(fw_path, rootfs_part, log_func)
+    applied: List[str] = []
+    if patches.get('serial_shell'):
+        txn.add_file("serial_shell", serial_getty_op(fw_path, rootfs_part, preferred_serial))
+        applied.append("SerialShell")
+    if patches.get('network_services'):
+        txn.add_file("network_services", disable_inetd_services)
+        applied.append("DisableTelnet/FTP")
+    if patches.get('root_password'):
+        pw = password if password is not None else patches.get('root_password_value', 'admin1234')
+        txn.add_file("root_password", set_root_password(pw))
+        applied.append("RootPassword")
+    if patches.get('boot_delay'):
+        txn.add_raw("boot_delay", set_boot_delay_byte(int(patches['boot_delay_value'])))
+        applied.append(f"BootDelay={patches['boot_delay_value']}")
+    return txn, applied
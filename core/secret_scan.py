@@ -31,45 +31,39 @@ def _is_probably_text(data: bytes) -> bool:
     return printable / len(data) > 0.85
 
 
+def scan_secrets_in_file(path: str, limit: int = MAX_MATCHES_PER_FILE) -> List[Dict[str, str]]:
+    """Findings {type, snippet} for one file; [] for binaries and files above MAX_FILE_SIZE."""
+    try:
+        if os.path.getsize(path) > MAX_FILE_SIZE:
+            return []
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return []
+    if not _is_probably_text(data):
+        return []
+    text = data.decode('utf-8', errors='ignore')
+    out: List[Dict[str, str]] = []
+    for name, rgx in _PATTERNS:
+        for m in rgx.finditer(text):
+            out.append({'type': name, 'snippet': m.group(0)[:120]})
+            if len(out) >= limit:
+                return out
+    return out
+
+
 def scan_secrets_in_dir(root_dir: str) -> List[Dict[str, str]]:
     """Return list of secret findings: {file, type, snippet}.
     Keeps overall match count bounded for performance.
     """
     findings: List[Dict[str, str]] = []
-    total = 0
     for dp, _, files in os.walk(root_dir):
         for fn in files:
-            if total >= MAX_TOTAL_MATCHES:
-                return findings
             fp = os.path.join(dp, fn)
-            try:
-                if os.path.getsize(fp) > MAX_FILE_SIZE:
-                    continue
-                with open(fp, 'rb') as f:
-                    data = f.read()
-                if not _is_probably_text(data):
-                    continue
-                try:
-                    text = data.decode('utf-8', errors='ignore')
-                except Exception:
-                    continue
-                file_matches = 0
-                for name, rgx in _PATTERNS:
-                    for m in rgx.finditer(text):
-                        snippet = m.group(0)[:120]
-                        findings.append({
-                            'file': os.path.relpath(fp, root_dir),
-                            'type': name,
-                            'snippet': snippet,
-                        })
-                        file_matches += 1
-                        total += 1
-                        if file_matches >= MAX_MATCHES_PER_FILE or total >= MAX_TOTAL_MATCHES:
-                            break
-                    if file_matches >= MAX_MATCHES_PER_FILE or total >= MAX_TOTAL_MATCHES:
-                        break
-            except Exception:
-                continue
+            for hit in scan_secrets_in_file(fp, min(MAX_MATCHES_PER_FILE, MAX_TOTAL_MATCHES - len(findings))):
+                findings.append({'file': os.path.relpath(fp, root_dir), **hit})
+            if len(findings) >= MAX_TOTAL_MATCHES:
+                return findings
     return findings
 
-__all__ = ["scan_secrets_in_dir"]
+__all__ = ["scan_secrets_in_dir", "scan_secrets_in_file"]
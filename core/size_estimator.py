@@ -0,0 +1,235 @@
+"""Compressed image size estimator and shrink planner.
+
+Predicts the size of a repacked rootfs without running a repack: each file's
+full blocks are sampled with the target compressor and block size (results are
+cached per content hash), file tails are packed into fragment-sized buffers as
+mksquashfs would, and a metadata allowance is added.
+
+plan_shrink() then chooses the cheapest set of strips / removals whose
+estimated savings cover the deficit, as a min-cost covering knapsack, so the
+shrink loop needs only one confirming repack.
+"""
+from __future__ import annotations
+import os, json, hashlib, threading
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from core.squashfs_reader import compress_block, COMPRESSION_IDS
+from core.elf_analyze import read_elf_header, strippable_size
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['SizeEstimator', 'shrink_candidates', 'plan_shrink', 'REMOVAL_CANDIDATES', 'ESTIMATE_CACHE']
+
+ESTIMATE_CACHE = os.environ.get('FW_SIZE_ESTIMATE_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'firmware_toolkit', 'size_estimates.json'))
+
+# path -> cost (how intrusive removing it is; strip costs 1 per binary)
+REMOVAL_CANDIDATES = {
+    'var/log': 1, 'tmp': 1, 'var/tmp': 1,
+    'usr/share/doc': 4, 'usr/share/man': 4, 'usr/share/info': 4,
+    'usr/share/locale': 6, 'usr/share/locale-langpack': 6,
+}
+STRIP_COST = 1
+
+_SAMPLE_BLOCKS = 4
+_SAMPLE_FRAGMENTS = 64
+
+
+class SizeEstimator:
+    """Estimate squashfs output size for a given compressor and block size."""
+
+    def __init__(self, compression: str = 'gzip', block_size: int = 131072, cache_path: Optional[str] = ESTIMATE_CACHE):
+        self.comp_id = COMPRESSION_IDS[compression]
+        compress_block(self.comp_id, b'probe')  # SquashFSError if the codec module is missing
+        self.compression = compression
+        self.block_size = block_size
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._cache: Dict[str, int] = {}
+        if cache_path:
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    self._cache = json.load(f)
+            except Exception:
+                self._cache = {}
+
+    def save(self) -> None:
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = self.cache_path + f'.{os.getpid()}'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def _compressed(self, data: bytes) -> int:
+        # stored raw when compression does not help, as the writers do
+        return min(len(compress_block(self.comp_id, data, self.block_size)), len(data))
+
+    def estimate_blocks(self, path: str, size: int, digest: str) -> int:
+        """Estimated compressed size of the file's full blocks (tail excluded)."""
+        bs = self.block_size
+        nblocks = size // bs
+        if not nblocks:
+            return 0
+        key = f"{digest}:{self.compression}:{bs}"
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        picks = range(nblocks) if nblocks <= _SAMPLE_BLOCKS else \
+            sorted({i * (nblocks - 1) // (_SAMPLE_BLOCKS - 1) for i in range(_SAMPLE_BLOCKS)})
+        sampled = 0
+        with open(path, 'rb') as f:
+            for i in picks:
+                f.seek(i * bs)
+                blk = f.read(bs)
+                sampled += 0 if blk.count(0) == bs else self._compressed(blk)
+        est = sampled * nblocks // len(picks)
+        with self._lock:
+            self._cache[key] = est
+        return est
+
+    def estimate_tree(self, root: str, log_func: LogFunc = lambda m: None) -> Dict[str, Any]:
+        """Returns {'total', 'data', 'fragments', 'metadata', 'files': {rel: (size, est)}}."""
+        bs = self.block_size
+        files: Dict[str, Tuple[int, int]] = {}
+        seen: Dict[str, int] = {}
+        tails: List[Tuple[str, int, int]] = []  # (path, offset, length)
+        names = bytearray(); inode_bytes = 0; data = 0
+        for dp, dn, fn in os.walk(root):
+            dn.sort(); fn.sort()
+            inode_bytes += 32 + 12
+            for name in dn + fn:
+                names += os.fsencode(name) + b'\0'
+            for name in fn:
+                p = os.path.join(dp, name)
+                try:
+                    if os.path.islink(p) or not os.path.isfile(p):
+                        inode_bytes += 32; continue
+                    size = os.path.getsize(p)
+                    digest = _file_digest(p)
+                except OSError:
+                    continue
+                inode_bytes += 32 + 4 * (size // bs + 1)
+                rel = os.path.relpath(p, root)
+                if digest in seen:
+                    files[rel] = (size, 0)  # duplicate content is stored once
+                    continue
+                est = self.estimate_blocks(p, size, digest)
+                seen[digest] = est
+                if size % bs:
+                    tails.append((p, size - size % bs, size % bs))
+                files[rel] = (size, est)
+                data += est
+        frag_raw, frag_est = self._estimate_fragments(tails)
+        # spread fragment cost over the owning files so removal savings include it
+        if frag_raw:
+            ratio = frag_est / frag_raw
+            for p, off, ln in tails:
+                rel = os.path.relpath(p, root)
+                size, est = files[rel]
+                files[rel] = (size, est + int(ln * ratio))
+        meta = self._compressed(bytes(names)) + int(inode_bytes * 0.45) if names else 0
+        total = 96 + data + frag_est + meta
+        total += -total % 4096
+        self.save()
+        log_func(f"[EST] {self.compression}/{bs // 1024}K: ~{total} bytes "
+                 f"(data {data}, fragments {frag_est}, metadata {meta}; {len(files)} files)")
+        return {'total': total, 'data': data, 'fragments': frag_est, 'metadata': meta, 'files': files}
+
+    def _estimate_fragments(self, tails) -> Tuple[int, int]:
+        bs = self.block_size
+        buffers: List[List[Tuple[str, int, int]]] = [[]]
+        fill = 0
+        for t in tails:
+            if fill + t[2] > bs and buffers[-1]:
+                buffers.append([]); fill = 0
+            buffers[-1].append(t); fill += t[2]
+        buffers = [b for b in buffers if b]
+        if not buffers:
+            return 0, 0
+        raw_total = sum(t[2] for b in buffers for t in b)
+        step = max(1, len(buffers) // _SAMPLE_FRAGMENTS)
+        s_raw = s_comp = 0
+        for b in buffers[::step]:
+            chunk = bytearray()
+            for p, off, ln in b:
+                try:
+                    with open(p, 'rb') as f:
+                        f.seek(off); chunk += f.read(ln)
+                except OSError:
+                    continue
+            if chunk:
+                s_raw += len(chunk); s_comp += self._compressed(bytes(chunk))
+        est = raw_total * s_comp // s_raw if s_raw else raw_total
+        return raw_total, est
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def shrink_candidates(root: str, report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Strip / removal actions with estimated compressed savings and intrusiveness cost."""
+    items: List[Dict[str, Any]] = []
+    files = report['files']
+    for rel, (size, est) in files.items():
+        if not size or not est:
+            continue
+        p = os.path.join(root, rel)
+        if read_elf_header(p) is None:
+            continue
+        raw = strippable_size(p)
+        if raw:
+            items.append({'action': 'strip', 'path': rel, 'cost': STRIP_COST,
+                          'saving': int(raw * est / size) + 1})
+    for sub, cost in REMOVAL_CANDIDATES.items():
+        prefix = sub + os.sep
+        saving = sum(est for rel, (_, est) in files.items() if rel.startswith(prefix))
+        if saving:
+            items.append({'action': 'remove', 'path': sub, 'cost': cost, 'saving': saving})
+    return items
+
+
+def plan_shrink(items: List[Dict[str, Any]], need: int) -> Optional[List[Dict[str, Any]]]:
+    """Cheapest subset of items with total saving >= need (None if impossible).
+
+    0/1 min-cost covering knapsack: dp over total cost, bounded by the cost of a
+    greedy cover so the table stays small.
+    """
+    if need <= 0:
+        return []
+    if sum(it['saving'] for it in items) < need:
+        return None
+    greedy_cost = got = 0
+    for it in sorted(items, key=lambda it: it['cost'] / it['saving']):
+        if got >= need:
+            break
+        got += it['saving']; greedy_cost += it['cost']
+    cap = greedy_cost
+    dp = [0] + [-1] * cap  # dp[c] = best saving with exact cost c
+    keep: List[bytearray] = []
+    for it in items:
+        w, v = it['cost'], it['saving']
+        row = bytearray(cap + 1)
+        for c in range(cap, w - 1, -1):
+            if dp[c - w] >= 0 and dp[c - w] + v > dp[c]:
+                dp[c] = dp[c - w] + v; row[c] = 1
+        keep.append(row)
+    best = next(c for c in range(cap + 1) if dp[c] >= need)
+    chosen = []
+    c = best
+    for i in range(len(items) - 1, -1, -1):
+        if keep[i][c]:
+            chosen.append(items[i]); c -= items[i]['cost']
+    return chosen[::-1]
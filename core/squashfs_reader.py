@@ -0,0 +1,550 @@
+"""Lazy, read-only SquashFS v4 reader (pure Python).
+
+Only the superblock is parsed up front; inode, directory, fragment and id
+tables are decoded on demand through a small metadata-block cache, so a
+single file (e.g. /etc/shadow) can be read from a 100 MB image without
+touching the rest of it.
+
+Compression: gzip, xz and lzma use the standard library; lzo, zstd and lz4
+need the optional ``python-lzo`` / ``zstandard`` / ``lz4`` modules.
+
+The image may be embedded in a larger firmware file (pass ``offset``), so
+partitions can be inspected without carving a rootfs.bin first.
+"""
+from __future__ import annotations
+import io, os, stat, struct, zlib, lzma, posixpath
+from collections import OrderedDict
+from typing import Dict, List, Optional, Iterator, Tuple, Any
+
+from core.file_utils import valid_entry_name, safe_join
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+try:
+    import lzo as _lzo
+except ImportError:
+    _lzo = None
+try:
+    import lz4.block as _lz4
+except ImportError:
+    _lz4 = None
+
+__all__ = ['SquashFSImage', 'SquashFSError', 'decompress_block', 'compress_block',
+           'read_superblock', 'extract_squashfs', 'COMPRESSION_IDS']
+
+SQUASHFS_MAGIC = 0x73717368
+METADATA_SIZE = 8192
+NO_FRAGMENT = 0xFFFFFFFF
+INVALID_TABLE = 0xFFFFFFFFFFFFFFFF
+DATA_UNCOMPRESSED = 1 << 24
+META_UNCOMPRESSED = 0x8000
+
+COMPRESSION_IDS = {'gzip': 1, 'lzma': 2, 'lzo': 3, 'xz': 4, 'lz4': 5, 'zstd': 6}
+COMPRESSION_NAMES = {v: k for k, v in COMPRESSION_IDS.items()}
+
+# inode types (basic / extended)
+DIR, FILE, SYMLINK, BLKDEV, CHRDEV, FIFO, SOCKET = 1, 2, 3, 4, 5, 6, 7
+LDIR, LREG, LSYMLINK, LBLKDEV, LCHRDEV, LFIFO, LSOCKET = 8, 9, 10, 11, 12, 13, 14
+
+_TYPE_MODE = {
+    DIR: stat.S_IFDIR, FILE: stat.S_IFREG, SYMLINK: stat.S_IFLNK, BLKDEV: stat.S_IFBLK,
+    CHRDEV: stat.S_IFCHR, FIFO: stat.S_IFIFO, SOCKET: stat.S_IFSOCK,
+}
+_TYPE_NAME = {DIR: 'dir', FILE: 'file', SYMLINK: 'symlink', BLKDEV: 'blockdev',
+              CHRDEV: 'chardev', FIFO: 'fifo', SOCKET: 'socket'}
+
+_SB = struct.Struct('<IIIIIHHHHHHQQQQQQQQ')
+
+
+class SquashFSError(Exception):
+    pass
+
+
+def decompress_block(comp: int, data: bytes, out_size: int) -> bytes:
+    if comp == 1:
+        return zlib.decompress(data)
+    if comp == 4:
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ).decompress(data)
+    if comp == 2:
+        return lzma.LZMADecompressor(format=lzma.FORMAT_ALONE).decompress(data)
+    if comp == 3:
+        if _lzo is None:
+            raise SquashFSError("lzo compression requires the 'python-lzo' module")
+        return _lzo.decompress(data, False, out_size)
+    if comp == 6:
+        if _zstd is None:
+            raise SquashFSError("zstd compression requires the 'zstandard' module")
+        return _zstd.ZstdDecompressor().decompress(data, max_output_size=out_size)
+    if comp == 5:
+        if _lz4 is None:
+            raise SquashFSError("lz4 compression requires the 'lz4' module")
+        return _lz4.decompress(data, uncompressed_size=out_size)
+    raise SquashFSError(f"unknown compression id {comp}")
+
+
+def compress_block(comp: int, data: bytes, block_size: int = 131072, filters: Optional[list] = None) -> bytes:
+    """Compress one data/metadata block the way squashfs-tools does for ``comp``."""
+    if comp == 1:
+        return zlib.compress(data, 9)
+    if comp == 4:
+        chain = list(filters or []) + [{'id': lzma.FILTER_LZMA2, 'preset': 9, 'dict_size': max(block_size, 8192)}]
+        return lzma.compress(data, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC32, filters=chain)
+    if comp == 2:
+        out = lzma.compress(data, format=lzma.FORMAT_ALONE,
+                            filters=[{'id': lzma.FILTER_LZMA1, 'preset': 9, 'dict_size': max(block_size, 8192)}])
+        # like mksquashfs: the 13-byte header carries the real uncompressed size (squashfs-tools and
+        # the kernel take the output length from it), not the 'unknown' all-ones value
+        return out[:5] + struct.pack('<Q', len(data)) + out[13:]
+    if comp == 3:
+        if _lzo is None:
+            raise SquashFSError("lzo compression requires the 'python-lzo' module")
+        return _lzo.compress(data, 9, False)
+    if comp == 6:
+        if _zstd is None:
+            raise SquashFSError("zstd compression requires the 'zstandard' module")
+        return _zstd.ZstdCompressor(level=15).compress(data)
+    if comp == 5:
+        if _lz4 is None:
+            raise SquashFSError("lz4 compression requires the 'lz4' module")
+        return _lz4.compress(data, store_size=False)
+    raise SquashFSError(f"unknown compression id {comp}")
+
+
+def read_superblock(fileobj, offset: int = 0) -> Dict[str, Any]:
+    fileobj.seek(offset)
+    raw = fileobj.read(_SB.size)
+    if len(raw) < _SB.size:
+        raise SquashFSError("short superblock")
+    v = _SB.unpack(raw)
+    if v[0] != SQUASHFS_MAGIC:
+        raise SquashFSError("bad squashfs magic (big-endian / vendor variants are not supported)")
+    sb = dict(zip(('magic', 'inode_count', 'mod_time', 'block_size', 'frag_count', 'compression',
+                   'block_log', 'flags', 'id_count', 'version_major', 'version_minor', 'root_inode',
+                   'bytes_used', 'id_table_start', 'xattr_id_table_start', 'inode_table_start',
+                   'directory_table_start', 'fragment_table_start', 'export_table_start'), v))
+    if sb['version_major'] != 4:
+        raise SquashFSError(f"unsupported squashfs version {sb['version_major']}.{sb['version_minor']}")
+    sb['compression_name'] = COMPRESSION_NAMES.get(sb['compression'], str(sb['compression']))
+    return sb
+
+
+class Inode:
+    """Decoded inode. Only the fields relevant to its type are set."""
+    __slots__ = ('ref', 'type', 'perm', 'uid', 'gid', 'mtime', 'number', 'nlink',
+                 'start_block', 'offset', 'file_size', 'parent', 'blocks_start', 'fragment',
+                 'frag_offset', 'block_sizes', 'sparse', 'target', 'rdev', 'xattr', '_block_pos')
+
+    def __init__(self):
+        for s in self.__slots__:
+            setattr(self, s, None)
+
+    @property
+    def kind(self) -> int:
+        # extended types map onto their basic counterpart
+        return self.type - 7 if self.type > 7 else self.type
+
+    @property
+    def mode(self) -> int:
+        return _TYPE_MODE[self.kind] | self.perm
+
+
+class _MetaCursor:
+    """Sequential reader over a chain of metadata blocks."""
+
+    def __init__(self, img: 'SquashFSImage', pos: int, offset: int):
+        self.img, self.pos, self.offset = img, pos, offset
+
+    def read(self, n: int) -> bytes:
+        out = bytearray()
+        while n > 0:
+            data, nxt = self.img._meta_block(self.pos)
+            chunk = data[self.offset:self.offset + n]
+            if not chunk:
+                if self.offset >= len(data):
+                    self.pos, self.offset = nxt, 0
+                    continue
+                raise SquashFSError("metadata read past end")
+            out += chunk; n -= len(chunk); self.offset += len(chunk)
+            if self.offset >= len(data) and n > 0:
+                self.pos, self.offset = nxt, 0
+        return bytes(out)
+
+    def unpack(self, fmt: str):
+        return struct.unpack('<' + fmt, self.read(struct.calcsize('<' + fmt)))
+
+
+class SquashFSImage:
+    """Random-access view over a SquashFS v4 image.
+
+    Paths are POSIX style and relative to the image root ('/etc/shadow' or
+    'etc/shadow'). Use as a context manager or call close().
+    """
+
+    def __init__(self, source, offset: int = 0, cache_blocks: int = 256):
+        if isinstance(source, (str, os.PathLike)):
+            self._f = open(source, 'rb'); self._own = True
+        else:
+            self._f = source; self._own = False
+        self.base = offset
+        self.sb = read_superblock(self._f, offset)
+        self.block_size = self.sb['block_size']
+        self.comp = self.sb['compression']
+        self._meta_cache: 'OrderedDict[int, Tuple[bytes, int]]' = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._frag_cache: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._dir_cache: Dict[int, Dict[str, Tuple[int, int]]] = {}
+        self._inode_cache: Dict[int, Inode] = {}
+        self._frag_index: Optional[List[int]] = None
+        self._ids: Optional[List[int]] = None
+
+    # ---- context ----
+    def close(self):
+        if self._own:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def compression(self) -> str:
+        return self.sb['compression_name']
+
+    # ---- low level ----
+    def _pread(self, pos: int, n: int) -> bytes:
+        self._f.seek(self.base + pos)
+        data = self._f.read(n)
+        if len(data) != n:
+            raise SquashFSError(f"short read at 0x{pos:X}")
+        return data
+
+    def _meta_block(self, pos: int) -> Tuple[bytes, int]:
+        hit = self._meta_cache.get(pos)
+        if hit is not None:
+            self._meta_cache.move_to_end(pos)
+            return hit
+        (hdr,) = struct.unpack('<H', self._pread(pos, 2))
+        size = hdr & 0x7FFF
+        raw = self._pread(pos + 2, size)
+        data = raw if hdr & META_UNCOMPRESSED else decompress_block(self.comp, raw, METADATA_SIZE)
+        res = (data, pos + 2 + size)
+        self._meta_cache[pos] = res
+        if len(self._meta_cache) > self._cache_blocks:
+            self._meta_cache.popitem(last=False)
+        return res
+
+    def _lookup_table(self, start: int, count: int, entry_size: int, index: int, fmt: str):
+        per_block = METADATA_SIZE // entry_size
+        nblocks = (count + per_block - 1) // per_block
+        ptrs = struct.unpack(f'<{nblocks}Q', self._pread(start, 8 * nblocks))
+        cur = _MetaCursor(self, ptrs[index // per_block], (index % per_block) * entry_size)
+        return cur.unpack(fmt)
+
+    def _id(self, idx: int) -> int:
+        if self._ids is None:
+            n = self.sb['id_count']
+            nblocks = (n + 2047) // 2048
+            ptrs = struct.unpack(f'<{nblocks}Q', self._pread(self.sb['id_table_start'], 8 * nblocks))
+            cur = _MetaCursor(self, ptrs[0], 0) if ptrs else None
+            self._ids = list(cur.unpack(f'{n}I')) if cur else []
+        return self._ids[idx] if idx < len(self._ids) else 0
+
+    def fragment_entry(self, index: int) -> Tuple[int, int]:
+        start, size, _ = self._lookup_table(self.sb['fragment_table_start'], self.sb['frag_count'], 16, index, 'QII')
+        return start, size
+
+    def _fragment_block(self, index: int) -> bytes:
+        hit = self._frag_cache.get(index)
+        if hit is not None:
+            return hit
+        start, size = self.fragment_entry(index)
+        raw = self._pread(start, size & ~DATA_UNCOMPRESSED)
+        data = raw if size & DATA_UNCOMPRESSED else decompress_block(self.comp, raw, self.block_size)
+        self._frag_cache[index] = data
+        if len(self._frag_cache) > 8:
+            self._frag_cache.popitem(last=False)
+        return data
+
+    # ---- inodes ----
+    def inode(self, ref: int) -> Inode:
+        hit = self._inode_cache.get(ref)
+        if hit is not None:
+            return hit
+        cur = _MetaCursor(self, self.sb['inode_table_start'] + (ref >> 16), ref & 0xFFFF)
+        ino = Inode(); ino.ref = ref
+        ino.type, ino.perm, uid_i, gid_i, ino.mtime, ino.number = cur.unpack('HHHHII')
+        ino.uid, ino.gid = self._id(uid_i), self._id(gid_i)
+        t = ino.type
+        if t == DIR:
+            ino.start_block, ino.nlink, ino.file_size, ino.offset, ino.parent = cur.unpack('IIHHI')
+        elif t == LDIR:
+            ino.nlink, ino.file_size, ino.start_block, ino.parent, _cnt, ino.offset, ino.xattr = cur.unpack('IIIIHHI')
+        elif t in (FILE, LREG):
+            if t == FILE:
+                ino.blocks_start, ino.fragment, ino.frag_offset, ino.file_size = cur.unpack('IIII')
+                ino.nlink, ino.sparse = 1, 0
+            else:
+                ino.blocks_start, ino.file_size, ino.sparse, ino.nlink, ino.fragment, ino.frag_offset, ino.xattr = cur.unpack('QQQIIII')
+            n = ino.file_size // self.block_size
+            if ino.fragment == NO_FRAGMENT and ino.file_size % self.block_size:
+                n += 1
+            ino.block_sizes = list(cur.unpack(f'{n}I')) if n else []
+        elif t in (SYMLINK, LSYMLINK):
+            ino.nlink, size = cur.unpack('II')
+            ino.target = cur.read(size).decode('utf-8', 'surrogateescape')
+        elif t in (BLKDEV, CHRDEV, LBLKDEV, LCHRDEV):
+            ino.nlink, rdev = cur.unpack('II')
+            ino.rdev = os.makedev((rdev >> 8) & 0xFFF, (rdev & 0xFF) | ((rdev >> 12) & 0xFFF00))
+        elif t in (FIFO, SOCKET, LFIFO, LSOCKET):
+            (ino.nlink,) = cur.unpack('I')
+        else:
+            raise SquashFSError(f"unknown inode type {t} at ref 0x{ref:X}")
+        self._inode_cache[ref] = ino
+        return ino
+
+    @property
+    def root(self) -> Inode:
+        return self.inode(self.sb['root_inode'])
+
+    def _entries(self, dino: Inode) -> Dict[str, Tuple[int, int]]:
+        """name -> (inode_ref, basic_type) for a directory inode."""
+        hit = self._dir_cache.get(dino.ref)
+        if hit is not None:
+            return hit
+        out: Dict[str, Tuple[int, int]] = {}
+        remaining = dino.file_size - 3
+        cur = _MetaCursor(self, self.sb['directory_table_start'] + dino.start_block, dino.offset)
+        while remaining > 0:
+            count, start, _base = cur.unpack('III'); remaining -= 12
+            for _ in range(count + 1):
+                off, _ioff, typ, nsize = cur.unpack('HhHH')
+                name = cur.read(nsize + 1).decode('utf-8', 'surrogateescape')
+                remaining -= 8 + nsize + 1
+                if valid_entry_name(name):  # '..', 'a/b' etc. from a crafted image are dropped
+                    out[name] = ((start << 16) | off, typ)
+        self._dir_cache[dino.ref] = out
+        return out
+
+    # ---- path resolution ----
+    def _resolve(self, path: str, follow_symlinks: bool = True, _depth: int = 0) -> Inode:
+        if _depth > 40:
+            raise SquashFSError(f"too many symlink levels: {path}")
+        parts = [p for p in posixpath.normpath('/' + path).split('/') if p]
+        node = self.root; walked: List[str] = []
+        for i, name in enumerate(parts):
+            if node.kind != DIR:
+                raise NotADirectoryError(path)
+            entry = self._entries(node).get(name)
+            if entry is None:
+                raise FileNotFoundError(path)
+            child = self.inode(entry[0])
+            last = i == len(parts) - 1
+            if child.kind == SYMLINK and (follow_symlinks or not last):
+                target = child.target if child.target.startswith('/') else posixpath.join('/', *walked, child.target)
+                rest = parts[i + 1:]
+                return self._resolve(posixpath.join(target, *rest), follow_symlinks, _depth + 1)
+            walked.append(name); node = child
+        return node
+
+    def lookup(self, path: str, follow_symlinks: bool = False) -> Inode:
+        """Decoded inode for path (raises FileNotFoundError / NotADirectoryError)."""
+        return self._resolve(path, follow_symlinks)
+
+    def exists(self, path: str) -> bool:
+        try:
+            self._resolve(path, follow_symlinks=False); return True
+        except (FileNotFoundError, NotADirectoryError, SquashFSError):
+            return False
+
+    def isdir(self, path: str) -> bool:
+        try:
+            return self._resolve(path).kind == DIR
+        except (FileNotFoundError, NotADirectoryError, SquashFSError):
+            return False
+
+    def stat(self, path: str, follow_symlinks: bool = False) -> Dict[str, Any]:
+        ino = self._resolve(path, follow_symlinks)
+        return {'type': _TYPE_NAME[ino.kind], 'mode': ino.mode, 'uid': ino.uid, 'gid': ino.gid,
+                'mtime': ino.mtime, 'size': ino.file_size if ino.kind == FILE else (len(ino.target.encode('utf-8', 'surrogateescape')) if ino.kind == SYMLINK else 0),
+                'nlink': ino.nlink, 'inode': ino.number, 'target': ino.target, 'rdev': ino.rdev}
+
+    def listdir(self, path: str = '/') -> List[str]:
+        ino = self._resolve(path)
+        if ino.kind != DIR:
+            raise NotADirectoryError(path)
+        return sorted(self._entries(ino))
+
+    def readlink(self, path: str) -> str:
+        ino = self._resolve(path, follow_symlinks=False)
+        if ino.kind != SYMLINK:
+            raise SquashFSError(f"not a symlink: {path}")
+        return ino.target
+
+    def walk(self, top: str = '/') -> Iterator[Tuple[str, List[str], List[str]]]:
+        """os.walk-style traversal (top-down, symlinks not followed)."""
+        ino = self._resolve(top)
+        stack = [(posixpath.normpath('/' + top), ino)]
+        while stack:
+            path, dino = stack.pop()
+            dirs, files = [], []
+            for name, (ref, typ) in sorted(self._entries(dino).items()):
+                (dirs if typ == DIR else files).append(name)
+            yield path, dirs, files
+            ents = self._entries(dino)
+            for name in reversed(dirs):
+                stack.append((posixpath.join(path, name), self.inode(ents[name][0])))
+
+    # ---- file data ----
+    def _block_positions(self, ino: Inode) -> List[int]:
+        if ino._block_pos is None:
+            pos = ino.blocks_start; out = []
+            for s in ino.block_sizes:
+                out.append(pos); pos += s & ~DATA_UNCOMPRESSED
+            ino._block_pos = out
+        return ino._block_pos
+
+    def _read_block(self, ino: Inode, index: int) -> bytes:
+        """Uncompressed contents of block ``index`` (the fragment tail counts as the last block)."""
+        nblocks = len(ino.block_sizes)
+        if index < nblocks:
+            size = ino.block_sizes[index]
+            want = min(self.block_size, ino.file_size - index * self.block_size)
+            if size == 0:
+                return b'\x00' * want  # sparse
+            raw = self._pread(self._block_positions(ino)[index], size & ~DATA_UNCOMPRESSED)
+            return raw if size & DATA_UNCOMPRESSED else decompress_block(self.comp, raw, self.block_size)
+        if ino.fragment != NO_FRAGMENT and index == nblocks:
+            tail = ino.file_size - nblocks * self.block_size
+            frag = self._fragment_block(ino.fragment)
+            return frag[ino.frag_offset:ino.frag_offset + tail]
+        return b''
+
+    def open(self, path: str) -> 'SquashFSFile':
+        ino = self._resolve(path)
+        if ino.kind != FILE:
+            raise IsADirectoryError(path) if ino.kind == DIR else SquashFSError(f"not a regular file: {path}")
+        return SquashFSFile(self, ino)
+
+    def read(self, path: str) -> bytes:
+        with self.open(path) as f:
+            return f.read()
+
+    def extract_all(self, dest: str, preserve_owner: bool = False) -> int:
+        """Unpack the whole image into dest (like unsquashfs -d). Returns entries written."""
+        count = 0
+        dir_meta: List[Tuple[str, Inode]] = []
+        for path, dirs, files in self.walk('/'):
+            dino = self._resolve(path)
+            target_dir = safe_join(dest, path.lstrip('/'))
+            os.makedirs(target_dir, exist_ok=True)
+            dir_meta.append((target_dir, dino))
+            ents = self._entries(dino)
+            for name in files:
+                if not valid_entry_name(name):
+                    raise SquashFSError(f"invalid entry name {name!r} in {path}")
+                ino = self.inode(ents[name][0]); out = safe_join(target_dir, name)
+                k = ino.kind
+                if k == FILE:
+                    with SquashFSFile(self, ino) as src, open(out, 'wb') as dst:
+                        while True:
+                            chunk = src.read(self.block_size)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+                elif k == SYMLINK:
+                    os.symlink(ino.target, out)
+                elif k == FIFO:
+                    os.mkfifo(out, ino.perm)
+                elif k in (BLKDEV, CHRDEV):
+                    try:
+                        os.mknod(out, ino.mode, ino.rdev)
+                    except (PermissionError, OSError):
+                        continue  # needs root, like unsquashfs
+                else:
+                    continue  # sockets are not recreated
+                self._apply_meta(out, ino, preserve_owner)
+                count += 1
+        for target_dir, dino in reversed(dir_meta):
+            self._apply_meta(target_dir, dino, preserve_owner); count += 1
+        return count
+
+    @staticmethod
+    def _apply_meta(path: str, ino: Inode, preserve_owner: bool):
+        try:
+            if preserve_owner:
+                os.lchown(path, ino.uid, ino.gid)
+            if ino.kind != SYMLINK:
+                os.chmod(path, ino.perm)
+            os.utime(path, (ino.mtime, ino.mtime), follow_symlinks=False)
+        except (OSError, NotImplementedError):
+            pass
+
+
+class SquashFSFile(io.RawIOBase):
+    """Seekable file object that decompresses blocks on demand."""
+
+    def __init__(self, img: SquashFSImage, ino: Inode):
+        super().__init__()
+        self._img, self._ino = img, ino
+        self._pos = 0
+        self._cache_idx = -1; self._cache = b''
+
+    @property
+    def size(self) -> int:
+        return self._ino.file_size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self._ino.file_size
+        self._pos = max(0, pos)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        size = self._ino.file_size
+        if self._pos >= size:
+            return 0
+        bs = self._img.block_size
+        idx, off = divmod(self._pos, bs)
+        if idx != self._cache_idx:
+            self._cache = self._img._read_block(self._ino, idx); self._cache_idx = idx
+        chunk = self._cache[off:off + min(len(b), size - self._pos)]
+        b[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self._ino.file_size - self._pos
+        out = bytearray()
+        while n > 0:
+            buf = bytearray(min(n, self._img.block_size))
+            got = self.readinto(buf)
+            if not got:
+                break
+            out += buf[:got]; n -= got
+        return bytes(out)
+
+
+def extract_squashfs(image_path: str, dest: str, offset: int = 0) -> Tuple[bool, str]:
+    """In-process replacement for ``unsquashfs -d dest image``. Returns (ok, err)."""
+    try:
+        with SquashFSImage(image_path, offset) as img:
+            img.extract_all(dest)
+        return True, ''
+    except Exception as e:
+        return False, f"native squashfs reader: {e}"
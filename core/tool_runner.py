@@ -0,0 +1,164 @@
+"""Cancellable external tool runner with streamed output and progress.
+
+External tools (unsquashfs, mksquashfs, cramfsck, jefferson, binwalk, ...) run
+as asyncio subprocesses. stdout and stderr are read incrementally and split on
+both newlines and carriage returns: progress bars (``[===|   ] 120/4000  3%``
+as redrawn by unsquashfs / mksquashfs, or a bare ``37%``) become progress
+events, every other line goes to log_func tagged with the tool name (capped at
+LOG_LINES per run; the last lines are kept for the error message).
+
+Timeouts scale with the input: adaptive_timeout(bytes) allows a base plus the
+time to get through the input at MIN_RATE, instead of a fixed 30-180 s that
+kills legitimate extractions of large images.
+
+Cancellation is cooperative: the cancel callable is polled while the tool
+runs; by default it is the core.jobs job running on the calling thread, in
+which case the process group is killed and the job's JobCancelled raised.
+Progress defaults to that job's ctx.progress.
+
+run_tool is synchronous (one event loop per call), so worker threads, e.g.
+several partitions extracting concurrently, can each run their own tools.
+"""
+from __future__ import annotations
+import os, re, time, signal, asyncio
+from collections import deque
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from core.jobs import current_context
+
+LogFunc = Callable[[str], None]
+ProgressFunc = Callable[[int, int, str], None]
+
+__all__ = ['run_tool', 'run_tool_async', 'adaptive_timeout', 'parse_progress', 'MIN_RATE', 'LOG_LINES']
+
+# slowest throughput (input bytes / s) a tool is expected to sustain; slow SBCs may want less
+MIN_RATE = int(os.environ.get('FW_TOOL_MIN_RATE', str(1024 * 1024)))
+LOG_LINES = 200
+_POLL = 0.2
+# Each tool runs in a process group of its own so a timeout / cancel kills its helpers too. core.batch
+# workers set this False: their tools then stay in the worker's group, which the batch parent kills whole.
+OWN_GROUP = True
+
+_SPLIT = re.compile(rb'[\r\n]')
+_BAR = re.compile(r'(\d+)/(\d+)\s+\d{1,3}%\s*$')
+_PCT = re.compile(r'^[\[\]=|/\\\-\s]*(\d{1,3})%\s*$')
+
+
+def adaptive_timeout(input_bytes: int, base: float = 60.0, rate: Optional[int] = None) -> float:
+    """Seconds allowed for a tool processing input_bytes."""
+    return base + max(0, input_bytes) / float(rate or MIN_RATE)
+
+
+def parse_progress(line: str) -> Optional[Tuple[int, int]]:
+    """(done, total) from a progress bar line, (pct, 100) from a bare percentage, else None."""
+    m = _BAR.search(line)
+    if m:
+        return int(m.group(1)), int(m.group(2))
+    m = _PCT.match(line)
+    if m and int(m.group(1)) <= 100:
+        return int(m.group(1)), 100
+    return None
+
+
+def _kill(proc) -> None:
+    try:
+        if not OWN_GROUP:
+            raise OSError('shared process group')
+        os.killpg(proc.pid, signal.SIGKILL)  # binwalk & co. spawn helpers of their own
+    except (OSError, AttributeError):
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def run_tool_async(cmd: Sequence[str], log_func: LogFunc = lambda m: None, timeout: Optional[float] = None,
+                         progress: Optional[ProgressFunc] = None, cancel: Optional[Callable[[], bool]] = None,
+                         tag: Optional[str] = None, cwd: Optional[str] = None) -> Tuple[bool, str]:
+    """Run cmd to completion; (True, '') on exit status 0, else (False, reason with the last output lines)."""
+    tag = tag or os.path.basename(cmd[0])
+    ctx = current_context()
+    if cancel is None and ctx is not None:
+        cancel = lambda: ctx.cancelled
+    if progress is None and ctx is not None:
+        progress = ctx.progress
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.DEVNULL,
+                                                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                    cwd=cwd, start_new_session=OWN_GROUP)
+    except OSError as e:
+        return False, f"{tag}: {e}"
+    pending: List[str] = []
+    tail: deque = deque(maxlen=10)
+    logged = 0
+    last = None
+
+    async def _pump(stream) -> None:
+        buf = b''
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            *lines, buf = _SPLIT.split(buf + chunk)
+            pending.extend(l.decode('utf-8', 'replace') for l in lines)
+        if buf:
+            pending.append(buf.decode('utf-8', 'replace'))
+
+    async def _finish() -> int:
+        await asyncio.gather(_pump(proc.stdout), _pump(proc.stderr))
+        return await proc.wait()
+
+    def _drain() -> None:
+        nonlocal logged, last
+        lines = pending[:]
+        del pending[:len(lines)]
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            p = parse_progress(line)
+            if p is not None:
+                if progress and p != last:
+                    last = p
+                    progress(p[0], p[1], tag)
+                continue
+            tail.append(line)
+            if logged < LOG_LINES:
+                logged += 1
+                log_func(f"[{tag}] {line}" if logged < LOG_LINES else f"[{tag}] ... (ไม่แสดง output ที่เหลือ)")
+
+    t0 = time.monotonic()
+    done = asyncio.ensure_future(_finish())
+    reason = ''
+    try:
+        while True:
+            finished, _ = await asyncio.wait({done}, timeout=_POLL)
+            _drain()
+            if finished:
+                break
+            if cancel and cancel():
+                reason = 'cancelled'
+                break
+            if timeout and time.monotonic() - t0 > timeout:
+                reason = f"timeout หลัง {timeout:.0f}s"
+                break
+    finally:
+        if not done.done():
+            _kill(proc)
+            await done  # pipes hit EOF once the process group is gone
+    if reason == 'cancelled' and ctx is not None:
+        ctx.check()
+    if reason:
+        log_func(f"[{tag}] {reason}")
+        return False, f"{tag}: {reason}"
+    rc = done.result()
+    if rc != 0:
+        return False, f"{tag} exit {rc}: " + ' | '.join(tail)
+    return True, ''
+
+
+def run_tool(cmd: Sequence[str], log_func: LogFunc = lambda m: None, timeout: Optional[float] = None,
+             progress: Optional[ProgressFunc] = None, cancel: Optional[Callable[[], bool]] = None,
+             tag: Optional[str] = None, cwd: Optional[str] = None) -> Tuple[bool, str]:
+    """Blocking wrapper around run_tool_async for use from (worker) threads."""
+    return asyncio.run(run_tool_async(cmd, log_func, timeout, progress, cancel, tag, cwd))
@@ -0,0 +1,152 @@
+"""Metadata-first diff building blocks for extracted rootfs trees.
+
+Every entry (files, directories, symlinks, device nodes) is compared on
+lstat metadata first: type, size, permission bits, owner, group and symlink
+target. Regular files whose sizes match are handed back to the caller to
+settle by content; core.cas_store.diff_manifests does that by comparing the
+hashes already recorded in its manifests, so no file is read.
+
+Results stream as they are decided: write_report writes entries to a JSON
+Lines report without any cap.
+"""
+from __future__ import annotations
+import os, json, stat
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+# (kind, size, mode bits, uid, gid, symlink target or rdev, mtime_ns for trees / sha256 for manifests)
+Meta = Tuple[str, int, int, int, int, Any, int]
+
+__all__ = ['scan_tree', 'diff_metadata', 'make_entry', 'write_report', 'format_entry']
+
+
+def _kind(mode: int) -> str:
+    if stat.S_ISREG(mode):
+        return 'file'
+    if stat.S_ISDIR(mode):
+        return 'dir'
+    if stat.S_ISLNK(mode):
+        return 'symlink'
+    if stat.S_ISCHR(mode) or stat.S_ISBLK(mode):
+        return 'device'
+    return 'other'
+
+
+def scan_tree(root: str) -> Dict[str, Meta]:
+    """Map of 'relative/path' -> Meta for everything below root (lstat only, no reads)."""
+    out: Dict[str, Meta] = {}
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel) if rel else root)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                r = f"{rel}/{e.name}" if rel else e.name
+                try:
+                    st = e.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                kind = _kind(st.st_mode)
+                extra: Any = None
+                if kind == 'symlink':
+                    try:
+                        extra = os.readlink(e.path)
+                    except OSError:
+                        extra = '?'
+                elif kind == 'device':
+                    extra = st.st_rdev
+                out[r] = (kind, st.st_size if kind == 'file' else 0, stat.S_IMODE(st.st_mode),
+                          st.st_uid, st.st_gid, extra, st.st_mtime_ns)
+                if kind == 'dir':
+                    stack.append(r)
+    return out
+
+
+def _meta_dict(m: Meta) -> Dict[str, Any]:
+    d = {'type': m[0], 'mode': f"{m[2]:04o}", 'uid': m[3], 'gid': m[4]}
+    if m[0] == 'file':
+        d['size'] = m[1]
+    elif m[0] == 'symlink':
+        d['target'] = m[5]
+    elif m[0] == 'device':
+        d['rdev'] = m[5]
+    return d
+
+
+def make_entry(rel: str, status: str, old: Optional[Meta], new: Optional[Meta], changes=()) -> Dict[str, Any]:
+    e: Dict[str, Any] = {'path': rel, 'status': status, 'changes': list(changes)}
+    if old:
+        e['old'] = _meta_dict(old)
+    if new:
+        e['new'] = _meta_dict(new)
+    m = new or old
+    e['exec'] = bool(m and m[0] == 'file' and m[2] & 0o111)
+    return e
+
+
+def diff_metadata(old: Dict[str, Meta], new: Dict[str, Meta], stats: Dict[str, int],
+                  pending: List[Tuple[str, Meta, Meta, List[str]]]) -> Iterator[Dict[str, Any]]:
+    """Yield the differences decidable from metadata alone.
+
+    Same-type, same-size regular files are appended to pending as (rel, old, new, changes)
+    for the caller to settle by content.
+    """
+    for rel in sorted(old.keys() | new.keys()):
+        a, b = old.get(rel), new.get(rel)
+        if b is None:
+            stats['removed'] += 1
+            yield make_entry(rel, 'removed', a, None)
+            continue
+        if a is None:
+            stats['added'] += 1
+            yield make_entry(rel, 'added', None, b)
+            continue
+        if a[0] != b[0]:
+            stats['changed'] += 1
+            yield make_entry(rel, 'changed', a, b, ['type'])
+            continue
+        changes = [f for f, i in (('mode', 2), ('uid', 3), ('gid', 4)) if a[i] != b[i]]
+        if a[0] == 'symlink' and a[5] != b[5]:
+            changes.append('target')
+        elif a[0] == 'device' and a[5] != b[5]:
+            changes.append('rdev')
+        elif a[0] == 'file':
+            if a[1] != b[1]:
+                changes.append('size')
+            else:
+                pending.append((rel, a, b, changes))
+                continue
+        if changes:
+            stats['changed'] += 1
+            yield make_entry(rel, 'changed', a, b, changes)
+        else:
+            stats['unchanged'] += 1
+
+
+def write_report(entries: Iterable[Dict[str, Any]], report_path: str) -> int:
+    """Stream entries to report_path as JSON Lines (renamed into place when complete); returns the count."""
+    n = 0
+    tmp = f"{report_path}.{os.getpid()}.part"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for e in entries:
+                f.write(json.dumps(e, ensure_ascii=False) + '\n')
+                n += 1
+        os.replace(tmp, report_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return n
+
+
+def format_entry(e: Dict[str, Any]) -> str:
+    """One report line: '+ path', '- path' or '* path [content, mode 0755->0777]'."""
+    if e['status'] == 'added':
+        return f"+ {e['path']}"
+    if e['status'] == 'removed':
+        return f"- {e['path']}"
+    detail = [f"{c} {e['old'][c]}->{e['new'][c]}" if c in e['old'] and c in e['new'] else c
+              for c in e['changes']]
+    return f"* {e['path']} [{', '.join(detail)}]"
@@ -0,0 +1,702 @@
+"""Read-only UBI container and UBIFS reader (pure Python).
+
+UBI: the physical erase-block size is detected from the spacing of erase
+counter headers, then every PEB's EC / VID header pair is read once to build
+a (volume, LEB) -> PEB map (the copy with the highest sqnum wins). Volume
+names come from the layout volume, so listing volumes costs one pass over the
+headers and no payload reads.
+
+UBIFS: volumes are exposed through the same lazy path API as the squashfs and
+jffs2 readers. The committed index B-tree is walked once (index nodes only);
+inode, dirent and data nodes are read and decompressed when a path is
+actually used. zlib is handled by the standard library, lzo / zstd need the
+optional ``python-lzo`` / ``zstandard`` modules. Uncommitted journal contents
+are not replayed (images produced by mkfs.ubifs are fully committed).
+
+Non-UBIFS volumes (e.g. an OpenWrt squashfs ``rootfs`` volume) can be opened
+as a seekable file object and handed to SquashFSImage directly.
+"""
+from __future__ import annotations
+import io, os, re, mmap, stat, math, struct, zlib, posixpath, threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Iterator, Tuple, Any, Union
+
+from core.file_utils import valid_entry_name, safe_join
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+try:
+    import lzo as _lzo
+except ImportError:
+    _lzo = None
+
+__all__ = ['UBIImage', 'UBIVolume', 'UBIVolumeFile', 'UBIFSVolume', 'UBIError', 'detect_peb_size', 'extract_ubi',
+           'UBI_EC_MAGIC', 'UBI_VID_MAGIC', 'UBIFS_NODE_MAGIC']
+
+UBI_EC_MAGIC = b'UBI#'
+UBI_VID_MAGIC = b'UBI!'
+UBI_LAYOUT_VOLUME_ID = 0x7FFFEFFF
+UBI_VTBL_RECORD_SIZE = 172
+UBI_MAX_VOLUMES = 128
+UBI_STATIC_VOLUME = 2
+
+UBIFS_NODE_MAGIC = 0x06101831
+UBIFS_ROOT_INO = 1
+UBIFS_BLOCK_SIZE = 4096
+UBIFS_INO_NODE, UBIFS_DATA_NODE, UBIFS_DENT_NODE = 0, 1, 2
+UBIFS_PAD_NODE, UBIFS_SB_NODE, UBIFS_MST_NODE, UBIFS_IDX_NODE = 5, 6, 7, 9
+UBIFS_INO_KEY, UBIFS_DATA_KEY, UBIFS_DENT_KEY = 0, 1, 2
+UBIFS_COMPR_NONE, UBIFS_COMPR_LZO, UBIFS_COMPR_ZLIB, UBIFS_COMPR_ZSTD = 0, 1, 2, 3
+
+_EC = struct.Struct('>4sB3xQIII32xI')
+_VID = struct.Struct('>4sBBBBII4xIIII4xQ12xI')
+_VTBL = struct.Struct('>IIIBBH128sB23xI')
+_CH = struct.Struct('<IIQIBB2x')
+_INO = struct.Struct('<16sQQQQQIIIIIIIIIII4xIH26x')
+_DENT = struct.Struct('<16sQxBHI')
+_DATA = struct.Struct('<16sIHH')
+_BRANCH = struct.Struct('<III8s')
+_SB = struct.Struct('<2xBBIIIIIQIIIIIIIH')
+_EC_RE = re.compile(re.escape(UBI_EC_MAGIC))
+
+_ITYPE_MODE = {0: stat.S_IFREG, 1: stat.S_IFDIR, 2: stat.S_IFLNK, 3: stat.S_IFBLK,
+               4: stat.S_IFCHR, 5: stat.S_IFIFO, 6: stat.S_IFSOCK}
+_TYPE_NAME = {stat.S_IFDIR: 'dir', stat.S_IFREG: 'file', stat.S_IFLNK: 'symlink', stat.S_IFBLK: 'blockdev',
+              stat.S_IFCHR: 'chardev', stat.S_IFIFO: 'fifo', stat.S_IFSOCK: 'socket'}
+
+
+class UBIError(Exception):
+    pass
+
+
+def _crc(data) -> int:
+    # UBI / UBIFS: crc32 seeded with 0xFFFFFFFF, no final inversion
+    return zlib.crc32(data) ^ 0xFFFFFFFF
+
+
+def _ec_valid(buf, pos: int) -> bool:
+    hdr = buf[pos:pos + 64]
+    return len(hdr) == 64 and hdr[:4] == UBI_EC_MAGIC and _EC.unpack(hdr)[-1] == _crc(hdr[:60])
+
+
+def detect_peb_size(buf, start: int = 0, end: Optional[int] = None, sample: int = 64) -> int:
+    """Physical erase-block size from the spacing of the first valid EC headers (0 if unknown)."""
+    end = len(buf) if end is None else end
+    positions = []
+    for m in _EC_RE.finditer(buf, start, min(end, start + 64 * 1024 * 1024)):
+        if _ec_valid(buf, m.start()):
+            positions.append(m.start() - start)
+            if len(positions) >= sample:
+                break
+    if len(positions) < 2:
+        return (end - start) if positions == [0] else 0
+    g = 0
+    for p in positions[1:]:
+        g = math.gcd(g, p - positions[0])
+    return g
+
+
+class UBIVolume:
+    """One UBI volume: an ordered list of LEBs backed by PEBs in the image."""
+
+    def __init__(self, image: 'UBIImage', vol_id: int, name: str = '', vol_type: int = 1,
+                 reserved_pebs: int = 0, data_pad: int = 0):
+        self.image = image
+        self.id = vol_id
+        self.name = name or f'vol{vol_id}'
+        self.vol_type = vol_type
+        self.reserved_pebs = reserved_pebs
+        self.leb_size = image.leb_size - data_pad
+        self.lebs: Dict[int, Tuple[int, int]] = {}  # lnum -> (data position, data_size)
+
+    @property
+    def leb_count(self) -> int:
+        return max(self.lebs) + 1 if self.lebs else 0
+
+    @property
+    def size(self) -> int:
+        if self.vol_type == UBI_STATIC_VOLUME and self.lebs:
+            return sum(ds for _, ds in self.lebs.values())
+        return self.leb_count * self.leb_size
+
+    def read_leb(self, lnum: int) -> bytes:
+        ent = self.lebs.get(lnum)
+        if ent is None:
+            return b'\xff' * self.leb_size  # unmapped LEBs read as erased flash
+        pos, data_size = ent
+        n = data_size if self.vol_type == UBI_STATIC_VOLUME else self.leb_size
+        return bytes(self.image._buf[pos:pos + n])
+
+    def read(self, pos: int, n: int) -> bytes:
+        n = min(n, self.size - pos)
+        out = bytearray()
+        while n > 0:
+            lnum, off = divmod(pos, self.leb_size)
+            take = min(n, self.leb_size - off)
+            ent = self.lebs.get(lnum)
+            out += self.image._buf[ent[0] + off:ent[0] + off + take] if ent else b'\xff' * take
+            pos += take; n -= take
+        return bytes(out)
+
+    def open(self) -> 'UBIVolumeFile':
+        return UBIVolumeFile(self)
+
+    def dump(self, out_path: str) -> int:
+        """Write the volume contents to out_path; returns bytes written."""
+        total = 0
+        with open(out_path, 'wb') as f:
+            for lnum in range(self.leb_count):
+                data = self.read_leb(lnum)
+                f.write(data); total += len(data)
+        return total
+
+    def magic(self) -> bytes:
+        return self.read(0, 4)
+
+    def is_ubifs(self) -> bool:
+        return self.magic() == struct.pack('<I', UBIFS_NODE_MAGIC)
+
+    def ubifs(self) -> 'UBIFSVolume':
+        return UBIFSVolume(self)
+
+
+class UBIVolumeFile(io.RawIOBase):
+    """Seekable read-only file over a UBI volume (usable as SquashFSImage source)."""
+
+    def __init__(self, vol: UBIVolume):
+        super().__init__()
+        self.vol = vol
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += self.vol.size
+        self.pos = max(0, pos)
+        return self.pos
+
+    def readinto(self, b) -> int:
+        data = self.vol.read(self.pos, len(b))
+        b[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+
+class UBIImage:
+    """UBI container (optionally a slice of a larger firmware file)."""
+
+    def __init__(self, source, offset: int = 0, size: Optional[int] = None, peb_size: Optional[int] = None):
+        self._mm = None
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                total = os.fstat(f.fileno()).st_size
+                if not total:
+                    raise UBIError('empty image')
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._buf = self._mm
+        else:
+            source.seek(0)
+            self._buf = source.read()
+            total = len(self._buf)
+        self.start = offset
+        self.end = min(total, offset + size) if size is not None else total
+        if not _ec_valid(self._buf, self.start):
+            raise UBIError('no UBI erase counter header at image start')
+        _, _, _, self.vid_hdr_offset, self.data_offset, self.image_seq, _ = _EC.unpack(
+            self._buf[self.start:self.start + 64])
+        self.peb_size = peb_size or detect_peb_size(self._buf, self.start, self.end)
+        if self.peb_size <= self.data_offset:
+            raise UBIError(f"cannot determine PEB size (got {self.peb_size})")
+        self.leb_size = self.peb_size - self.data_offset
+        self.stats = {'pebs': 0, 'mapped': 0, 'bad_hdr': 0}
+        self.volumes: Dict[int, UBIVolume] = {}
+        self._scan()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close(); self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _scan(self) -> None:
+        buf = self._buf
+        best: Dict[Tuple[int, int], Tuple[int, int, int, int, int]] = {}
+        for peb in range(self.start, self.end - self.data_offset + 1, self.peb_size):
+            self.stats['pebs'] += 1
+            if buf[peb:peb + 4] != UBI_EC_MAGIC:
+                continue  # erased / bad block
+            vpos = peb + self.vid_hdr_offset
+            vid = buf[vpos:vpos + 64]
+            if vid[:4] != UBI_VID_MAGIC:
+                continue  # free PEB
+            f = _VID.unpack(vid)
+            if f[-1] != _crc(vid[:60]):
+                self.stats['bad_hdr'] += 1
+                continue
+            _, _, vol_type, copy_flag, compat, vol_id, lnum, data_size, used_ebs, data_pad, data_crc, sqnum, _ = f
+            key = (vol_id, lnum)
+            if key not in best or sqnum > best[key][0]:
+                best[key] = (sqnum, peb + self.data_offset, data_size, vol_type, data_pad)
+        self.stats['mapped'] = len(best)
+        layout = {lnum: v for (vid, lnum), v in best.items() if vid == UBI_LAYOUT_VOLUME_ID}
+        records = self._volume_table(layout.get(0))
+        for (vid, lnum), (sqnum, pos, data_size, vol_type, data_pad) in sorted(best.items()):
+            if vid == UBI_LAYOUT_VOLUME_ID:
+                continue
+            vol = self.volumes.get(vid)
+            if vol is None:
+                rec = records.get(vid, {})
+                vol = self.volumes[vid] = UBIVolume(self, vid, rec.get('name', ''), rec.get('vol_type', vol_type),
+                                                    rec.get('reserved_pebs', 0), data_pad)
+            vol.lebs[lnum] = (pos, data_size)
+
+    def _volume_table(self, entry) -> Dict[int, Dict[str, Any]]:
+        if entry is None:
+            return {}
+        pos = entry[1]
+        out = {}
+        for i in range(min(UBI_MAX_VOLUMES, self.leb_size // UBI_VTBL_RECORD_SIZE)):
+            rec = self._buf[pos + i * UBI_VTBL_RECORD_SIZE:pos + (i + 1) * UBI_VTBL_RECORD_SIZE]
+            if len(rec) < UBI_VTBL_RECORD_SIZE:
+                break
+            reserved, alignment, data_pad, vol_type, upd_marker, name_len, name, flags, crc = _VTBL.unpack(rec)
+            if not reserved or crc != _crc(rec[:-4]):
+                continue
+            out[i] = {'name': name[:name_len].decode('utf-8', 'replace'), 'vol_type': vol_type,
+                      'reserved_pebs': reserved}
+        return out
+
+    def list_volumes(self) -> List[Dict[str, Any]]:
+        return [{'id': v.id, 'name': v.name, 'type': 'static' if v.vol_type == UBI_STATIC_VOLUME else 'dynamic',
+                 'lebs': len(v.lebs), 'size': v.size, 'ubifs': v.is_ubifs()} for v in self.volumes.values()]
+
+    def volume(self, key: Union[int, str]) -> UBIVolume:
+        if isinstance(key, int):
+            if key in self.volumes:
+                return self.volumes[key]
+        else:
+            for v in self.volumes.values():
+                if v.name == key:
+                    return v
+        raise KeyError(key)
+
+    def rootfs_volume(self) -> Optional[UBIVolume]:
+        """Most likely root filesystem: a volume named rootfs/root/system, else the largest UBIFS one."""
+        vols = list(self.volumes.values())
+        for name in ('rootfs', 'root', 'system', 'ubi_rootfs'):
+            for v in vols:
+                if v.name == name:
+                    return v
+        ubifs = [v for v in vols if v.is_ubifs()]
+        return max(ubifs or vols, key=lambda v: v.size) if vols else None
+
+
+def _decompress(compr: int, data: bytes, out_size: int) -> bytes:
+    if compr == UBIFS_COMPR_NONE:
+        return data
+    if compr == UBIFS_COMPR_ZLIB:
+        return zlib.decompress(data, -15)  # raw deflate
+    if compr == UBIFS_COMPR_LZO:
+        if _lzo is None:
+            raise UBIError("lzo compression requires the 'python-lzo' module")
+        return _lzo.decompress(data, False, out_size)
+    if compr == UBIFS_COMPR_ZSTD:
+        if _zstd is None:
+            raise UBIError("zstd compression requires the 'zstandard' module")
+        return _zstd.ZstdDecompressor().decompress(data, max_output_size=out_size)
+    raise UBIError(f"unsupported ubifs compression {compr}")
+
+
+class _Ino:
+    __slots__ = ('ino_ref', 'dents', 'blocks', '_meta')
+
+    def __init__(self):
+        self.ino_ref = None
+        self.dents: List[Tuple[int, int, int]] = []
+        self.blocks: List[Tuple[int, Tuple[int, int, int]]] = []
+        self._meta = None
+
+
+class UBIFSVolume:
+    """Lazy path-level view over a UBIFS volume."""
+
+    def __init__(self, vol: UBIVolume, cache_lebs: int = 64):
+        self.vol = vol
+        self._leb_cache: 'OrderedDict[int, bytes]' = OrderedDict()
+        self._cache_lebs = cache_lebs
+        self._cache_lock = threading.Lock()  # extract_all reads from a thread pool
+        sb = self._node(0, 0)
+        if sb[20] != UBIFS_SB_NODE:
+            raise UBIError('UBIFS superblock node not found')
+        f = _SB.unpack_from(sb, 24)
+        self.sb = {'key_hash': f[0], 'key_fmt': f[1], 'min_io_size': f[3], 'leb_size': f[4],
+                   'leb_cnt': f[5], 'fmt_version': f[14], 'default_compr': f[15]}
+        self.master = self._master()
+        self._index: Optional[Dict[int, _Ino]] = None
+
+    # ---- raw nodes ----
+    def _leb(self, lnum: int) -> bytes:
+        with self._cache_lock:
+            data = self._leb_cache.get(lnum)
+            if data is not None:
+                self._leb_cache.move_to_end(lnum)
+                return data
+        data = self.vol.read_leb(lnum)
+        with self._cache_lock:
+            self._leb_cache[lnum] = data
+            self._leb_cache.move_to_end(lnum)
+            if len(self._leb_cache) > self._cache_lebs:
+                self._leb_cache.popitem(last=False)
+        return data
+
+    def _node(self, lnum: int, offs: int, length: Optional[int] = None) -> bytes:
+        leb = self._leb(lnum)
+        if offs + 24 > len(leb):
+            raise UBIError(f"node out of range at {lnum}:{offs}")
+        magic, crc, sqnum, nlen, ntype, group = _CH.unpack_from(leb, offs)
+        if magic != UBIFS_NODE_MAGIC:
+            raise UBIError(f"bad node magic at {lnum}:{offs}")
+        node = leb[offs:offs + nlen]
+        if len(node) != nlen or _crc(node[8:]) != crc:
+            raise UBIError(f"node crc mismatch at {lnum}:{offs}")
+        return node
+
+    def _master(self) -> Dict[str, int]:
+        """Newest valid master node of the two master LEBs (1 and 2).
+
+        Every master is written in its own min_io_size unit, the rest of the
+        unit filled by a pad node or, when too small for one, 0xCE bytes; the
+        scan follows pad nodes and otherwise resumes at the next unit.
+        """
+        best = None
+        unit = max(8, self.sb['min_io_size'])
+        for lnum in (1, 2):
+            leb = self._leb(lnum)
+            offs = 0
+            while offs + 24 <= len(leb):
+                magic, crc, sqnum, nlen, ntype, group = _CH.unpack_from(leb, offs)
+                if magic == UBIFS_NODE_MAGIC and 24 <= nlen <= len(leb) - offs:
+                    if ntype == UBIFS_PAD_NODE and nlen >= 28:
+                        offs += nlen + struct.unpack_from('<I', leb, offs + 24)[0]
+                        continue
+                    if ntype == UBIFS_MST_NODE and _crc(leb[offs + 8:offs + nlen]) == crc and (best is None or sqnum > best[0]):
+                        best = (sqnum, lnum, offs)
+                    offs += (nlen + 7) & ~7
+                elif leb[offs:offs + 4] == b'\xff\xff\xff\xff':
+                    break  # erased: LEBs are written sequentially, nothing follows
+                else:
+                    offs = (offs // unit + 1) * unit
+        if best is None:
+            raise UBIError('UBIFS master node not found')
+        node = self._node(best[1], best[2])
+        highest_inum, cmt_no, flags, log_lnum, root_lnum, root_offs, root_len = struct.unpack_from('<QQIIIII', node, 24)
+        return {'highest_inum': highest_inum, 'cmt_no': cmt_no, 'root_lnum': root_lnum,
+                'root_offs': root_offs, 'root_len': root_len}
+
+    def _build_index(self) -> Dict[int, _Ino]:
+        if self._index is not None:
+            return self._index
+        index: Dict[int, _Ino] = {}
+        stack = [(self.master['root_lnum'], self.master['root_offs'])]
+        seen = set()
+        while stack:
+            lnum, offs = stack.pop()
+            if (lnum, offs) in seen:
+                continue
+            seen.add((lnum, offs))
+            node = self._node(lnum, offs)
+            if node[20] != UBIFS_IDX_NODE:
+                raise UBIError(f"expected index node at {lnum}:{offs}")
+            child_cnt, level = struct.unpack_from('<HH', node, 24)
+            for i in range(child_cnt):
+                blnum, boffs, blen, key = _BRANCH.unpack_from(node, 28 + i * _BRANCH.size)
+                if level:
+                    stack.append((blnum, boffs))
+                    continue
+                inum, lo = struct.unpack('<II', key)
+                ktype = lo >> 29
+                ent = index.get(inum)
+                if ent is None:
+                    ent = index[inum] = _Ino()
+                ref = (blnum, boffs, blen)
+                if ktype == UBIFS_INO_KEY:
+                    ent.ino_ref = ref
+                elif ktype == UBIFS_DENT_KEY:
+                    ent.dents.append(ref)
+                elif ktype == UBIFS_DATA_KEY:
+                    ent.blocks.append((lo & 0x1FFFFFFF, ref))
+        self._index = index
+        return index
+
+    def _ino(self, inum: int) -> _Ino:
+        ent = self._build_index().get(inum)
+        if ent is None:
+            raise FileNotFoundError(f"inode {inum}")
+        return ent
+
+    def inode(self, inum: int) -> Dict[str, Any]:
+        ent = self._ino(inum)
+        if ent._meta is None:
+            if ent.ino_ref is None:
+                raise UBIError(f"inode node missing for {inum}")
+            node = self._node(*ent.ino_ref[:2])
+            f = _INO.unpack_from(node, 24)
+            (key, creat_sqnum, size, atime, ctime, mtime, atime_ns, ctime_ns, mtime_ns, nlink, uid, gid,
+             mode, flags, data_len, xattr_cnt, xattr_size, xattr_names, compr_type) = f
+            ent._meta = {'size': size, 'mtime': mtime, 'nlink': nlink, 'uid': uid, 'gid': gid, 'mode': mode,
+                         'compr_type': compr_type, 'data': bytes(node[160:160 + data_len])}
+        return ent._meta
+
+    def _entries(self, inum: int) -> Dict[str, Tuple[int, int]]:
+        out = {}
+        for ref in self._ino(inum).dents:
+            node = self._node(*ref[:2])
+            key, target, itype, nlen, cookie = _DENT.unpack_from(node, 24)
+            name = bytes(node[56:56 + nlen]).decode('utf-8', 'surrogateescape')
+            if valid_entry_name(name):  # '..', '/' or NUL only appear in crafted images
+                out[name] = (target, itype)
+        return out
+
+    def inode_data(self, inum: int) -> bytes:
+        meta = self.inode(inum)
+        size = meta['size']
+        buf = bytearray(size)
+        for block, ref in self._ino(inum).blocks:
+            start = block * UBIFS_BLOCK_SIZE
+            if start >= size:
+                continue
+            node = self._node(*ref[:2])
+            key, dsize, compr, _ = _DATA.unpack_from(node, 24)
+            chunk = _decompress(compr, bytes(node[48:]), dsize)[:min(dsize, size - start)]
+            buf[start:start + len(chunk)] = chunk
+        return bytes(buf)
+
+    # ---- paths (same API as SquashFSImage / JFFS2Image) ----
+    def _mode(self, inum: int) -> int:
+        return self.inode(inum)['mode']
+
+    def _resolve(self, path: str, follow_symlinks: bool = True, _depth: int = 0) -> int:
+        if _depth > 40:
+            raise UBIError(f"too many symlink levels: {path}")
+        parts = [p for p in posixpath.normpath('/' + path).split('/') if p]
+        inum = UBIFS_ROOT_INO; walked: List[str] = []
+        for i, name in enumerate(parts):
+            if not stat.S_ISDIR(self._mode(inum)):
+                raise NotADirectoryError(path)
+            entry = self._entries(inum).get(name)
+            if entry is None:
+                raise FileNotFoundError(path)
+            child = entry[0]
+            last = i == len(parts) - 1
+            if stat.S_ISLNK(self._mode(child)) and (follow_symlinks or not last):
+                target = self.inode(child)['data'].decode('utf-8', 'surrogateescape')
+                target = target if target.startswith('/') else posixpath.join('/', *walked, target)
+                return self._resolve(posixpath.join(target, *parts[i + 1:]), follow_symlinks, _depth + 1)
+            walked.append(name); inum = child
+        return inum
+
+    def exists(self, path: str) -> bool:
+        try:
+            self._resolve(path, follow_symlinks=False); return True
+        except (FileNotFoundError, NotADirectoryError, UBIError):
+            return False
+
+    def isdir(self, path: str) -> bool:
+        try:
+            return stat.S_ISDIR(self._mode(self._resolve(path)))
+        except (FileNotFoundError, NotADirectoryError, UBIError):
+            return False
+
+    def stat(self, path: str, follow_symlinks: bool = False) -> Dict[str, Any]:
+        inum = self._resolve(path, follow_symlinks)
+        m = self.inode(inum)
+        fmt = stat.S_IFMT(m['mode'])
+        return {'type': _TYPE_NAME.get(fmt, 'file'), 'mode': m['mode'], 'uid': m['uid'], 'gid': m['gid'],
+                'mtime': m['mtime'], 'size': m['size'] if fmt in (stat.S_IFREG, stat.S_IFLNK) else 0,
+                'nlink': m['nlink'], 'inode': inum,
+                'target': m['data'].decode('utf-8', 'surrogateescape') if fmt == stat.S_IFLNK else '',
+                'rdev': self._rdev(m) if fmt in (stat.S_IFBLK, stat.S_IFCHR) else 0}
+
+    def listdir(self, path: str = '/') -> List[str]:
+        inum = self._resolve(path)
+        if not stat.S_ISDIR(self._mode(inum)):
+            raise NotADirectoryError(path)
+        return sorted(self._entries(inum))
+
+    def readlink(self, path: str) -> str:
+        inum = self._resolve(path, follow_symlinks=False)
+        m = self.inode(inum)
+        if not stat.S_ISLNK(m['mode']):
+            raise UBIError(f"not a symlink: {path}")
+        return m['data'].decode('utf-8', 'surrogateescape')
+
+    def walk(self, top: str = '/') -> Iterator[Tuple[str, List[str], List[str]]]:
+        """os.walk-style traversal (top-down, symlinks not followed)."""
+        stack = [(posixpath.normpath('/' + top), self._resolve(top))]
+        seen = set()
+        while stack:
+            path, dino = stack.pop()
+            if dino in seen:
+                continue  # corrupt images can contain directory loops
+            seen.add(dino)
+            ents = self._entries(dino)
+            dirs, files = [], []
+            for name, (child, itype) in sorted(ents.items()):
+                (dirs if itype == 1 else files).append(name)
+            yield path, dirs, files
+            for name in reversed(dirs):
+                stack.append((posixpath.join(path, name), ents[name][0]))
+
+    def read(self, path: str) -> bytes:
+        inum = self._resolve(path)
+        mode = self._mode(inum)
+        if stat.S_ISDIR(mode):
+            raise IsADirectoryError(path)
+        if not stat.S_ISREG(mode):
+            raise UBIError(f"not a regular file: {path}")
+        return self.inode_data(inum)
+
+    @staticmethod
+    def _rdev(meta) -> int:
+        raw = meta['data']
+        if len(raw) == 4:  # new_encode_dev
+            v, = struct.unpack('<I', raw)
+            return os.makedev((v & 0xFFF00) >> 8, (v & 0xFF) | ((v >> 12) & 0xFFF00))
+        if len(raw) == 8:  # huge_encode_dev
+            v, = struct.unpack('<Q', raw)
+            return os.makedev((v & 0xFFF00) >> 8, (v & 0xFF) | ((v >> 12) & 0xFFF00))
+        return 0
+
+    def extract_all(self, dest: str, workers: Optional[int] = None, preserve_owner: bool = False) -> int:
+        """Unpack the volume into dest. Returns entries written.
+
+        Entry names are validated and every output path is checked with
+        safe_join right before it is created. At most two decompressed files
+        per worker are held in memory at once.
+        """
+        dir_meta: List[Tuple[str, int]] = []
+        files: List[Tuple[int, str]] = []        # (inum, path relative to dest)
+        others: List[Tuple[int, str]] = []
+        first_path: Dict[int, str] = {}
+        links: List[Tuple[str, str]] = []
+        for path, dirs, names in self.walk('/'):
+            dino = self._resolve(path)
+            target_dir = safe_join(dest, path.lstrip('/'))
+            os.makedirs(target_dir, exist_ok=True)
+            dir_meta.append((target_dir, dino))
+            ents = self._entries(dino)
+            for name in names:
+                if not valid_entry_name(name):
+                    raise UBIError(f"invalid entry name {name!r} in {path}")
+                inum, itype = ents[name]
+                rel = posixpath.join(path.lstrip('/'), name)
+                if itype == 0:
+                    if inum in first_path:
+                        links.append((first_path[inum], rel))
+                    else:
+                        first_path[inum] = rel
+                        files.append((inum, rel))
+                else:
+                    others.append((inum, rel))
+        # decompression runs in the pool; writes stay in order on this thread
+        n_workers = workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            pending = deque()
+            jobs = iter(files)
+            while True:
+                for inum, rel in jobs:
+                    pending.append((pool.submit(self.inode_data, inum), inum, rel))
+                    if len(pending) >= n_workers * 2:
+                        break
+                if not pending:
+                    break
+                fut, inum, rel = pending.popleft()
+                out = safe_join(dest, rel)
+                with open(out, 'wb') as f:
+                    f.write(fut.result())
+                self._apply_meta(out, inum, preserve_owner)
+        count = len(files)
+        for src_rel, rel in links:
+            src, out = safe_join(dest, src_rel), safe_join(dest, rel)
+            try:
+                os.link(src, out)
+            except OSError:
+                with open(src, 'rb') as fs, open(out, 'wb') as fd:
+                    fd.write(fs.read())
+            count += 1
+        for inum, rel in others:
+            m = self.inode(inum)
+            fmt = stat.S_IFMT(m['mode'])
+            out = safe_join(dest, rel)
+            try:
+                if fmt == stat.S_IFLNK:
+                    os.symlink(m['data'].decode('utf-8', 'surrogateescape'), out)
+                elif fmt == stat.S_IFIFO:
+                    os.mkfifo(out, stat.S_IMODE(m['mode']))
+                elif fmt in (stat.S_IFBLK, stat.S_IFCHR):
+                    os.mknod(out, m['mode'], self._rdev(m))
+                else:
+                    continue
+            except (PermissionError, OSError):
+                continue
+            self._apply_meta(out, inum, preserve_owner)
+            count += 1
+        for target_dir, dino in reversed(dir_meta):
+            self._apply_meta(target_dir, dino, preserve_owner); count += 1
+        return count
+
+    def _apply_meta(self, path: str, inum: int, preserve_owner: bool):
+        m = self.inode(inum)
+        try:
+            if preserve_owner:
+                os.lchown(path, m['uid'], m['gid'])
+            if not stat.S_ISLNK(m['mode']):
+                os.chmod(path, stat.S_IMODE(m['mode']))
+            os.utime(path, (m['mtime'], m['mtime']), follow_symlinks=False)
+        except (OSError, NotImplementedError):
+            pass
+
+
+def extract_ubi(image_path: str, dest: str, offset: int = 0, size: Optional[int] = None,
+                volume: Union[int, str, None] = None, log_func=lambda m: None) -> Tuple[bool, str]:
+    """Extract one volume (default: the rootfs volume) into dest. Returns (ok, err).
+
+    UBIFS volumes are unpacked natively; a squashfs volume goes through the
+    native squashfs reader. Other volumes are reported as unsupported.
+    """
+    try:
+        with UBIImage(image_path, offset, size) as ubi:
+            for v in ubi.list_volumes():
+                log_func(f"[UBI] vol {v['id']} '{v['name']}' {v['type']} {v['size']} bytes"
+                         f"{' (ubifs)' if v['ubifs'] else ''}")
+            vol = ubi.volume(volume) if volume is not None else ubi.rootfs_volume()
+            if vol is None:
+                return False, 'native ubi reader: no volumes'
+            if vol.is_ubifs():
+                vol.ubifs().extract_all(dest)
+                return True, ''
+            if vol.magic() in (b'hsqs', b'sqsh'):
+                from core.squashfs_reader import SquashFSImage
+                with SquashFSImage(vol.open()) as img:
+                    img.extract_all(dest)
+                return True, ''
+            return False, f"native ubi reader: volume '{vol.name}' is not ubifs/squashfs"
+    except Exception as e:
+        return False, f"native ubi reader: {e}"
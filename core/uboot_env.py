@@ -3,10 +3,13 @@ from __future__ import annotations
 import os, re, struct, binascii
 from typing import List, Dict, Tuple, Callable
 
+from core.slice_io import clone_file
+
 LogFunc = Callable[[str], None]
 
 __all__ = [
-    'scan_uboot_env','analyze_bootloader_env','patch_uboot_env_bootdelay','patch_uboot_env_vars'
+    'scan_uboot_env','analyze_bootloader_env','patch_uboot_env_bootdelay','patch_uboot_env_vars',
+    'find_compiled_env_tables','patch_compiled_uboot_env','patch_compiled_uboot_bootdelay'
 ]
 
 def scan_uboot_env(fw_path, max_search=0x200000, env_sizes=(0x1000,0x2000,0x4000,0x8000,0x10000), deep: bool=False):
@@ -139,10 +142,8 @@ def patch_uboot_env_bootdelay(src_fw, dst_fw, new_val, log_func: LogFunc=lambda
     new_env_region=kv_bytes+b'\x00'
     new_crc=binascii.crc32(new_env_region) & 0xffffffff
     new_block=struct.pack('<I', new_crc)+new_env_region+data[end_double+2:]
-    with open(src_fw,'rb') as f:
-        whole=f.read()
-    new_whole=whole[:off]+new_block+whole[off+len(new_block):]
-    with open(dst_fw,'wb') as f: f.write(new_whole)
+    clone_file(src_fw, dst_fw)
+    with open(dst_fw,'r+b') as f: f.seek(off); f.write(new_block)
     log_func(f'[UBOOT] bootdelay -> {new_val} (offset 0x{off:X})')
     return True
 
@@ -169,8 +170,122 @@ def patch_uboot_env_vars(src_fw, dst_fw, off, size, updates: dict, log_func: Log
     new_env_region=kv_bytes+b'\x00'
     new_crc=binascii.crc32(new_env_region) & 0xffffffff
     new_block=struct.pack('<I', new_crc)+new_env_region+data[end_double+2:]
-    with open(src_fw,'rb') as f: whole=f.read()
-    new_whole=whole[:off]+new_block+whole[off+len(new_block):]
-    with open(dst_fw,'wb') as f: f.write(new_whole)
+    clone_file(src_fw, dst_fw)
+    with open(dst_fw,'r+b') as f: f.seek(off); f.write(new_block)
     log_func(f'[UBOOT] updated vars: {", ".join(updates.keys())}')
     return True
+
+# ---- Compiled-in default environment (default_environment[] inside U-Boot) ----
+_ENV_ANCHORS=(b'bootdelay=', b'bootcmd=', b'bootargs=')
+
+def _env_segment_ok(seg: bytes) -> bool:
+    if not seg or seg[:1]==b'=' or b'=' not in seg:
+        return False
+    return all(32<=c<127 or c==9 for c in seg)
+
+def find_compiled_env_tables(data, start: int=0, end=None, min_pairs: int=3):
+    """Locate NUL-separated ``k=v\\0...k=v\\0\\0`` tables compiled into a binary.
+
+    Returns list of dicts: offset, end (one past the terminating NUL),
+    capacity (bytes usable in place incl. trailing NUL slack), pairs [(k,v)].
+    Slack is the run of NUL bytes after the terminator, aligned down to 4 so
+    the next object in .rodata is never touched.
+    """
+    end=len(data) if end is None else min(end, len(data))
+    tables={}
+    for anchor in _ENV_ANCHORS:
+        i=start
+        while True:
+            p=data.find(anchor, i, end)
+            if p==-1: break
+            i=p+1
+            if p>start and 32<=data[p-1]<127:
+                continue  # substring of another string (e.g. "setenv bootdelay=")
+            # walk backwards over preceding k=v strings
+            s=p
+            while s-2>=start and data[s-1]==0 and data[s-2]!=0:
+                cand=s-1
+                while cand>start and (32<=data[cand-1]<127 or data[cand-1]==9):
+                    cand-=1
+                if not _env_segment_ok(bytes(data[cand:s-1])): break
+                s=cand
+            if s in tables: continue
+            # walk forward until the double NUL terminator
+            pairs=[]; e=s; term=-1
+            while e<end:
+                nul=data.find(b'\x00', e, end)
+                if nul==-1: break
+                seg=bytes(data[e:nul])
+                if not seg:
+                    term=e; break
+                if not _env_segment_ok(seg): break
+                k,v=seg.split(b'=',1)
+                pairs.append((k.decode(), v.decode(errors='ignore')))
+                e=nul+1
+            if term==-1 or len(pairs)<min_pairs:
+                continue
+            slack_end=term+1
+            while slack_end<end and data[slack_end]==0:
+                slack_end+=1
+            if slack_end<end:
+                slack_end-=slack_end%4
+            table_end=term+1
+            tables[s]={'offset':s,'end':table_end,'capacity':max(slack_end,table_end)-s,'pairs':pairs}
+    return [tables[k] for k in sorted(tables)]
+
+def _apply_env_updates(pairs, updates: dict):
+    """Apply updates ('' or None deletes) keeping original key order; new keys appended."""
+    out=[]; seen=set()
+    for k,v in pairs:
+        if k in updates:
+            seen.add(k); nv=updates[k]
+            if nv is None or nv=='': continue
+            out.append((k,str(nv)))
+        else:
+            out.append((k,v))
+    for k,nv in updates.items():
+        if k not in seen and nv is not None and nv!='':
+            out.append((k,str(nv)))
+    return out
+
+def patch_compiled_uboot_env(src_fw, dst_fw, updates: dict, log_func: LogFunc=lambda m:None, search_limit=None):
+    """Rewrite compiled-in default env tables in place, growing into trailing NUL slack.
+
+    Every table found (within search_limit bytes, None = whole file) is re-serialised
+    with ``updates`` applied and written back with a single positioned write; the
+    rest of the image is untouched. Returns (ok, err) where ok means at least one
+    table was rewritten.
+    """
+    try:
+        with open(src_fw,'rb') as f:
+            data=f.read() if search_limit is None else f.read(search_limit)
+        tables=find_compiled_env_tables(data)
+        if not tables:
+            log_func('[UBOOT] ไม่พบ compiled-in env table'); return False, 'no table'
+        writes=[]
+        for t in tables:
+            new_pairs=_apply_env_updates(t['pairs'], updates)
+            if new_pairs==t['pairs']:
+                continue
+            blob=b''.join(f"{k}={v}".encode()+b'\x00' for k,v in new_pairs)+b'\x00'
+            if len(blob)>t['capacity']:
+                log_func(f"[UBOOT] compiled env @0x{t['offset']:X} ต้องการ {len(blob)} bytes เกิน capacity {t['capacity']} (ข้าม)")
+                continue
+            old_len=t['end']-t['offset']; new_len=len(blob)
+            blob+=b'\x00'*max(0, old_len-new_len)
+            writes.append((t['offset'], blob))
+            log_func(f"[UBOOT] compiled env @0x{t['offset']:X} {old_len}->{new_len} bytes (capacity {t['capacity']}) updates={list(updates)}")
+        if not writes:
+            return False, 'no change'
+        clone_file(src_fw, dst_fw)
+        with open(dst_fw,'r+b') as f:
+            for off,blob in writes:
+                f.seek(off); f.write(blob)
+        return True, ''
+    except Exception as e:
+        log_func(f"[UBOOT] compiled env error: {e}"); return False, str(e)
+
+def patch_compiled_uboot_bootdelay(src_fw, dst_fw, new_val, log_func: LogFunc=lambda m:None, search_limit=0x80000):
+    """Set bootdelay in the compiled-in default env (any digit length). Returns bool."""
+    ok,_=patch_compiled_uboot_env(src_fw, dst_fw, {'bootdelay': str(new_val)}, log_func, search_limit)
+    return ok
@@ -0,0 +1,259 @@
+"""Scratch workspace manager with RAM-backed placement and byte accounting.
+
+Patch / extract / diff operations create throw-away trees (rootfs.bin, the
+unpacked rootfs, the repacked image). When a tmpfs such as /dev/shm has room
+within the configured budget the workspace is placed there, so unpack and
+repack are not bound by disk latency; otherwise it falls back to the normal
+temp directory. Every workspace reserves its expected size against the budget
+until it is cleaned up. Reservations are recorded in a flocked ledger file in
+the tmpfs root, so processes sharing it (core.batch workers, several app
+instances) draw on one budget; entries of processes that have exited are
+dropped on the next access. A workspace reports the bytes it actually used
+and is removed on
+context exit, explicit cleanup() or interpreter exit (atexit), whichever
+comes first.
+
+Environment:
+  FW_WORKSPACE_RAM         tmpfs directory to use (default /dev/shm; "" disables)
+  FW_WORKSPACE_RAM_BUDGET  max bytes reserved on the tmpfs (default half its free space)
+"""
+from __future__ import annotations
+import os, json, atexit, shutil, tempfile, threading
+from typing import Callable, Dict, Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX
+    fcntl = None
+
+LogFunc = Callable[[str], None]
+
+__all__ = ['Workspace', 'WorkspaceManager', 'get_workspace_manager', 'new_workspace', 'tree_usage',
+           'ROOTFS_WS_FACTOR']
+
+DEFAULT_RAM_ROOT = '/dev/shm'
+# expected workspace bytes per byte of partition: rootfs.bin + unpacked tree + repacked image
+ROOTFS_WS_FACTOR = 6
+# ledger of RAM reservations shared by every process using the same tmpfs root
+LEDGER_NAME = '.fw-workspace-reservations.json'
+
+
+def tree_usage(path: str) -> int:
+    """Bytes allocated under path (st_blocks based, so sparse files count what they occupy)."""
+    total = 0
+    for dp, dn, fn in os.walk(path):
+        for name in dn + fn:
+            try:
+                st = os.lstat(os.path.join(dp, name))
+            except OSError:
+                continue
+            total += getattr(st, 'st_blocks', 0) * 512 or st.st_size
+    return total
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _is_tmpfs(path: str) -> bool:
+    try:
+        real = os.path.realpath(path)
+        best, fstype = '', ''
+        with open('/proc/mounts', 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and (real == parts[1] or real.startswith(parts[1].rstrip('/') + '/')) \
+                        and len(parts[1]) > len(best):
+                    best, fstype = parts[1], parts[2]
+        return fstype in ('tmpfs', 'ramfs')
+    except OSError:
+        return False
+
+
+class Workspace:
+    """One scratch directory; use as a context manager or call cleanup()."""
+
+    def __init__(self, manager: 'WorkspaceManager', path: str, prefix: str, on_ram: bool,
+                 reserved: int, log_func: LogFunc):
+        self.manager = manager
+        self.path = path
+        self.prefix = prefix
+        self.on_ram = on_ram
+        self.reserved = reserved
+        self.used = 0
+        self.closed = False
+        self._log = log_func
+
+    @property
+    def medium(self) -> str:
+        return 'ram' if self.on_ram else 'disk'
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __enter__(self) -> str:
+        return self.path
+
+    def __exit__(self, *exc) -> None:
+        self.cleanup()
+
+    def usage(self) -> int:
+        return tree_usage(self.path) if not self.closed else self.used
+
+    def cleanup(self) -> int:
+        """Remove the tree (idempotent); returns the bytes it occupied."""
+        if self.closed:
+            return self.used
+        self.used = tree_usage(self.path)
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.closed = True
+        self.manager._release(self)
+        t = self.manager.totals()
+        self._log(f"[WS] ลบ {self.prefix} ({self.medium}) ใช้ {self.used} bytes; "
+                  f"รวม ram {t['ram_bytes']} / disk {t['disk_bytes']} bytes ใน {t['count']} workspace")
+        return self.used
+
+
+class WorkspaceManager:
+    """Places workspaces on a tmpfs within a byte budget, else on disk."""
+
+    def __init__(self, ram_root: Optional[str] = None, ram_budget: Optional[int] = None,
+                 disk_root: Optional[str] = None):
+        if ram_root is None:
+            ram_root = os.environ.get('FW_WORKSPACE_RAM', DEFAULT_RAM_ROOT)
+        self.ram_root = ram_root if ram_root and os.path.isdir(ram_root) and os.access(ram_root, os.W_OK) \
+            and _is_tmpfs(ram_root) else None
+        if ram_budget is None and os.environ.get('FW_WORKSPACE_RAM_BUDGET'):
+            ram_budget = int(os.environ['FW_WORKSPACE_RAM_BUDGET'])
+        self._fixed_budget = ram_budget
+        self.disk_root = disk_root
+        self._lock = threading.Lock()
+        self._live: Dict[str, Workspace] = {}
+        self._reserved_ram = 0
+        self._stats = {'count': 0, 'ram_count': 0, 'ram_bytes': 0, 'disk_bytes': 0, 'peak_ram_reserved': 0}
+        atexit.register(self.cleanup_all)
+
+    def _ledger(self, fn):
+        """Run fn(entries) on the shared {path: [pid, bytes]} reservation ledger under its flock."""
+        with open(os.path.join(self.ram_root, LEDGER_NAME), 'a+', encoding='utf-8') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    entries = json.loads(f.read() or '{}')
+                except ValueError:
+                    entries = {}
+                for path, (pid, _) in list(entries.items()):
+                    if not _pid_alive(pid) or not os.path.isdir(path):
+                        entries.pop(path)  # owner died without cleaning up
+                result = fn(entries)
+                f.seek(0); f.truncate()
+                f.write(json.dumps(entries))
+                f.flush()
+                return result
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _budget_for(self, reserved: int) -> int:
+        if self._fixed_budget is not None:
+            return self._fixed_budget
+        try:
+            st = os.statvfs(self.ram_root)
+        except OSError:
+            return 0
+        # half of what is free now, plus what live workspaces (any process) already hold
+        return st.f_bavail * st.f_frsize // 2 + reserved
+
+    def ram_budget(self) -> int:
+        if not self.ram_root:
+            return 0
+        try:
+            reserved = self._ledger(lambda entries: sum(b for _, b in entries.values()))
+        except OSError:
+            reserved = self._reserved_ram
+        return self._budget_for(reserved)
+
+    def _reserve_ram(self, prefix: str, expected: int) -> Optional[str]:
+        """mkdtemp on the tmpfs and record the reservation if the shared budget has room."""
+        def _try(entries):
+            reserved = sum(b for _, b in entries.values())
+            if reserved + expected > self._budget_for(reserved):
+                return None
+            path = tempfile.mkdtemp(prefix=prefix, dir=self.ram_root)
+            entries[path] = [os.getpid(), expected]
+            return path
+        try:
+            return self._ledger(_try)
+        except OSError:
+            return None
+
+    def create(self, prefix: str, expected: int = 0, log_func: LogFunc = lambda m: None) -> Workspace:
+        """New workspace; expected is the caller's estimate of peak bytes it will hold."""
+        path = None
+        if self.ram_root:
+            with self._lock:
+                path = self._reserve_ram(prefix, expected)
+                if path:
+                    self._reserved_ram += expected
+                    self._stats['peak_ram_reserved'] = max(self._stats['peak_ram_reserved'], self._reserved_ram)
+        on_ram = path is not None
+        if not on_ram:
+            path = tempfile.mkdtemp(prefix=prefix, dir=self.disk_root)
+        ws = Workspace(self, path, prefix, on_ram, expected if on_ram else 0, log_func)
+        with self._lock:
+            self._live[path] = ws
+        log_func(f"[TEMP] {prefix} workspace ({ws.medium}, คาด {expected} bytes): {path}")
+        return ws
+
+    def _release(self, ws: Workspace) -> None:
+        with self._lock:
+            self._live.pop(ws.path, None)
+            self._reserved_ram -= ws.reserved
+            self._stats['count'] += 1
+            self._stats['ram_count'] += int(ws.on_ram)
+            self._stats['ram_bytes' if ws.on_ram else 'disk_bytes'] += ws.used
+            if ws.on_ram:
+                try:
+                    self._ledger(lambda entries: entries.pop(ws.path, None))
+                except OSError:
+                    pass
+
+    def live(self):
+        with self._lock:
+            return list(self._live.values())
+
+    def totals(self) -> Dict[str, Any]:
+        """Cumulative bytes of closed workspaces plus current reservations."""
+        with self._lock:
+            return dict(self._stats, live=len(self._live), ram_reserved=self._reserved_ram,
+                        ram_root=self.ram_root)
+
+    def cleanup_all(self) -> None:
+        for ws in self.live():
+            try:
+                ws.cleanup()
+            except Exception:
+                # at interpreter exit the log sink (GUI widget) may already be gone
+                shutil.rmtree(ws.path, ignore_errors=True)
+
+
+_DEFAULT: Optional[WorkspaceManager] = None
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = WorkspaceManager()
+    return _DEFAULT
+
+
+def new_workspace(prefix: str, expected: int = 0, log_func: LogFunc = lambda m: None) -> Workspace:
+    return get_workspace_manager().create(prefix, expected, log_func)
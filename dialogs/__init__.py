@@ -4,3 +4,5 @@ from .rootfs_editor import RootFSEditDialog
 from .custom_script import CustomScriptDialog
 from .special_functions import SpecialFunctionsWindow
 from .uboot_env_editor import UBootEnvEditorDialog
+from .job_monitor import JobSignals, JobMonitorWidget
+from .hex_viewer import HexView, HexViewerDialog
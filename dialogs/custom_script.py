@@ -1,5 +1,8 @@
-import os, tempfile, subprocess
+import os, subprocess
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QComboBox, QTextEdit, QHBoxLayout, QPushButton, QMessageBox)
+from core.workspace import new_workspace, ROOTFS_WS_FACTOR
+from core.extract_cache import get_cache as get_extract_cache
+from core.rootfs_ops import extract_rootfs
 
 class CustomScriptDialog(QDialog):
     def __init__(self, parent, rootfs_part):
@@ -32,22 +35,15 @@ class CustomScriptDialog(QDialog):
         if getattr(self.parent_win,'edit_cache_dir',None) and getattr(self.parent_win,'edit_cache_part_index',None)==part_index:
             if os.path.isdir(self.parent_win.edit_cache_dir): self.work_dir = self.parent_win.edit_cache_dir; use_cache=True
         if use_cache: self.log("ใช้ rootfs cache เดิม"); return
-        tmp_work = tempfile.mkdtemp(prefix="custom_script_"); self.parent_win.log(f"[TEMP] custom script workspace: {tmp_work}")
-        rootfs_bin = os.path.join(tmp_work,"rootfs.bin")
-        with open(self.parent_win.fw_path,'rb') as f:
-            f.seek(self.rootfs_part['offset']); blob = f.read(self.rootfs_part['size'])
-        with open(rootfs_bin,'wb') as f: f.write(blob)
-        extract_dir = os.path.join(tmp_work,'extract'); os.makedirs(extract_dir, exist_ok=True)
-        from app import extract_rootfs
-        ok, err = extract_rootfs(self.rootfs_part['fs'], rootfs_bin, extract_dir, self.log)
+        self._temp_workspace = new_workspace("custom_script_", self.rootfs_part['size'] * ROOTFS_WS_FACTOR, self.parent_win.log)
+        extract_dir = os.path.join(self._temp_workspace.path,'extract'); os.makedirs(extract_dir, exist_ok=True)
+        ok, err = get_extract_cache().checkout(self.parent_win.fw_path, self.rootfs_part, extract_dir, extract_rootfs, self.log)
         if not ok: self.log(f"❌ extract ไม่สำเร็จ: {err}"); self.work_dir=None
         else: self.work_dir = extract_dir; self.log(f"เตรียม rootfs สำหรับ script: {extract_dir}")
-        self._temp_workspace = tmp_work
 
     def closeEvent(self, event):
         if hasattr(self,'_temp_workspace'):
-            try: import shutil; shutil.rmtree(self._temp_workspace, ignore_errors=True)
-            except: pass
+            self._temp_workspace.cleanup()
         super().closeEvent(event)
 
     def _list_files(self, base):
@@ -0,0 +1,206 @@
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QCheckBox, QListWidget, QListWidgetItem,
+    QSplitter, QAbstractScrollArea, QMessageBox, QToolTip
+)
+from PySide6.QtCore import Qt, Signal
+from PySide6.QtGui import QPainter, QFont, QFontMetrics, QColor, QPalette
+from core.hex_view import HexSource, format_row, region_map, region_at, parse_pattern, search, BYTES_PER_ROW
+
+_REGION_COLORS = {'rootfs': QColor(200, 225, 255), 'env': QColor(255, 240, 180)}
+_MAX_SCROLL = 1 << 30  # QScrollBar is int based; larger row counts are scaled
+
+
+class HexView(QAbstractScrollArea):
+    """Virtual-scrolling hex/ASCII view: only the visible rows are read from the mmap and painted."""
+    offsetClicked = Signal(object)  # offsets of multi-GB images do not fit a C int
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.source = None
+        self.regions = []
+        self.selection = (0, 0)  # (offset, length)
+        font = QFont("monospace"); font.setStyleHint(QFont.TypeWriter)
+        self.viewport().setFont(font)
+        fm = QFontMetrics(font)
+        self._cw, self._rh, self._ascent = fm.horizontalAdvance('0'), fm.height(), fm.ascent()
+        self.viewport().setMouseTracking(True)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+
+    # ----- model -----
+    def set_source(self, source):
+        self.source = source; self._update_scroll(); self.viewport().update()
+
+    def set_regions(self, regions):
+        self.regions = regions; self.viewport().update()
+
+    def _rows(self):
+        return (self.source.size + BYTES_PER_ROW - 1) // BYTES_PER_ROW if self.source else 0
+
+    def _scale(self):
+        return max(1, -(-self._rows() // _MAX_SCROLL))
+
+    def _visible_rows(self):
+        return max(1, self.viewport().height() // self._rh)
+
+    def _update_scroll(self):
+        bar = self.verticalScrollBar(); scale = self._scale()
+        bar.setRange(0, max(0, (self._rows() - self._visible_rows()) // scale + 1))
+        bar.setPageStep(max(1, self._visible_rows() // scale)); bar.setSingleStep(1)
+
+    def top_row(self):
+        return self.verticalScrollBar().value() * self._scale()
+
+    def goto(self, offset, length=1):
+        """Scroll so offset is on the top row (a third of a page of context above) and select it."""
+        if not self.source:
+            return
+        offset = max(0, min(offset, self.source.size - 1))
+        self.selection = (offset, max(1, length))
+        row = max(0, offset // BYTES_PER_ROW - self._visible_rows() // 3)
+        self.verticalScrollBar().setValue(row // self._scale())
+        self.viewport().update()
+
+    # ----- layout: offset column (10 chars), hex column, ascii column -----
+    def _hex_x(self, i):
+        return self._cw * (11 + 3 * i + (1 if i >= BYTES_PER_ROW // 2 else 0))
+
+    def _ascii_x(self, i):
+        return self._hex_x(BYTES_PER_ROW) + self._cw * (2 + i)
+
+    def _offset_at(self, pos):
+        row = self.top_row() + pos.y() // self._rh
+        x = pos.x()
+        for i in range(BYTES_PER_ROW):
+            if self._hex_x(i) <= x < self._hex_x(i) + 3 * self._cw or self._ascii_x(i) <= x < self._ascii_x(i + 1):
+                off = row * BYTES_PER_ROW + i
+                return off if self.source and off < self.source.size else None
+        return None
+
+    # ----- Qt events -----
+    def resizeEvent(self, event):
+        super().resizeEvent(event); self._update_scroll()
+
+    def paintEvent(self, event):
+        p = QPainter(self.viewport())
+        p.fillRect(self.viewport().rect(), self.palette().base())
+        if not self.source:
+            p.end(); return
+        top = self.top_row(); n = self._visible_rows() + 1
+        data = self.source.read(top * BYTES_PER_ROW, n * BYTES_PER_ROW)
+        sel_lo, sel_len = self.selection
+        for r in range(n):
+            chunk = data[r * BYTES_PER_ROW:(r + 1) * BYTES_PER_ROW]
+            if not chunk:
+                break
+            base = (top + r) * BYTES_PER_ROW; y = r * self._rh
+            for i in range(len(chunk)):
+                off = base + i
+                if sel_lo <= off < sel_lo + sel_len:
+                    color = self.palette().highlight().color()
+                else:
+                    reg = region_at(self.regions, off) if self.regions else None
+                    color = _REGION_COLORS.get(reg['kind'], QColor(215, 245, 215)) if reg else None
+                if color is not None:
+                    p.fillRect(self._hex_x(i), y, 2 * self._cw, self._rh, color)
+                    p.fillRect(self._ascii_x(i), y, self._cw, self._rh, color)
+            hex_text, ascii_text = format_row(chunk)
+            p.setPen(self.palette().color(QPalette.PlaceholderText))
+            p.drawText(0, y + self._ascent, f"{base:010X}")
+            p.setPen(self.palette().text().color())
+            p.drawText(self._hex_x(0), y + self._ascent, hex_text)
+            p.drawText(self._ascii_x(0), y + self._ascent, ascii_text)
+        p.end()
+
+    def mousePressEvent(self, event):
+        off = self._offset_at(event.position().toPoint())
+        if off is not None:
+            self.selection = (off, 1); self.viewport().update(); self.offsetClicked.emit(off)
+
+    def mouseMoveEvent(self, event):
+        off = self._offset_at(event.position().toPoint())
+        reg = region_at(self.regions, off) if off is not None and self.regions else None
+        if reg:
+            QToolTip.showText(event.globalPosition().toPoint(),
+                              f"{reg['label']} 0x{reg['start']:X}-0x{reg['end']:X} (+0x{off - reg['start']:X})", self)
+        else:
+            QToolTip.hideText()
+
+
+class HexViewerDialog(QDialog):
+    """Raw hex view of the firmware with a region map and background search.
+
+    Parent (MainWindow) must expose: run_job(), log()
+    """
+
+    def __init__(self, parent, fw_path):
+        super().__init__(parent)
+        self.setWindowTitle(f"Hex Viewer - {fw_path}")
+        self.resize(1100, 700)
+        self.parent_win = parent
+        self.fw_path = fw_path
+        self.source = HexSource(fw_path)
+        root = QVBoxLayout(self)
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Offset:"))
+        self.offset_edit = QLineEdit(); self.offset_edit.setPlaceholderText("0x1A0000 หรือ 1703936"); top.addWidget(self.offset_edit)
+        btn_go = QPushButton("ไป"); top.addWidget(btn_go)
+        top.addWidget(QLabel("ค้นหา:"))
+        self.find_edit = QLineEdit(); self.find_edit.setPlaceholderText("ข้อความ หรือ hex เช่น 68 73 71 73"); top.addWidget(self.find_edit, 1)
+        self.hex_check = QCheckBox("Hex"); top.addWidget(self.hex_check)
+        self.btn_find = QPushButton("ค้นหาถัดไป"); top.addWidget(self.btn_find)
+        root.addLayout(top)
+        split = QSplitter()
+        self.region_list = QListWidget(); split.addWidget(self.region_list)
+        self.view = HexView(); self.view.set_source(self.source); split.addWidget(self.view)
+        split.setStretchFactor(0, 1); split.setStretchFactor(1, 4)
+        root.addWidget(split, 1)
+        self.status = QLabel(f"{self.source.size} bytes"); root.addWidget(self.status)
+        btn_go.clicked.connect(self.do_goto); self.offset_edit.returnPressed.connect(self.do_goto)
+        self.btn_find.clicked.connect(self.do_find); self.find_edit.returnPressed.connect(self.do_find)
+        self.region_list.itemClicked.connect(self._on_region_clicked)
+        self.view.offsetClicked.connect(self._show_offset)
+        self.region_list.addItem("(กำลังสแกน region...)")
+        parent.run_job("Hex Region Map", lambda ctx: region_map(fw_path, ctx.log), on_done=self._set_regions)
+
+    def _set_regions(self, regions):
+        if self.source is None:
+            return
+        self.view.set_regions(regions); self.region_list.clear()
+        for r in regions:
+            it = QListWidgetItem(f"0x{r['start']:08X}  {r['label']}"); it.setData(Qt.UserRole, r); self.region_list.addItem(it)
+        if not regions:
+            self.region_list.addItem("(ไม่พบ rootfs / env)")
+
+    def _on_region_clicked(self, item):
+        r = item.data(Qt.UserRole)
+        if r: self.view.goto(r['start']); self._show_offset(r['start'])
+
+    def _show_offset(self, off):
+        reg = region_at(self.view.regions, off)
+        self.status.setText(f"0x{off:X} ({off})" + (f"  {reg['label']} +0x{off - reg['start']:X}" if reg else ""))
+
+    def do_goto(self):
+        try: off = int(self.offset_edit.text().strip(), 0)
+        except ValueError: QMessageBox.warning(self, "Offset", "offset ไม่ถูกต้อง"); return
+        if not 0 <= off < self.source.size: QMessageBox.warning(self, "Offset", "เกินขนาดไฟล์"); return
+        self.view.goto(off); self._show_offset(off)
+
+    def do_find(self):
+        try: pattern = parse_pattern(self.find_edit.text(), self.hex_check.isChecked())
+        except ValueError as e: QMessageBox.warning(self, "ค้นหา", str(e)); return
+        start = self.view.selection[0] + 1
+        # runs as a background job: cancellable from the Jobs tab, the file is never loaded
+        if self.parent_win.run_job("Hex Search", lambda ctx: search(self.fw_path, pattern, start),
+                                   on_done=lambda off: self._found(off, len(pattern)), key='hex_search'):
+            self.status.setText("กำลังค้นหา...")
+
+    def _found(self, off, length):
+        if self.source is None:
+            return
+        if off is None: self.status.setText("ไม่พบ"); return
+        self.view.goto(off, length); self._show_offset(off)
+
+    def done(self, result):
+        if self.source is not None:
+            self.view.set_source(None); self.source.close(); self.source = None
+        super().done(result)
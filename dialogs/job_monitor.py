@@ -0,0 +1,71 @@
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem, QProgressBar, QPushButton, QHeaderView
+
+
+class JobSignals(QObject):
+    """core.jobs listener that re-emits worker-thread callbacks as Qt signals (queued onto the GUI thread)."""
+    log = Signal(object, str)
+    progress = Signal(object, int, int, str)
+    finished = Signal(object)
+
+    def on_log(self, job, line):
+        self.log.emit(job, line)
+
+    def on_progress(self, job, done, total, msg):
+        self.progress.emit(job, done, total, msg)
+
+    def on_finished(self, job):
+        self.finished.emit(job)
+
+
+class JobMonitorWidget(QWidget):
+    """Table of active / recent jobs with a progress bar and a cancel button per row."""
+    MAX_ROWS = 50
+
+    def __init__(self, signals, parent=None):
+        super().__init__(parent)
+        lay = QVBoxLayout(self)
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["งาน", "สถานะ", "ความคืบหน้า", ""])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.verticalHeader().hide()
+        lay.addWidget(self.table)
+        self._rows = {}
+        signals.progress.connect(self._on_progress)
+        signals.finished.connect(self._on_finished)
+
+    def add_job(self, job):
+        row = 0
+        self.table.insertRow(row)
+        self.table.setItem(row, 0, QTableWidgetItem(job.name))
+        self.table.setItem(row, 1, QTableWidgetItem(job.status))
+        bar = QProgressBar(); bar.setRange(0, 0); bar.setTextVisible(True)
+        self.table.setCellWidget(row, 2, bar)
+        btn = QPushButton("ยกเลิก"); btn.clicked.connect(job.cancel); btn.clicked.connect(lambda: btn.setEnabled(False))
+        self.table.setCellWidget(row, 3, btn)
+        self._rows[job.id] = (self.table.item(row, 1), bar, btn)
+        while self.table.rowCount() > self.MAX_ROWS:
+            self.table.removeRow(self.table.rowCount() - 1)
+
+    def _on_progress(self, job, done, total, msg):
+        row = self._rows.get(job.id)
+        if not row:
+            return
+        status, bar, _ = row
+        status.setText('running')
+        if total > 0:
+            bar.setRange(0, total); bar.setValue(min(done, total))
+        bar.setFormat(f"{msg} %p%" if total > 0 else msg)
+
+    def _on_finished(self, job):
+        row = self._rows.pop(job.id, None)
+        if not row:
+            return
+        status, bar, btn = row
+        status.setText(f"{job.status} ({job.elapsed():.1f}s)")
+        if job.status == 'failed':
+            status.setToolTip(job.traceback or job.error)
+        bar.setRange(0, 1); bar.setValue(1 if job.status == 'done' else 0)
+        bar.setFormat(job.error if job.status == 'failed' else job.status)
+        btn.setEnabled(False)
@@ -1,9 +1,13 @@
-import os, shutil, tempfile, datetime
+import os, shutil, datetime
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QLabel, QTreeWidget, QTreeWidgetItem, QSplitter, QWidget, QHBoxLayout,
+    QDialog, QVBoxLayout, QLabel, QTreeView, QSplitter, QWidget, QHBoxLayout,
     QPushButton, QTextEdit, QFileDialog, QMessageBox, QMenu, QLineEdit
 )
 from PySide6.QtCore import Qt
+from core.slice_io import splice_partition
+from core.workspace import new_workspace
+from core.rootfs_ops import repack_rootfs
+from .rootfs_model import RootFSTreeModel
 
 # Expect extract_rootfs & repack_rootfs helpers to be imported at runtime from main module
 from typing import Callable
@@ -23,7 +27,6 @@ class RootFSEditDialog(QDialog):
         self.parent_win = parent
         self.pending_changes = []
         self._build_ui()
-        self.load_tree()
 
     def _build_ui(self):
         main_lay = QVBoxLayout(self)
@@ -32,8 +35,11 @@ class RootFSEditDialog(QDialog):
         main_lay.addWidget(self.dir_label)
         split = QSplitter(); main_lay.addWidget(split, 1)
         left_widget = QWidget(); left_lay = QVBoxLayout(left_widget); left_lay.setContentsMargins(0,0,0,0)
-        self.tree = QTreeWidget(); self.tree.setHeaderLabels(["Path", "Size", "Perms"])
-        self.tree.itemClicked.connect(self.on_tree_click)
+        # lazy model: directories are listed when expanded, so large rootfs open instantly
+        self.model = RootFSTreeModel(self.extract_dir, self)
+        self.tree = QTreeView(); self.tree.setModel(self.model); self.tree.setUniformRowHeights(True)
+        self.tree.setColumnWidth(0, 320)
+        self.tree.clicked.connect(self.on_tree_click)
         self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tree.customContextMenuRequested.connect(self.on_tree_menu)
         left_lay.addWidget(self.tree, 1)
@@ -68,7 +74,7 @@ class RootFSEditDialog(QDialog):
         self.btn_repack.clicked.connect(self.do_repack)
         self.btn_mkdir.clicked.connect(self.do_mkdir)
         self.btn_export.clicked.connect(self.do_export)
-        btn_refresh.clicked.connect(self.load_tree)
+        btn_refresh.clicked.connect(self.model.refresh)
         btn_open_dir.clicked.connect(self.open_in_file_manager)
 
     # ----- helpers -----
@@ -82,64 +88,16 @@ class RootFSEditDialog(QDialog):
         self.log_view.append(msg); self.log_view.ensureCursorVisible()
         if hasattr(self.parent_win, 'log'): self.parent_win.log(f"[RootFS-Edit] {msg}")
 
-    # ----- tree -----
-    def load_tree(self):
-        self.tree.clear(); base = self.extract_dir; max_nodes = 5000; max_depth = 12; count = 0; symlink_skipped = 0
-        for root, dirs, files in os.walk(base, followlinks=False):
-            rel_root = os.path.relpath(root, base)
-            if rel_root == '.': rel_root = ''; depth = 0
-            else: depth = rel_root.count('/') + 1
-            if depth > max_depth: continue
-            parent_item = None
-            if rel_root: parent_item = self._ensure_path_item(rel_root)
-            for name in sorted(files):
-                if count >= max_nodes: break
-                rel_path = os.path.join(rel_root, name) if rel_root else name
-                full_path = os.path.join(base, rel_path)
-                try:
-                    if os.path.islink(full_path):
-                        item = QTreeWidgetItem([rel_path, '-', 'link'])
-                    else:
-                        size = os.path.getsize(full_path)
-                        try: perms = oct(os.lstat(full_path).st_mode & 0o777)
-                        except Exception: perms = '?'
-                        item = QTreeWidgetItem([rel_path, str(size), perms])
-                except (FileNotFoundError, OSError): continue
-                if parent_item: parent_item.addChild(item)
-                else: self.tree.addTopLevelItem(item)
-                count += 1
-            if count >= max_nodes: break
-        if count >= max_nodes: self.tree.addTopLevelItem(QTreeWidgetItem([f"[แสดงบางส่วน จำกัด {max_nodes} ไฟล์]", "", ""]))
-        if symlink_skipped: self.tree.addTopLevelItem(QTreeWidgetItem([f"[ข้าม symlink {symlink_skipped} รายการ]", "", ""]))
-        self.tree.sortItems(0, Qt.AscendingOrder)
-
-    def _ensure_path_item(self, rel_root):
-        parts = rel_root.split('/'); path_accum = []; parent = None
-        for part in parts:
-            path_accum.append(part); key = '/'.join(path_accum); parent = self._find_or_create_dir_item(parent, key, part)
-        return parent
-
-    def _find_or_create_dir_item(self, parent, key, label):
-        container = self.tree if parent is None else parent
-        for i in range(container.childCount() if parent else container.topLevelItemCount()):
-            it = container.child(i) if parent else container.topLevelItem(i)
-            if it.text(0) == key: return it
-        new_item = QTreeWidgetItem([key, "", "dir"])
-        if parent: parent.addChild(new_item)
-        else: self.tree.addTopLevelItem(new_item)
-        return new_item
-
     # ----- tree interactions -----
-    def on_tree_click(self, item):
-        path_text = item.text(0)
-        if path_text.startswith('[แสดงบางส่วน'): return
+    def on_tree_click(self, index):
+        path_text = self.model.rel_path(index)
         if path_text: self.internal_edit.setText(path_text)
 
     def on_tree_menu(self, pos):
-        item = self.tree.itemAt(pos)
-        if not item: return
-        path_text = item.text(0)
-        if not path_text or path_text.startswith('[แสดงบางส่วน'): return
+        index = self.tree.indexAt(pos)
+        if not index.isValid(): return
+        path_text = self.model.rel_path(index)
+        if not path_text: return
         menu = QMenu(self)
         act_view = menu.addAction("View"); act_delete = menu.addAction("Delete"); act_export = menu.addAction("Export")
         act = menu.exec(self.tree.mapToGlobal(pos))
@@ -152,7 +110,7 @@ class RootFSEditDialog(QDialog):
         try: rel = self._norm_internal()
         except Exception as e: QMessageBox.warning(self, "mkdir", str(e)); return
         dst = os.path.join(self.extract_dir, rel)
-        try: os.makedirs(dst, exist_ok=True); self.log(f"mkdir: {rel}"); self.load_tree()
+        try: os.makedirs(dst, exist_ok=True); self.log(f"mkdir: {rel}"); self.model.path_changed(rel)
         except Exception as e: QMessageBox.critical(self, "mkdir", f"ล้มเหลว: {e}")
 
     def do_export(self):
@@ -177,7 +135,7 @@ class RootFSEditDialog(QDialog):
         src, _ = QFileDialog.getOpenFileName(self, "เลือกไฟล์ต้นทาง")
         if not src: return
         dst = os.path.join(self.extract_dir, rel); os.makedirs(os.path.dirname(dst), exist_ok=True)
-        try: shutil.copyfile(src, dst); self.log(f"Add/Replace: {rel} <- {src}"); self.pending_changes.append(("add_replace", rel, src))
+        try: shutil.copyfile(src, dst); self.log(f"Add/Replace: {rel} <- {src}"); self.pending_changes.append(("add_replace", rel, src)); self.model.path_changed(rel)
         except Exception as e: QMessageBox.critical(self, "Add/Replace", f"ล้มเหลว: {e}")
 
     def do_delete(self):
@@ -185,7 +143,7 @@ class RootFSEditDialog(QDialog):
         except Exception as e: QMessageBox.warning(self, "Path", str(e)); return
         dst = os.path.join(self.extract_dir, rel)
         if not os.path.exists(dst): QMessageBox.information(self, "Delete", "ไม่มีไฟล์นี้"); return
-        try: os.remove(dst); self.log(f"Delete: {rel}"); self.pending_changes.append(("delete", rel, None))
+        try: os.remove(dst); self.log(f"Delete: {rel}"); self.pending_changes.append(("delete", rel, None)); self.model.path_changed(rel)
         except Exception as e: QMessageBox.critical(self, "Delete", f"ล้มเหลว: {e}")
 
     def do_view(self):
@@ -199,27 +157,25 @@ class RootFSEditDialog(QDialog):
         QMessageBox.information(self, rel, data if data else "(ว่าง)")
 
     def do_repack(self):
-        from app import repack_rootfs  # local import to avoid circular
         self.log("เริ่ม repack rootfs ...")
-        tmpdir = tempfile.mkdtemp(prefix="rfse_pack_")
+        ws = new_workspace("rfse_pack_", self.rootfs_part['size'] * 2, self.log)
+        tmpdir = ws.path
         try:
             new_rootfs_bin = os.path.join(tmpdir, "new_rootfs.bin")
-            ok, err = repack_rootfs(self.rootfs_part['fs'], self.extract_dir, new_rootfs_bin, self.log)
+            ok, err = repack_rootfs(self.rootfs_part['fs'], self.extract_dir, new_rootfs_bin, self.log,
+                                    base_image=self.fw_path, base_offset=self.rootfs_part['offset'])
             if not ok: QMessageBox.critical(self, "Repack", f"ไม่สำเร็จ: {err}"); return
-            with open(self.fw_path, 'rb') as f: fw_data = bytearray(f.read())
-            with open(new_rootfs_bin, 'rb') as f: new_rootfs = f.read()
-            if len(new_rootfs) > self.rootfs_part['size']:
+            if os.path.getsize(new_rootfs_bin) > self.rootfs_part['size']:
                 QMessageBox.critical(self, "Repack", "rootfs ใหม่ใหญ่เกินขนาดเดิม"); return
-            fw_data[self.rootfs_part['offset']:self.rootfs_part['offset']+len(new_rootfs)] = new_rootfs
-            if len(new_rootfs) < self.rootfs_part['size']:
-                fw_data[self.rootfs_part['offset']+len(new_rootfs):self.rootfs_part['offset']+self.rootfs_part['size']] = b'\x00' * (self.rootfs_part['size'] - len(new_rootfs))
             ts = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
             out_fw = os.path.join(self.output_dir, f"edited_rootfs_{self.rootfs_part['fs']}_0x{self.rootfs_part['offset']:X}_{ts}.bin")
-            with open(out_fw, 'wb') as f: f.write(fw_data)
+            ok, err = splice_partition(self.fw_path, out_fw, self.rootfs_part['offset'], self.rootfs_part['size'], new_rootfs_bin)
+            if not ok: QMessageBox.critical(self, "Repack", f"เขียน firmware ไม่สำเร็จ: {err}"); return
             self.log(f"✅ Repack สำเร็จ -> {out_fw}")
             QMessageBox.information(self, "Repack", f"สำเร็จ: {out_fw}\nเปลี่ยนแปลง {len(self.pending_changes)} รายการ")
         finally:
-            shutil.rmtree(tmpdir, ignore_errors=True)
+            ws.cleanup()
 
-    # utilities
-    def open_in_file_manager(self): pass  # already defined above
+    def done(self, result):
+        self.model.close()
+        super().done(result)
@@ -0,0 +1,203 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, Qt, Signal
+from core.dir_listing import list_names, stat_entries, iter_batches, listing_changes, STAT_BATCH
+
+_HEADERS = ["Path", "Size", "Perms"]
+
+
+class _Node:
+    __slots__ = ('name', 'kind', 'parent', 'row', 'children', 'loading', 'token', 'dead', 'size', 'mode', 'target')
+
+    def __init__(self, name, kind, parent, row=0):
+        self.name, self.kind, self.parent, self.row = name, kind, parent, row
+        self.children = None  # None = not listed yet
+        self.loading = False
+        self.token = 0
+        self.dead = False
+        self.size = self.mode = self.target = None
+
+    @property
+    def rel(self):
+        parts = []
+        n = self
+        while n.parent is not None:
+            parts.append(n.name); n = n.parent
+        return '/'.join(reversed(parts))
+
+    def child(self, name):
+        for c in self.children or ():
+            if c.name == name:
+                return c
+        return None
+
+
+class RootFSTreeModel(QAbstractItemModel):
+    """Lazy tree over an extracted rootfs: a directory is listed when expanded, entries are stat'ed in batches on a worker."""
+    _listed = Signal(object, int, object)
+    _stated = Signal(object, int, object)
+
+    def __init__(self, root_dir, parent=None):
+        super().__init__(parent)
+        self.root_dir = root_dir
+        self._root = _Node('', 'dir', None)
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='rootfs-list')
+        self._closed = False
+        self._listed.connect(self._on_listed)
+        self._stated.connect(self._on_stated)
+        self._list(self._root)
+
+    # ----- QAbstractItemModel -----
+    def _node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def _index_of(self, node):
+        return QModelIndex() if node is self._root else self.createIndex(node.row, 0, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        if node.children is None or not (0 <= row < len(node.children)) or not (0 <= column < len(_HEADERS)):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self._index_of(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self._node(parent).children or ())
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(_HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self._node(parent)
+        return node.kind == 'dir' and (node.children is None or bool(node.children))
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return node.kind == 'dir' and node.children is None and not node.loading
+
+    def fetchMore(self, parent):
+        self._list(self._node(parent))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        n, col = index.internalPointer(), index.column()
+        if role == Qt.ToolTipRole:
+            return n.rel
+        if role != Qt.DisplayRole:
+            return None
+        if col == 0:
+            return f"{n.name} -> {n.target}" if n.target else n.name
+        if n.kind == 'dir':
+            return "" if col == 1 else "dir"
+        if n.kind == 'symlink':
+            return "-" if col == 1 else "link"
+        if n.mode is None:
+            return "…"
+        return str(n.size) if col == 1 else oct(n.mode & 0o777)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return _HEADERS[section]
+        return None
+
+    # ----- public -----
+    def rel_path(self, index):
+        return self._node(index).rel
+
+    def refresh(self):
+        """Re-list every directory that has been expanded; rows are updated in place."""
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.children is None:
+                continue
+            self._list(node)
+            stack.extend(c for c in node.children if c.kind == 'dir')
+
+    def path_changed(self, rel):
+        """Re-list the deepest already listed directory on the way to rel (after add / replace / delete / mkdir)."""
+        node = self._root
+        for comp in [c for c in rel.strip('/').split('/') if c][:-1]:
+            child = node.child(comp)
+            if child is None or child.children is None:
+                break
+            node = child
+        if node.children is not None:
+            self._list(node)
+
+    def close(self):
+        self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ----- worker side -----
+    def _list(self, node):
+        node.token += 1; node.loading = True
+        self._pool.submit(self._work, node, node.token, os.path.join(self.root_dir, node.rel))
+
+    def _work(self, node, token, path):
+        entries = list_names(path)
+        if self._closed:
+            return
+        self._listed.emit(node, token, entries)
+        for batch in iter_batches([n for n, kind in entries if kind != 'dir'], STAT_BATCH):
+            if self._closed or token != node.token:
+                return
+            self._stated.emit(node, token, stat_entries(path, batch))
+
+    # ----- GUI thread -----
+    def _alive(self, node, token):
+        if token != node.token:
+            return False
+        while node is not None:
+            if node.dead:
+                return False
+            node = node.parent
+        return True
+
+    def _renumber(self, node, start=0):
+        for i in range(start, len(node.children)):
+            node.children[i].row = i
+
+    def _on_listed(self, node, token, entries):
+        if not self._alive(node, token):
+            return
+        node.loading = False
+        pi = self._index_of(node)
+        if node.children is None:
+            if entries:
+                self.beginInsertRows(pi, 0, len(entries) - 1)
+            node.children = [_Node(name, kind, node, i) for i, (name, kind) in enumerate(entries)]
+            if entries:
+                self.endInsertRows()
+            return
+        removed, inserts = listing_changes([(c.name, c.kind) for c in node.children], entries)
+        for row in removed:
+            self.beginRemoveRows(pi, row, row)
+            node.children.pop(row).dead = True
+            self._renumber(node, row)
+            self.endRemoveRows()
+        for row, (name, kind) in inserts:
+            self.beginInsertRows(pi, row, row)
+            node.children.insert(row, _Node(name, kind, node, row))
+            self._renumber(node, row)
+            self.endInsertRows()
+
+    def _on_stated(self, node, token, stats):
+        if not self._alive(node, token) or not node.children:
+            return
+        rows = []
+        for c in node.children:
+            st = stats.get(c.name)
+            if st is not None:
+                c.size, c.mode, c.target = st
+                rows.append(c.row)
+        if rows:
+            pi = self._index_of(node)
+            self.dataChanged.emit(self.index(min(rows), 0, pi), self.index(max(rows), len(_HEADERS) - 1, pi))
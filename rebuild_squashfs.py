@@ -1,37 +1,499 @@
 """
-Skeleton (Future Work): Pure Python SquashFS Rebuilder
+Pure Python SquashFS (v4) Rebuilder
 
-เป้าหมาย:
-- อ่านโครงสร้าง directory + file data จาก rootfs directory
-- เขียน SquashFS image (v4) โดยใช้ pure python (หรือ binding library)
-- รองรับ compression (gzip/xz/lzma) ผ่าน python-lzma / gzip module
-- รักษา ownership/permissions (อาจ map ทุกไฟล์เป็น root:root หากไม่สำคัญ)
-- รองรับ blocksize config
+สร้าง SquashFS image จาก rootfs directory โดยไม่ต้องพึ่ง mksquashfs:
+- บีบอัด data block แบบขนานใน process pool (ลำดับผลลัพธ์คงที่ -> output ซ้ำได้ byte ต่อ byte)
+- dedup ไฟล์ที่เนื้อหาเหมือนกัน และ tail/fragment ที่ซ้ำกัน
+- เขียน output แบบ streaming (data block ลงไฟล์ทันที, superblock เขียนทีหลังด้วย seek)
+- รองรับ compression gzip / xz / lzma (+ lzo / zstd / lz4 หากมี module) และ block_size 4K-1M
+- รักษา mode / uid / gid / mtime, symlink, device node, fifo, hardlink
 
-สถานะ: ยังไม่ implement — ใช้เป็นจุดเริ่มต้นออกแบบ
+Layout เหมือน mksquashfs: superblock | data+fragments | inode table | directory table |
+fragment table | id table แล้ว pad เป็น 4K. mkfs time มาจาก SOURCE_DATE_EPOCH ถ้ามี
+ไม่งั้นใช้ mtime ล่าสุดใน tree.
+"""
+from __future__ import annotations
+import os, stat, struct, hashlib, sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
-แนะนำลำดับงาน:
-1. Enumerate files -> build inode table
-2. Chunk file data เป็น blocks -> compress -> build data block descriptors
-3. Generate metadata (superblock, inode table, directory table, fragment table, export table)
-4. เขียน superblock (ต้องมี offset ของตารางต่างๆ)
-5. ทดสอบ mount ด้วย unsquashfs หรือ mount -t squashfs (loop)
+from core.squashfs_reader import (
+    SquashFSImage, SquashFSError, compress_block, COMPRESSION_IDS, SQUASHFS_MAGIC, METADATA_SIZE,
+    DATA_UNCOMPRESSED, META_UNCOMPRESSED, NO_FRAGMENT, INVALID_TABLE,
+    DIR, FILE, SYMLINK, BLKDEV, CHRDEV, FIFO, SOCKET, LDIR, LREG,
+)
 
-อ้างอิง spec:
-- Documentation/filesystems/squashfs.txt (Linux kernel)
-- squashfs-tools source code (mksquashfs.c)
+ProgressCb = Callable[[int, int, int, int], None]
+
+_FLAG_DUPLICATES = 0x40
+_FLAG_NO_XATTRS = 0x200
+_U32 = 0xFFFFFFFF
+
+
+def _compress_job(args):
+    """Worker entry point: returns compressed bytes or None if storing raw is smaller."""
+    comp, block_size, data, filters = args
+    c = compress_block(comp, data, block_size, filters)
+    return c if len(c) < len(data) else None
+
+
+def _encode_rdev(rdev: int) -> int:
+    major, minor = os.major(rdev), os.minor(rdev)
+    return (minor & 0xFF) | (major << 8) | ((minor & ~0xFF) << 12)
+
+
+class _Node:
+    __slots__ = ('path', 'name', 'st', 'kind', 'children', 'number', 'ref', 'nlink', 'link_of',
+                 'digest', 'blocks_start', 'block_sizes', 'fragment', 'frag_offset', 'sparse',
+                 'dup_of', 'target', 'dir_start', 'dir_offset', 'dir_size', 'reuse')
+
+    def __init__(self, path, name, st):
+        self.path, self.name, self.st = path, name, st
+        self.children: List['_Node'] = []
+        self.number = 0; self.ref = 0; self.nlink = 1; self.link_of = None
+        self.digest = None; self.blocks_start = 0; self.block_sizes: List[int] = []
+        self.fragment = NO_FRAGMENT; self.frag_offset = 0; self.sparse = 0; self.dup_of = None
+        self.target = b''; self.dir_start = 0; self.dir_offset = 0; self.dir_size = 3
+        self.reuse = None
+        m = st.st_mode
+        self.kind = (DIR if stat.S_ISDIR(m) else FILE if stat.S_ISREG(m) else SYMLINK if stat.S_ISLNK(m)
+                     else BLKDEV if stat.S_ISBLK(m) else CHRDEV if stat.S_ISCHR(m)
+                     else FIFO if stat.S_ISFIFO(m) else SOCKET)
+
+
+class _MetaWriter:
+    """Packs a metadata stream into 8K blocks, compressing each as it fills."""
+
+    def __init__(self, comp: int, block_size: int):
+        self.comp, self.block_size = comp, block_size
+        self.out = bytearray(); self.buf = bytearray()
+
+    def pos(self) -> Tuple[int, int]:
+        return len(self.out), len(self.buf)
+
+    def write(self, data: bytes):
+        self.buf += data
+        while len(self.buf) >= METADATA_SIZE:
+            self._flush(bytes(self.buf[:METADATA_SIZE])); del self.buf[:METADATA_SIZE]
+
+    def _flush(self, raw: bytes):
+        c = compress_block(self.comp, raw, self.block_size)
+        if len(c) < len(raw):
+            self.out += struct.pack('<H', len(c)) + c
+        else:
+            self.out += struct.pack('<H', len(raw) | META_UNCOMPRESSED) + raw
+
+    def finish(self) -> bytes:
+        if self.buf:
+            self._flush(bytes(self.buf)); self.buf.clear()
+        return bytes(self.out)
 
-เมื่อสุกงอม สามารถ plug แทน estimate_squashfs_size() และ build pipeline
-"""
 
 class SquashFSBuilder:
-    def __init__(self, root_dir, block_size=131072, compression="xz"):
-        self.root_dir=root_dir
-        self.block_size=block_size
-        self.compression=compression
+    def __init__(self, root_dir, block_size=131072, compression="xz", workers=None,
+                 all_root=False, xz_filters=None, reuse_image=None, reuse_offset=0):
+        if compression not in COMPRESSION_IDS:
+            raise ValueError(f"unsupported compression: {compression}")
+        if block_size & (block_size - 1) or not 4096 <= block_size <= 1024 * 1024:
+            raise ValueError("block_size must be a power of two between 4K and 1M")
+        self.root_dir = root_dir
+        self.block_size = block_size
+        self.compression = compression
+        self.workers = workers or os.cpu_count() or 1
+        self.all_root = all_root
+        self.xz_filters = xz_filters if compression == 'xz' else None
+        # incremental mode: unchanged files (same path, size, mtime) are copied as
+        # already-compressed blocks from this image instead of being recompressed
+        self.reuse_image = reuse_image
+        self.reuse_offset = reuse_offset
+        self.reused_extents: List[Tuple[int, int, int]] = []  # (new_pos, orig_pos, length)
+        self.stats: Dict[str, int] = {}
+
+    # ---- tree scan ----
+    def _scan(self) -> _Node:
+        root = _Node(self.root_dir, b'', os.lstat(self.root_dir))
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for bname in sorted(os.fsencode(n) for n in os.listdir(node.path)):
+                p = os.path.join(node.path, os.fsdecode(bname))
+                child = _Node(p, bname, os.lstat(p))
+                if child.kind == SYMLINK:
+                    child.target = os.fsencode(os.readlink(p))
+                elif child.kind == DIR:
+                    stack.append(child)
+                node.children.append(child)
+        return root
 
+    def _plan_reuse(self, files: List[_Node]) -> Optional[SquashFSImage]:
+        if not self.reuse_image:
+            return None
+        try:
+            img = SquashFSImage(self.reuse_image, self.reuse_offset)
+        except (OSError, SquashFSError):
+            self.stats['reuse_unavailable'] = 1
+            return None
+        if img.comp != COMPRESSION_IDS[self.compression] or img.block_size != self.block_size:
+            # blocks are only interchangeable with the same codec and block size
+            img.close(); self.stats['reuse_unavailable'] = 1
+            return None
+        for n in files:
+            rel = os.path.relpath(n.path, self.root_dir).replace(os.sep, '/')
+            try:
+                ino = img.lookup(rel)
+            except (FileNotFoundError, NotADirectoryError, SquashFSError):
+                continue
+            if ino.kind == FILE and ino.file_size == n.st.st_size and \
+                    ino.mtime == min(max(int(n.st.st_mtime), 0), _U32):
+                n.reuse = ino
+        return img
+
+    def _hash_files(self, files: List[_Node]):
+        for n in files:
+            if n.reuse is not None:
+                continue
+            h = hashlib.sha256()
+            with open(n.path, 'rb') as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+            n.digest = (n.st.st_size, h.digest())
+
+    # ---- data area ----
+    def _jobs(self, files: List[_Node], img: Optional[SquashFSImage]):
+        """Yield (kind, node_or_fragment_index, payload) in output order.
+
+        kind: 'data' (compress, append to node), 'sparse' (zero block), 'tail' (file tail
+        placed in a fragment, progress only), 'frag' (fragment block to compress),
+        'reuse' / 'rawfrag' (copy compressed bytes verbatim from the reuse image).
+        Fragment indexes are allocated here so the output is deterministic.
+        """
+        bs = self.block_size
+        seen: Dict[tuple, _Node] = {}
+        tails: Dict[bytes, Tuple[int, int]] = {}
+        frag_map: Dict[int, int] = {}
+        next_frag = 0; cur_frag = None
+        fbuf = bytearray()
+        for n in files:
+            o = n.reuse
+            key = ('reuse', o.blocks_start, tuple(o.block_sizes), o.fragment, o.frag_offset, o.file_size) \
+                if o is not None else n.digest
+            first = seen.get(key)
+            if first is not None:
+                n.dup_of = first
+                self.stats['dup_files'] = self.stats.get('dup_files', 0) + 1
+                continue
+            seen[key] = n
+            if o is not None:
+                if o.fragment != NO_FRAGMENT:
+                    if o.fragment not in frag_map:
+                        frag_map[o.fragment] = next_frag; next_frag += 1
+                        yield 'rawfrag', frag_map[o.fragment], img.fragment_entry(o.fragment)
+                    n.fragment, n.frag_offset = frag_map[o.fragment], o.frag_offset
+                length = sum(sz & ~DATA_UNCOMPRESSED for sz in o.block_sizes)
+                yield 'reuse', n, (o.blocks_start, length, list(o.block_sizes))
+                continue
+            size = n.st.st_size
+            tail_len = size % bs
+            with open(n.path, 'rb') as f:
+                for _ in range(size // bs):
+                    raw = f.read(bs)
+                    if raw.count(0) == bs:
+                        yield 'sparse', n, raw
+                    else:
+                        yield 'data', n, raw
+                tail = f.read(tail_len) if tail_len else b''
+            if not tail:
+                continue
+            th = hashlib.sha256(tail).digest()
+            hit = tails.get(th)
+            if hit is not None:
+                n.fragment, n.frag_offset = hit
+                self.stats['dup_fragments'] = self.stats.get('dup_fragments', 0) + 1
+                yield 'tail', n, tail
+                continue
+            if fbuf and len(fbuf) + len(tail) > bs:
+                yield 'frag', cur_frag, bytes(fbuf)
+                fbuf.clear(); cur_frag = None
+            if cur_frag is None:
+                cur_frag = next_frag; next_frag += 1
+            n.fragment, n.frag_offset = cur_frag, len(fbuf)
+            tails[th] = (n.fragment, n.frag_offset)
+            fbuf += tail
+            yield 'tail', n, tail
+        if fbuf:
+            yield 'frag', cur_frag, bytes(fbuf)
+
+    def _copy_raw(self, src, out, orig_pos: int, length: int) -> int:
+        """Copy compressed bytes verbatim from the reuse image; records the extent for delta builds."""
+        pos = out.tell()
+        src.seek(self.reuse_offset + orig_pos)
+        remaining = length
+        while remaining > 0:
+            chunk = src.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise SquashFSError(f"reuse image truncated at 0x{orig_pos:X}")
+            out.write(chunk); remaining -= len(chunk)
+        if length:
+            ext = self.reused_extents
+            if ext and ext[-1][0] + ext[-1][2] == pos and ext[-1][1] + ext[-1][2] == orig_pos:
+                ext[-1] = (ext[-1][0], ext[-1][1], ext[-1][2] + length)
+            else:
+                ext.append((pos, orig_pos, length))
+        return pos
+
+    def _write_data(self, out, files: List[_Node], img: Optional[SquashFSImage],
+                    progress_cb: Optional[ProgressCb]):
+        comp = COMPRESSION_IDS[self.compression]
+        bs = self.block_size
+        uniq = {n.digest: n.st.st_size for n in files if n.reuse is None}
+        uniq.update({('reuse', n.reuse.blocks_start, n.reuse.fragment, n.reuse.frag_offset): n.st.st_size
+                     for n in files if n.reuse is not None})
+        blocks_total = sum((size + bs - 1) // bs for size in uniq.values())
+        bytes_total = sum(uniq.values())
+        blocks_done = bytes_done = 0
+        fragments: Dict[int, Tuple[int, int]] = {}
+        new_bytes = sum(n.st.st_size for n in files if n.reuse is None)
+        pool = ProcessPoolExecutor(self.workers) if self.workers > 1 and new_bytes > 4 * bs else None
+        src = open(self.reuse_image, 'rb') if img is not None else None
+        pending: deque = deque()
+
+        def _commit(kind, node, raw, result):
+            nonlocal blocks_done, bytes_done
+            if kind == 'rawfrag':
+                start, size = raw
+                fragments[node] = (self._copy_raw(src, out, start, size & ~DATA_UNCOMPRESSED), size)
+                return
+            if kind == 'reuse':
+                orig_pos, length, sizes = raw
+                node.blocks_start = self._copy_raw(src, out, orig_pos, length)
+                node.block_sizes = sizes
+                node.sparse = bs * sizes.count(0)
+                self.stats['reused_files'] = self.stats.get('reused_files', 0) + 1
+                self.stats['reused_bytes'] = self.stats.get('reused_bytes', 0) + node.st.st_size
+                blocks_done += (node.st.st_size + bs - 1) // bs; bytes_done += node.st.st_size
+                if progress_cb:
+                    progress_cb(blocks_done, blocks_total, bytes_done, bytes_total)
+                return
+            if kind in ('data', 'frag'):
+                pos = out.tell()
+                if result is None:
+                    out.write(raw); size = len(raw) | DATA_UNCOMPRESSED
+                else:
+                    out.write(result); size = len(result)
+                if kind == 'frag':
+                    fragments[node] = (pos, size); return
+                if not node.block_sizes:
+                    node.blocks_start = pos
+                node.block_sizes.append(size)
+            elif kind == 'sparse':
+                if not node.block_sizes:
+                    node.blocks_start = out.tell()
+                node.block_sizes.append(0); node.sparse += len(raw)
+            blocks_done += 1; bytes_done += len(raw)
+            if progress_cb:
+                progress_cb(blocks_done, blocks_total, bytes_done, bytes_total)
+
+        try:
+            for kind, node, raw in self._jobs(files, img):
+                if kind in ('data', 'frag'):
+                    args = (comp, bs, raw, self.xz_filters)
+                    fut = pool.submit(_compress_job, args) if pool else _compress_job(args)
+                else:
+                    fut = None
+                pending.append((kind, node, raw, fut))
+                while pending and (not pool or len(pending) > self.workers * 4):
+                    k, nd, r, f = pending.popleft()
+                    _commit(k, nd, r, f.result() if pool and f is not None else f)
+            while pending:
+                k, nd, r, f = pending.popleft()
+                _commit(k, nd, r, f.result() if pool and f is not None else f)
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            if src:
+                src.close()
+        for n in files:
+            if n.dup_of is not None:
+                d = n.dup_of
+                n.blocks_start, n.block_sizes, n.sparse = d.blocks_start, d.block_sizes, d.sparse
+                n.fragment, n.frag_offset = d.fragment, d.frag_offset
+        return [fragments[i] for i in range(len(fragments))]
+
+    # ---- metadata ----
+    def _number(self, root: _Node) -> Tuple[int, List[_Node]]:
+        """Assign inode numbers in write (post-) order and resolve hardlinks.
+
+        Returns (inode_count, unique regular files in traversal order).
+        """
+        counter = 0
+        links: Dict[Tuple[int, int], _Node] = {}
+        files: List[_Node] = []
+        def _walk(d):
+            nonlocal counter
+            for c in d.children:
+                if c.kind == DIR:
+                    _walk(c); continue
+                if c.st.st_nlink > 1:
+                    first = links.setdefault((c.st.st_dev, c.st.st_ino), c)
+                    if first is not c:
+                        first.nlink += 1; c.link_of = first
+                        continue
+                counter += 1; c.number = counter
+                if c.kind == FILE:
+                    files.append(c)
+            counter += 1; d.number = counter
+        _walk(root)
+        return counter, files
+
+    def _id_index(self, ids: Dict[int, int], value: int) -> int:
+        if self.all_root:
+            value = 0
+        if value not in ids:
+            ids[value] = len(ids)
+        return ids[value]
+
+    def _write_inode(self, iw: _MetaWriter, n: _Node, ids: Dict[int, int], parent_no: int):
+        st = n.st
+        blk, off = iw.pos()
+        n.ref = (blk << 16) | off
+        mtime = min(max(int(st.st_mtime), 0), _U32)
+        kind = n.kind
+        if kind == DIR:
+            subdirs = sum(1 for c in n.children if c.kind == DIR)
+            if n.dir_size > 0xFFFF or n.dir_start > _U32:
+                kind = LDIR
+        elif kind == FILE:
+            if n.blocks_start > _U32 or st.st_size > _U32 or n.nlink > 1 or n.sparse:
+                kind = LREG
+        hdr = struct.pack('<HHHHII', kind, st.st_mode & 0o7777, self._id_index(ids, st.st_uid),
+                          self._id_index(ids, st.st_gid), mtime, n.number)
+        if kind == DIR:
+            body = struct.pack('<IIHHI', n.dir_start, 2 + subdirs, n.dir_size, n.dir_offset, parent_no)
+        elif kind == LDIR:
+            body = struct.pack('<IIIIHHI', 2 + subdirs, n.dir_size, n.dir_start, parent_no, 0, n.dir_offset, _U32)
+        elif kind == FILE:
+            body = struct.pack('<IIII', n.blocks_start, n.fragment, n.frag_offset, st.st_size)
+        elif kind == LREG:
+            body = struct.pack('<QQQIIII', n.blocks_start, st.st_size, n.sparse, n.nlink,
+                               n.fragment, n.frag_offset, _U32)
+        elif kind == SYMLINK:
+            body = struct.pack('<II', n.nlink, len(n.target)) + n.target
+        elif kind in (BLKDEV, CHRDEV):
+            body = struct.pack('<II', n.nlink, _encode_rdev(st.st_rdev))
+        else:
+            body = struct.pack('<I', n.nlink)
+        if kind in (FILE, LREG):
+            body += struct.pack(f'<{len(n.block_sizes)}I', *n.block_sizes)
+        iw.write(hdr + body)
+
+    @staticmethod
+    def _dir_listing(entries: List[_Node]) -> bytes:
+        out = bytearray()
+        i = 0
+        while i < len(entries):
+            start = entries[i].ref >> 16; base = entries[i].number
+            group = []
+            while i < len(entries) and len(group) < 256:
+                e = entries[i]
+                if e.ref >> 16 != start or not -32768 <= e.number - base <= 32767:
+                    break
+                group.append(e); i += 1
+            out += struct.pack('<III', len(group) - 1, start, base)
+            for e in group:
+                t = e.kind if e.kind <= 7 else e.kind - 7
+                out += struct.pack('<HhHH', e.ref & 0xFFFF, e.number - base, t, len(e.name) - 1) + e.name
+        return bytes(out)
+
+    def _write_tables(self, root: _Node, inode_count: int):
+        comp = COMPRESSION_IDS[self.compression]
+        iw = _MetaWriter(comp, self.block_size); dw = _MetaWriter(comp, self.block_size)
+        ids: Dict[int, int] = {}
+        def _walk(d: _Node, parent_no: int):
+            for c in d.children:
+                if c.kind == DIR:
+                    _walk(c, d.number)
+                elif c.link_of is None:
+                    self._write_inode(iw, c, ids, 0)
+            for c in d.children:
+                if c.link_of is not None:
+                    c.ref, c.number, c.kind = c.link_of.ref, c.link_of.number, c.link_of.kind
+            listing = self._dir_listing(d.children)
+            d.dir_start, d.dir_offset = dw.pos()
+            d.dir_size = len(listing) + 3
+            dw.write(listing)
+            self._write_inode(iw, d, ids, parent_no)
+        _walk(root, inode_count + 1)
+        return iw.finish(), dw.finish(), ids
+
+    @staticmethod
+    def _lookup_table(comp: int, block_size: int, entries: bytes, table_pos: int) -> Tuple[bytes, int]:
+        """Metadata blocks holding ``entries`` followed by their u64 index. Returns (blob, index_offset)."""
+        blob = bytearray(); ptrs = []
+        for i in range(0, len(entries), METADATA_SIZE):
+            ptrs.append(table_pos + len(blob))
+            mw = _MetaWriter(comp, block_size); mw.write(entries[i:i + METADATA_SIZE])
+            blob += mw.finish()
+        index_off = table_pos + len(blob)
+        blob += struct.pack(f'<{len(ptrs)}Q', *ptrs)
+        return bytes(blob), index_off
+
+    # ---- public ----
     def build(self, out_file, progress_cb=None):
-        raise NotImplementedError("Pure Python SquashFS build not implemented yet.")
+        """Write the image to out_file (path). Returns bytes_used (before 4K padding).
+
+        With ``reuse_image`` set, files whose path, size and mtime match the old image
+        keep their compressed data blocks and fragment blocks byte for byte (fragment
+        blocks are copied whole, so tails of removed files may linger in them); only
+        new or modified files are compressed and the metadata tables are rebuilt.
+        """
+        comp = COMPRESSION_IDS[self.compression]
+        root = self._scan()
+        inode_count, files = self._number(root)
+        self.reused_extents = []
+        self.stats = {}
+        img = self._plan_reuse(files)
+        self._hash_files(files)
+        epoch = os.environ.get('SOURCE_DATE_EPOCH')
+        mkfs_time = int(epoch) if epoch else max(
+            [int(root.st.st_mtime)] + [int(f.st.st_mtime) for f in files])
+        self.stats.update({'files': len(files), 'inodes': inode_count})
+        with open(out_file, 'wb') as out:
+            out.write(b'\x00' * 96)
+            try:
+                fragments = self._write_data(out, files, img, progress_cb)
+            finally:
+                if img is not None:
+                    img.close()
+            inode_tbl, dir_tbl, ids = self._write_tables(root, inode_count)
+            inode_start = out.tell(); out.write(inode_tbl)
+            dir_start = out.tell(); out.write(dir_tbl)
+            frag_entries = b''.join(struct.pack('<QII', p, s, 0) for p, s in fragments)
+            blob, frag_start = self._lookup_table(comp, self.block_size, frag_entries, out.tell())
+            out.write(blob)
+            id_entries = struct.pack(f'<{len(ids)}I', *ids)
+            blob, id_start = self._lookup_table(comp, self.block_size, id_entries, out.tell())
+            out.write(blob)
+            bytes_used = out.tell()
+            if bytes_used % 4096:
+                out.write(b'\x00' * (4096 - bytes_used % 4096))
+            sb = struct.pack('<IIIIIHHHHHHQQQQQQQQ', SQUASHFS_MAGIC, inode_count, mkfs_time & _U32,
+                             self.block_size, len(fragments), comp, self.block_size.bit_length() - 1,
+                             _FLAG_DUPLICATES | _FLAG_NO_XATTRS, len(ids), 4, 0, root.ref, bytes_used,
+                             id_start, INVALID_TABLE, inode_start, dir_start, frag_start, INVALID_TABLE)
+            out.seek(0); out.write(sb)
+        self.stats.update({'fragments': len(fragments), 'bytes_used': bytes_used})
+        return bytes_used
+
 
 if __name__ == "__main__":
-    print("Pure Python SquashFS builder skeleton (ยังไม่พร้อมใช้งาน)")
\ No newline at end of file
+    if len(sys.argv) < 3:
+        print("usage: rebuild_squashfs.py <root_dir> <out.sqsh> [gzip|xz|lzma|lzo|zstd] [block_size]")
+        sys.exit(1)
+    b = SquashFSBuilder(sys.argv[1], int(sys.argv[4]) if len(sys.argv) > 4 else 131072,
+                        sys.argv[3] if len(sys.argv) > 3 else 'xz')
+    used = b.build(sys.argv[2], lambda bd, bt, xd, xt: print(f"\r{bd}/{bt} blocks", end='', flush=True))
+    print(f"\nwrote {sys.argv[2]} ({used} bytes used) {b.stats}")
@@ -0,0 +1,101 @@
+import json, os, time
+import pytest
+import core.extract_cache as extract_cache
+import core.batch as batch
+from core.batch import discover_images, load_profile, run_batch
+from core.squashfs_reader import SquashFSImage
+from rebuild_squashfs import SquashFSBuilder
+
+
+def _firmware(tmp_path, name, telnet=True):
+    root = tmp_path / f'tree_{name}'
+    (root / 'etc').mkdir(parents=True)
+    (root / 'etc' / 'inetd.conf').write_text(('telnet stream tcp nowait root /usr/sbin/telnetd\n' if telnet else '')
+                                              + 'http stream tcp nowait root /usr/sbin/httpd\n')
+    (root / 'etc' / 'shadow').write_text('root:x:0:0:99999:7:::\n')
+    sq = tmp_path / f'{name}.sqsh'
+    SquashFSBuilder(str(root), block_size=4096, compression='gzip', workers=1).build(str(sq))
+    img = sq.read_bytes()
+    fw = tmp_path / 'images' / f'{name}.bin'
+    fw.parent.mkdir(exist_ok=True)
+    fw.write_bytes(b'\x07' * 0x10000 + img + b'\xff' * 0x8000)
+    return fw
+
+
+@pytest.fixture(autouse=True)
+def _private_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_cache, '_DEFAULT', extract_cache.ExtractionCache(root=str(tmp_path / 'cache')))
+
+
+def test_batch_patch_and_resume(tmp_path):
+    for name in ('a', 'b'):
+        _firmware(tmp_path, name)
+    profile_path = tmp_path / 'profile.json'
+    profile_path.write_text(json.dumps({'version': 1, 'patches': {'network_services': True, 'boot_delay': True,
+                                                                  'boot_delay_value': 1}}))
+    profile = load_profile(str(profile_path))
+    images = discover_images(str(tmp_path / 'images'))
+    assert [stem for _, stem in images] == ['a', 'b']
+    out = tmp_path / 'out'
+    counts = run_batch(profile, images, str(out), jobs=2, log_func=lambda m: None)
+    assert counts == {'ok': 2, 'error': 0, 'skipped': 0}
+    recs = [json.loads(l) for l in (out / 'results.jsonl').read_text().splitlines()]
+    assert sorted(r['status'] for r in recs) == ['ok', 'ok']
+    patched = out / 'a_patched.bin'
+    data = patched.read_bytes()
+    assert data[0x100] == 1 and len(data) == os.path.getsize(tmp_path / 'images' / 'a.bin')
+    with SquashFSImage(str(patched), 0x10000) as img:
+        assert img.read('/etc/inetd.conf').startswith(b'#DISABLED telnet')
+    # interrupted / repeated run: nothing is redone
+    assert run_batch(profile, images, str(out), jobs=2, log_func=lambda m: None)['skipped'] == 2
+
+
+def test_batch_failure_is_isolated(tmp_path):
+    _firmware(tmp_path, 'good')
+    (tmp_path / 'images' / 'junk.bin').write_bytes(os.urandom(4096))
+    profile = {'patches': {'root_password': True, 'root_password_value': '$6$x$y'}}
+    counts = run_batch(profile, discover_images(str(tmp_path / 'images')), str(tmp_path / 'out'), jobs=2,
+                       log_func=lambda m: None)
+    assert counts == {'ok': 1, 'error': 1, 'skipped': 0}
+
+
+def _slow_image(path, out_path, patches, rootfs_index, log, delta):
+    # stands in for an extractor started through tool_runner that outlives its worker
+    import subprocess
+    child = subprocess.Popen(['sleep', '60'])
+    with open(out_path + '.pid', 'w') as f:
+        f.write(str(child.pid))
+    time.sleep(60)
+
+
+def _big_record(path, out_path, patches, rootfs_index, log, delta):
+    return {'status': 'ok', 'blob': 'x' * (1 << 20)}  # far larger than a pipe buffer
+
+
+def test_batch_timeout_kills_tool_processes(tmp_path, monkeypatch):
+    if not hasattr(os, 'killpg'):
+        pytest.skip('process groups are POSIX only')
+    monkeypatch.setattr(batch, 'patch_image', _slow_image)
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'images' / 'a.bin').write_bytes(b'\0' * 4096)
+    counts = run_batch({'patches': {}}, discover_images(str(tmp_path / 'images')), str(tmp_path / 'out'),
+                       jobs=1, timeout=1, log_func=lambda m: None)
+    assert counts['error'] == 1
+    pid = int((tmp_path / 'out' / 'a_patched.bin.pid').read_text())
+    for _ in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail('tool process survived the worker timeout')
+
+
+def test_batch_large_result_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'patch_image', _big_record)
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'images' / 'a.bin').write_bytes(b'\0' * 4096)
+    counts = run_batch({'patches': {}}, discover_images(str(tmp_path / 'images')), str(tmp_path / 'out'),
+                       jobs=1, timeout=30, log_func=lambda m: None)
+    assert counts == {'ok': 1, 'error': 0, 'skipped': 0}
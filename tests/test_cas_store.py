@@ -0,0 +1,86 @@
+import os
+import pytest
+from core.cas_store import CASStore, diff_manifests
+
+
+def _tree(root, web):
+    (root / 'bin').mkdir(parents=True)
+    (root / 'etc').mkdir()
+    (root / 'www').mkdir()
+    (root / 'bin' / 'busybox').write_bytes(b'\x7fELF' + b'\x00' * 4000)
+    os.chmod(root / 'bin' / 'busybox', 0o755)
+    (root / 'www' / 'index.html').write_text(web)
+    (root / 'etc' / 'app.conf').write_text('password = hunter22\n')
+    os.symlink('busybox', root / 'bin' / 'sh')
+
+
+def test_ingest_dedups_and_diffs_by_join(tmp_path):
+    store = CASStore(str(tmp_path / 'cas'))
+    _tree(tmp_path / 'v1', '<html>v1</html>')
+    _tree(tmp_path / 'v2', '<html>v2</html>')
+    m1 = store.ingest(str(tmp_path / 'v1'), 'fw-v1')
+    m2 = store.ingest(str(tmp_path / 'v2'), 'fw-v2')
+    assert m1['stats']['new_objects'] == 3
+    assert m2['stats']['new_objects'] == 1 and m2['stats']['deduped_bytes'] > 4000
+    assert store.manifests() == ['fw-v1', 'fw-v2']
+    bb = next(e for e in m1['entries'] if e['path'] == 'bin/busybox')
+    assert bb['elf'] and bb['mode'] == '0755'
+    assert os.path.samefile(store.object_path(bb['sha256']),
+                            store.object_path(next(e for e in m2['entries'] if e['path'] == 'bin/busybox')['sha256']))
+
+    stats = {}
+    diff = list(diff_manifests(store.load_manifest('fw-v1'), m2, stats))
+    assert [(e['path'], e['changes']) for e in diff] == [('www/index.html', ['content'])]
+    assert stats['unchanged'] > 0
+
+    calls = []
+    orig = store.derived
+    store.derived = lambda kind, sha, func: orig(kind, sha, lambda p: calls.append(p) or func(p))
+    assert [f['file'] for f in store.scan_secrets(m1)] == ['etc/app.conf']
+    assert [f['file'] for f in store.scan_secrets(m2)] == ['etc/app.conf']
+    assert len(calls) == 3  # app.conf once for both versions, each index.html once
+
+    out = tmp_path / 'out'
+    assert store.materialise(m2, str(out)) == 3
+    assert (out / 'www' / 'index.html').read_text() == '<html>v2</html>'
+    assert os.readlink(out / 'bin' / 'sh') == 'busybox'
+
+    os.remove(os.path.join(store.root, 'manifests', 'fw-v1.json'))
+    assert store.gc() == len('<html>v1</html>')
+
+
+def test_ingest_fails_instead_of_dropping_unreadable_files(tmp_path, monkeypatch):
+    import core.cas_store as cas
+    store = CASStore(str(tmp_path / 'cas'))
+    _tree(tmp_path / 'v1', '<html>v1</html>')
+    real = cas._hash_file
+
+    def flaky(path):
+        if path.endswith('index.html'):
+            raise OSError('EIO')
+        return real(path)
+    monkeypatch.setattr(cas, '_hash_file', flaky)
+    with pytest.raises(OSError):
+        store.ingest(str(tmp_path / 'v1'), 'fw-v1')
+    assert not store.has_manifest('fw-v1')
+
+
+def test_gc_waits_for_a_running_ingest(tmp_path, monkeypatch):
+    import threading
+    import core.cas_store as cas
+    store = CASStore(str(tmp_path / 'cas'))
+    _tree(tmp_path / 'v1', '<html>v1</html>')
+    real, gcs = cas._hash_file, []
+
+    def hash_then_gc(path):
+        if not gcs:  # objects are being stored but the manifest is not written yet
+            t = threading.Thread(target=lambda: gcs.append(store.gc()))
+            t.start(); t.join(0.2)
+            assert t.is_alive()
+            gcs.append(t)
+        return real(path)
+    monkeypatch.setattr(cas, '_hash_file', hash_then_gc)
+    m = store.ingest(str(tmp_path / 'v1'), 'fw-v1', workers=1)
+    gcs[0].join(5)
+    assert gcs[1] == 0
+    assert all(os.path.exists(store.object_path(e['sha256'])) for e in m['entries'] if e.get('sha256'))
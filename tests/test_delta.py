@@ -0,0 +1,57 @@
+import os
+import core.extract_cache as extract_cache
+from core.delta import create_delta, apply_delta, read_delta_header
+from core.patch_txn import disable_inetd_services, set_boot_delay_byte
+from core.rootfs_ops import new_patch_transaction
+from rebuild_squashfs import SquashFSBuilder
+
+
+def test_region_delta_roundtrip(tmp_path):
+    src = os.urandom(1 << 20)
+    moved = src[600000:640000]
+    # partition rewritten at 200000: a block moved from elsewhere plus new bytes; one byte patched at 0x100
+    tgt = bytearray(src)
+    tgt[0x100] ^= 0xFF
+    tgt[200000:300000] = moved + os.urandom(100000 - len(moved))
+    (tmp_path / 'src.bin').write_bytes(src)
+    (tmp_path / 'tgt.bin').write_bytes(bytes(tgt))
+    delta = str(tmp_path / 'out.fwdelta')
+    hdr = create_delta(str(tmp_path / 'src.bin'), str(tmp_path / 'tgt.bin'), delta,
+                       regions=[(0x100, 1), (200000, 100000)], extents=[(200000, 600000, len(moved))])
+    assert hdr['copy_bytes'] >= len(src) - 100000
+    assert hdr['data_bytes'] <= 100000 - len(moved) + 4096 * 2
+    assert os.path.getsize(delta) < 80000
+    ok, err = apply_delta(str(tmp_path / 'src.bin'), delta, str(tmp_path / 'back.bin'))
+    assert ok, err
+    assert (tmp_path / 'back.bin').read_bytes() == bytes(tgt)
+    assert read_delta_header(delta)['target_size'] == len(tgt)
+    (tmp_path / 'other.bin').write_bytes(os.urandom(len(src)))
+    ok, err = apply_delta(str(tmp_path / 'other.bin'), delta, str(tmp_path / 'bad.bin'))
+    assert not ok and 'sha256' in err and not (tmp_path / 'bad.bin').exists()
+
+
+def test_transaction_delta_matches_full_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_cache, '_DEFAULT', extract_cache.ExtractionCache(root=str(tmp_path / 'cache')))
+    root = tmp_path / 'tree'
+    (root / 'etc').mkdir(parents=True)
+    (root / 'etc' / 'inetd.conf').write_text('telnet stream tcp nowait root /usr/sbin/telnetd\n')
+    (root / 'bin').mkdir()
+    (root / 'bin' / 'busybox').write_bytes(os.urandom(300000))
+    SquashFSBuilder(str(root), block_size=65536, compression='gzip', workers=1).build(str(tmp_path / 'r.sqsh'))
+    img = (tmp_path / 'r.sqsh').read_bytes()
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(os.urandom(0x40000) + img + b'\xff' * 0x10000 + os.urandom(0x40000))
+    part = dict(fs='squashfs', offset=0x40000, size=len(img) + 0x10000)
+
+    def txn():
+        return new_patch_transaction(str(fw), part, lambda m: None).add_file(
+            'net', disable_inetd_services).add_raw('bd', set_boot_delay_byte(3))
+    full, delta = str(tmp_path / 'full.bin'), str(tmp_path / 'p.fwdelta')
+    assert txn().commit(full) == (True, '')
+    assert txn().commit(delta, delta=True) == (True, '')
+    hdr = read_delta_header(delta)
+    assert os.path.getsize(delta) < 64 * 1024 < os.path.getsize(fw)
+    ok, err = apply_delta(str(fw), delta, str(tmp_path / 'mat.bin'))
+    assert ok, err
+    assert (tmp_path / 'mat.bin').read_bytes() == (tmp_path / 'full.bin').read_bytes()
+    assert hdr['source_size'] == os.path.getsize(fw)
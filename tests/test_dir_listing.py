@@ -0,0 +1,36 @@
+import os
+from core.dir_listing import list_names, stat_entries, iter_batches, listing_changes
+
+
+def _apply(old, removed, inserts):
+    rows = list(old)
+    for i in removed:
+        rows.pop(i)
+    for i, e in inserts:
+        rows.insert(i, e)
+    return rows
+
+
+def test_list_and_stat(tmp_path):
+    (tmp_path / 'bin').mkdir()
+    (tmp_path / 'b.conf').write_bytes(b'x' * 10)
+    (tmp_path / 'a.sh').write_bytes(b'#!/bin/sh\n')
+    os.chmod(tmp_path / 'a.sh', 0o755)
+    os.symlink('b.conf', tmp_path / 'link')
+    names = list_names(str(tmp_path))
+    assert names == [('bin', 'dir'), ('a.sh', 'file'), ('b.conf', 'file'), ('link', 'symlink')]
+    st = stat_entries(str(tmp_path), ['a.sh', 'b.conf', 'link', 'gone'])
+    assert st['a.sh'][:2] == (10, 0o755) and st['a.sh'][2] is None
+    assert st['b.conf'][0] == 10 and st['link'][2] == 'b.conf' and 'gone' not in st
+    assert list_names(str(tmp_path / 'missing')) == []
+    assert [list(b) for b in iter_batches(list(range(5)), 2)] == [[0, 1], [2, 3], [4]]
+
+
+def test_listing_changes_applies_in_place():
+    old = [('etc', 'dir'), ('usr', 'dir'), ('a', 'file'), ('b', 'file'), ('c', 'file')]
+    new = [('etc', 'dir'), ('lib', 'dir'), ('usr', 'dir'), ('a', 'dir'), ('c', 'file'), ('d', 'file')]
+    new.sort(key=lambda e: (e[1] != 'dir', e[0]))
+    removed, inserts = listing_changes(old, new)
+    assert removed == sorted(removed, reverse=True)
+    assert _apply(old, removed, inserts) == new
+    assert listing_changes(new, new) == ([], [])
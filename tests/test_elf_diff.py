@@ -0,0 +1,45 @@
+import shutil, subprocess
+import pytest
+from core.elf_analyze import elf_needed, elf_symbols
+from core.elf_diff import diff_elf, diff_elf_pairs, format_elf_diff
+
+V1 = r'''
+#include <stdio.h>
+int helper(int x) { return x * 3; }
+int untouched(int x) { return x - 1; }
+int main(int c, char **v) { printf("%d %d\n", helper(c), untouched(c)); return 0; }
+'''
+V2 = r'''
+#include <stdio.h>
+#include <math.h>
+int helper(int x) { return x * 5 + 7; }
+int untouched(int x) { return x - 1; }
+int added(int x) { return (int)sqrt(x); }
+int main(int c, char **v) { printf("%d %d %d\n", helper(c), untouched(c), added(c)); return 0; }
+'''
+
+
+def _build(tmp_path, name, src, *libs):
+    (tmp_path / f'{name}.c').write_text(src)
+    out = str(tmp_path / name)
+    subprocess.run(['gcc', '-O1', '-fno-inline', '-o', out, str(tmp_path / f'{name}.c'), *libs], check=True)
+    return out
+
+
+@pytest.mark.skipif(not shutil.which('gcc'), reason='gcc not installed')
+def test_elf_structural_diff(tmp_path):
+    a = _build(tmp_path, 'v1', V1)
+    b = _build(tmp_path, 'v2', V2, '-lm')
+    assert 'libm.so.6' in elf_needed(b) and 'libm.so.6' not in elf_needed(a)
+    assert any(s['name'] == 'printf' and s['shndx'] == 0 for s in elf_symbols(a))
+    d = diff_elf(a, b)
+    assert d['needed']['added'] == ['libm.so.6']
+    assert 'sqrt' in d['imports']['added']
+    assert '.text' in [c['name'] for c in d['sections']['changed']]
+    assert d['functions']['added'] == ['added']
+    assert 'helper' in d['functions']['changed']
+    assert d['sections']['unchanged'] > 0
+    text = '\n'.join(format_elf_diff(d))
+    assert 'libm.so.6' in text and 'helper' in text
+    same = diff_elf_pairs([('x', a, a)])['x']
+    assert not same['sections']['changed'] and not same['functions']['changed']
@@ -0,0 +1,20 @@
+import shutil, subprocess
+import pytest
+from core.elf_strip import strip_elfs
+from core.elf_analyze import has_symtab
+
+pytestmark = pytest.mark.skipif(not (shutil.which('gcc') and shutil.which('strip')), reason='needs gcc + strip')
+
+
+def test_strip_skips_stripped_and_reports_savings(tmp_path):
+    src = tmp_path / 'a.c'
+    src.write_text('int helper(int x){return x*2;}\nint main(){return helper(1);}\n')
+    subprocess.run(['gcc', '-g', '-o', str(tmp_path / 'a'), str(src)], check=True)
+    shutil.copy(tmp_path / 'a', tmp_path / 'b')
+    subprocess.run(['strip', str(tmp_path / 'b')], check=True)
+    (tmp_path / 'notes.txt').write_text('not an elf')
+    results = strip_elfs(str(tmp_path), workers=2)
+    assert [r['path'] for r in results] == [str(tmp_path / 'a')]
+    assert results[0]['ok'] and results[0]['saved'] > 0
+    assert not has_symtab(str(tmp_path / 'a'))
+    assert strip_elfs(str(tmp_path)) == []
@@ -0,0 +1,67 @@
+import os
+from core.extract_cache import ExtractionCache
+
+def _fake_extractor(calls):
+    def extract(fs, rootfs_bin, extract_dir, log_func):
+        calls.append(rootfs_bin)
+        data = open(rootfs_bin, 'rb').read()
+        os.makedirs(os.path.join(extract_dir, 'etc'))
+        with open(os.path.join(extract_dir, 'etc', 'shadow'), 'wb') as f:
+            f.write(data)
+        return True, ''
+    return extract
+
+def test_extract_once_and_private_checkout(tmp_path):
+    fw = tmp_path / "fw.bin"
+    fw.write_bytes(b"\xff" * 16 + b"root:x:0\n" + b"\xff" * 16)
+    part = dict(fs='squashfs', offset=16, size=9)
+    cache = ExtractionCache(root=str(tmp_path / "cache"), quota=1 << 20)
+    calls = []
+    ok, tree = cache.get(str(fw), part, _fake_extractor(calls))
+    assert ok and open(os.path.join(tree, 'etc', 'shadow'), 'rb').read() == b"root:x:0\n"
+    work = tmp_path / "work"
+    ok, err = cache.checkout(str(fw), part, str(work), _fake_extractor(calls))
+    assert ok, err
+    assert len(calls) == 1  # second operation hit the cache
+    (work / 'etc' / 'shadow').write_bytes(b"changed")
+    assert open(os.path.join(tree, 'etc', 'shadow'), 'rb').read() == b"root:x:0\n"
+
+def test_lru_eviction_under_quota(tmp_path):
+    fw = tmp_path / "fw.bin"
+    fw.write_bytes(os.urandom(3000))
+    cache = ExtractionCache(root=str(tmp_path / "cache"), quota=1500)
+    calls = []
+    parts = [dict(fs='squashfs', offset=i * 1000, size=1000) for i in range(3)]
+    trees = [cache.get(str(fw), p, _fake_extractor(calls))[1] for p in parts]
+    assert not os.path.exists(trees[0]) and os.path.exists(trees[2])
+    assert cache.total_size() <= 1500
+
+def test_use_pins_entry_against_eviction(tmp_path):
+    fw = tmp_path / "fw.bin"
+    fw.write_bytes(os.urandom(3000))
+    cache = ExtractionCache(root=str(tmp_path / "cache"), quota=1500)
+    calls = []
+    parts = [dict(fs='squashfs', offset=i * 1000, size=1000) for i in range(3)]
+    with cache.use(str(fw), parts[0], _fake_extractor(calls)) as (ok, tree):
+        assert ok
+        for p in parts[1:]:
+            cache.get(str(fw), p, _fake_extractor(calls))
+        assert os.path.exists(os.path.join(tree, 'etc', 'shadow'))
+    cache.evict()
+    assert not os.path.exists(tree)
+
+def test_pins_are_visible_to_other_cache_instances(tmp_path):
+    # a second instance on the same root stands in for a batch worker process
+    fw = tmp_path / "fw.bin"
+    fw.write_bytes(os.urandom(3000))
+    root = str(tmp_path / "cache")
+    reader, worker = ExtractionCache(root=root, quota=1500), ExtractionCache(root=root, quota=1500)
+    calls = []
+    parts = [dict(fs='squashfs', offset=i * 1000, size=1000) for i in range(3)]
+    with reader.use(str(fw), parts[0], _fake_extractor(calls)) as (ok, tree):
+        assert ok
+        for p in parts[1:]:
+            worker.get(str(fw), p, _fake_extractor(calls))
+        assert os.path.exists(os.path.join(tree, 'etc', 'shadow'))
+    worker.evict()
+    assert not os.path.exists(tree)
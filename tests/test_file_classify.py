@@ -0,0 +1,32 @@
+import os, shutil, struct
+import pytest
+from core.file_classify import classify_bytes, classify_tree
+
+
+def test_magic_table():
+    elf = b'\x7fELF\x01\x01\x01' + b'\0' * 9 + struct.pack('<HH', 2, 0x28)
+    assert classify_bytes(elf) == 'ELF 32-bit LSB executable, ARM'
+    assert classify_bytes(b'#!/bin/sh\necho hi\n') == 'POSIX shell script, ASCII text executable'
+    assert classify_bytes(b'#!/usr/bin/env lua\n') == 'Lua script, ASCII text executable'
+    assert classify_bytes(b'-----BEGIN CERTIFICATE-----\nMII') == 'PEM certificate'
+    assert classify_bytes(b'hsqs' + b'\0' * 60).startswith('Squashfs')
+    assert classify_bytes(b'SQLite format 3\x00' + b'\0' * 80) == 'SQLite 3.x database'
+    assert classify_bytes(b'option x 1\n') == 'ASCII text'
+    assert classify_bytes(b'') == 'empty'
+    assert classify_bytes(b'\x00\x01\x02\x03garbage') is None
+
+
+@pytest.mark.skipif(not shutil.which('file'), reason='needs file(1)')
+def test_tree_batches_unknown_and_caches(tmp_path):
+    root = tmp_path / 'root'; (root / 'bin').mkdir(parents=True)
+    (root / 'bin' / 'init').write_text('#!/bin/sh\n')
+    (root / 'blob').write_bytes(b'\x00\x01\x02' * 100)
+    os.symlink('init', root / 'bin' / 'sh')
+    cache = tmp_path / 'ft.json'
+    logs = []
+    types = dict(classify_tree(str(root), logs.append, str(cache)))
+    assert types[os.path.join('bin', 'sh')] == 'symbolic link to init'
+    assert types['blob'] and cache.exists()
+    assert 'file/libmagic 1' in logs[-1]
+    assert dict(classify_tree(str(root), logs.append, str(cache))) == types
+    assert 'cache 1' in logs[-1]
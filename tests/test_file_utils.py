@@ -1,4 +1,4 @@
-from core.file_utils import sha256sum, md5sum, crc32sum, get_entropy
+from core.file_utils import sha256sum, md5sum, crc32sum, get_entropy, valid_entry_name, safe_join
 import tempfile, os
 
 def test_hash_functions(tmp_path):
@@ -14,3 +14,15 @@ def test_entropy(tmp_path):
     p.write_bytes(os.urandom(4096))
     ent = get_entropy(str(p))
     assert 'avg=' in ent
+
+
+def test_entry_name_and_safe_join(tmp_path):
+    import pytest
+    assert valid_entry_name('busybox') and valid_entry_name('.profile')
+    assert not any(valid_entry_name(n) for n in ('', '.', '..', 'a/b', 'x\0y'))
+    assert safe_join(str(tmp_path), 'etc', 'passwd') == os.path.join(str(tmp_path), 'etc', 'passwd')
+    os.symlink('/', tmp_path / 'lib')
+    with pytest.raises(ValueError):
+        safe_join(str(tmp_path), 'lib', 'evil')
+    with pytest.raises(ValueError):
+        safe_join(str(tmp_path), '..', 'x')
@@ -0,0 +1,50 @@
+import os, random
+from core.fw_diff import diff_images, iter_chunks, format_report, MIN_CHUNK, MAX_CHUNK
+
+
+def _rand(rnd, n):
+    return bytes(rnd.getrandbits(8) for _ in range(n))
+
+
+def test_chunks_resync_after_insert():
+    rnd = random.Random(3)
+    data = _rand(rnd, 400000)
+    shifted = data[:1000] + b'new bytes' + data[1000:]
+    a = {data[o:o + n] for o, n in iter_chunks(data)}
+    b = [shifted[o:o + n] for o, n in iter_chunks(shifted)]
+    assert all(MIN_CHUNK <= len(c) <= MAX_CHUNK for c in b[:-1])
+    assert sum(1 for c in b if c in a) >= len(b) - 2
+
+
+def test_diff_classifies_regions(tmp_path):
+    rnd = random.Random(1)
+    old = _rand(rnd, 300000) + b'\xff' * 200000 + _rand(rnd, 500000)
+    new = bytearray(old)
+    new[100000:100010] = b'X' * 10
+    new[400000:400000] = b'INSERTED' * 100
+    blk = bytes(new[700000:720000])
+    del new[700000:720000]
+    new += blk
+    del new[50000:51000]
+    (tmp_path / 'a.bin').write_bytes(old)
+    (tmp_path / 'b.bin').write_bytes(bytes(new))
+    parts = [{'fs': 'squashfs', 'offset': 300000, 'size': 700000}]
+    rep = diff_images(str(tmp_path / 'a.bin'), str(tmp_path / 'b.bin'), parts_old=parts, parts_new=parts)
+    got = [(r['kind'], r['old_offset'], r['old_length'], r['new_offset'], r['new_length']) for r in rep['regions']]
+    assert got == [
+        ('deleted', 50000, 1000, 50000, 0),
+        ('changed', 100000, 10, 99000, 10),
+        ('inserted', 400000, 0, 399000, 800),
+        ('moved', 700000 - 800, 20000, len(new) - 20000, 20000),
+    ]
+    assert rep['regions'][2]['new_partitions'] == ['squashfs@0x493E0']
+    assert rep['summary']['partitions_touched'] == ['squashfs@0x493E0']
+    assert 'inserted' in format_report(rep)
+
+
+def test_identical_images(tmp_path):
+    data = os.urandom(100000)
+    (tmp_path / 'a.bin').write_bytes(data)
+    (tmp_path / 'b.bin').write_bytes(data)
+    rep = diff_images(str(tmp_path / 'a.bin'), str(tmp_path / 'b.bin'), [], [])
+    assert rep['regions'] == [] and rep['summary']['identical']
@@ -0,0 +1,51 @@
+import struct, binascii
+import pytest
+from core.hex_view import HexSource, format_row, region_map, region_at, parse_pattern, search
+
+ENV = b"bootcmd=bootm 0x9f020000\x00bootdelay=1\x00baudrate=115200\x00bootargs=console=ttyS0,115200\x00\x00"
+
+
+def test_format_row_and_pattern():
+    hx, asc = format_row(b'hsqs\x00\x01' + bytes(range(0x41, 0x4b)))
+    assert hx.startswith('68 73 71 73 00 01 41 42  43 44') and asc == 'hsqs..ABCDEFGHIJ'
+    hx, asc = format_row(b'AB')
+    assert len(hx) == len(format_row(bytes(16))[0]) and asc == 'AB'
+    assert parse_pattern('de ad BE ef', True) == b'\xde\xad\xbe\xef'
+    assert parse_pattern('root:', False) == b'root:'
+    with pytest.raises(ValueError):
+        parse_pattern('xyz', True)
+
+
+def test_search_windows_and_wrap(tmp_path):
+    p = tmp_path / 'img.bin'
+    data = bytearray(10000)
+    data[1000:1004] = b'MARK'; data[4094:4098] = b'MARK'  # second hit straddles a window edge
+    p.write_bytes(bytes(data))
+    assert search(str(p), b'MARK', 0, window=4096) == 1000
+    assert search(str(p), b'MARK', 1001, window=4096) == 4094
+    assert search(str(p), b'MARK', 4095, window=4096) == 1000  # wrapped
+    assert search(str(p), b'MARK', 4095, wrap=False, window=4096) is None
+    assert search(str(p), b'NOPE') is None
+
+
+def test_sparse_multi_gb_source(tmp_path):
+    p = tmp_path / 'big.bin'
+    with open(p, 'wb') as f:
+        f.truncate(5 << 30)
+        f.seek((5 << 30) - 16); f.write(b'END-OF-THE-IMAGE')
+    with HexSource(str(p)) as src:
+        assert src.size == 5 << 30
+        assert src.read(src.size - 16, 64) == b'END-OF-THE-IMAGE'
+        assert src.read(123456789, 4) == b'\x00' * 4 and src.read(src.size, 4) == b''
+
+
+def test_region_map(tmp_path):
+    env = ENV + b'\x00' * (0x1000 - 4 - len(ENV))
+    block = struct.pack('<I', binascii.crc32(env[:len(ENV) - 1]) & 0xffffffff) + env
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(b'\xff' * 0x2000 + block + b'\xff' * 0x1000 + b'hsqs' + b'\x00' * 0x3000)
+    regions = region_map(str(fw))
+    kinds = [(r['kind'], r['start']) for r in regions]
+    assert ('env', 0x2000) in kinds and ('rootfs', 0x4000) in kinds
+    assert region_at(regions, 0x2010)['kind'] == 'env'
+    assert region_at(regions, 0x4005)['kind'] == 'rootfs' and region_at(regions, 0x10) is None
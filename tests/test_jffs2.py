@@ -0,0 +1,98 @@
+import binascii, lzma, os, stat, struct, zlib
+import pytest
+from core.jffs2 import JFFS2Image, extract_jffs2, rtime_decompress
+
+
+def _crc(b):
+    return (binascii.crc32(b, 0xFFFFFFFF) ^ 0xFFFFFFFF) & 0xFFFFFFFF
+
+
+def _pad(b):
+    return b + b'\xff' * (-len(b) % 4)
+
+
+def _hdr(e, ntype, totlen):
+    h = struct.pack(e + 'HHI', 0x1985, ntype, totlen)
+    return h + struct.pack(e + 'I', _crc(h))
+
+
+def _dirent(e, pino, version, ino, name, dtype):
+    name = name.encode()
+    body = _hdr(e, 0xE001, 40 + len(name)) + struct.pack(e + 'IIIIBB2x', pino, version, ino, 0, len(name), dtype)
+    return _pad(body + struct.pack(e + 'II', _crc(body), _crc(name)) + name)
+
+
+def _inode(e, ino, version, mode, data, offset=0, isize=None, compr=0):
+    if compr == 6:
+        payload = zlib.compress(data)
+    elif compr == 2:  # rtime with no back-references
+        payload = b''.join(bytes([c, 0]) for c in data)
+    elif compr == 8:
+        payload = lzma.compress(data, format=lzma.FORMAT_ALONE, filters=[
+            {'id': lzma.FILTER_LZMA1, 'lc': 0, 'lp': 0, 'pb': 0, 'dict_size': 0x2000}])[13:]
+    else:
+        payload = data
+    isize = offset + len(data) if isize is None else isize
+    body = _hdr(e, 0xE002, 68 + len(payload)) + struct.pack(
+        e + 'IIIHHIIIIIIIBBHI', ino, version, mode, 0, 0, isize, 0, 1000, 0, offset,
+        len(payload), len(data), compr, 0, 0, _crc(payload))
+    return _pad(body + struct.pack(e + 'I', _crc(body[:60])) + payload)
+
+
+def _image(e):
+    nodes = [
+        _inode(e, 2, 1, stat.S_IFDIR | 0o755, b''), _dirent(e, 1, 1, 2, 'etc', 4),
+        _inode(e, 3, 1, stat.S_IFREG | 0o600, b'root:old:1::::::\n', compr=6),
+        _dirent(e, 2, 1, 3, 'shadow', 8),
+        _inode(e, 3, 2, stat.S_IFREG | 0o600, b'root:new:1::::::\n', compr=8),
+        _inode(e, 4, 1, stat.S_IFREG | 0o755, b'AB' * 3000, compr=2),
+        _inode(e, 4, 2, stat.S_IFREG | 0o755, b'', offset=6000, isize=8000, compr=1),
+        _dirent(e, 1, 2, 4, 'busybox', 8),
+        _inode(e, 5, 1, stat.S_IFLNK | 0o777, b'busybox'), _dirent(e, 1, 3, 5, 'sh', 10),
+        _inode(e, 6, 1, stat.S_IFREG | 0o644, b'gone'), _dirent(e, 1, 4, 6, 'tmpfile', 8),
+        _dirent(e, 1, 5, 0, 'tmpfile', 8),
+    ]
+    first, rest = b''.join(nodes[:5]), b''.join(nodes[5:])
+    return first + b'\xff' * (4096 - len(first)) + rest  # erase-block padding
+
+
+@pytest.mark.parametrize('e', ['<', '>'])
+def test_lazy_read_and_extract(tmp_path, e):
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(b'\0' * 256 + _image(e) + b'\xff' * 1000)
+    with JFFS2Image(str(fw), offset=256) as img:
+        assert img.endian == e
+        assert img.listdir('/') == ['busybox', 'etc', 'sh']
+        assert img.read('/etc/shadow') == b'root:new:1::::::\n'
+        assert img.read('/busybox') == b'AB' * 3000 + b'\0' * 2000
+        assert img.readlink('/sh') == 'busybox'
+        assert img.read('/sh') == img.read('/busybox')
+        assert img.stat('/etc/shadow')['mode'] & 0o777 == 0o600
+        assert not img.exists('/tmpfile')
+    out = tmp_path / 'out'
+    ok, err = extract_jffs2(str(fw), str(out), offset=256, workers=2)
+    assert ok, err
+    assert (out / 'etc' / 'shadow').read_bytes() == b'root:new:1::::::\n'
+    assert os.readlink(out / 'sh') == 'busybox'
+    assert (out / 'busybox').stat().st_size == 8000
+
+
+def test_rtime_backrefs():
+    # the second 'a' repeats 3 bytes starting after the first 'a' (overlapping copy)
+    assert rtime_decompress(bytes([97, 0, 98, 0, 97, 3]), 6) == b'ababab'
+
+
+def test_extract_rejects_traversal_names(tmp_path):
+    e = '<'
+    nodes = [_inode(e, 2, 1, stat.S_IFREG | 0o644, b'pwned'), _dirent(e, 1, 1, 2, '../../x', 8),
+             _inode(e, 3, 1, stat.S_IFREG | 0o644, b'pwned'), _dirent(e, 1, 2, 3, 'a/../../y', 8),
+             _inode(e, 4, 1, stat.S_IFREG | 0o644, b'fine'), _dirent(e, 1, 3, 4, 'ok', 8)]
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(b''.join(nodes))
+    dest = tmp_path / 'out' / 'dest'
+    with JFFS2Image(str(fw)) as img:
+        assert img.listdir('/') == ['ok'] and img.stats['bad_names'] == 2
+    ok, err = extract_jffs2(str(fw), str(dest))
+    assert ok, err
+    assert sorted(os.listdir(dest)) == ['ok']
+    assert not (tmp_path / 'x').exists() and not (tmp_path / 'y').exists()
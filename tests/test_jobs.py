@@ -0,0 +1,84 @@
+import threading
+import pytest
+from core.jobs import JobRunner, JobBusy
+
+
+class Recorder:
+    def __init__(self):
+        self.lines, self.progress, self.done = [], [], []
+
+    def on_log(self, job, line):
+        self.lines.append((job.id, line))
+
+    def on_progress(self, job, done, total, msg):
+        self.progress.append((done, total, msg))
+
+    def on_finished(self, job):
+        self.done.append(job)
+
+
+def test_result_log_and_progress():
+    rec = Recorder()
+    runner = JobRunner(max_workers=2, listener=rec)
+
+    def work(ctx, a, b=0):
+        ctx.log('start'); ctx.progress(1, 2, 'half')
+        return a + b
+    job = runner.submit('add', work, 2, b=3)
+    job.future.result(timeout=5)
+    assert job.status == 'done' and job.result == 5 and job.elapsed() >= 0
+    assert rec.lines == [(job.id, 'start')] and rec.progress == [(1, 2, 'half')]
+    assert rec.done == [job] and runner.jobs() == []
+    runner.shutdown()
+
+
+def test_jobs_run_concurrently():
+    runner = JobRunner(max_workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+    jobs = [runner.submit(f'j{i}', lambda ctx: barrier.wait()) for i in range(2)]
+    for j in jobs:
+        j.future.result(timeout=5)
+    assert [j.status for j in jobs] == ['done', 'done']
+    runner.shutdown()
+
+
+def test_cancel_through_check_and_key_exclusion():
+    rec = Recorder()
+    runner = JobRunner(max_workers=2, listener=rec)
+    started, cleaned = threading.Event(), []
+
+    def long_op(ctx, log_func):
+        started.set()
+        try:
+            while True:
+                try:
+                    log_func('tick')  # core code only ever sees a plain log_func
+                    ctx.check()  # as core.tool_runner polls while a tool runs
+                except Exception:
+                    pass  # broad handlers in core must not swallow cancellation
+        finally:
+            log_func('cleanup')  # logging during unwinding must not raise again
+            cleaned.append(True)
+    job = runner.submit('patch', lambda ctx: long_op(ctx, ctx.log), key='patch')
+    assert started.wait(5)
+    assert runner.busy('patch')
+    with pytest.raises(JobBusy):
+        runner.submit('again', lambda ctx: None, key='patch')
+    job.cancel()
+    job.future.result(timeout=5)
+    assert job.status == 'cancelled' and cleaned == [True]
+    assert rec.lines[-1] == (job.id, 'cleanup')
+    assert not runner.busy('patch')
+    runner.submit('again', lambda ctx: None, key='patch').future.result(timeout=5)
+    runner.shutdown()
+
+
+def test_failure_is_reported():
+    runner = JobRunner(max_workers=1)
+
+    def bad(ctx):
+        raise RuntimeError('boom')
+    job = runner.submit('bad', bad)
+    job.future.result(timeout=5)
+    assert job.status == 'failed' and job.error == 'boom' and 'RuntimeError' in job.traceback
+    runner.shutdown()
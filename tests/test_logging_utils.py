@@ -0,0 +1,33 @@
+import datetime, threading
+from core.logging_utils import write_category, shutdown_logging, GuiLogger
+
+
+def test_category_files_written_by_listener(tmp_path):
+    for i in range(1000):
+        write_category(str(tmp_path), 'analysis', f"line {i}")
+    write_category(str(tmp_path), 'patch_serial', "serial ok")
+    shutdown_logging()  # drains the queue and closes the files
+    day = datetime.datetime.utcnow().strftime('%Y%m%d')
+    lines = (tmp_path / 'analysis' / f"{day}.log").read_text(encoding='utf-8').splitlines()
+    assert lines == [f"line {i}" for i in range(1000)]
+    assert (tmp_path / 'patch_serial' / f"{day}.log").read_text(encoding='utf-8') == "serial ok\n"
+    write_category(str(tmp_path), 'analysis', "after restart")  # listener restarts on demand
+    shutdown_logging()
+    assert (tmp_path / 'analysis' / f"{day}.log").read_text(encoding='utf-8').endswith("line 999\nafter restart\n")
+
+
+def test_gui_logger_batches_and_bounds():
+    batches = []
+    log = GuiLogger(batches.append, name=None, max_pending=100)
+    threads = [threading.Thread(target=lambda: [log(f"t{i}") for i in range(30)]) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert log.flush() == 60 and len(batches) == 1 and batches[0].count('\n') == 59
+    assert log.flush() == 0 and len(batches) == 1
+    for i in range(250):
+        log(f"n{i}")
+    assert log.last == 'n249'
+    lines = log.drain()
+    assert lines[0] == "[... ข้าม 150 บรรทัด]" and lines[1] == 'n150' and len(lines) == 101
@@ -0,0 +1,72 @@
+import json, os
+from core.extract_cache import ExtractionCache
+from core.patch_txn import PatchTransaction, disable_inetd_services, set_root_password, set_boot_delay_byte
+
+FILES = {'etc/inetd.conf': 'telnet stream tcp nowait root /usr/sbin/telnetd\n', 'etc/shadow': 'root:x:0:0:::::\n'}
+
+
+def _extract(calls):
+    # partition = JSON {relpath: text}
+    def extract(fs, rootfs_bin, dest, log_func):
+        calls.append('extract')
+        for rel, text in json.load(open(rootfs_bin)).items():
+            os.makedirs(os.path.join(dest, os.path.dirname(rel)), exist_ok=True)
+            with open(os.path.join(dest, rel), 'w') as f:
+                f.write(text)
+        return True, ''
+    return extract
+
+
+def _repack(calls):
+    def repack(fs, src_dir, out_bin, log_func, base_image=None, extents_out=None):
+        calls.append('repack')
+        tree = {}
+        for dp, dn, fn in os.walk(src_dir):
+            for n in fn:
+                p = os.path.join(dp, n)
+                tree[os.path.relpath(p, src_dir)] = open(p).read()
+        with open(out_bin, 'w') as f:
+            json.dump(tree, f)
+        return True, ''
+    return repack
+
+
+def _fw(tmp_path):
+    blob = json.dumps(FILES).encode()
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(b'\x05' * 0x200 + blob + b' ' * 256)
+    return str(fw), dict(fs='jsonfs', offset=0x200, size=len(blob) + 256)
+
+
+def test_single_extract_and_repack(tmp_path):
+    fw, part = _fw(tmp_path)
+    calls = []
+    cache = ExtractionCache(root=str(tmp_path / 'cache'), quota=1 << 20)
+    txn = PatchTransaction(fw, part, _extract(calls), _repack(calls), cache=cache)
+    txn.add_file('network', disable_inetd_services).add_file('rootpw', set_root_password(''))
+    txn.add_raw('bootdelay', set_boot_delay_byte(1))
+    out = str(tmp_path / 'out.bin')
+    ok, err = txn.commit(out)
+    assert ok, err
+    assert calls == ['extract', 'repack']
+    data = open(out, 'rb').read()
+    assert len(data) == os.path.getsize(fw) and data[0x100] == 1
+    tree = json.loads(data[0x200:0x200 + part['size']].rstrip(b'\x00'))
+    assert tree['etc/inetd.conf'].startswith('#DISABLED telnet')
+    assert tree['etc/shadow'].startswith('root:!:')
+    manifest = json.load(open(out + '.manifest.json'))
+    assert [o['op'] for o in manifest['ops']] == ['network', 'rootpw', 'bootdelay']
+    assert all(o['changed'] for o in manifest['ops'])
+
+
+def test_failing_op_writes_nothing(tmp_path):
+    fw, part = _fw(tmp_path)
+    calls = []
+    cache = ExtractionCache(root=str(tmp_path / 'cache'), quota=1 << 20)
+    txn = PatchTransaction(fw, part, _extract(calls), _repack(calls), cache=cache)
+    txn.add_file('rootpw', set_root_password('$6$salt$hash'))
+    txn.add_file('boom', lambda root, log: (_ for _ in ()).throw(RuntimeError('bad')))
+    out = tmp_path / 'out.bin'
+    ok, err = txn.commit(str(out))
+    assert not ok and err.startswith('boom')
+    assert not out.exists() and 'repack' not in calls
@@ -0,0 +1,31 @@
+import struct, random
+from core.repack_fit import detect_bcj, candidate_configs, plan_fit
+
+
+def _fake_elf(path, machine):
+    hdr = b'\x7fELF' + bytes([1, 1, 1]) + b'\0' * 9 + struct.pack('<HH', 2, machine) + b'\0' * 44
+    path.write_bytes(hdr + b'\x01\x02' * 4000)
+
+
+def test_detect_bcj_and_candidates(tmp_path):
+    _fake_elf(tmp_path / 'busybox', 0x28)
+    (tmp_path / 'README').write_text('x')
+    assert detect_bcj(str(tmp_path)) == 'arm'
+    cfgs = candidate_configs('gzip', 'arm')
+    assert cfgs[0] == {'comp': 'xz', 'block_size': 1024 * 1024, 'bcj': 'arm'}
+    assert any(c['comp'] == 'gzip' and c['block_size'] == 64 * 1024 for c in cfgs)
+
+
+def test_plan_fit_picks_smallest_fitting(tmp_path):
+    src = tmp_path / 'root'; src.mkdir()
+    rnd = random.Random(3)
+    words = [rnd.randbytes(3).hex() for _ in range(3000)]
+    (src / 'data').write_text(' '.join(rnd.choice(words) for _ in range(60000)))
+    cfgs = [{'comp': 'gzip', 'block_size': 256 * 1024, 'bcj': None},
+            {'comp': 'xz', 'block_size': 1024 * 1024, 'bcj': None}]
+    out = tmp_path / 'fit.sqsh'
+    ok, info = plan_fit(str(src), str(out), 1 << 20, configs=cfgs)
+    assert ok and info['size'] == out.stat().st_size
+    assert info['comp'] == 'xz'
+    ok, err = plan_fit(str(src), str(tmp_path / 'none.sqsh'), 100, configs=cfgs)
+    assert not ok and not (tmp_path / 'none.sqsh').exists()
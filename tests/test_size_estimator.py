@@ -0,0 +1,33 @@
+import os, random
+from core.size_estimator import SizeEstimator, plan_shrink
+from rebuild_squashfs import SquashFSBuilder
+
+
+def test_estimate_close_to_real_image(tmp_path):
+    root = tmp_path / 'root'
+    (root / 'usr' / 'share' / 'doc').mkdir(parents=True)
+    rnd = random.Random(5)
+    words = [rnd.randbytes(3).hex() for _ in range(500)]
+    for i in range(30):
+        n = rnd.randint(100, 40000)
+        (root / f'f{i}').write_text(' '.join(rnd.choice(words) for _ in range(n // 7)))
+    (root / 'usr' / 'share' / 'doc' / 'big.txt').write_bytes(rnd.randbytes(150000))
+    est = SizeEstimator('gzip', 65536, cache_path=str(tmp_path / 'cache.json'))
+    report = est.estimate_tree(str(root))
+    SquashFSBuilder(str(root), block_size=65536, compression='gzip', workers=1).build(str(tmp_path / 'o.sqsh'))
+    real = os.path.getsize(tmp_path / 'o.sqsh')
+    assert abs(report['total'] - real) / real < 0.1
+    # cached per content hash: a second estimator reuses the sampled block sizes
+    again = SizeEstimator('gzip', 65536, cache_path=str(tmp_path / 'cache.json'))
+    assert again.estimate_tree(str(root))['data'] == report['data']
+
+
+def test_plan_shrink_min_cost_cover():
+    items = [{'action': 'remove', 'path': 'usr/share/locale', 'cost': 6, 'saving': 900},
+             {'action': 'strip', 'path': 'bin/a', 'cost': 1, 'saving': 300},
+             {'action': 'strip', 'path': 'bin/b', 'cost': 1, 'saving': 350},
+             {'action': 'remove', 'path': 'var/log', 'cost': 1, 'saving': 100}]
+    chosen = plan_shrink(items, 600)
+    assert sorted(it['path'] for it in chosen) == ['bin/a', 'bin/b']
+    assert plan_shrink(items, 10_000) is None
+    assert plan_shrink(items, 0) == []
@@ -0,0 +1,43 @@
+import os
+from core.slice_io import extract_slice, clone_file, splice_partition
+
+
+def test_extract_and_splice(tmp_path):
+    fw = tmp_path / 'fw.bin'
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    fw.write_bytes(data)
+    part = tmp_path / 'part.bin'
+    assert extract_slice(str(fw), 4096, 2 * 1024 * 1024, str(part)) == 2 * 1024 * 1024
+    assert part.read_bytes() == data[4096:4096 + 2 * 1024 * 1024]
+    img = tmp_path / 'new.bin'
+    img.write_bytes(b'\xaa' * 5000)
+    out = tmp_path / 'out.bin'
+    ok, err = splice_partition(str(fw), str(out), 4096, 2 * 1024 * 1024, str(img))
+    assert ok, err
+    new = out.read_bytes()
+    assert len(new) == len(data)
+    assert new[:4096] == data[:4096]
+    assert new[4096:9096] == b'\xaa' * 5000
+    assert new[9096:4096 + 2 * 1024 * 1024] == b'\0' * (2 * 1024 * 1024 - 5000)
+    assert new[4096 + 2 * 1024 * 1024:] == data[4096 + 2 * 1024 * 1024:]
+
+
+def test_splice_rejects_oversize_and_clone(tmp_path):
+    fw = tmp_path / 'fw.bin'; fw.write_bytes(b'x' * 8192)
+    img = tmp_path / 'img'; img.write_bytes(b'y' * 5000)
+    ok, err = splice_partition(str(fw), str(tmp_path / 'o'), 0, 4096, str(img))
+    assert not ok and not (tmp_path / 'o').exists()
+    assert clone_file(str(fw), str(tmp_path / 'c')) in ('reflink', 'copy')
+    assert (tmp_path / 'c').read_bytes() == b'x' * 8192
+
+
+def test_clone_onto_itself_keeps_data(tmp_path):
+    fw = tmp_path / 'same.bin'; fw.write_bytes(b'z' * 8192)
+    assert clone_file(str(fw), str(fw)) == 'same'
+    assert fw.read_bytes() == b'z' * 8192
+    link = tmp_path / 'link.bin'; os.link(fw, link)
+    assert clone_file(str(fw), str(link)) == 'same'
+    img = tmp_path / 'img'; img.write_bytes(b'y' * 100)
+    ok, err = splice_partition(str(fw), str(fw), 0, 4096, str(img))
+    assert ok, err
+    assert fw.read_bytes() == b'y' * 100 + b'\0' * 3996 + b'z' * 4096
@@ -0,0 +1,75 @@
+import os
+from rebuild_squashfs import SquashFSBuilder
+from core.squashfs_reader import SquashFSImage
+
+
+def _tree(root):
+    (root / 'etc').mkdir(parents=True)
+    (root / 'bin').mkdir()
+    (root / 'etc' / 'shadow').write_text('root:!:1::::::\n')
+    big = os.urandom(5000) * 40 + b'tail'
+    (root / 'bin' / 'busybox').write_bytes(big)
+    (root / 'bin' / 'copy').write_bytes(big)
+    (root / 'bin' / 'zeros').write_bytes(b'\0' * 8192 * 2)
+    os.symlink('busybox', root / 'bin' / 'sh')
+    return big
+
+
+def test_roundtrip_dedup_and_determinism(tmp_path):
+    big = _tree(tmp_path / 'root')
+    images = []
+    for workers in (1, 2):
+        out = tmp_path / f'out{workers}.sqsh'
+        b = SquashFSBuilder(str(tmp_path / 'root'), block_size=8192, compression='gzip', workers=workers)
+        b.build(str(out))
+        images.append(out.read_bytes())
+    assert images[0] == images[1]
+    assert b.stats['dup_files'] == 1
+    assert len(images[0]) % 4096 == 0
+    with SquashFSImage(str(tmp_path / 'out1.sqsh')) as img:
+        assert img.listdir('/bin') == ['busybox', 'copy', 'sh', 'zeros']
+        assert img.read('/bin/copy') == big
+        assert img.read('/bin/zeros') == b'\0' * 16384
+        assert img.readlink('/bin/sh') == 'busybox'
+        assert img.read('/etc/shadow') == b'root:!:1::::::\n'
+
+
+def test_progress_callback(tmp_path):
+    _tree(tmp_path / 'root')
+    seen = []
+    SquashFSBuilder(str(tmp_path / 'root'), block_size=8192, compression='xz', workers=1).build(
+        str(tmp_path / 'o.sqsh'), lambda *a: seen.append(a))
+    blocks_done, blocks_total, bytes_done, bytes_total = seen[-1]
+    assert blocks_done == blocks_total and bytes_done == bytes_total
+
+
+def test_incremental_reuses_unchanged_blocks(tmp_path):
+    big = _tree(tmp_path / 'root')
+    base = tmp_path / 'base.sqsh'
+    SquashFSBuilder(str(tmp_path / 'root'), block_size=8192, compression='gzip', workers=1).build(str(base))
+    (tmp_path / 'root' / 'etc' / 'shadow').write_text('root:$6$new:1::::::\n')
+    b = SquashFSBuilder(str(tmp_path / 'root'), block_size=8192, compression='gzip', workers=1,
+                        reuse_image=str(base))
+    b.build(str(tmp_path / 'inc.sqsh'))
+    assert b.stats['reused_files'] == 2  # busybox (+ its duplicate) and zeros; shadow changed
+    old = base.read_bytes()
+    new = (tmp_path / 'inc.sqsh').read_bytes()
+    for new_pos, orig_pos, length in b.reused_extents:
+        assert new[new_pos:new_pos + length] == old[orig_pos:orig_pos + length]
+    with SquashFSImage(str(tmp_path / 'inc.sqsh')) as img:
+        assert img.read('/etc/shadow') == b'root:$6$new:1::::::\n'
+        assert img.read('/bin/busybox') == big
+        assert img.read('/bin/copy') == big
+
+
+def test_lzma_blocks_carry_uncompressed_size(tmp_path):
+    import struct
+    from core.squashfs_reader import compress_block, decompress_block
+    data = b'busybox ' * 4000
+    block = compress_block(2, data, 131072)
+    assert struct.unpack_from('<Q', block, 5)[0] == len(data)
+    assert decompress_block(2, block, 131072) == data
+    big = _tree(tmp_path / 'root')
+    SquashFSBuilder(str(tmp_path / 'root'), block_size=8192, compression='lzma', workers=1).build(str(tmp_path / 'o.sqsh'))
+    with SquashFSImage(str(tmp_path / 'o.sqsh')) as img:
+        assert img.read('/bin/busybox') == big
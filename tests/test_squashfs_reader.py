@@ -0,0 +1,87 @@
+import struct, zlib
+from core.squashfs_reader import SquashFSImage, extract_squashfs
+
+
+def _meta(data: bytes) -> bytes:
+    comp = zlib.compress(data, 9)
+    return struct.pack('<H', len(comp)) + comp
+
+
+def _tiny_image(path, content: bytes):
+    """Hand-assembled gzip image: /etc/passwd (regular file) and /sh -> /bin/busybox."""
+    bs = 4096
+    data_start = 96
+    # inode table: passwd(1), link(2), etc dir(3), root dir(4)
+    hdr = lambda t, perm, num: struct.pack('<HHHHII', t, perm, 0, 0, 1700000000, num)
+    f_ino = hdr(2, 0o644, 1) + struct.pack('<IIII', data_start, 0xFFFFFFFF, 0, len(content)) + struct.pack('<I', len(content) | (1 << 24))
+    target = b'/bin/busybox'
+    l_ino = hdr(3, 0o777, 2) + struct.pack('<II', 1, len(target)) + target
+    etc_off = len(f_ino) + len(l_ino)
+    # directory table: etc listing at 0, root listing after it
+    etc_list = struct.pack('<III', 0, 0, 1) + struct.pack('<HhHH', 0, 0, 2, 5) + b'passwd'
+    root_list = struct.pack('<III', 1, 0, 2) + struct.pack('<HhHH', etc_off, 1, 1, 2) + b'etc' \
+        + struct.pack('<HhHH', len(f_ino), 0, 3, 1) + b'sh'
+    etc_ino = hdr(1, 0o755, 3) + struct.pack('<IIHHI', 0, 2, len(etc_list) + 3, 0, 4)
+    root_off = etc_off + len(etc_ino)
+    root_ino = hdr(1, 0o755, 4) + struct.pack('<IIHHI', 0, 3, len(root_list) + 3, len(etc_list), 5)
+    inode_tbl = _meta(f_ino + l_ino + etc_ino + root_ino)
+    dir_tbl = _meta(etc_list + root_list)
+    id_blk = _meta(struct.pack('<I', 0))
+    inode_start = data_start + len(content)
+    dir_start = inode_start + len(inode_tbl)
+    id_blk_start = dir_start + len(dir_tbl)
+    id_start = id_blk_start + len(id_blk)
+    end = id_start + 8
+    sb = struct.pack('<IIIIIHHHHHHQQQQQQQQ', 0x73717368, 4, 1700000000, bs, 0, 1, 12, 0x10, 1, 4, 0,
+                     root_off, end, id_start, 0xFFFFFFFFFFFFFFFF, inode_start, dir_start,
+                     0xFFFFFFFFFFFFFFFF, 0xFFFFFFFFFFFFFFFF)
+    img = sb + content + inode_tbl + dir_tbl + id_blk + struct.pack('<Q', id_blk_start)
+    with open(path, 'wb') as f:
+        f.write(b'\xff' * 64 + img)  # embedded at an offset, as in a firmware dump
+
+
+def test_lazy_lookup_and_read(tmp_path):
+    content = b'root:x:0:0:root:/root:/bin/sh\n'
+    img_path = tmp_path / 'fw.bin'
+    _tiny_image(img_path, content)
+    with SquashFSImage(str(img_path), offset=64) as img:
+        assert img.compression == 'gzip'
+        assert img.listdir('/') == ['etc', 'sh']
+        assert img.read('/etc/passwd') == content
+        assert img.readlink('sh') == '/bin/busybox'
+        assert img.stat('/etc/passwd')['size'] == len(content)
+        assert not img.exists('/etc/shadow')
+        with img.open('etc/passwd') as f:
+            f.seek(5)
+            assert f.read(4) == b'x:0:'
+    with open(img_path, 'rb') as f:
+        raw = f.read()[64:]
+    (tmp_path / 'rootfs.bin').write_bytes(raw)
+    ok, err = extract_squashfs(str(tmp_path / 'rootfs.bin'), str(tmp_path / 'out'))
+    assert ok, err
+    assert (tmp_path / 'out' / 'etc' / 'passwd').read_bytes() == content
+    assert (tmp_path / 'out' / 'sh').is_symlink()
+
+
+def test_extract_rejects_traversal_names(tmp_path, monkeypatch):
+    import os
+    import rebuild_squashfs
+    from core.squashfs_reader import SquashFSImage
+    # store every block uncompressed so the entry name can be rewritten in place
+    monkeypatch.setattr(rebuild_squashfs, 'compress_block', lambda comp, data, *a, **k: data + b'\0')
+    root = tmp_path / 'root'
+    (root / 'a' / 'b').mkdir(parents=True)
+    (root / 'a' / 'b' / 'AAAAAAx').write_bytes(b'pwned')
+    (root / 'a' / 'b' / 'ok').write_bytes(b'fine')
+    img = tmp_path / 'evil.sqsh'
+    rebuild_squashfs.SquashFSBuilder(str(root), block_size=4096, compression='gzip', workers=1).build(str(img))
+    data = img.read_bytes()
+    assert data.count(b'AAAAAAx') == 1
+    img.write_bytes(data.replace(b'AAAAAAx', b'../../x'))
+    dest = tmp_path / 'out' / 'dest'
+    dest.mkdir(parents=True)
+    with SquashFSImage(str(img)) as fs:
+        assert fs.listdir('/a/b') == ['ok']
+        fs.extract_all(str(dest))
+    assert not (tmp_path / 'out' / 'x').exists() and not (dest / 'x').exists()
+    assert (dest / 'a' / 'b' / 'ok').read_bytes() == b'fine'
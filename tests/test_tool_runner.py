@@ -0,0 +1,48 @@
+import sys, time, threading
+from core.jobs import JobRunner
+from core.tool_runner import run_tool, parse_progress, adaptive_timeout
+
+BAR = ("import sys, time\n"
+       "for i in range(1, 5):\n"
+       "    sys.stdout.write('\\r[===|   ] %d/4  %d%%' % (i, i * 25)); sys.stdout.flush(); time.sleep(0.02)\n"
+       "print()\nprint('created 4 files')\nsys.stderr.write('warning: xattr\\n')\n")
+
+
+def test_parse_progress_and_timeout_scaling():
+    assert parse_progress('[=========|          ] 120/4000   3%') == (120, 4000)
+    assert parse_progress(' 37%') == (37, 100)
+    assert parse_progress('35.12% of uncompressed filesystem size') is None
+    assert adaptive_timeout(0) == 60 and adaptive_timeout(100 << 20, rate=1 << 20) == 160
+
+
+def test_streams_output_and_progress():
+    logs, prog = [], []
+    ok, err = run_tool([sys.executable, '-c', BAR], logs.append, timeout=30,
+                       progress=lambda d, t, m: prog.append((d, t)), tag='unsquashfs')
+    assert ok and err == ''
+    assert prog == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert sorted(logs) == ['[unsquashfs] created 4 files', '[unsquashfs] warning: xattr']
+
+
+def test_failure_timeout_and_cancel():
+    ok, err = run_tool([sys.executable, '-c', 'import sys; print("bad superblock"); sys.exit(2)'], tag='t')
+    assert not ok and err == 't exit 2: bad superblock'
+    sleeper = [sys.executable, '-c', 'import time; time.sleep(30)']
+    t0 = time.time()
+    ok, err = run_tool(sleeper, timeout=0.5)
+    assert not ok and 'timeout' in err and time.time() - t0 < 10
+    flag = threading.Event()
+    threading.Timer(0.3, flag.set).start()
+    ok, err = run_tool(sleeper, cancel=flag.is_set, tag='t')
+    assert not ok and err == 't: cancelled'
+
+
+def test_job_cancel_kills_tool():
+    runner = JobRunner(max_workers=1)
+    job = runner.submit('extract', lambda ctx: run_tool([sys.executable, '-c', 'import time; time.sleep(30)']))
+    time.sleep(0.5)
+    t0 = time.time()
+    job.cancel()
+    job.future.result(timeout=10)
+    assert job.status == 'cancelled' and time.time() - t0 < 5
+    runner.shutdown()
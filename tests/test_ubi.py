@@ -0,0 +1,138 @@
+import os, stat, struct, zlib
+from core.ubi import UBIImage, detect_peb_size, extract_ubi
+
+PEB, VID_OFF, DATA_OFF = 16384, 512, 1024
+LEB = PEB - DATA_OFF
+
+
+def _crc(b):
+    return zlib.crc32(b) ^ 0xFFFFFFFF
+
+
+def _node(ntype, body, sqnum=1):
+    hdr = struct.pack('<IIQIBB2x', 0x06101831, 0, sqnum, 24 + len(body), ntype, 0)
+    node = hdr + body
+    node = node[:4] + struct.pack('<I', _crc(node[8:])) + node[8:]
+    return node + b'\0' * (-len(node) % 8)
+
+
+def _key(inum, ktype, low=0):
+    return struct.pack('<II', inum, (ktype << 29) | low)
+
+
+def _ubifs(extra=()):
+    """LEB list for a tiny committed UBIFS: /etc/passwd (zlib, 2 blocks), /bin/sh -> busybox."""
+    leaves = []
+    def ino(inum, mode, size, data=b''):
+        body = struct.pack('<16sQQQQQIIIIIIIIIII4xIH26x', _key(inum, 0) + b'\0' * 8, 0, size, 0, 0, 1234,
+                           0, 0, 0, 1, 0, 0, mode, 0, len(data), 0, 0, 0, 0) + data
+        leaves.append((_key(inum, 0), _node(0, body)))
+    def dent(parent, name, inum, itype):
+        body = struct.pack('<16sQxBHI', _key(parent, 2, len(name)) + b'\0' * 8, inum, itype, len(name), 0)
+        leaves.append((_key(parent, 2, len(name)), _node(2, body + name + b'\0')))
+    def data(inum, block, payload):
+        c = zlib.compressobj(9, zlib.DEFLATED, -15)
+        comp = c.compress(payload) + c.flush()
+        body = struct.pack('<16sIHH', _key(inum, 1, block) + b'\0' * 8, len(payload), 2, 0) + comp
+        leaves.append((_key(inum, 1, block), _node(1, body)))
+    passwd = b'root:x:0:0::/root:/bin/sh\n' * 200
+    ino(1, stat.S_IFDIR | 0o755, 0); ino(64, stat.S_IFDIR | 0o755, 0); ino(65, stat.S_IFDIR | 0o755, 0)
+    ino(66, stat.S_IFREG | 0o644, len(passwd)); ino(67, stat.S_IFLNK | 0o777, 7, b'busybox')
+    dent(1, b'etc', 64, 1); dent(1, b'bin', 65, 1); dent(64, b'passwd', 66, 0); dent(65, b'sh', 67, 2)
+    for args in extra:
+        dent(*args)
+    data(66, 0, passwd[:4096]); data(66, 1, passwd[4096:])
+    leb3 = b''; branches = b''
+    for key, node in leaves:
+        branches += struct.pack('<III8s', 3, len(leb3), len(node), key)
+        leb3 += node
+    idx_offs = len(leb3)
+    idx = _node(9, struct.pack('<HH', len(leaves), 0) + branches)
+    leb3 += idx
+    sb = _node(6, struct.pack('<2xBBIIIIIQIIIIIIIH', 0, 0, 0, 8, LEB, 8, 8, 0, 1, 1, 1, 1, 8, 0, 4, 2) + b'\0' * 64)
+    mst = _node(7, struct.pack('<QQIIIII', 67, 1, 0, 2, 3, idx_offs, len(idx)) + b'\0' * 64, sqnum=9)
+    return [sb, mst, b'', leb3], passwd
+
+
+def _peb(vol_id, lnum, data, sqnum, ec=1):
+    ec_hdr = struct.pack('>4sB3xQIII32x', b'UBI#', 1, ec, VID_OFF, DATA_OFF, 0x1234)
+    ec_hdr += struct.pack('>I', _crc(ec_hdr))
+    vid = struct.pack('>4sBBBBII4xIIII4xQ12x', b'UBI!', 1, 1, 0, 0, vol_id, lnum, 0, 0, 0, 0, sqnum)
+    vid += struct.pack('>I', _crc(vid))
+    peb = ec_hdr.ljust(VID_OFF, b'\xff') + vid
+    return (peb.ljust(DATA_OFF, b'\xff') + data).ljust(PEB, b'\xff')
+
+
+def _vtbl(names):
+    out = b''
+    for i in range(LEB // 172):
+        if i < len(names):
+            name = names[i].encode()
+            rec = struct.pack('>IIIBBH128sB23x', 4, 1, 0, 1, 0, len(name), name, 0)
+        else:
+            rec = struct.pack('>IIIBBH128sB23x', 0, 0, 0, 0, 0, 0, b'', 0)
+        out += rec + struct.pack('>I', _crc(rec))
+    return out
+
+
+def _image(extra=()):
+    lebs, passwd = _ubifs(extra)
+    pebs = [_peb(0x7FFFEFFF, 0, _vtbl(['rootfs', 'kernel']), 1), _peb(0x7FFFEFFF, 1, _vtbl(['rootfs', 'kernel']), 2)]
+    pebs += [_peb(0, i, d, 10 + i) for i, d in enumerate(lebs)]
+    pebs.append(_peb(0, 3, b'stale copy', 5))  # older copy of LEB 3 must lose
+    pebs.append(b'\xff' * PEB)  # erased block
+    pebs.append(_peb(1, 0, b'KERNEL' * 100, 20))
+    return b''.join(pebs), passwd
+
+
+def test_volumes_and_lazy_ubifs(tmp_path):
+    img, passwd = _image()
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(b'\0' * 4096 + img)
+    assert detect_peb_size(img) == PEB
+    with UBIImage(str(fw), offset=4096) as ubi:
+        vols = {v['name']: v for v in ubi.list_volumes()}
+        assert vols['rootfs']['ubifs'] and not vols['kernel']['ubifs']
+        assert ubi.volume('kernel').read(0, 12) == b'KERNELKERNEL'
+        fs = ubi.rootfs_volume().ubifs()
+        assert fs.listdir('/') == ['bin', 'etc']
+        assert fs.read('/etc/passwd') == passwd
+        assert fs.readlink('/bin/sh') == 'busybox'
+        assert fs.stat('/etc/passwd')['mtime'] == 1234
+    out = tmp_path / 'out'
+    ok, err = extract_ubi(str(fw), str(out), offset=4096)
+    assert ok, err
+    assert (out / 'etc' / 'passwd').read_bytes() == passwd
+    assert os.readlink(out / 'bin' / 'sh') == 'busybox'
+
+
+def test_newest_master_behind_pad_node(tmp_path):
+    lebs, passwd = _ubifs()
+    good = lebs[1]
+    stale = _node(7, struct.pack('<QQIIIII', 67, 0, 0, 2, 3, 8, 100) + b'\0' * 64, sqnum=3)
+    pad_len = 256 - len(stale) - 28  # pad node fills the rest of a 256-byte min_io unit
+    pad = _node(5, struct.pack('<I', pad_len))[:28] + b'\0' * pad_len
+    lebs[1] = stale + pad + stale + b'\xce' * 8
+    lebs[2] = stale + pad + good  # newest copy only in LEB 2
+    pebs = [_peb(0x7FFFEFFF, 0, _vtbl(['rootfs']), 1)] + [_peb(0, i, d, 10 + i) for i, d in enumerate(lebs)]
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(b''.join(pebs))
+    with UBIImage(str(fw)) as ubi:
+        fs = ubi.rootfs_volume().ubifs()
+        assert fs.master['cmt_no'] == 1
+        assert fs.read('/etc/passwd') == passwd
+
+
+def test_extract_rejects_traversal_names_and_dir_loops(tmp_path):
+    img, passwd = _image([(1, b'../../x', 66, 0), (65, b'a/../../y', 66, 0), (64, b'loop', 1, 1)])
+    fw = tmp_path / 'fw.bin'
+    fw.write_bytes(img)
+    with UBIImage(str(fw)) as ubi:
+        fs = ubi.rootfs_volume().ubifs()
+        assert fs.listdir('/') == ['bin', 'etc'] and fs.listdir('/bin') == ['sh']
+        assert len(list(fs.walk('/'))) == 3  # /etc/loop points back at the root
+    dest = tmp_path / 'out' / 'dest'
+    ok, err = extract_ubi(str(fw), str(dest))
+    assert ok, err
+    assert (dest / 'etc' / 'passwd').read_bytes() == passwd
+    assert not (tmp_path / 'x').exists() and not (tmp_path / 'y').exists()
@@ -0,0 +1,47 @@
+import binascii, struct
+from core.uboot_env import (find_compiled_env_tables, patch_compiled_uboot_env, patch_compiled_uboot_bootdelay,
+                           patch_uboot_env_vars)
+
+ENV = b"bootcmd=bootm 0x9f020000\x00bootdelay=1\x00baudrate=115200\x00bootargs=console=ttyS0,115200\x00\x00"
+
+def _make_fw(tmp_path, slack=32):
+    fw = tmp_path / "uboot.bin"
+    fw.write_bytes(b"\xAA" * 64 + ENV + b"\x00" * slack + b"\x55" * 16)
+    return fw
+
+def test_find_compiled_env_table(tmp_path):
+    data = _make_fw(tmp_path).read_bytes()
+    tables = find_compiled_env_tables(data)
+    assert len(tables) == 1
+    t = tables[0]
+    assert t['offset'] == 64 and t['end'] == 64 + len(ENV)
+    assert dict(t['pairs'])['bootdelay'] == '1'
+    assert t['capacity'] >= len(ENV) + 28
+
+def test_length_changing_patch_uses_slack(tmp_path):
+    fw = _make_fw(tmp_path); out = tmp_path / "out.bin"
+    ok, err = patch_compiled_uboot_env(str(fw), str(out), {'bootdelay': '15', 'bootargs': 'console=ttyS1,115200 root=/dev/mtdblock2'})
+    assert ok, err
+    data = out.read_bytes()
+    assert len(data) == fw.stat().st_size
+    assert data[:64] == b"\xAA" * 64 and data.endswith(b"\x55" * 16)
+    pairs = dict(find_compiled_env_tables(data)[0]['pairs'])
+    assert pairs['bootdelay'] == '15' and pairs['bootargs'].endswith('mtdblock2')
+
+def test_overflow_is_skipped(tmp_path):
+    fw = _make_fw(tmp_path, slack=4); out = tmp_path / "out.bin"
+    assert not patch_compiled_uboot_bootdelay(str(fw), str(out), 1, search_limit=None)  # unchanged
+    ok, err = patch_compiled_uboot_env(str(fw), str(out), {'bootargs': 'x' * 200})
+    assert not ok
+
+def test_env_block_patch_writes_in_place(tmp_path):
+    body = ENV.ljust(0x1000 - 4, b"\x00")
+    fw = tmp_path / "fw.bin"
+    fw.write_bytes(b"\xAA" * 0x400 + struct.pack('<I', binascii.crc32(body)) + body + b"\x55" * 0x400)
+    for dst in (tmp_path / "out.bin", fw):  # separate output, then patching the file itself
+        assert patch_uboot_env_vars(str(fw), str(dst), 0x400, 0x1000, {'bootdelay': '5'})
+        data = dst.read_bytes()
+        assert len(data) == 0x1800 and data[:0x400] == b"\xAA" * 0x400 and data.endswith(b"\x55" * 0x400)
+        block = data[0x404:0x1400]
+        assert b"bootdelay=5\x00" in block
+        assert struct.unpack('<I', data[0x400:0x404])[0] == binascii.crc32(block[:block.find(b"\x00\x00") + 2])
@@ -0,0 +1,43 @@
+import os
+from core.workspace import WorkspaceManager
+
+
+def test_ram_budget_and_accounting(tmp_path):
+    ram = tmp_path / 'ram'; ram.mkdir()
+    disk = tmp_path / 'disk'; disk.mkdir()
+    mgr = WorkspaceManager(ram_root=str(ram), ram_budget=10000, disk_root=str(disk))
+    mgr.ram_root = str(ram)  # tmp_path is not a tmpfs; force placement for the test
+    a = mgr.create('a-', expected=8000)
+    b = mgr.create('b-', expected=8000)
+    assert a.on_ram and a.path.startswith(str(ram))
+    assert not b.on_ram and b.path.startswith(str(disk))
+    with open(os.path.join(a.path, 'f'), 'wb') as f:
+        f.write(b'x' * 5000)
+    assert a.usage() >= 5000
+    assert a.cleanup() >= 5000 and not os.path.exists(a.path)
+    assert a.cleanup() == a.used  # idempotent
+    t = mgr.totals()
+    assert t['ram_reserved'] == 0 and t['ram_bytes'] >= 5000 and t['live'] == 1
+    with mgr.create('c-', expected=8000) as path:
+        assert path.startswith(str(ram))
+    assert not os.path.exists(path)
+    mgr.cleanup_all()
+    assert not os.path.exists(b.path) and mgr.totals()['live'] == 0
+
+
+def test_ram_budget_shared_between_managers(tmp_path):
+    # a second manager on the same tmpfs root stands in for a batch worker process
+    ram = tmp_path / 'ram'; ram.mkdir()
+    disk = tmp_path / 'disk'; disk.mkdir()
+    mgrs = [WorkspaceManager(ram_root=str(ram), ram_budget=10000, disk_root=str(disk)) for _ in range(2)]
+    for m in mgrs:
+        m.ram_root = str(ram)  # tmp_path is not a tmpfs
+    a = mgrs[0].create('a-', expected=8000)
+    b = mgrs[1].create('b-', expected=8000)
+    assert a.on_ram and not b.on_ram
+    assert mgrs[1].ram_budget() == 10000
+    a.cleanup()
+    c = mgrs[1].create('c-', expected=8000)
+    assert c.on_ram
+    for m in mgrs:
+        m.cleanup_all()